@@ -11,12 +11,32 @@
 - AgentOrchestrator: 主协调器
 """
 
-from .base import ExpertAgent, AgentConfig
-from .registry import AgentRegistry
-from .factory import AgentFactory
-from .router import IntentRouter, RoutingResult
-from .collaboration import CollaborationProtocol, ConsultationRequest, ConsultationResponse
-from .orchestrator import AgentOrchestrator
+import importlib
+
+# 按需导入: base / factory / collaboration 依赖 llama_index (导入约 1.5s),
+# 而 api.routes 只用到不依赖它的 agents.octopus_engine, 不应为此加载整个包
+_LAZY_EXPORTS = {
+    'ExpertAgent': '.base',
+    'AgentConfig': '.base',
+    'AgentRegistry': '.registry',
+    'AgentFactory': '.factory',
+    'IntentRouter': '.router',
+    'RoutingResult': '.router',
+    'CollaborationProtocol': '.collaboration',
+    'ConsultationRequest': '.collaboration',
+    'ConsultationResponse': '.collaboration',
+    'AgentOrchestrator': '.orchestrator',
+}
+
+
+def __getattr__(name):
+    module = _LAZY_EXPORTS.get(name)
+    if module is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(module, __name__), name)
+    globals()[name] = value
+    return value
+
 
 __all__ = [
     'ExpertAgent',
@@ -0,0 +1,29 @@
+"""batch ingestion pipeline: stage progress + resumable jobs
+
+Revision ID: 060
+Revises: 059
+Create Date: 2026-10-19
+
+批量灌注改为后台分阶段流水线:
+- stage / stage_stats: 当前阶段与各阶段吞吐
+- job_params / source_path / completed_files: 失败后从最后完成的文件续跑
+"""
+from alembic import op
+
+revision = "060"
+down_revision = "059"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.execute("ALTER TABLE batch_ingestion_jobs ADD COLUMN IF NOT EXISTS stage VARCHAR(20)")
+    op.execute("ALTER TABLE batch_ingestion_jobs ADD COLUMN IF NOT EXISTS stage_stats JSON")
+    op.execute("ALTER TABLE batch_ingestion_jobs ADD COLUMN IF NOT EXISTS job_params JSON")
+    op.execute("ALTER TABLE batch_ingestion_jobs ADD COLUMN IF NOT EXISTS source_path VARCHAR(500)")
+    op.execute("ALTER TABLE batch_ingestion_jobs ADD COLUMN IF NOT EXISTS completed_files JSON")
+
+
+def downgrade():
+    for col in ("completed_files", "source_path", "job_params", "stage_stats", "stage"):
+        op.execute(f"ALTER TABLE batch_ingestion_jobs DROP COLUMN IF EXISTS {col}")
@@ -0,0 +1,28 @@
+"""knowledge_chunks.content_hash for incremental re-embed
+
+Revision ID: 061
+Revises: 060
+Create Date: 2026-10-19
+
+chunk 级内容哈希: 重新发布时未变化的 chunk 保留 id 与向量, 仅嵌入新增/修改的 chunk。
+旧数据为 NULL, 首次重新发布时按内容回填。
+"""
+from alembic import op
+
+revision = "061"
+down_revision = "060"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.execute("ALTER TABLE knowledge_chunks ADD COLUMN IF NOT EXISTS content_hash VARCHAR(64)")
+    op.execute(
+        "CREATE INDEX IF NOT EXISTS idx_kchunk_doc_hash "
+        "ON knowledge_chunks (document_id, content_hash)"
+    )
+
+
+def downgrade():
+    op.execute("DROP INDEX IF EXISTS idx_kchunk_doc_hash")
+    op.execute("ALTER TABLE knowledge_chunks DROP COLUMN IF EXISTS content_hash")
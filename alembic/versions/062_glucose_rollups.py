@@ -0,0 +1,66 @@
+"""glucose_rollups: per-user daily/hourly glucose aggregates
+
+Revision ID: 062
+Revises: 061
+Create Date: 2026-10-19
+
+血糖日/小时聚合桶 (充分统计量 + 区间计数), 写入时增量维护, 多周视图读 O(天数) 行。
+建表后用 SQL 从 glucose_readings 一次性回填; MAGE 留空, 首次读取时按天计算。
+之后如需重建可运行 `python -m core.glucose_rollup --backfill`。
+"""
+from alembic import op
+
+revision = "062"
+down_revision = "061"
+branch_labels = None
+depends_on = None
+
+_BACKFILL = """
+INSERT INTO glucose_rollups
+    (user_id, granularity, bucket_start, count, sum_value, sum_sq, min_value, max_value,
+     n_very_low, n_low, n_in_range, n_high, n_very_high, first_at, last_at)
+SELECT user_id, '{granularity}', date_trunc('{granularity}', recorded_at),
+       COUNT(*), SUM(value), SUM(value * value), MIN(value), MAX(value),
+       COUNT(*) FILTER (WHERE value < 3.0),
+       COUNT(*) FILTER (WHERE value >= 3.0 AND value < 3.9),
+       COUNT(*) FILTER (WHERE value >= 3.9 AND value <= 10.0),
+       COUNT(*) FILTER (WHERE value > 10.0 AND value <= 13.9),
+       COUNT(*) FILTER (WHERE value > 13.9),
+       MIN(recorded_at), MAX(recorded_at)
+FROM glucose_readings
+GROUP BY user_id, date_trunc('{granularity}', recorded_at)
+ON CONFLICT (user_id, granularity, bucket_start) DO NOTHING
+"""
+
+
+def upgrade():
+    op.execute("""
+        CREATE TABLE IF NOT EXISTS glucose_rollups (
+            id SERIAL PRIMARY KEY,
+            user_id INTEGER NOT NULL REFERENCES users(id),
+            granularity VARCHAR(5) NOT NULL,
+            bucket_start TIMESTAMP NOT NULL,
+            count INTEGER NOT NULL DEFAULT 0,
+            sum_value DOUBLE PRECISION NOT NULL DEFAULT 0,
+            sum_sq DOUBLE PRECISION NOT NULL DEFAULT 0,
+            min_value DOUBLE PRECISION,
+            max_value DOUBLE PRECISION,
+            n_very_low INTEGER NOT NULL DEFAULT 0,
+            n_low INTEGER NOT NULL DEFAULT 0,
+            n_in_range INTEGER NOT NULL DEFAULT 0,
+            n_high INTEGER NOT NULL DEFAULT 0,
+            n_very_high INTEGER NOT NULL DEFAULT 0,
+            mage DOUBLE PRECISION,
+            first_at TIMESTAMP,
+            last_at TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT now(),
+            CONSTRAINT uq_glucose_rollup_bucket UNIQUE (user_id, granularity, bucket_start)
+        )
+    """)
+    op.execute("CREATE INDEX IF NOT EXISTS ix_glucose_rollups_id ON glucose_rollups (id)")
+    for granularity in ("day", "hour"):
+        op.execute(_BACKFILL.format(granularity=granularity))
+
+
+def downgrade():
+    op.execute("DROP TABLE IF EXISTS glucose_rollups")
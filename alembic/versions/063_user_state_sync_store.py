@@ -0,0 +1,62 @@
+"""user_state_sync: StateSyncManager 持久化存储 + 待审核部分索引
+
+Revision ID: 063
+Revises: 062
+Create Date: 2026-10-19
+
+StateSyncManager 以 user_state_sync 为记录源 (进程内仅保留有界 LRU, 写入后台批量落库)。
+新增 requires_review 列 (由 expert_view 回填), 以及:
+  - (user_id, timestamp) 组合索引: 用户最近事件
+  - requires_review 部分索引: 待审核列表只扫描待审核行
+"""
+from alembic import op
+
+revision = "063"
+down_revision = "062"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.execute("""
+        CREATE TABLE IF NOT EXISTS user_state_sync (
+            id SERIAL PRIMARY KEY,
+            event_id VARCHAR(36) UNIQUE NOT NULL,
+            user_id INTEGER NOT NULL,
+            event_type VARCHAR(50) NOT NULL,
+            timestamp TIMESTAMP NOT NULL,
+            client_view JSONB NOT NULL,
+            coach_view JSONB NOT NULL,
+            expert_view JSONB,
+            trigger_id VARCHAR(50),
+            action_id VARCHAR(50),
+            processed INTEGER DEFAULT 1,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+    op.execute("""
+        ALTER TABLE user_state_sync
+        ADD COLUMN IF NOT EXISTS requires_review BOOLEAN NOT NULL DEFAULT FALSE
+    """)
+    op.execute("""
+        UPDATE user_state_sync SET requires_review = TRUE
+        WHERE (expert_view ->> 'requires_review')::boolean IS TRUE AND NOT requires_review
+    """)
+    op.execute("CREATE INDEX IF NOT EXISTS ix_user_state_sync_user_id ON user_state_sync (user_id)")
+    op.execute("CREATE INDEX IF NOT EXISTS idx_user_state_sync_event_type ON user_state_sync (event_type)")
+    op.execute("CREATE INDEX IF NOT EXISTS idx_user_state_sync_timestamp ON user_state_sync (timestamp)")
+    op.execute("""
+        CREATE INDEX IF NOT EXISTS idx_user_state_sync_user_ts
+        ON user_state_sync (user_id, timestamp)
+    """)
+    op.execute("""
+        CREATE INDEX IF NOT EXISTS idx_user_state_sync_pending
+        ON user_state_sync (timestamp) WHERE requires_review
+    """)
+
+
+def downgrade():
+    op.execute("DROP INDEX IF EXISTS idx_user_state_sync_pending")
+    op.execute("DROP INDEX IF EXISTS idx_user_state_sync_user_ts")
+    op.execute("ALTER TABLE user_state_sync DROP COLUMN IF EXISTS requires_review")
@@ -0,0 +1,38 @@
+"""exam_400_candidates: 400分制考核考生状态持久化
+
+Revision ID: 064
+Revises: 063
+Create Date: 2026-10-19
+
+Exam400Engine 的考生进度原先只在进程内 dict 中, 多 worker 之间不一致且重启丢失。
+每考生一行, 状态整体存 JSONB, version 用于乐观并发写入
+(UPDATE ... WHERE user_id = :uid AND version = :ver)。
+"""
+from alembic import op
+
+revision = "064"
+down_revision = "063"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.execute("""
+        CREATE TABLE IF NOT EXISTS exam_400_candidates (
+            user_id INTEGER PRIMARY KEY REFERENCES users(id) ON DELETE CASCADE,
+            coach_track VARCHAR(20) NOT NULL,
+            certification_result VARCHAR(30) NOT NULL,
+            state JSONB NOT NULL,
+            version INTEGER NOT NULL DEFAULT 1,
+            created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+    op.execute("""
+        CREATE INDEX IF NOT EXISTS ix_exam_400_candidates_certification_result
+        ON exam_400_candidates (certification_result)
+    """)
+
+
+def downgrade():
+    op.execute("DROP TABLE IF EXISTS exam_400_candidates")
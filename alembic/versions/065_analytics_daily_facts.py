@@ -0,0 +1,58 @@
+"""analytics_daily_facts / analytics_watermarks: 增量物化分析事实表
+
+Revision ID: 065
+Revises: 064
+Create Date: 2026-10-19
+
+每日聚合任务与管理端报表原先按全量历史逐指标 COUNT(*)。
+改为 (day, tenant_id, role) 事实行, 按各来源表水位增量刷新 (core/analytics_facts.py);
+micro_action_tasks 按 completed_at 增量扫描, 补索引。
+"""
+from alembic import op
+
+revision = "065"
+down_revision = "064"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.execute("""
+        CREATE TABLE IF NOT EXISTS analytics_daily_facts (
+            day DATE NOT NULL,
+            tenant_id VARCHAR(64) NOT NULL DEFAULT '',
+            role VARCHAR(30) NOT NULL,
+            active_users INTEGER NOT NULL DEFAULT 0,
+            retained_7d INTEGER NOT NULL DEFAULT 0,
+            new_users INTEGER NOT NULL DEFAULT 0,
+            accounts_active INTEGER NOT NULL DEFAULT 0,
+            total_events INTEGER NOT NULL DEFAULT 0,
+            chat_events INTEGER NOT NULL DEFAULT 0,
+            ai_response_ms_sum DOUBLE PRECISION NOT NULL DEFAULT 0,
+            ai_response_count INTEGER NOT NULL DEFAULT 0,
+            chat_messages INTEGER NOT NULL DEFAULT 0,
+            tasks_completed INTEGER NOT NULL DEFAULT 0,
+            assessments INTEGER NOT NULL DEFAULT 0,
+            high_risk_assessments INTEGER NOT NULL DEFAULT 0,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (day, tenant_id, role)
+        )
+    """)
+    op.execute("CREATE INDEX IF NOT EXISTS idx_adf_tenant_day ON analytics_daily_facts (tenant_id, day)")
+    op.execute("""
+        CREATE TABLE IF NOT EXISTS analytics_watermarks (
+            source VARCHAR(40) PRIMARY KEY,
+            watermark TIMESTAMP NOT NULL,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+    op.execute("""
+        CREATE INDEX IF NOT EXISTS idx_micro_task_completed_at
+        ON micro_action_tasks (completed_at)
+    """)
+
+
+def downgrade():
+    op.execute("DROP INDEX IF EXISTS idx_micro_task_completed_at")
+    op.execute("DROP TABLE IF EXISTS analytics_watermarks")
+    op.execute("DROP TABLE IF EXISTS analytics_daily_facts")
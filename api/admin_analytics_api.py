@@ -24,6 +24,7 @@ from core.models import (
     User, UserRole, Assessment, BehavioralProfile, RiskLevel,
     MicroActionTask,
     ChallengeTemplate, ChallengeEnrollment, EnrollmentStatus,
+    AnalyticsDailyFact,
 )
 from api.dependencies import require_admin, require_coach_or_admin
 
@@ -160,16 +161,17 @@ def get_user_growth(
     db: Session = Depends(get_db),
     current_user: User = Depends(require_coach_or_admin),
 ):
-    """用户增长趋势 (bar + line)"""
-    since = datetime.utcnow() - timedelta(days=months * 30)
+    """用户增长趋势 (bar + line), 读取增量物化的 analytics_daily_facts"""
+    since = (datetime.utcnow() - timedelta(days=months * 30)).date()
+    month = func.to_char(AnalyticsDailyFact.day, 'YYYY-MM')
     rows = (
         db.query(
-            func.to_char(User.created_at, 'YYYY-MM').label("month"),
-            func.count().label("new_users"),
+            month.label("month"),
+            func.sum(AnalyticsDailyFact.new_users).label("new_users"),
         )
-        .filter(User.created_at >= since)
-        .group_by(func.to_char(User.created_at, 'YYYY-MM'))
-        .order_by(func.to_char(User.created_at, 'YYYY-MM'))
+        .filter(AnalyticsDailyFact.day >= since)
+        .group_by(month)
+        .order_by(month)
         .all()
     )
 
@@ -14,6 +14,7 @@ from loguru import logger
 
 from core.database import get_db
 from core.models import Assessment, User, TriggerRecord
+from core.home_snapshot_cache import invalidate_home_snapshot
 from api.dependencies import get_current_user
 
 # 创建路由器
@@ -378,6 +379,7 @@ def submit_assessment(
 
         db.commit()
         db.refresh(assessment)
+        invalidate_home_snapshot(current_user.id)
 
         logger.info(f"✓ 评估提交成功: {assessment_id}, 风险等级: {risk_level}")
 
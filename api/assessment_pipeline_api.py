@@ -27,6 +27,7 @@ from core.brain.stage_runtime import StageRuntimeBuilder, StageInput
 from core.brain.policy_gate import RuntimePolicyGate
 from core.intervention_matcher import InterventionMatcher
 from core.behavior_facts_service import BehaviorFactsService
+from core.home_snapshot_cache import invalidate_home_snapshot
 from api.dependencies import get_current_user, require_coach_or_admin
 
 router = APIRouter(prefix="/api/v1/assessment", tags=["评估管道"])
@@ -239,6 +240,7 @@ async def evaluate_full_pipeline(
 
         # === Step 6: 提交 & 返回 ===
         db.commit()
+        invalidate_home_snapshot(user_id)
 
         return {
             "success": True,
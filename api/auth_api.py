@@ -17,7 +17,7 @@ from typing import Optional
 from datetime import datetime
 
 from core.database import get_db
-from core.models import User, UserRole, UserSession, UserActivityLog
+from core.models import User, UserRole, UserSession, UserActivityLog, ExpertTenant, TenantClient
 from core.auth import (
     hash_password, authenticate_user, create_user_tokens,
     verify_token, verify_token_with_blacklist
@@ -58,6 +58,18 @@ def normalize_role(role: str) -> str:
     return ROLE_MIGRATION_MAP.get(role_value.lower(), role_value.lower())
 
 
+def _tenant_id_for(user_id: int, db: Session) -> Optional[str]:
+    """用户所属租户 (专家本人的租户优先, 其次 active 客户关系), 签入令牌供限流使用"""
+    tenant = db.query(ExpertTenant.id).filter(ExpertTenant.expert_user_id == user_id).first()
+    if tenant:
+        return tenant.id
+    client = db.query(TenantClient.tenant_id).filter(
+        TenantClient.user_id == user_id,
+        TenantClient.status == "active",
+    ).first()
+    return client.tenant_id if client else None
+
+
 # ============================================
 # 密码强度验证 (FIX-05)
 # ============================================
@@ -337,7 +349,8 @@ async def login(request: Request, db: Session = Depends(get_db)):
         tokens = create_user_tokens(
             user_id=user.id,
             username=user.username,
-            role=user.role.value
+            role=user.role.value,
+            tenant_id=_tenant_id_for(user.id, db),
         )
 
         logger.info(f"[LOGIN] Tokens generated successfully")
@@ -423,7 +436,8 @@ def refresh_token_endpoint(
     tokens = create_user_tokens(
         user_id=user.id,
         username=user.username,
-        role=user.role.value
+        role=user.role.value,
+        tenant_id=_tenant_id_for(user.id, db),
     )
 
     normalized_role = normalize_role(user.role)
@@ -575,7 +589,7 @@ async def sms_login(
 
     # 生成 token
     role_str = user.role.value if hasattr(user.role, "value") else str(user.role)
-    tokens = create_user_tokens(user.id, user.username, role_str)
+    tokens = create_user_tokens(user.id, user.username, role_str, tenant_id=_tenant_id_for(user.id, db))
 
     ROLE_LEVELS = {"observer": 1, "grower": 2, "sharer": 3, "coach": 4, "promoter": 5, "supervisor": 5, "master": 6, "admin": 99}
 
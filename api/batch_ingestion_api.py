@@ -2,11 +2,13 @@
 批量知识灌注 API
 
 支持 PDF/DOCX/TXT/MD/ZIP/7Z/RAR 批量上传
+上传后立即返回 job_id, 转换/分块/嵌入/入库在后台流水线中执行, 进度见 /batch-jobs/{job_id}
 """
 import os
 import tempfile
 import shutil
-from fastapi import APIRouter, Depends, UploadFile, File, Form, HTTPException
+from datetime import datetime, timedelta
+from fastapi import APIRouter, BackgroundTasks, Depends, UploadFile, File, Form, HTTPException
 from sqlalchemy.orm import Session
 from typing import Optional
 from loguru import logger
@@ -19,10 +21,12 @@ router = APIRouter(prefix="/api/v1/knowledge", tags=["批量知识灌注"])
 
 ALLOWED_EXTENSIONS = {".pdf", ".docx", ".txt", ".md", ".zip", ".7z", ".rar"}
 MAX_FILE_SIZE = 100 * 1024 * 1024  # 100MB
+STALE_JOB_MINUTES = 15
 
 
 @router.post("/batch-upload")
 async def batch_upload(
+    background_tasks: BackgroundTasks,
     file: UploadFile = File(...),
     scope: str = Form("platform"),
     domain_id: Optional[str] = Form(None),
@@ -56,18 +60,24 @@ async def batch_upload(
         with os.fdopen(tmp_fd, "wb") as f:
             f.write(content)
 
-        from core.knowledge.batch_ingestion_service import process_batch_upload
-        job = process_batch_upload(
-            db=db,
-            user_id=current_user.id,
-            file_path=tmp_path,
-            filename=filename,
-            scope=scope,
-            domain_id=domain_id,
-            tenant_id=tenant_id,
-            evidence_tier=evidence_tier,
-            priority=priority,
+        from core.knowledge.batch_ingestion_service import (
+            create_batch_job, run_ingestion_job_background,
         )
+        try:
+            job = create_batch_job(
+                db=db,
+                user_id=current_user.id,
+                file_path=tmp_path,
+                filename=filename,
+                scope=scope,
+                domain_id=domain_id,
+                tenant_id=tenant_id,
+                evidence_tier=evidence_tier,
+                priority=priority,
+            )
+        except ValueError as e:
+            raise HTTPException(400, str(e))
+        background_tasks.add_task(run_ingestion_job_background, job.id)
 
         return {
             "job_id": job.id,
@@ -108,6 +118,7 @@ def list_batch_jobs(
                 "total_files": j.total_files,
                 "processed_files": j.processed_files,
                 "total_chunks": j.total_chunks,
+                "stage": j.stage,
                 "error_message": j.error_message,
                 "created_at": j.created_at.isoformat() if j.created_at else None,
             }
@@ -138,6 +149,8 @@ def get_batch_job(
         "total_files": job.total_files,
         "processed_files": job.processed_files,
         "total_chunks": job.total_chunks,
+        "stage": job.stage,
+        "stage_stats": job.stage_stats,
         "error_message": job.error_message,
         "result_doc_ids": job.result_doc_ids,
         "created_at": job.created_at.isoformat() if job.created_at else None,
@@ -145,6 +158,45 @@ def get_batch_job(
     }
 
 
+@router.post("/batch-jobs/{job_id}/resume")
+def resume_batch_job(
+    job_id: int,
+    background_tasks: BackgroundTasks,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(require_coach_or_admin),
+):
+    """续跑失败的批量灌注任务 (从最后完成的文件之后开始)"""
+    job = db.query(BatchIngestionJob).filter(
+        BatchIngestionJob.id == job_id,
+        BatchIngestionJob.user_id == current_user.id,
+    ).first()
+    if not job:
+        raise HTTPException(404, "任务不存在")
+
+    # 进程崩溃遗留的 processing/pending 任务超过 STALE_JOB_MINUTES 无进度也可续跑
+    stale = (
+        job.status in ("pending", "processing")
+        and job.updated_at is not None
+        and datetime.utcnow() - job.updated_at > timedelta(minutes=STALE_JOB_MINUTES)
+    )
+    if job.status != "failed" and not stale:
+        raise HTTPException(400, f"仅失败任务可续跑 (当前: {job.status})")
+    if not job.source_path or not os.path.exists(job.source_path):
+        raise HTTPException(400, "上传文件已不存在，请重新上传")
+
+    from core.knowledge.batch_ingestion_service import run_ingestion_job_background
+    job.status = "pending"
+    db.commit()
+    background_tasks.add_task(run_ingestion_job_background, job.id)
+
+    return {
+        "job_id": job.id,
+        "status": job.status,
+        "completed_files": len(job.completed_files or []),
+        "total_files": job.total_files,
+    }
+
+
 @router.delete("/batch-jobs/{job_id}")
 def cancel_batch_job(
     job_id: int,
@@ -162,6 +214,8 @@ def cancel_batch_job(
     if job.status == "processing":
         raise HTTPException(400, "任务正在处理中，无法取消")
 
+    from core.knowledge.batch_ingestion_service import delete_job_source
+    delete_job_source(job)
     db.delete(job)
     db.commit()
     return {"message": "任务已删除"}
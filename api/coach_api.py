@@ -1185,6 +1185,28 @@ def get_student_glucose(
     }
 
 
+@router.get("/students/{student_id}/glucose/summary")
+def get_student_glucose_summary(
+    student_id: int,
+    days: int = Query(14, ge=1, le=90),
+    db: Session = Depends(get_db),
+    current_user: User = Depends(require_coach_or_admin),
+):
+    """教练查看学员血糖指标 (TIR/TBR/TAR、CV、GMI、MAGE), 读日聚合桶"""
+    from core.glucose_rollup import glucose_summary
+
+    student = _verify_coach_student(db, current_user, student_id)
+    end_day = datetime.utcnow().date()
+    result = glucose_summary(db, student.id, end_day - timedelta(days=days - 1), end_day)
+    db.commit()  # 持久化本次重算的 MAGE
+    return {
+        "student_id": student.id,
+        "student_name": student.full_name or student.username,
+        "days": days,
+        **result,
+    }
+
+
 @router.get("/students/{student_id}/sleep")
 def get_student_sleep(
     student_id: int,
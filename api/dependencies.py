@@ -14,13 +14,45 @@ from loguru import logger
 
 from core.database import get_db
 from core.models import User, UserRole
-from core.auth import verify_token_with_blacklist
+from core.auth import TokenBlacklist, token_blacklist, verify_token_with_blacklist
+from core.auth_cache import Principal, principal_cache
 
 # OAuth2密码模式
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/api/v1/auth/login")
 oauth2_scheme_optional = OAuth2PasswordBearer(tokenUrl="/api/v1/auth/login", auto_error=False)
 
 
+def _resolve_user(token: str, db: Session) -> Optional[User]:
+    """
+    token → User (未校验 is_active); 无效 / 已撤销 / 用户不存在返回 None
+
+    常规路径命中认证主体缓存: 撤销检查走进程内过滤器, User 由快照挂到会话,
+    不做 JWT 解码、不访问 Redis、不查 users 表。
+    """
+    token_hash = TokenBlacklist._hash(token)
+    principal = principal_cache.get(token_hash)
+    if principal is not None:
+        if token_blacklist.is_hash_revoked(token_hash):
+            principal_cache.invalidate_token(token_hash)
+            return None
+        return principal.attach(db)
+
+    # 验证Token（含黑名单检查）
+    payload = verify_token_with_blacklist(token, "access")
+    if payload is None:
+        return None
+
+    # 获取用户ID (兼容 V1 user_id 和 V3 sub)
+    user_id = payload.get("user_id") or payload.get("sub")
+    if user_id is None:
+        return None
+
+    user = db.query(User).filter(User.id == int(user_id)).first()
+    if user is not None:
+        principal_cache.put(token_hash, Principal.from_user(user), token_exp=payload.get("exp"))
+    return user
+
+
 def get_optional_user(
     token: Optional[str] = Depends(oauth2_scheme_optional),
     db: Session = Depends(get_db),
@@ -32,13 +64,7 @@ def get_optional_user(
     if not token:
         return None
     try:
-        payload = verify_token_with_blacklist(token, "access")
-        if payload is None:
-            return None
-        user_id = payload.get("user_id") or payload.get("sub")
-        if user_id is None:
-            return None
-        user = db.query(User).filter(User.id == int(user_id)).first()
+        user = _resolve_user(token, db)
         if user and user.is_active:
             return user
         return None
@@ -53,7 +79,7 @@ def get_current_user(
     """
     获取当前认证用户
 
-    从JWT token中解析用户信息并验证
+    从JWT token中解析用户信息并验证 (认证主体缓存命中时跳过解码与查询)
 
     Args:
         token: JWT access token
@@ -72,19 +98,7 @@ def get_current_user(
     )
 
     try:
-        # 验证Token（含黑名单检查）
-        payload = verify_token_with_blacklist(token, "access")
-        if payload is None:
-            raise credentials_exception
-
-        # 获取用户ID (兼容 V1 user_id 和 V3 sub)
-        user_id = payload.get("user_id") or payload.get("sub")
-        if user_id is None:
-            raise credentials_exception
-        user_id = int(user_id)
-
-        # 从数据库获取用户
-        user = db.query(User).filter(User.id == user_id).first()
+        user = _resolve_user(token, db)
         if user is None:
             raise credentials_exception
 
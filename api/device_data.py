@@ -21,6 +21,8 @@ import enum
 
 import asyncio
 
+import numpy as np
+
 from api.dependencies import get_current_user
 from core.database import get_db_session, db_transaction
 from core.models import (
@@ -28,6 +30,8 @@ from core.models import (
     GlucoseReading, HeartRateReading, HRVReading,
     SleepRecord, ActivityRecord, WorkoutRecord, VitalSign
 )
+from core import glucose_rollup
+from core.glucose_rollup import band_masks, rollup_on_ingest
 
 router = APIRouter(prefix="/device", tags=["设备数据"])
 
@@ -198,37 +202,34 @@ def get_trend_arrow(trend: Optional[str]) -> Optional[str]:
 
 
 def calculate_glucose_stats(readings: List[GlucoseReading]) -> GlucoseStatistics:
-    """计算血糖统计"""
+    """计算血糖统计 (readings 只需带 .value, ORM 对象或列查询结果均可)"""
     if not readings:
         return GlucoseStatistics()
 
-    values = [r.value for r in readings]
-    avg = sum(values) / len(values)
+    values = np.fromiter((r.value for r in readings), dtype=float, count=len(readings))
+    avg = float(values.mean())
 
     # 标准差
-    if len(values) > 1:
-        variance = sum((x - avg) ** 2 for x in values) / len(values)
-        std = variance ** 0.5
+    if values.size > 1:
+        std = float(values.std())
         cv = (std / avg) * 100 if avg > 0 else 0
     else:
         std = 0
         cv = 0
 
-    # 范围时间 (TIR: 3.9-10.0)
-    in_range = sum(1 for v in values if 3.9 <= v <= 10.0)
-    below = sum(1 for v in values if v < 3.9)
-    above = sum(1 for v in values if v > 10.0)
-    total = len(values)
+    # 范围时间 (TIR: 3.9-10.0), 区间口径与 glucose_rollups 一致
+    very_low, low, in_range, high, very_high = band_masks(values)
+    total = int(values.size)
 
     return GlucoseStatistics(
         avg_glucose=round(avg, 2),
-        min_glucose=round(min(values), 2),
-        max_glucose=round(max(values), 2),
+        min_glucose=round(float(values.min()), 2),
+        max_glucose=round(float(values.max()), 2),
         std_glucose=round(std, 2),
         cv=round(cv, 1),
-        time_in_range=round(in_range / total * 100, 1) if total > 0 else None,
-        time_below_range=round(below / total * 100, 1) if total > 0 else None,
-        time_above_range=round(above / total * 100, 1) if total > 0 else None,
+        time_in_range=round(int(in_range.sum()) / total * 100, 1),
+        time_below_range=round(int((very_low | low).sum()) / total * 100, 1),
+        time_above_range=round(int((high | very_high).sum()) / total * 100, 1),
         readings_count=total
     )
 
@@ -389,6 +390,7 @@ async def record_glucose_manual(
             )
             db.add(glucose)
             db.flush()
+            rollup_on_ingest(db, user_id, [(recorded_at, reading.value)])
 
             logger.info(f"[Glucose] Manual record: user={user_id}, value={reading.value}")
 
@@ -541,17 +543,18 @@ async def get_current_glucose(user_id: int = Depends(get_current_user_id)):
 @router.get("/glucose/chart/daily")
 async def get_glucose_daily_chart(
     date: str = Query(..., description="日期 YYYY-MM-DD"),
+    max_points: Optional[int] = Query(None, ge=3, le=2000, description="LTTB 降采样点数, 不传则返回全部"),
     user_id: int = Depends(get_current_user_id)
 ):
     """
-    获取每日血糖图表数据
+    获取每日血糖图表数据 (统计基于全部读数, 曲线可按 max_points 降采样)
     """
     try:
         target_date = datetime.strptime(date, "%Y-%m-%d")
         next_date = target_date + timedelta(days=1)
 
         with db_transaction() as db:
-            readings = db.query(GlucoseReading).filter(
+            readings = db.query(GlucoseReading.recorded_at, GlucoseReading.value).filter(
                 GlucoseReading.user_id == user_id,
                 GlucoseReading.recorded_at >= target_date,
                 GlucoseReading.recorded_at < next_date
@@ -565,11 +568,16 @@ async def get_glucose_daily_chart(
                     "message": "当天无血糖数据"
                 }
 
-            timestamps = [r.recorded_at.strftime("%H:%M") for r in readings]
-            values = [r.value for r in readings]
-
             stats = calculate_glucose_stats(readings)
 
+            points = readings
+            if max_points:
+                keep = glucose_rollup.lttb([r.recorded_at.timestamp() for r in readings],
+                                           [r.value for r in readings], max_points)
+                points = [readings[i] for i in keep]
+            timestamps = [r.recorded_at.strftime("%H:%M") for r in points]
+            values = [r.value for r in points]
+
             return {
                 "date": date,
                 "chart_data": {
@@ -594,6 +602,48 @@ async def get_glucose_daily_chart(
         return {"date": date, "chart_data": {}, "error": str(e)}
 
 
+@router.get("/glucose/summary")
+async def get_glucose_summary(
+    days: int = Query(14, ge=1, le=90, description="最近 N 天 (含今天)"),
+    user_id: int = Depends(get_current_user_id)
+):
+    """
+    多日血糖指标 (TIR/TBR/TAR 分级、CV、GMI、MAGE) 与逐日指标
+
+    读取日聚合桶, 与读数数量无关。
+    """
+    try:
+        end_day = datetime.utcnow().date()
+        with db_transaction() as db:
+            return glucose_rollup.glucose_summary(db, user_id, end_day - timedelta(days=days - 1), end_day)
+    except Exception as e:
+        logger.error(f"Get glucose summary error: {e}")
+        return {"period": {}, "summary": {"readings_count": 0}, "daily": [], "error": str(e)}
+
+
+@router.get("/glucose/chart/trend")
+async def get_glucose_trend_chart(
+    days: int = Query(14, ge=1, le=90),
+    max_points: int = Query(200, ge=3, le=2000, description="LTTB 降采样点数"),
+    user_id: int = Depends(get_current_user_id)
+):
+    """
+    多日血糖趋势 (小时均值曲线, LTTB 降采样)
+    """
+    try:
+        end = datetime.utcnow() + timedelta(hours=1)
+        with db_transaction() as db:
+            chart = glucose_rollup.hourly_trend(db, user_id, end - timedelta(days=days), end, max_points)
+        return {
+            "days": days,
+            "chart_data": {**chart, "target_low": glucose_rollup.TARGET_LOW,
+                           "target_high": glucose_rollup.TARGET_HIGH},
+        }
+    except Exception as e:
+        logger.error(f"Get glucose trend error: {e}")
+        return {"days": days, "chart_data": {}, "error": str(e)}
+
+
 # ============================================
 # 体重/体征数据 API
 # ============================================
@@ -873,26 +923,26 @@ async def get_today_dashboard(user_id: int = Depends(get_current_user_id)):
         today_end = datetime.combine(today + timedelta(days=1), datetime.min.time())
 
         with db_transaction() as db:
-            # 血糖数据
-            glucose_readings = db.query(GlucoseReading).filter(
+            # 血糖数据: 最新一条 + 当日聚合桶
+            latest = db.query(GlucoseReading).filter(
                 GlucoseReading.user_id == user_id,
                 GlucoseReading.recorded_at >= today_start,
                 GlucoseReading.recorded_at < today_end
-            ).order_by(GlucoseReading.recorded_at.desc()).all()
+            ).order_by(GlucoseReading.recorded_at.desc()).first()
 
             glucose_data = None
-            if glucose_readings:
-                latest = glucose_readings[0]
-                stats = calculate_glucose_stats(glucose_readings)
+            if latest:
+                stats = glucose_rollup.summarize(
+                    glucose_rollup.load_rollups(db, user_id, today_start, today_end))
                 in_range = 3.9 <= latest.value <= 10.0
                 glucose_data = {
                     "current": latest.value,
                     "current_mgdl": mmol_to_mgdl(latest.value),
                     "trend": latest.trend,
                     "trend_arrow": get_trend_arrow(latest.trend),
-                    "avg_today": stats.avg_glucose,
-                    "tir_today": stats.time_in_range,
-                    "readings_count": stats.readings_count,
+                    "avg_today": stats.get("mean"),
+                    "tir_today": stats.get("tir"),
+                    "readings_count": stats["readings_count"],
                     "status": "good" if in_range else ("low" if latest.value < 3.9 else "high"),
                     "last_reading_at": latest.recorded_at.isoformat()
                 }
@@ -1011,6 +1061,7 @@ async def sync_device_data(
                 raise HTTPException(status_code=404, detail="设备未绑定")
 
             # 处理血糖数据
+            new_glucose = []
             if "glucose" in data and data["glucose"].get("readings"):
                 for reading in data["glucose"]["readings"]:
                     glucose = GlucoseReading(
@@ -1023,7 +1074,10 @@ async def sync_device_data(
                         recorded_at=datetime.fromisoformat(reading["timestamp"].replace("Z", "+00:00"))
                     )
                     db.add(glucose)
+                    new_glucose.append((glucose.recorded_at, glucose.value))
                     records_processed += 1
+                db.flush()
+                rollup_on_ingest(db, user_id, new_glucose)
 
             # 更新设备同步时间
             device.last_sync_at = datetime.utcnow()
@@ -1106,6 +1160,7 @@ async def sync_device_data_batch(
             data = request.data
 
             # 处理血糖数据
+            new_glucose = []
             if "glucose" in data and data["glucose"].get("readings"):
                 for reading in data["glucose"]["readings"]:
                     try:
@@ -1131,10 +1186,14 @@ async def sync_device_data_batch(
                                 recorded_at=recorded_at
                             )
                             db.add(glucose)
+                            new_glucose.append((recorded_at, glucose.value))
                             records_new += 1
                         records_processed += 1
                     except Exception as e:
                         errors.append(f"glucose: {str(e)}")
+                if new_glucose:
+                    db.flush()
+                    rollup_on_ingest(db, user_id, new_glucose)
 
             # 处理心率数据
             if "heart_rate" in data and data["heart_rate"].get("readings"):
@@ -523,6 +523,9 @@ def create_glucose_reading(
     )
 
     db.add(reading)
+    db.flush()
+    from core.glucose_rollup import rollup_on_ingest
+    rollup_on_ingest(db, current_user.id, [(recorded_at, req.value)])
     db.commit()
     db.refresh(reading)
 
@@ -3,379 +3,417 @@
 Unified Home API — auto-routes by user role
 
 每个角色返回 2-4 个最基础数据块，复用飞轮API的SQL逻辑。
+
+每个数据块 (section) 是互不依赖的聚合查询:
+  - 有连接池时各 section 各取一个连接并发执行, 首页耗时 ≈ 最慢的一条查询
+  - section 失败只降级该数据块 (返回默认值), 不影响其他数据块
+  - 结果按 (首页类型, 用户) 写入快照缓存 (core/home_snapshot_cache.py),
+    打卡 / 审核 / 新评估等领域事件使对应用户的快照失效
 """
 
+import asyncio
+import copy
 import logging
 from datetime import date, datetime, timedelta
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
 
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, Response
 from sqlalchemy import text
 from sqlalchemy.ext.asyncio import AsyncSession
 
+from core import database
 from core.database import get_async_db as get_db
+from core.home_snapshot_cache import HOME_SNAPSHOT_ENABLED, home_snapshot_cache
 from api.dependencies import get_current_user
 
 logger = logging.getLogger(__name__)
 
 router = APIRouter(prefix="/api/v1", tags=["home"])
 
+SectionFn = Callable[[int, AsyncSession], Awaitable[Any]]
+
 
 # ──────────────────────────────────────────────
 # Observer (role_level=1): 配额 + 评估进度
 # ──────────────────────────────────────────────
-async def _observer_home(user_id: int, db: AsyncSession) -> dict:
-    quota = {}
-    try:
-        today_start = datetime.combine(date.today(), datetime.min.time())
-        tomorrow_start = today_start + timedelta(days=1)
-        result = await db.execute(text("""
-            SELECT quota_type, COUNT(*) as cnt
-            FROM observer_quota_logs
-            WHERE user_id = :uid
-              AND created_at >= :today_start
-              AND created_at < :tomorrow_start
-            GROUP BY quota_type
-        """), {"uid": user_id, "today_start": today_start, "tomorrow_start": tomorrow_start})
-        rows = result.mappings().all()
-        used = {r["quota_type"]: r["cnt"] for r in rows}
-        chat_used = used.get("chat", 0)
-        food_used = used.get("food_scan", 0)
-        voice_used = used.get("voice", 0)
-        quota = {
-            "chat_remaining": max(3 - chat_used, 0),
-            "food_scan_remaining": max(3 - food_used, 0),
-            "voice_remaining": max(3 - voice_used, 0),
-            "total_remaining": max(9 - chat_used - food_used - voice_used, 0),
-        }
-    except Exception as e:
-        logger.warning(f"[home] observer quota error: {e}")
-        quota = {"chat_remaining": 3, "food_scan_remaining": 3, "voice_remaining": 3, "total_remaining": 9}
-
-    assessment = {}
-    try:
-        result = await db.execute(text("""
-            SELECT DISTINCT module_type
-            FROM assessment_sessions
-            WHERE user_id = :uid AND status = 'completed'
-        """), {"uid": user_id})
-        completed = {r["module_type"] for r in result.mappings().all()}
-        has_pending = len(completed) < 5
-        next_step = "完成BAPS基线评估" if not completed else "继续完成评估模块"
-        assessment = {
-            "has_pending": has_pending,
-            "completed_count": len(completed),
-            "next_step": next_step,
-        }
-    except Exception as e:
-        logger.warning(f"[home] observer assessment error: {e}")
-        assessment = {"has_pending": True, "completed_count": 0, "next_step": "完成BAPS基线评估"}
-
-    return {"quota": quota, "assessment": assessment}
+async def _observer_quota(user_id: int, db: AsyncSession) -> dict:
+    today_start = datetime.combine(date.today(), datetime.min.time())
+    tomorrow_start = today_start + timedelta(days=1)
+    result = await db.execute(text("""
+        SELECT quota_type, COUNT(*) as cnt
+        FROM observer_quota_logs
+        WHERE user_id = :uid
+          AND created_at >= :today_start
+          AND created_at < :tomorrow_start
+        GROUP BY quota_type
+    """), {"uid": user_id, "today_start": today_start, "tomorrow_start": tomorrow_start})
+    rows = result.mappings().all()
+    used = {r["quota_type"]: r["cnt"] for r in rows}
+    chat_used = used.get("chat", 0)
+    food_used = used.get("food_scan", 0)
+    voice_used = used.get("voice", 0)
+    return {
+        "chat_remaining": max(3 - chat_used, 0),
+        "food_scan_remaining": max(3 - food_used, 0),
+        "voice_remaining": max(3 - voice_used, 0),
+        "total_remaining": max(9 - chat_used - food_used - voice_used, 0),
+    }
+
+
+async def _observer_assessment(user_id: int, db: AsyncSession) -> dict:
+    result = await db.execute(text("""
+        SELECT DISTINCT module_type
+        FROM assessment_sessions
+        WHERE user_id = :uid AND status = 'completed'
+    """), {"uid": user_id})
+    completed = {r["module_type"] for r in result.mappings().all()}
+    has_pending = len(completed) < 5
+    next_step = "完成BAPS基线评估" if not completed else "继续完成评估模块"
+    return {
+        "has_pending": has_pending,
+        "completed_count": len(completed),
+        "next_step": next_step,
+    }
 
 
 # ──────────────────────────────────────────────
 # Grower (role_level=2): 今日任务 + 教练提示
 # ──────────────────────────────────────────────
-async def _grower_home(user_id: int, db: AsyncSession) -> dict:
-    today_data = {}
-    try:
-        today_str = date.today().isoformat()
-        result = await db.execute(text("""
-            SELECT COUNT(*) as total,
-                   SUM(CASE WHEN done THEN 1 ELSE 0 END) as done_count
-            FROM daily_tasks
-            WHERE user_id = :uid AND task_date = :today
-        """), {"uid": user_id, "today": today_str})
-        row = result.mappings().first()
-        total = row["total"] if row else 0
-        done = row["done_count"] if row else 0
-        done = done or 0
-
-        # streak
-        streak_days = 0
-        sr = await db.execute(text("""
-            SELECT current_streak FROM user_streaks WHERE user_id = :uid
-        """), {"uid": user_id})
-        streak_row = sr.mappings().first()
-        if streak_row:
-            streak_days = streak_row["current_streak"] or 0
-
-        today_data = {
-            "done_count": int(done),
-            "total_count": int(total),
-            "completion_pct": round(int(done) * 100 / max(int(total), 1)),
-            "streak_days": int(streak_days),
-        }
-    except Exception as e:
-        logger.warning(f"[home] grower today error: {e}")
-        today_data = {"done_count": 0, "total_count": 0, "completion_pct": 0, "streak_days": 0}
-
-    coach_tip = {}
-    try:
-        result = await db.execute(text("""
-            SELECT push_content, push_type
-            FROM coach_review_queue
-            WHERE student_id = :uid AND status = 'approved'
-            ORDER BY reviewed_at DESC NULLS LAST
-            LIMIT 1
-        """), {"uid": user_id})
-        row = result.mappings().first()
-        if row and row["push_content"]:
-            coach_tip = {"tip": row["push_content"], "tip_type": row["push_type"] or "encouragement", "review_status": "approved"}
-        else:
-            coach_tip = {"tip": "坚持每日打卡，养成健康习惯", "tip_type": "encouragement", "review_status": "auto"}
-    except Exception as e:
-        logger.warning(f"[home] grower coach_tip error: {e}")
-        coach_tip = {"tip": "坚持每日打卡，养成健康习惯", "tip_type": "encouragement", "review_status": "auto"}
-
-    return {"today": today_data, "coach_tip": coach_tip}
+async def _grower_today(user_id: int, db: AsyncSession) -> dict:
+    today_str = date.today().isoformat()
+    result = await db.execute(text("""
+        SELECT COUNT(*) as total,
+               SUM(CASE WHEN done THEN 1 ELSE 0 END) as done_count
+        FROM daily_tasks
+        WHERE user_id = :uid AND task_date = :today
+    """), {"uid": user_id, "today": today_str})
+    row = result.mappings().first()
+    total = row["total"] if row else 0
+    done = row["done_count"] if row else 0
+    done = done or 0
+    return {
+        "done_count": int(done),
+        "total_count": int(total),
+        "completion_pct": round(int(done) * 100 / max(int(total), 1)),
+    }
+
+
+async def _grower_streak(user_id: int, db: AsyncSession) -> int:
+    sr = await db.execute(text("""
+        SELECT current_streak FROM user_streaks WHERE user_id = :uid
+    """), {"uid": user_id})
+    streak_row = sr.mappings().first()
+    return int(streak_row["current_streak"] or 0) if streak_row else 0
+
+
+async def _grower_coach_tip(user_id: int, db: AsyncSession) -> dict:
+    result = await db.execute(text("""
+        SELECT push_content, push_type
+        FROM coach_review_queue
+        WHERE student_id = :uid AND status = 'approved'
+        ORDER BY reviewed_at DESC NULLS LAST
+        LIMIT 1
+    """), {"uid": user_id})
+    row = result.mappings().first()
+    if row and row["push_content"]:
+        return {"tip": row["push_content"], "tip_type": row["push_type"] or "encouragement",
+                "review_status": "approved"}
+    return {"tip": "坚持每日打卡，养成健康习惯", "tip_type": "encouragement", "review_status": "auto"}
 
 
 # ──────────────────────────────────────────────
 # Sharer (role_level=3): 同道者 + 贡献 + 影响力
 # ──────────────────────────────────────────────
-async def _sharer_home(user_id: int, db: AsyncSession) -> dict:
-    mentees = {}
-    try:
-        result = await db.execute(text("""
-            SELECT COUNT(*) as total,
-                   COUNT(*) FILTER (WHERE status = 'active') as active_cnt
-            FROM companion_relations
-            WHERE mentor_id = :uid
-        """), {"uid": user_id})
-        row = result.mappings().first()
-        filled = row["total"] if row else 0
-        active = row["active_cnt"] if row else 0
-        mentees = {"filled": int(filled), "total_slots": 4, "active_count": int(active)}
-    except Exception as e:
-        logger.warning(f"[home] sharer mentees error: {e}")
-        mentees = {"filled": 0, "total_slots": 4, "active_count": 0}
-
-    contribution = {}
-    try:
-        result = await db.execute(text("""
-            SELECT COUNT(*) as submitted,
-                   COUNT(*) FILTER (WHERE review_status = 'approved') as published
-            FROM knowledge_documents
-            WHERE contributor_id = :uid
-        """), {"uid": user_id})
-        row = result.mappings().first()
-        submitted = row["submitted"] if row else 0
-        published = row["published"] if row else 0
-        contribution = {"submitted": int(submitted), "published": int(published)}
-    except Exception as e:
-        logger.warning(f"[home] sharer contribution error: {e}")
-        contribution = {"submitted": 0, "published": 0}
-
-    influence = {}
-    try:
-        result = await db.execute(text("""
-            SELECT COALESCE(SUM(like_count), 0) AS likes,
-                   COALESCE(SUM(collect_count), 0) AS saves
-            FROM content_items
-            WHERE author_id = :uid
-        """), {"uid": user_id})
-        row = result.mappings().first()
-        total_influence = (row["likes"] if row else 0) + (row["saves"] if row else 0)
-        influence = {"total": int(total_influence)}
-    except Exception as e:
-        logger.warning(f"[home] sharer influence error: {e}")
-        influence = {"total": 0}
-
-    return {"mentees": mentees, "contribution": contribution, "influence": influence}
+async def _sharer_mentees(user_id: int, db: AsyncSession) -> dict:
+    result = await db.execute(text("""
+        SELECT COUNT(*) as total,
+               COUNT(*) FILTER (WHERE status = 'active') as active_cnt
+        FROM companion_relations
+        WHERE mentor_id = :uid
+    """), {"uid": user_id})
+    row = result.mappings().first()
+    filled = row["total"] if row else 0
+    active = row["active_cnt"] if row else 0
+    return {"filled": int(filled), "total_slots": 4, "active_count": int(active)}
+
+
+async def _sharer_contribution(user_id: int, db: AsyncSession) -> dict:
+    result = await db.execute(text("""
+        SELECT COUNT(*) as submitted,
+               COUNT(*) FILTER (WHERE review_status = 'approved') as published
+        FROM knowledge_documents
+        WHERE contributor_id = :uid
+    """), {"uid": user_id})
+    row = result.mappings().first()
+    submitted = row["submitted"] if row else 0
+    published = row["published"] if row else 0
+    return {"submitted": int(submitted), "published": int(published)}
+
+
+async def _sharer_influence(user_id: int, db: AsyncSession) -> dict:
+    result = await db.execute(text("""
+        SELECT COALESCE(SUM(like_count), 0) AS likes,
+               COALESCE(SUM(collect_count), 0) AS saves
+        FROM content_items
+        WHERE author_id = :uid
+    """), {"uid": user_id})
+    row = result.mappings().first()
+    total_influence = (row["likes"] if row else 0) + (row["saves"] if row else 0)
+    return {"total": int(total_influence)}
 
 
 # ──────────────────────────────────────────────
 # Coach (role_level=4): 审核队列 + 今日统计 + 学员数
 # ──────────────────────────────────────────────
-async def _coach_home(user_id: int, db: AsyncSession) -> dict:
-    review_queue = {}
-    try:
-        result = await db.execute(text("""
-            SELECT
-                COUNT(*) FILTER (WHERE status = 'pending') as pending,
-                COUNT(*) FILTER (WHERE status = 'pending' AND priority = 'urgent') as urgent
-            FROM coach_review_queue
-            WHERE coach_id = :cid
-        """), {"cid": user_id})
-        row = result.mappings().first()
-        review_queue = {
-            "total_pending": int(row["pending"]) if row else 0,
-            "urgent_count": int(row["urgent"]) if row else 0,
-        }
-    except Exception as e:
-        logger.warning(f"[home] coach review_queue error: {e}")
-        review_queue = {"total_pending": 0, "urgent_count": 0}
-
-    stats_today = {}
-    try:
-        today_start = datetime.combine(date.today(), datetime.min.time())
-        result = await db.execute(text("""
-            SELECT
-                COUNT(*) FILTER (WHERE reviewed_at >= :today_start) as total_reviewed,
-                COUNT(*) FILTER (WHERE status = 'approved' AND reviewed_at >= :today_start) as approved,
-                COUNT(*) FILTER (WHERE status = 'rejected' AND reviewed_at >= :today_start) as rejected,
-                COALESCE(AVG(elapsed_seconds) FILTER (WHERE reviewed_at >= :today_start), 0) as avg_seconds
-            FROM coach_review_queue
-            WHERE coach_id = :cid
-        """), {"cid": user_id, "today_start": today_start})
-        row = result.mappings().first()
-        avg_min = round(float(row["avg_seconds"] or 0) / 60, 1) if row else 0
-        stats_today = {
-            "total_reviewed": int(row["total_reviewed"]) if row else 0,
-            "approved": int(row["approved"]) if row else 0,
-            "rejected": int(row["rejected"]) if row else 0,
-            "avg_response_min": avg_min,
-        }
-    except Exception as e:
-        logger.warning(f"[home] coach stats_today error: {e}")
-        stats_today = {"total_reviewed": 0, "approved": 0, "rejected": 0, "avg_response_min": 0}
-
-    student_count = 0
-    try:
-        result = await db.execute(text("""
-            SELECT COUNT(DISTINCT student_id) as cnt
-            FROM coach_review_queue
-            WHERE coach_id = :cid
-        """), {"cid": user_id})
-        row = result.mappings().first()
-        student_count = int(row["cnt"]) if row else 0
-    except Exception as e:
-        logger.warning(f"[home] coach student_count error: {e}")
-
-    return {"review_queue": review_queue, "stats_today": stats_today, "student_count": student_count}
+async def _coach_review_queue(user_id: int, db: AsyncSession) -> dict:
+    result = await db.execute(text("""
+        SELECT
+            COUNT(*) FILTER (WHERE status = 'pending') as pending,
+            COUNT(*) FILTER (WHERE status = 'pending' AND priority = 'urgent') as urgent
+        FROM coach_review_queue
+        WHERE coach_id = :cid
+    """), {"cid": user_id})
+    row = result.mappings().first()
+    return {
+        "total_pending": int(row["pending"]) if row else 0,
+        "urgent_count": int(row["urgent"]) if row else 0,
+    }
+
+
+async def _coach_stats_today(user_id: int, db: AsyncSession) -> dict:
+    today_start = datetime.combine(date.today(), datetime.min.time())
+    result = await db.execute(text("""
+        SELECT
+            COUNT(*) FILTER (WHERE reviewed_at >= :today_start) as total_reviewed,
+            COUNT(*) FILTER (WHERE status = 'approved' AND reviewed_at >= :today_start) as approved,
+            COUNT(*) FILTER (WHERE status = 'rejected' AND reviewed_at >= :today_start) as rejected,
+            COALESCE(AVG(elapsed_seconds) FILTER (WHERE reviewed_at >= :today_start), 0) as avg_seconds
+        FROM coach_review_queue
+        WHERE coach_id = :cid
+    """), {"cid": user_id, "today_start": today_start})
+    row = result.mappings().first()
+    avg_min = round(float(row["avg_seconds"] or 0) / 60, 1) if row else 0
+    return {
+        "total_reviewed": int(row["total_reviewed"]) if row else 0,
+        "approved": int(row["approved"]) if row else 0,
+        "rejected": int(row["rejected"]) if row else 0,
+        "avg_response_min": avg_min,
+    }
+
+
+async def _coach_student_count(user_id: int, db: AsyncSession) -> int:
+    result = await db.execute(text("""
+        SELECT COUNT(DISTINCT student_id) as cnt
+        FROM coach_review_queue
+        WHERE coach_id = :cid
+    """), {"cid": user_id})
+    row = result.mappings().first()
+    return int(row["cnt"]) if row else 0
 
 
 # ──────────────────────────────────────────────
 # Expert/Promoter/Supervisor (role_level=5): 审计队列 + 质量指标
 # ──────────────────────────────────────────────
-async def _expert_home(user_id: int, db: AsyncSession) -> dict:
-    audit_queue = {}
-    try:
-        result = await db.execute(text("""
-            SELECT
-                COUNT(*) FILTER (WHERE verdict IS NULL) as pending_count,
-                COUNT(*) FILTER (WHERE verdict IS NULL AND risk_level IN ('high', 'critical')) as anomaly_count
-            FROM expert_audit_records
-        """))
-        row = result.mappings().first()
-        audit_queue = {
-            "pending_count": int(row["pending_count"]) if row else 0,
-            "anomaly_count": int(row["anomaly_count"]) if row else 0,
-        }
-    except Exception as e:
-        logger.warning(f"[home] expert audit_queue error: {e}")
-        audit_queue = {"pending_count": 0, "anomaly_count": 0}
-
-    quality = {}
-    try:
-        today_start = datetime.combine(date.today(), datetime.min.time())
-        result = await db.execute(text("""
-            SELECT
-                CASE WHEN COUNT(*) FILTER (WHERE reviewed_at >= :today_start) > 0
-                    THEN ROUND(
-                        COUNT(*) FILTER (WHERE verdict = 'pass' AND reviewed_at >= :today_start)::numeric /
-                        COUNT(*) FILTER (WHERE reviewed_at >= :today_start), 2)
-                    ELSE 0.0
-                END as approval_rate,
-                COALESCE(AVG(
-                    EXTRACT(EPOCH FROM (reviewed_at - created_at)) / 60
-                ) FILTER (WHERE reviewed_at >= :today_start), 0) as avg_review_min
-            FROM expert_audit_records
-        """), {"today_start": today_start})
-        row = result.mappings().first()
-        quality = {
-            "approval_rate": float(row["approval_rate"]) if row else 0,
-            "avg_review_min": round(float(row["avg_review_min"] or 0), 1) if row else 0,
-        }
-    except Exception as e:
-        logger.warning(f"[home] expert quality error: {e}")
-        quality = {"approval_rate": 0, "avg_review_min": 0}
-
-    return {"audit_queue": audit_queue, "quality": quality}
+async def _expert_audit_queue(user_id: int, db: AsyncSession) -> dict:
+    result = await db.execute(text("""
+        SELECT
+            COUNT(*) FILTER (WHERE verdict IS NULL) as pending_count,
+            COUNT(*) FILTER (WHERE verdict IS NULL AND risk_level IN ('high', 'critical')) as anomaly_count
+        FROM expert_audit_records
+    """))
+    row = result.mappings().first()
+    return {
+        "pending_count": int(row["pending_count"]) if row else 0,
+        "anomaly_count": int(row["anomaly_count"]) if row else 0,
+    }
+
+
+async def _expert_quality(user_id: int, db: AsyncSession) -> dict:
+    today_start = datetime.combine(date.today(), datetime.min.time())
+    result = await db.execute(text("""
+        SELECT
+            CASE WHEN COUNT(*) FILTER (WHERE reviewed_at >= :today_start) > 0
+                THEN ROUND(
+                    COUNT(*) FILTER (WHERE verdict = 'pass' AND reviewed_at >= :today_start)::numeric /
+                    COUNT(*) FILTER (WHERE reviewed_at >= :today_start), 2)
+                ELSE 0.0
+            END as approval_rate,
+            COALESCE(AVG(
+                EXTRACT(EPOCH FROM (reviewed_at - created_at)) / 60
+            ) FILTER (WHERE reviewed_at >= :today_start), 0) as avg_review_min
+        FROM expert_audit_records
+    """), {"today_start": today_start})
+    row = result.mappings().first()
+    return {
+        "approval_rate": float(row["approval_rate"]) if row else 0,
+        "avg_review_min": round(float(row["avg_review_min"] or 0), 1) if row else 0,
+    }
 
 
 # ──────────────────────────────────────────────
 # Admin / Master (role_level=99/6): KPI + 安全
 # ──────────────────────────────────────────────
-async def _admin_home(user_id: int, db: AsyncSession) -> dict:
-    kpi = {}
-    try:
-        today_start = datetime.combine(date.today(), datetime.min.time())
-        # total users
-        r1 = await db.execute(text("SELECT COUNT(*) as cnt FROM users WHERE is_active = true"))
-        total_users = int(r1.scalar() or 0)
-
-        # DAU
-        r2 = await db.execute(text("""
-            SELECT COUNT(DISTINCT cs.user_id) as cnt
-            FROM chat_messages cm
-            JOIN chat_sessions cs ON cs.id = cm.session_id
-            WHERE cm.created_at >= :today_start
-        """), {"today_start": today_start})
-        dau = int(r2.scalar() or 0)
-
-        # active coaches
-        r3 = await db.execute(text("""
-            SELECT COUNT(*) as cnt FROM users
-            WHERE role::text IN ('COACH', 'PROMOTER', 'SUPERVISOR', 'MASTER') AND is_active = true
-        """))
-        active_coaches = int(r3.scalar() or 0)
-
-        # pending reviews
-        r4 = await db.execute(text("""
-            SELECT COUNT(*) as cnt FROM coach_review_queue WHERE status = 'pending'
-        """))
-        pending_reviews = int(r4.scalar() or 0)
-
-        kpi = {
-            "total_users": total_users,
-            "dau": dau,
-            "active_coaches": active_coaches,
-            "pending_reviews": pending_reviews,
-        }
-    except Exception as e:
-        logger.warning(f"[home] admin kpi error: {e}")
-        kpi = {"total_users": 0, "dau": 0, "active_coaches": 0, "pending_reviews": 0}
-
-    safety = {}
-    try:
-        result = await db.execute(text("""
-            SELECT
-                COUNT(*) FILTER (WHERE severity = 'critical') as critical_count,
-                COUNT(*) FILTER (WHERE severity IN ('high', 'warning')) as warning_count
-            FROM safety_logs
-            WHERE created_at >= NOW() - INTERVAL '24 hours'
-        """))
-        row = result.mappings().first()
-        safety = {
-            "critical_count": int(row["critical_count"]) if row else 0,
-            "warning_count": int(row["warning_count"]) if row else 0,
-        }
-    except Exception as e:
-        logger.warning(f"[home] admin safety error: {e}")
-        safety = {"critical_count": 0, "warning_count": 0}
-
-    return {"kpi": kpi, "safety": safety}
+async def _admin_total_users(user_id: int, db: AsyncSession) -> int:
+    r = await db.execute(text("SELECT COUNT(*) as cnt FROM users WHERE is_active = true"))
+    return int(r.scalar() or 0)
+
+
+async def _admin_dau(user_id: int, db: AsyncSession) -> int:
+    today_start = datetime.combine(date.today(), datetime.min.time())
+    r = await db.execute(text("""
+        SELECT COUNT(DISTINCT cs.user_id) as cnt
+        FROM chat_messages cm
+        JOIN chat_sessions cs ON cs.id = cm.session_id
+        WHERE cm.created_at >= :today_start
+    """), {"today_start": today_start})
+    return int(r.scalar() or 0)
+
+
+async def _admin_active_coaches(user_id: int, db: AsyncSession) -> int:
+    r = await db.execute(text("""
+        SELECT COUNT(*) as cnt FROM users
+        WHERE role::text IN ('COACH', 'PROMOTER', 'SUPERVISOR', 'MASTER') AND is_active = true
+    """))
+    return int(r.scalar() or 0)
+
+
+async def _admin_pending_reviews(user_id: int, db: AsyncSession) -> int:
+    r = await db.execute(text("""
+        SELECT COUNT(*) as cnt FROM coach_review_queue WHERE status = 'pending'
+    """))
+    return int(r.scalar() or 0)
+
+
+async def _admin_safety(user_id: int, db: AsyncSession) -> dict:
+    result = await db.execute(text("""
+        SELECT
+            COUNT(*) FILTER (WHERE severity = 'critical') as critical_count,
+            COUNT(*) FILTER (WHERE severity IN ('high', 'warning')) as warning_count
+        FROM safety_logs
+        WHERE created_at >= NOW() - INTERVAL '24 hours'
+    """))
+    row = result.mappings().first()
+    return {
+        "critical_count": int(row["critical_count"]) if row else 0,
+        "warning_count": int(row["warning_count"]) if row else 0,
+    }
 
 
 # ──────────────────────────────────────────────
-# 角色路由映射
+# 首页类型 → 数据块
+# (路径, 查询, 降级默认值); 路径 "a.b" 表示写入 data["a"]["b"]
 # ──────────────────────────────────────────────
+_HOME_SECTIONS: Dict[str, List[Tuple[str, SectionFn, Any]]] = {
+    "observer": [
+        ("quota", _observer_quota,
+         {"chat_remaining": 3, "food_scan_remaining": 3, "voice_remaining": 3, "total_remaining": 9}),
+        ("assessment", _observer_assessment,
+         {"has_pending": True, "completed_count": 0, "next_step": "完成BAPS基线评估"}),
+    ],
+    "grower": [
+        ("today", _grower_today, {"done_count": 0, "total_count": 0, "completion_pct": 0}),
+        ("today.streak_days", _grower_streak, 0),
+        ("coach_tip", _grower_coach_tip,
+         {"tip": "坚持每日打卡，养成健康习惯", "tip_type": "encouragement", "review_status": "auto"}),
+    ],
+    "sharer": [
+        ("mentees", _sharer_mentees, {"filled": 0, "total_slots": 4, "active_count": 0}),
+        ("contribution", _sharer_contribution, {"submitted": 0, "published": 0}),
+        ("influence", _sharer_influence, {"total": 0}),
+    ],
+    "coach": [
+        ("review_queue", _coach_review_queue, {"total_pending": 0, "urgent_count": 0}),
+        ("stats_today", _coach_stats_today,
+         {"total_reviewed": 0, "approved": 0, "rejected": 0, "avg_response_min": 0}),
+        ("student_count", _coach_student_count, 0),
+    ],
+    "expert": [
+        ("audit_queue", _expert_audit_queue, {"pending_count": 0, "anomaly_count": 0}),
+        ("quality", _expert_quality, {"approval_rate": 0, "avg_review_min": 0}),
+    ],
+    "admin": [
+        ("kpi.total_users", _admin_total_users, 0),
+        ("kpi.dau", _admin_dau, 0),
+        ("kpi.active_coaches", _admin_active_coaches, 0),
+        ("kpi.pending_reviews", _admin_pending_reviews, 0),
+        ("safety", _admin_safety, {"critical_count": 0, "warning_count": 0}),
+    ],
+}
+
+# 角色 → 首页类型
 _ROLE_HOME_MAP = {
-    "OBSERVER": _observer_home,
-    "GROWER": _grower_home,
-    "SHARER": _sharer_home,
-    "COACH": _coach_home,
-    "PROMOTER": _expert_home,
-    "SUPERVISOR": _expert_home,
-    "MASTER": _admin_home,
-    "ADMIN": _admin_home,
+    "OBSERVER": "observer",
+    "GROWER": "grower",
+    "SHARER": "sharer",
+    "COACH": "coach",
+    "PROMOTER": "expert",
+    "SUPERVISOR": "expert",
+    "MASTER": "admin",
+    "ADMIN": "admin",
 }
 
+# 全局数据的首页类型: 快照按角色共享, 不按用户区分
+_SHARED_HOMES = {"expert", "admin"}
+
+
+async def _run_section(
+    home: str, path: str, fn: SectionFn, fallback: Any, user_id: int, db: Optional[AsyncSession],
+) -> Tuple[Any, bool]:
+    """执行单个数据块; db 为 None 时从连接池取独立会话 (并发执行)"""
+    try:
+        if db is not None:
+            return await fn(user_id, db), True
+        async with database.AsyncSessionLocal() as session:
+            return await fn(user_id, session), True
+    except Exception as e:
+        logger.warning(f"[home] {home} {path} error: {e}")
+        if db is not None:
+            try:
+                await db.rollback()
+            except Exception:
+                pass
+        return copy.deepcopy(fallback), False
+
+
+async def build_home(
+    home: str, user_id: int, db: Optional[AsyncSession] = None,
+) -> Tuple[Dict[str, Any], bool]:
+    """
+    聚合首页数据
+
+    Args:
+        home: 首页类型 (_HOME_SECTIONS 的 key)
+        user_id: 当前用户
+        db: 请求会话; 仅在没有异步连接池时使用, 此时各数据块顺序执行
+
+    Returns:
+        (数据, 是否全部数据块成功)
+    """
+    sections = _HOME_SECTIONS[home]
+    if db is None and database.AsyncSessionLocal is not None:
+        results = await asyncio.gather(*(
+            _run_section(home, path, fn, fallback, user_id, None)
+            for path, fn, fallback in sections
+        ))
+    else:
+        results = [
+            await _run_section(home, path, fn, fallback, user_id, db)
+            for path, fn, fallback in sections
+        ]
+
+    data: Dict[str, Any] = {}
+    for (path, _, _), (value, _) in zip(sections, results):
+        head, _, tail = path.partition(".")
+        if tail:
+            data.setdefault(head, {})[tail] = value
+        else:
+            data[head] = value
+    return data, all(ok for _, ok in results)
+
 
 @router.get("/home")
 async def get_home(
+    response: Response,
     current_user=Depends(get_current_user),
     db: AsyncSession = Depends(get_db),
 ):
@@ -388,8 +426,24 @@ async def get_home(
     - Coach: 审核队列 + 今日统计 + 学员数
     - Expert/Promoter/Supervisor: 审计队列 + 质量指标
     - Admin/Master: KPI + 安全
+
+    响应头 X-Home-Snapshot: fresh / stale / miss / off
     """
     role_text = str(current_user.role).split(".")[-1].upper()
-    handler = _ROLE_HOME_MAP.get(role_text, _observer_home)
-    data = await handler(current_user.id, db)
+    home = _ROLE_HOME_MAP.get(role_text, "observer")
+    user_id = current_user.id
+    pooled = database.AsyncSessionLocal is not None
+
+    async def _load():
+        return await build_home(home, user_id, None if pooled else db)
+
+    if HOME_SNAPSHOT_ENABLED:
+        key = (home, None if home in _SHARED_HOMES else user_id)
+        # 无连接池时加载依赖请求会话, 不能放到请求结束后的后台刷新
+        data, state = await home_snapshot_cache.get(key, _load, allow_stale=pooled)
+    else:
+        data, _ = await _load()
+        state = "off"
+
+    response.headers["X-Home-Snapshot"] = state
     return {"role": role_text.lower(), **data}
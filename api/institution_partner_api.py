@@ -18,6 +18,7 @@ from sqlalchemy import text
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from api.dependencies import get_current_user, require_roles
+from core.auth_cache import invalidate_principal
 from core.database import get_async_db as get_db
 from core.models import User, UserRole
 
@@ -309,13 +310,17 @@ async def invite_institution_admin(
     db: AsyncSession = Depends(get_db),
 ):
     """邀请用户成为机构管理员（InstitutionAdmin）"""
-    await db.execute(text("""
+    result = await db.execute(text("""
         UPDATE users
         SET role = 'INSTITUTION_ADMIN',
             tenant_id = CAST(:iid AS UUID)
         WHERE id = CAST(:uid AS INTEGER)
+        RETURNING id
     """), {"iid": str(institution_id), "uid": str(user_id)})
+    updated_ids = list(result.scalars())
     await db.commit()
+    # 原生 SQL 改角色不会触发 ORM 钩子, 需显式失效认证快照
+    invalidate_principal(*updated_ids)
     return {"message": "机构管理员已设置"}
 
 
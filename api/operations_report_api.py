@@ -2,20 +2,21 @@
 Operations Report API — weekly/monthly analytics + CSV export.
 
 Endpoints:
-  GET /api/v1/admin/reports/weekly     — Last 7 days from analytics_daily
+  GET /api/v1/admin/reports/weekly     — Last 7 days from analytics_daily_facts
   GET /api/v1/admin/reports/monthly    — Last 30 days aggregated
   GET /api/v1/admin/reports/export     — CSV StreamingResponse
 """
 import csv
 import io
 from datetime import date, timedelta
+from typing import Optional
 
 from fastapi import APIRouter, Depends, Query
 from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
-from sqlalchemy import text
 from sqlalchemy.ext.asyncio import AsyncSession
 
+from core.analytics_facts import daily_series, public_row
 from core.database import get_async_db
 from api.dependencies import require_admin
 
@@ -36,19 +37,10 @@ class DayMetrics(BaseModel):
     total_chat_messages: int = 0
 
 
-async def _fetch_range(db: AsyncSession, start: date, end: date) -> list[dict]:
-    result = await db.execute(
-        text("""
-            SELECT date::text, dau, new_users, active_growers, conversion_rate,
-                   retention_7d, avg_tasks_completed, avg_session_minutes,
-                   ai_response_avg_ms, total_events, total_chat_messages
-            FROM analytics_daily
-            WHERE date BETWEEN :s AND :e
-            ORDER BY date
-        """),
-        {"s": start, "e": end},
-    )
-    return [dict(r) for r in result.mappings().all()]
+async def _fetch_range(db: AsyncSession, start: date, end: date, tenant_id: Optional[str] = None) -> list[dict]:
+    """Daily metrics read from the materialized fact table only."""
+    rows = await daily_series(db, start, end, tenant_id=tenant_id)
+    return [public_row(r) for r in rows]
 
 
 def _trends(rows: list[dict]) -> dict:
@@ -72,14 +64,15 @@ def _trends(rows: list[dict]) -> dict:
 
 @router.get("/weekly")
 async def weekly_report(
+    tenant_id: Optional[str] = Query(None),
     admin_user=Depends(require_admin),
     db: AsyncSession = Depends(get_async_db),
 ):
-    """Last 7 days from analytics_daily + trends."""
+    """Last 7 days from analytics_daily_facts + trends."""
     end = date.today() - timedelta(days=1)
     start = end - timedelta(days=6)
     try:
-        rows = await _fetch_range(db, start, end)
+        rows = await _fetch_range(db, start, end, tenant_id)
     except Exception:
         rows = []
     return {
@@ -93,6 +86,7 @@ async def weekly_report(
 
 @router.get("/monthly")
 async def monthly_report(
+    tenant_id: Optional[str] = Query(None),
     admin_user=Depends(require_admin),
     db: AsyncSession = Depends(get_async_db),
 ):
@@ -100,7 +94,7 @@ async def monthly_report(
     end = date.today() - timedelta(days=1)
     start = end - timedelta(days=29)
     try:
-        rows = await _fetch_range(db, start, end)
+        rows = await _fetch_range(db, start, end, tenant_id)
     except Exception:
         rows = []
 
@@ -127,6 +121,7 @@ async def monthly_report(
 @router.get("/export")
 async def export_report(
     period: str = Query("weekly", regex="^(weekly|monthly)$"),
+    tenant_id: Optional[str] = Query(None),
     admin_user=Depends(require_admin),
     db: AsyncSession = Depends(get_async_db),
 ):
@@ -135,7 +130,7 @@ async def export_report(
     days = 6 if period == "weekly" else 29
     start = end - timedelta(days=days)
     try:
-        rows = await _fetch_range(db, start, end)
+        rows = await _fetch_range(db, start, end, tenant_id)
     except Exception:
         rows = []
 
@@ -144,7 +139,7 @@ async def export_report(
         "date", "dau", "new_users", "active_growers", "conversion_rate",
         "retention_7d", "avg_tasks_completed", "avg_session_minutes",
         "ai_response_avg_ms", "total_events", "total_chat_messages",
-    ])
+    ], extrasaction="ignore")
     writer.writeheader()
     for row in rows:
         writer.writerow(row)
@@ -19,6 +19,7 @@ from sqlalchemy.ext.asyncio import AsyncSession
 
 from core.database import get_async_db as get_db
 from api.dependencies import get_current_user
+from core.home_snapshot_cache import invalidate_home_snapshot
 
 router = APIRouter(prefix="/api/v1", tags=["grower-flywheel"])
 
@@ -269,6 +270,7 @@ async def checkin_task(
                      {"uid": user_id, "pts": total_points})
 
     await db.commit()
+    invalidate_home_snapshot(user_id)
 
     # ── 信任分更新 (异步桥接同步服务) ──
     try:
@@ -658,6 +660,7 @@ async def quick_checkin(
         await db.execute(text("UPDATE users SET growth_points = COALESCE(growth_points, 0) + 10 WHERE id = :uid"),
                          {"uid": user_id})
         await db.commit()
+        invalidate_home_snapshot(user_id)
         return {"success": True, "task_id": task["id"], "message": f"{domain} 打卡成功 +10积分", "points": 10}
     else:
         # No matching task — create ad-hoc checkin via a new task
@@ -676,6 +679,7 @@ async def quick_checkin(
         await db.execute(text("UPDATE users SET growth_points = COALESCE(growth_points, 0) + 5 WHERE id = :uid"),
                          {"uid": user_id})
         await db.commit()
+        invalidate_home_snapshot(user_id)
         return {"success": True, "task_id": new_id, "message": f"{domain} 记录已保存 +5积分", "points": 5}
 
 
@@ -777,6 +781,7 @@ async def add_task_from_catalog(
         "hint": "", "mode": cat_item["input_mode"], "ql": cat_item["quick_label"],
     })
     await db.commit()
+    invalidate_home_snapshot(user_id)
 
     return {
         "success": True,
@@ -807,6 +812,7 @@ async def remove_self_task(
     """), {"tid": task_id, "uid": user_id})
     deleted = result.first()
     await db.commit()
+    invalidate_home_snapshot(user_id)
     if not deleted:
         raise HTTPException(status_code=404, detail="任务不存在或无法删除（已完成或非自选任务）")
     return {"success": True, "message": "任务已删除"}
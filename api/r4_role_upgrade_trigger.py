@@ -24,6 +24,7 @@ from sqlalchemy import text
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from core.database import get_async_db as get_db
+from core.auth_cache import invalidate_principal
 from api.dependencies import get_current_user
 
 logger = logging.getLogger("role_upgrade")
@@ -241,6 +242,7 @@ async def execute_upgrade(
         logger.warning(f"用户 {user_id} 首次任务生成失败: {e}")
 
     await db.commit()
+    invalidate_principal(user_id)
 
     logger.info(f"用户 {user_id}: {old_role} → grower 升级完成")
 
@@ -538,6 +540,7 @@ async def execute_sharer_upgrade(
         WHERE id = :uid
     """), {"uid": user_id})
     await db.commit()
+    invalidate_principal(user_id)
 
     logger.info(f"用户 {user_id}: grower → sharer 升级完成")
 
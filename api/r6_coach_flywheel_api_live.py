@@ -24,6 +24,7 @@ from sqlalchemy.ext.asyncio import AsyncSession
 
 from core.database import get_async_db as get_db
 from api.dependencies import get_current_user
+from core.home_snapshot_cache import invalidate_home_snapshot
 
 logger = logging.getLogger("coach_flywheel")
 
@@ -282,6 +283,9 @@ async def approve_review(
             except Exception:
                 pass
 
+    # 首页快照: 教练审核队列 + 学员教练提示/今日任务
+    invalidate_home_snapshot(coach_id, student_id)
+
     # Step 5: 推送通知给用户 (commit 之后, non-blocking)
     try:
         from gateway.channels.push_router import send_notification as _push_notify
@@ -382,6 +386,7 @@ async def reject_review(
     """), {"cid": coach_id, "rid": review_id, "elapsed": elapsed, "now": now})
 
     await db.commit()
+    invalidate_home_snapshot(coach_id, review["student_id"])
 
     return ReviewActionResponse(
         success=True,
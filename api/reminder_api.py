@@ -20,6 +20,7 @@ from sqlalchemy import desc
 from core.database import get_db
 from core.models import Reminder, User
 from core.reminder_service import ReminderService
+from core.reminder_dispatcher import notify_scheduled
 from api.dependencies import get_current_user, require_coach_or_admin
 
 router = APIRouter(tags=["提醒管理"])
@@ -103,6 +104,7 @@ async def create_reminder(
     db.add(reminder)
     db.commit()
     db.refresh(reminder)
+    notify_scheduled(reminder.id, reminder.next_fire_at)
 
     return {"success": True, "reminder": _reminder_to_dict(reminder)}
 
@@ -139,6 +141,7 @@ async def update_reminder(
 
     db.commit()
     db.refresh(reminder)
+    notify_scheduled(reminder.id, reminder.next_fire_at, reminder.is_active)
 
     return {"success": True, "reminder": _reminder_to_dict(reminder)}
 
@@ -160,6 +163,7 @@ async def delete_reminder(
 
     db.delete(reminder)
     db.commit()
+    notify_scheduled(reminder_id, None)
 
     return {"success": True, "message": "提醒已删除"}
 
@@ -0,0 +1,256 @@
+# -*- coding: utf-8 -*-
+"""
+路由清单 + 按清单加载
+Router manifest and loader
+
+api/main.py 原先为约 110 个路由各写一段 try/except 导入注册; 现在集中为两张清单:
+- EARLY_ROUTERS: 在 main.py 自身端点之前注册 (与原先位置一致)
+- LATE_ROUTERS:  在 main.py 自身端点之后注册; 顺序即匹配优先级
+  (R2-R8 飞轮必须先于 gateway.bridge 的 catch-all)
+
+每项属于一个功能组; 被禁用的组不导入模块也不注册路由, 可缩短冷启动并减少常驻内存。
+core 组始终加载。每项的导入 / 挂载耗时记入 core.startup_profiler.startup_profile。
+
+环境变量:
+  ROUTER_GROUPS_DISABLED  逗号分隔的功能组, 不加载 (例: "vision,xzb,exam")
+  ROUTER_GROUPS_ENABLED   若设置, 只加载列出的功能组 (以及 core)
+"""
+
+import os
+import time
+from dataclasses import dataclass
+from typing import FrozenSet, Iterable, List, Optional, Sequence, Tuple
+
+from core.startup_profiler import RouterTiming, StartupProfile, startup_profile
+
+CORE_GROUP = "core"
+
+
+@dataclass(frozen=True)
+class RouterSpec:
+    """
+    清单项: 一组一起导入、一起注册的路由
+
+    targets 形如 "api.auth_api:router"; 任一目标导入失败则整项不注册。
+    catch 为 ImportError 时其它异常照常抛出 (与原 try/except ImportError 一致)。
+    """
+    label: str
+    targets: Tuple[str, ...]
+    group: str = CORE_GROUP
+    prefix: str = ""
+    note: str = ""
+    catch: type = ImportError
+
+    @property
+    def modules(self) -> List[str]:
+        return [t.partition(":")[0] for t in self.targets]
+
+
+def R(label: str, *targets: str, group: str = CORE_GROUP, prefix: str = "", note: str = "",
+      catch: type = ImportError) -> RouterSpec:
+    return RouterSpec(label, targets, group, prefix, note, catch)
+
+
+def _split_groups(value: Optional[str]) -> FrozenSet[str]:
+    return frozenset(g.strip() for g in (value or "").split(",") if g.strip())
+
+
+def group_enabled(group: str, disabled: FrozenSet[str] = frozenset(),
+                  enabled: FrozenSet[str] = frozenset()) -> bool:
+    if group == CORE_GROUP:
+        return True
+    if group in disabled:
+        return False
+    return not enabled or group in enabled
+
+
+def _resolve(target: str):
+    module_name, _, attr = target.partition(":")
+    # 用 __import__ 而不是 importlib.import_module: 后者走纯 Python 导入路径, -X importtime 看不到
+    module = __import__(module_name, fromlist=[attr or "router"])
+    try:
+        return getattr(module, attr or "router")
+    except AttributeError as e:
+        # 与 "from X import router" 的失败类型一致
+        raise ImportError(f"cannot import name '{attr}' from '{module_name}'") from e
+
+
+def load_routers(app, specs: Iterable[RouterSpec], disabled: Optional[Iterable[str]] = None,
+                 enabled: Optional[Iterable[str]] = None,
+                 profile: StartupProfile = startup_profile) -> List[RouterTiming]:
+    """按清单顺序导入并注册路由, 返回每项的耗时记录"""
+    disabled = frozenset(disabled) if disabled is not None else _split_groups(os.getenv("ROUTER_GROUPS_DISABLED"))
+    enabled = frozenset(enabled) if enabled is not None else _split_groups(os.getenv("ROUTER_GROUPS_ENABLED"))
+    timings = []
+    for spec in specs:
+        timing = RouterTiming(spec.label, spec.group, spec.modules)
+        timings.append(timing)
+        profile.add(timing)
+        if not group_enabled(spec.group, disabled, enabled):
+            timing.status = "skipped"
+            print(f"[API] {spec.label}已跳过 (功能组 {spec.group} 未启用)")
+            continue
+
+        t0 = time.perf_counter()
+        n_routes = len(app.router.routes)
+        try:
+            routers = [_resolve(t) for t in spec.targets]
+            t1 = time.perf_counter()
+            for router in routers:
+                app.include_router(router, prefix=spec.prefix)
+        except spec.catch as e:
+            timing.status, timing.error = "failed", str(e)
+            timing.import_ms = (time.perf_counter() - t0) * 1000
+            print(f"[API] {spec.label}注册失败: {e}")
+            continue
+        timing.import_ms = (t1 - t0) * 1000
+        timing.include_ms = (time.perf_counter() - t1) * 1000
+        timing.routes = len(app.router.routes) - n_routes
+        print(f"[API] {spec.label}已注册" + (f" {spec.note}" if spec.note else ""))
+    return timings
+
+
+# ---------------------------------------------------------------------------
+# 清单 (顺序即注册顺序)
+# ---------------------------------------------------------------------------
+
+EARLY_ROUTERS: Sequence[RouterSpec] = (
+    R("认证路由", "api.auth_api:router"),
+    R("评估路由", "api.assessment_api:router"),
+    R("小程序路由", "api.miniprogram:router", prefix="/api/v1"),
+    R("设备数据路由", "api.device_data:router", prefix="/api/v1/mp"),
+    R("内容管理路由", "api.content_api:router"),
+    R("学习激励路由", "api.learning_api:router"),
+    R("WebSocket 实时推送路由", "api.websocket_api:router"),
+    R("教练等级体系路由", "api.paths_api:router"),
+    R("用户分层路由", "api.segments_api:router"),
+    R("用户管理路由", "api.user_api:router"),
+    R("设备REST路由", "api.device_rest_api:router"),
+    R("聊天REST路由", "api.chat_rest_api:router"),
+    R("教练端路由", "api.coach_api:router"),
+    R("评估管道路由", "api.assessment_pipeline_api:router"),
+    R("微行动路由", "api.micro_action_api:router"),
+    R("今日任务路由", "api.daily_tasks_api:router"),
+    R("教练消息路由", "api.coach_message_api:router"),
+    R("提醒管理路由", "api.reminder_api:router"),
+    R("评估推送与审核路由", "api.assessment_assignment_api:router"),
+    R("高频题目路由", "api.high_freq_api:router"),
+    R("设备预警路由", "api.device_alert_api:router"),
+    R("AI推送建议路由", "api.push_recommendation_api:router"),
+    R("Prompt模板路由", "api.prompt_api:router"),
+    R("干预包路由", "api.intervention_api:router"),
+    R("挑战/打卡活动路由", "api.challenge_api:router"),
+    R("教练推送审批队列路由", "api.coach_push_queue_api:router", "api.coach_push_queue_api:alias_router",
+      note="(+ /coach-push 兼容别名)"),
+    R("全平台搜索路由", "api.search_api:router"),
+    R("用户行为周报路由", "api.weekly_report_api:router"),
+    R("多Agent协作路由", "api.agent_api:router"),
+    R("图片上传路由", "api.upload_api:router"),
+    R("食物识别路由", "api.food_recognition_api:router", group="media"),
+    R("音频处理路由", "api.audio_api:router", group="media"),
+    R("v3 路由",
+      "v3.routers.health:router", "v3.routers.auth:router", "v3.routers.diagnostic:router",
+      "v3.routers.chat:router", "v3.routers.assessment:router", "v3.routers.tracking:router",
+      "v3.routers.incentive:router", "v3.routers.knowledge:router",
+      group="v3", catch=Exception,
+      note="(8 routers: auth/diagnostic/chat/assessment/tracking/incentive/knowledge/health)"),
+    R("行智诊疗(XZB)路由", "api.xzb_api:router", group="xzb",
+      note="(29 endpoints: experts/knowledge/chat/rx/med-circle)"),
+)
+
+_SPRINT2 = (
+    ("api.peer_matching_api", "同伴配对"),
+    ("api.agency_api", "主体性引擎"),
+    ("api.incentive_phase_api", "三阶激励"),
+    ("api.peer_support_api", "同伴支持"),
+    ("api.reflection_api", "反思日志"),
+    ("api.advanced_rights_api", "高级权益"),
+    ("api.script_library_api", "话术库"),
+    ("api.ecosystem_v4_api", "生态系统"),
+    ("api.ies_api", "IES效果评分"),
+    ("api.contract_api", "契约管理"),
+)
+
+LATE_ROUTERS: Sequence[RouterSpec] = (
+    R("v16 Admin行为配置路由", "api.v14.admin_routes:router", prefix="/api/v1"),
+    R("CoachCopilot路由", "api.v14.copilot_routes:router", prefix="/api/v1"),
+    R("Patient路由", "api.patient_api:router"),
+    R("Recommendation路由", "api.recommendation_api:router"),
+    R("专家租户路由", "api.tenant_api:router", group="expert"),
+    R("督导会议路由", "api.supervision_api:router", group="expert"),
+    R("专家内容工作室路由", "api.expert_content_api:router", group="expert"),
+    R("Coach分析路由", "api.analytics_api:router", group="analytics"),
+    R("Admin分析路由", "api.admin_analytics_api:router", group="analytics"),
+    R("用户知识投稿路由", "api.content_contribution_api:router", group="knowledge"),
+    R("批量知识灌注路由", "api.batch_ingestion_api:router", group="knowledge"),
+    R("内容管理路由", "api.content_manage_api:router"),
+    R("考试管理路由", "api.exam_api:router", group="exam"),
+    R("题库管理路由", "api.question_api:router", group="exam"),
+    R("考试会话路由", "api.exam_session_api:router", group="exam"),
+    R("用户统计路由", "api.user_stats_api:router", group="analytics"),
+    R("问卷管理路由", "api.survey_api:router", group="survey"),
+    R("问卷填写路由", "api.survey_response_api:router", group="survey"),
+    R("问卷统计路由", "api.survey_stats_api:router", group="survey"),
+    # 学分制+晋级体系 (V002)
+    R("学分管理路由", "api.credits_api:router", group="credits"),
+    R("同道者关系路由", "api.companion_api:router", group="credits"),
+    R("晋级系统路由", "api.promotion_api:router", group="credits"),
+    R("V004 智能监测方案路由", "api.program_api:router", group="program"),
+    R("V005 安全管理路由", "api.safety_api:router"),
+    R("V007 策略引擎路由", "api.policy_api:router", group="agents"),
+    R("V006 Agent 模板管理路由", "api.agent_template_api:router", group="agents"),
+    R("专家自助注册入驻路由", "api.expert_registration_api:router", group="expert"),
+    R("专家自助 Agent 管理路由", "api.expert_agent_api:router", group="expert"),
+    R("Phase 5 Agent 生态路由", "api.agent_ecosystem_api:router", group="agents"),
+    R("Phase 4 反馈学习闭环路由", "api.agent_feedback_api:router", group="agents"),
+    R("Phase 3 知识共享路由", "api.knowledge_sharing_api:router", group="knowledge"),
+    R("V003 激励体系路由", "core.milestone_service:incentive_router", group="credits", catch=Exception),
+    R("行为处方 (Behavior Rx) 路由", "behavior_rx.rx_routes:router", group="behavior_rx"),
+    R("V4.0 旅程状态路由", "api.journey_api:router", group="v4"),
+    R("V4.0 治理体系路由", "api.governance_api:router", group="v4"),
+    # V4.0 Sprint 2: 价值重塑
+    *(R(f"V4.0 {name}路由", f"{module}:router", group="v4") for module, name in _SPRINT2),
+    # 审计修复 #7: routes.py 通用路由
+    R("v1 通用路由", "api.routes:router"),
+    R("V4.1 跨层网关路由", "gateway.router:router", note="(/v1/gateway)"),
+    # R2-R8 飞轮实装 (必须在 bridge 之前注册, 避免 catch-all 拦截)
+    R("R2 scheduler_agent API", "api.r2_scheduler_agent:scheduler_router", group="flywheel", catch=Exception),
+    R("R3 Grower飞轮(Live)", "api.r3_grower_flywheel_api_live:router", group="flywheel", catch=Exception,
+      note="(5 endpoints)"),
+    R("R4 角色升级触发器", "api.r4_role_upgrade_trigger:router", group="flywheel", catch=Exception,
+      note="(2 endpoints)"),
+    R("R5 Observer飞轮(Live)", "api.r5_observer_flywheel_api_live:router", group="flywheel", catch=Exception,
+      note="(3 endpoints)"),
+    R("R6 Coach飞轮(Live)", "api.r6_coach_flywheel_api_live:router", group="flywheel", catch=Exception,
+      note="(4 endpoints)"),
+    R("R7 通知API", "api.r7_notification_agent:notif_router", group="flywheel", catch=Exception,
+      note="(2 endpoints)"),
+    R("R8 用户上下文", "api.r8_user_context:router", group="flywheel", catch=Exception, note="(3 endpoints)"),
+    R("V4.1 兼容桥接路由", "gateway.bridge:bridge_router", note="(旧路径→新路径)"),
+    R("V4.2 Admin绑定管理路由", "api.admin_bindings_api:router", note="(/v1/admin/bindings)"),
+    # V5.0 飞轮 (Expert + Admin)
+    R("V5.0 Expert飞轮路由", "api.expert_flywheel_api:router", group="flywheel", note="(4 endpoints)"),
+    R("V5.0 Admin飞轮路由", "api.admin_flywheel_api:router", group="flywheel", note="(12 endpoints)"),
+    R("P4 Settings路由", "api.settings_api:router", note="(2 endpoints)"),
+    # P5
+    R("P5A WeChat Auth路由", "api.wechat_auth_api:router", note="(7 endpoints)"),
+    R("P5B Event Tracking路由", "api.event_tracking_api:router", note="(1 endpoint)"),
+    R("P5B Operations Report路由", "api.operations_report_api:router", group="analytics", note="(3 endpoints)"),
+    R("P5C Feature Flags路由", "api.feature_flag_api:router", note="(6 endpoints)"),
+    R("Sharer飞轮API", "api.sharer_flywheel_api:router", group="flywheel", catch=Exception, note="(3 endpoints)"),
+    R("I-07 督导资质管理路由", "api.supervisor_credential_api:router", group="expert", note="(4 endpoints)"),
+    R("VisionGuard 视力行为保护路由", "api.vision_api:router", group="vision", note="(14 endpoints)"),
+    R("统一首页API", "api.home_api:router", note="(1 endpoint: GET /api/v1/home)"),
+    R("首页激励统计API", "api.motivation_api:router", note="(1 endpoint: GET /api/v1/home/motivation-stats)"),
+    # V5.3.0
+    R("Expert独立AGENT API", "api.expert_api:router", group="expert", note="(18 endpoints: /api/v1/expert)"),
+    R("机构合作/合伙人体系API", "api.institution_partner_api:institution_router",
+      "api.institution_partner_api:partner_router", group="partner",
+      note="(12 endpoints: /api/v1/institutions, /api/v1/partners)"),
+    R("Landing Page API", "api.demo_request_api:router", group="partner",
+      note="(POST+GET /api/v1/demo-requests + GET /api/v1/landing/platform-stats)"),
+    R("运营中心API", "api.platform_event_log_api:router", group="analytics",
+      note="(GET /api/v1/admin/operation-center/stats|events|logs)"),
+)
+
+ROUTER_GROUPS: FrozenSet[str] = frozenset(s.group for s in (*EARLY_ROUTERS, *LATE_ROUTERS))
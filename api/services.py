@@ -9,8 +9,6 @@ import json
 import re
 from typing import List, Dict, Any, Optional
 
-from llama_index.llms.ollama import Ollama
-
 from .schemas import (
     AtomicTask,
     EfficacyScore,
@@ -94,6 +92,9 @@ class TaskDecomposer:
         Args:
             config: 配置字典
         """
+        # llama_index 导入较重 (~1.4s), 推迟到首次构造, 不拖慢 api.routes 的导入
+        from llama_index.llms.ollama import Ollama
+
         model_config = config.get("model", {})
 
         self.llm = Ollama(
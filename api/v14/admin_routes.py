@@ -365,10 +365,11 @@ async def get_triggers_for_stage(stage_id: str, current_user: User = Depends(req
 
 # ============================================
 # 状态同步 API
+# (存储读写会访问数据库, 使用同步路由在线程池中执行, 不阻塞事件循环)
 # ============================================
 
 @router.post("/sync/process")
-async def process_sync_event(request: ProcessEventRequest, current_user: User = Depends(require_admin)):
+def process_sync_event(request: ProcessEventRequest, current_user: User = Depends(require_admin)):
     """
     处理同步事件
     
@@ -412,7 +413,7 @@ async def process_sync_event(request: ProcessEventRequest, current_user: User =
 
 
 @router.get("/sync/view/{event_id}")
-async def get_sync_view(event_id: str, role: str = "patient", current_user: User = Depends(require_admin)):
+def get_sync_view(event_id: str, role: str = "patient", current_user: User = Depends(require_admin)):
     """
     获取事件视图
     
@@ -441,7 +442,7 @@ async def get_sync_view(event_id: str, role: str = "patient", current_user: User
 
 
 @router.get("/sync/user/{user_id}")
-async def get_user_sync_events(
+def get_user_sync_events(
     user_id: int,
     role: str = "patient",
     limit: int = Query(10, ge=1, le=100),
@@ -472,21 +473,24 @@ async def get_user_sync_events(
 
 
 @router.get("/sync/pending")
-async def get_pending_reviews(current_user: User = Depends(require_admin)):
+def get_pending_reviews(
+    limit: int = Query(100, ge=1, le=1000),
+    current_user: User = Depends(require_admin),
+):
     """
-    获取待审核事件
+    获取待审核事件 (最近 limit 条)
     
-    GET /api/v1/admin/behavior/sync/pending
+    GET /api/v1/admin/behavior/sync/pending?limit=100
     """
     if not STATE_SYNC_AVAILABLE:
         raise HTTPException(status_code=503, detail="状态同步未加载")
     
     manager = get_state_sync_manager()
-    pending = manager.get_pending_reviews()
+    pending = manager.get_pending_reviews(limit)
     
     return {
         "success": True,
-        "total": len(pending),
+        "total": manager.get_stats()["pending_reviews"],
         "pending": pending
     }
 
@@ -496,7 +500,7 @@ async def get_pending_reviews(current_user: User = Depends(require_admin)):
 # ============================================
 
 @router.get("/stats")
-async def get_behavior_stats(current_user: User = Depends(require_admin)):
+def get_behavior_stats(current_user: User = Depends(require_admin)):
     """
     获取行为系统统计
     
@@ -523,9 +527,10 @@ async def get_behavior_stats(current_user: User = Depends(require_admin)):
     
     if STATE_SYNC_AVAILABLE:
         manager = get_state_sync_manager()
+        sync_stats = manager.get_stats()
         stats["state_sync"].update({
-            "total_records": len(manager._records),
-            "pending_reviews": len(manager.get_pending_reviews())
+            "total_records": sync_stats["total_records"],
+            "pending_reviews": sync_stats["pending_reviews"]
         })
     
     return {
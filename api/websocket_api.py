@@ -11,11 +11,12 @@ WebSocket API - 实时推送服务
 import asyncio
 import json
 from datetime import datetime
-from typing import Dict, Set, Optional, Any
+from typing import List, Optional, Tuple
 from fastapi import APIRouter, WebSocket, WebSocketDisconnect, Query
 from loguru import logger
 
 from core.auth import verify_token_with_blacklist
+from core.ws_hub import ConnectionHub, ws_hub
 
 router = APIRouter(tags=["WebSocket"])
 
@@ -24,89 +25,10 @@ router = APIRouter(tags=["WebSocket"])
 # 连接管理器
 # ============================================================================
 
-class ConnectionManager:
-    """WebSocket 连接管理器"""
-
-    def __init__(self):
-        # content_id -> Set[WebSocket]
-        self.content_connections: Dict[str, Set[WebSocket]] = {}
-        # user_id -> WebSocket
-        self.user_connections: Dict[str, WebSocket] = {}
-        # 全局广播连接
-        self.broadcast_connections: Set[WebSocket] = set()
-
-    async def connect_content(self, websocket: WebSocket, content_id: str):
-        """连接到内容频道"""
-        await websocket.accept()
-        if content_id not in self.content_connections:
-            self.content_connections[content_id] = set()
-        self.content_connections[content_id].add(websocket)
-        logger.info(f"[WS] Client connected to content: {content_id}")
-
-    async def connect_user(self, websocket: WebSocket, user_id: str):
-        """连接用户频道"""
-        await websocket.accept()
-        self.user_connections[user_id] = websocket
-        logger.info(f"[WS] User connected: {user_id}")
-
-    async def connect_broadcast(self, websocket: WebSocket):
-        """连接全局广播"""
-        await websocket.accept()
-        self.broadcast_connections.add(websocket)
-        logger.info(f"[WS] Client connected to broadcast")
-
-    def disconnect_content(self, websocket: WebSocket, content_id: str):
-        """断开内容频道"""
-        if content_id in self.content_connections:
-            self.content_connections[content_id].discard(websocket)
-            if not self.content_connections[content_id]:
-                del self.content_connections[content_id]
-        logger.info(f"[WS] Client disconnected from content: {content_id}")
-
-    def disconnect_user(self, websocket: WebSocket, user_id: str):
-        """断开用户频道"""
-        if user_id in self.user_connections:
-            del self.user_connections[user_id]
-        logger.info(f"[WS] User disconnected: {user_id}")
-
-    def disconnect_broadcast(self, websocket: WebSocket):
-        """断开全局广播"""
-        self.broadcast_connections.discard(websocket)
-        logger.info(f"[WS] Client disconnected from broadcast")
-
-    async def send_to_content(self, content_id: str, message: dict):
-        """发送消息到内容频道的所有连接"""
-        if content_id in self.content_connections:
-            dead_connections = set()
-            for connection in self.content_connections[content_id]:
-                try:
-                    await connection.send_json(message)
-                except Exception:
-                    dead_connections.add(connection)
-            # 清理断开的连接
-            self.content_connections[content_id] -= dead_connections
-
-    async def send_to_user(self, user_id: str, message: dict):
-        """发送消息到特定用户"""
-        if user_id in self.user_connections:
-            try:
-                await self.user_connections[user_id].send_json(message)
-            except Exception:
-                del self.user_connections[user_id]
-
-    async def broadcast(self, message: dict):
-        """广播消息到所有连接"""
-        dead_connections = set()
-        for connection in self.broadcast_connections:
-            try:
-                await connection.send_json(message)
-            except Exception:
-                dead_connections.add(connection)
-        self.broadcast_connections -= dead_connections
-
-
-# 全局连接管理器实例
-manager = ConnectionManager()
+# 频道 user:<id> / content:<id> / broadcast 由 core.ws_hub 管理:
+# 多连接 / 有界发送队列 / 消息合并 / Redis pub/sub 跨 worker 投递
+ConnectionManager = ConnectionHub
+manager = ws_hub
 
 
 # ============================================================================
@@ -225,11 +147,13 @@ async def content_websocket(
     - 点赞/收藏数更新
     - 浏览量更新
     """
-    await manager.connect_content(websocket, content_id)
+    channel = f"content:{content_id}"
+    conn = await manager.connect(websocket, channel)
+    logger.info(f"[WS] Client connected to content: {content_id}")
 
     try:
         # 发送连接确认
-        await websocket.send_json({
+        conn.offer({
             "type": "connected",
             "content_id": content_id,
             "message": "实时更新已连接"
@@ -239,7 +163,7 @@ async def content_websocket(
             # 检查内容更新
             updates = await get_content_updates(content_id)
             if updates:
-                await websocket.send_json(updates)
+                conn.offer(updates)
 
             # 同时监听客户端消息（如用户操作）
             try:
@@ -251,14 +175,14 @@ async def content_websocket(
 
                 # 处理客户端消息
                 if data.get("action") == "like":
-                    # 广播点赞到所有连接
-                    await manager.send_to_content(content_id, {
+                    # 广播点赞到所有连接 (所有 worker)
+                    await manager.publish(channel, {
                         "type": "stats_update",
                         "data": {"like_count_delta": 1}
                     })
                 elif data.get("action") == "comment":
                     # 广播新评论
-                    await manager.send_to_content(content_id, {
+                    await manager.publish(channel, {
                         "type": "new_comment",
                         "data": data.get("comment")
                     })
@@ -268,10 +192,12 @@ async def content_websocket(
                 pass
 
     except WebSocketDisconnect:
-        manager.disconnect_content(websocket, content_id)
+        pass
     except Exception as e:
         logger.error(f"[WS] Content connection error: {e}")
-        manager.disconnect_content(websocket, content_id)
+    finally:
+        manager.disconnect(conn)
+        logger.info(f"[WS] Client disconnected from content: {content_id}")
 
 
 @router.websocket("/ws/feed")
@@ -289,30 +215,34 @@ async def feed_websocket(
     - 社区热点
     - 活动提醒
     """
-    await manager.connect_broadcast(websocket)
+    conn = await manager.connect(websocket, "broadcast")
+    logger.info(f"[WS] Client connected to broadcast")
 
     try:
         # 发送连接确认
-        await websocket.send_json({
+        conn.offer({
             "type": "connected",
             "domain": domain,
             "message": "动态推送已连接"
         })
 
-        while True:
+        # 发送失败 / 慢消费者会把连接标记为 closed
+        while not conn.closed:
             # 检查动态更新
             updates = await get_feed_updates(domain)
             if updates:
-                await websocket.send_json(updates)
+                conn.offer(updates)
 
             # 等待10秒
             await asyncio.sleep(10)
 
     except WebSocketDisconnect:
-        manager.disconnect_broadcast(websocket)
+        pass
     except Exception as e:
         logger.error(f"[WS] Feed connection error: {e}")
-        manager.disconnect_broadcast(websocket)
+    finally:
+        manager.disconnect(conn)
+        logger.info(f"[WS] Client disconnected from broadcast")
 
 
 @router.websocket("/ws/user/{user_id}")
@@ -354,10 +284,12 @@ async def user_websocket(
         return
 
     # ── 认证通过，建立连接 ──
-    await manager.connect_user(websocket, user_id)
+    # 同一用户可同时保持多个连接 (多标签页 / 多设备)
+    conn = await manager.connect(websocket, f"user:{user_id}")
+    logger.info(f"[WS] User connected: {user_id}")
 
     try:
-        await websocket.send_json({
+        conn.offer({
             "type": "connected",
             "user_id": user_id,
             "message": "个人频道已连接"
@@ -371,30 +303,40 @@ async def user_websocket(
                 )
 
                 if data.get("type") == "ping":
-                    await websocket.send_json({"type": "pong"})
+                    conn.offer({"type": "pong"})
                 elif data.get("action") == "progress_update":
-                    await websocket.send_json({
+                    conn.offer({
                         "type": "progress_confirmed",
                         "data": data.get("progress")
                     })
 
             except asyncio.TimeoutError:
-                await websocket.send_json({"type": "ping"})
+                conn.offer({"type": "ping"})
 
     except WebSocketDisconnect:
-        manager.disconnect_user(websocket, user_id)
+        pass
     except Exception as e:
         logger.error(f"[WS] User connection error: {e}")
-        manager.disconnect_user(websocket, user_id)
+    finally:
+        manager.disconnect(conn)
+        logger.info(f"[WS] User disconnected: {user_id}")
 
 
 # ============================================================================
 # 辅助函数：供其他模块调用推送消息
 # ============================================================================
 
+def _user_notification(notification: dict) -> dict:
+    return {
+        "type": "notification",
+        "data": notification,
+        "timestamp": datetime.now().isoformat()
+    }
+
+
 async def push_content_update(content_id: str, update_type: str, data: dict):
     """推送内容更新（供其他API调用）"""
-    await manager.send_to_content(content_id, {
+    await manager.publish(f"content:{content_id}", {
         "type": update_type,
         "data": data,
         "timestamp": datetime.now().isoformat()
@@ -402,17 +344,23 @@ async def push_content_update(content_id: str, update_type: str, data: dict):
 
 
 async def push_user_notification(user_id: str, notification: dict):
-    """推送用户通知（供其他API调用）"""
-    await manager.send_to_user(user_id, {
-        "type": "notification",
-        "data": notification,
-        "timestamp": datetime.now().isoformat()
-    })
+    """推送用户通知（供其他API调用）; 用户连接在任一 worker 均可送达"""
+    await manager.publish(f"user:{user_id}", _user_notification(notification))
+
+
+def push_user_notification_sync(user_id: str, notification: dict):
+    """同 push_user_notification, 供调度器线程等同步代码调用"""
+    manager.publish_sync(f"user:{user_id}", _user_notification(notification))
+
+
+def push_user_notifications_sync(notifications: List[Tuple[str, dict]]):
+    """批量 push_user_notification_sync: [(user_id, notification), ...] 一次发出"""
+    manager.publish_many_sync([(f"user:{uid}", _user_notification(n)) for uid, n in notifications])
 
 
 async def push_broadcast(message: dict):
     """全局广播（供其他API调用）"""
-    await manager.broadcast({
+    await manager.publish("broadcast", {
         **message,
         "timestamp": datetime.now().isoformat()
     })
@@ -424,5 +372,7 @@ __all__ = [
     "manager",
     "push_content_update",
     "push_user_notification",
+    "push_user_notification_sync",
+    "push_user_notifications_sync",
     "push_broadcast"
 ]
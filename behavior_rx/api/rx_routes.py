@@ -77,7 +77,9 @@ def get_handoff_service() -> AgentHandoffService:
 def get_orchestrator() -> AgentCollaborationOrchestrator:
     global _orchestrator
     if _orchestrator is None:
-        _orchestrator = AgentCollaborationOrchestrator()
+        from core.database import AsyncSessionLocal
+        # 辅助Agent各用独立异步会话, 才能并发执行并按截止时间丢弃
+        _orchestrator = AgentCollaborationOrchestrator(session_factory=AsyncSessionLocal)
     return _orchestrator
 
 
@@ -105,6 +107,8 @@ class CollaborateResponse(BaseModel):
     merged_message: str
     merged_content: Dict[str, Any]
     primary_rx: Optional[RxPrescriptionDTO] = None
+    dropped_overlays: List[Dict[str, Any]] = []
+    timings_ms: Dict[str, float] = {}
 
 
 class AgentStatusResponse(BaseModel):
@@ -359,6 +363,8 @@ async def collaborate(
             merged_message=merged.merged_message,
             merged_content=merged.merged_content,
             primary_rx=merged.primary.rx,
+            dropped_overlays=merged.dropped_overlays,
+            timings_ms=merged.timings_ms,
         )
     except ValueError as e:
         raise HTTPException(
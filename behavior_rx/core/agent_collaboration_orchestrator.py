@@ -13,15 +13,23 @@ BehaviorOS — AgentCollaborationOrchestrator 4-Agent 协作编排器
   4. 多病共管:      Metabolic + Cardiac(并行) + Adherence(横切) → 处方合并
   5. 阶段回退:      领域Agent(暂停) → Coach(紧急接管) → 恢复后交还
   6. 就诊准备:      Adherence(主导) + 领域Agent(数据提供) → 就诊准备处方
+
+执行:
+  辅助Agent互不依赖, 以 asyncio 并发执行, 各自有截止时间; 决策允许时主Agent也并行启动。
+  超时/失败的辅助Agent被丢弃并记录原因, 不拖慢合并响应 — 多专家会话耗时≈max() 而非 sum()。
+  传入 db 时: 配置了 session_factory 则每个辅助Agent使用独立会话 (各自提交/回滚),
+  否则所有Agent共用调用方会话, 逐个执行且不设截止时间 (会话不支持并发, 也不能在 flush 中途取消)。
 """
 
 from __future__ import annotations
 
+import asyncio
 import logging
+import time
 import uuid
 from datetime import datetime
 from enum import Enum
-from typing import Any, Dict, List, Optional, Tuple
+from typing import Any, Callable, Dict, List, Optional, Tuple
 
 from ..core.rx_schemas import (
     ExpertAgentType,
@@ -56,6 +64,10 @@ class CollaborationScenario(str, Enum):
 # 协作决策结果
 # =====================================================================
 
+# Coach 必须先落地的合并策略 (紧急接管 / 先脱敏再交接), 主Agent不与辅助Agent并行
+SEQUENTIAL_PRIMARY_STRATEGIES = {"coach_override", "coach_first_then_handoff"}
+
+
 class CollaborationDecision:
     """协作编排决策结果"""
 
@@ -66,12 +78,16 @@ class CollaborationDecision:
         secondary_agents: List[ExpertAgentType],
         merge_strategy: str = "primary_first",
         reason: str = "",
+        parallel_primary: Optional[bool] = None,
     ):
         self.scenario = scenario
         self.primary_agent = primary_agent
         self.secondary_agents = secondary_agents
         self.merge_strategy = merge_strategy
         self.reason = reason
+        if parallel_primary is None:
+            parallel_primary = merge_strategy not in SEQUENTIAL_PRIMARY_STRATEGIES
+        self.parallel_primary = parallel_primary
 
     def to_dict(self) -> Dict[str, Any]:
         return {
@@ -79,6 +95,7 @@ class CollaborationDecision:
             "primary_agent": self.primary_agent.value,
             "secondary_agents": [a.value for a in self.secondary_agents],
             "merge_strategy": self.merge_strategy,
+            "parallel_primary": self.parallel_primary,
             "reason": self.reason,
         }
 
@@ -97,21 +114,27 @@ class MergedResponse:
         merged_message: str,
         merged_content: Dict[str, Any],
         collaboration: CollaborationDecision,
+        dropped_overlays: Optional[List[Dict[str, Any]]] = None,
+        timings_ms: Optional[Dict[str, float]] = None,
     ):
         self.primary = primary
         self.overlays = overlays
         self.merged_message = merged_message
         self.merged_content = merged_content
         self.collaboration = collaboration
+        self.dropped_overlays = dropped_overlays or []
+        self.timings_ms = timings_ms or {}
         self.timestamp = datetime.utcnow()
 
     def to_dict(self) -> Dict[str, Any]:
         return {
             "primary_response": self.primary.to_dict(),
             "overlay_count": len(self.overlays),
+            "dropped_overlays": self.dropped_overlays,
             "merged_message": self.merged_message,
             "merged_content": self.merged_content,
             "collaboration": self.collaboration.to_dict(),
+            "timings_ms": self.timings_ms,
             "timestamp": self.timestamp.isoformat(),
         }
 
@@ -137,13 +160,30 @@ class AgentCollaborationOrchestrator:
       - 不直接调用 LLM (这是 MasterAgent 的职责)
     """
 
+    # 辅助Agent默认截止时间 (秒), 从该Agent启动时计时
+    DEFAULT_OVERLAY_TIMEOUT = 2.0
+
     def __init__(
         self,
         agents: Optional[Dict[ExpertAgentType, BaseExpertAgent]] = None,
         handoff_service: Optional[AgentHandoffService] = None,
+        overlay_timeout: float = DEFAULT_OVERLAY_TIMEOUT,
+        agent_timeouts: Optional[Dict[ExpertAgentType, float]] = None,
+        session_factory: Optional[Callable[[], Any]] = None,
     ):
+        """
+        Args:
+            agents: 预注册的专家Agent
+            handoff_service: 交接服务
+            overlay_timeout: 辅助Agent默认截止时间 (秒)
+            agent_timeouts: 按Agent覆盖截止时间, 例如心血管Agent放宽
+            session_factory: 异步会话工厂 (如 AsyncSessionLocal), 为并发的辅助Agent各开独立会话
+        """
         self._agents = agents or {}
         self._handoff_service = handoff_service or AgentHandoffService()
+        self._overlay_timeout = overlay_timeout
+        self._agent_timeouts = dict(agent_timeouts or {})
+        self._session_factory = session_factory
         logger.info(
             f"CollaborationOrchestrator initialized with "
             f"{len(self._agents)} agents"
@@ -298,9 +338,12 @@ class AgentCollaborationOrchestrator:
 
         流程:
           1. 构建上下文 → 场景识别
-          2. 调用主Agent
-          3. 调用辅助Agent(如有)
+          2. 启动辅助Agent(并发, 各自截止时间) + 主Agent(parallel_primary 时同时启动)
+          3. 收集辅助Agent, 超时/失败者记入 dropped_overlays
           4. 合并处方和消息
+
+        db 由主Agent使用; 辅助Agent在配置 session_factory 时使用独立会话, 否则与主Agent
+        共用 db 并退化为逐个执行。timings_ms 为各Agent自身耗时, total 为整体耗时。
         """
         # Step 1: 上下文 & 场景识别
         profile = user_input.get("behavioral_profile", {})
@@ -330,30 +373,67 @@ class AgentCollaborationOrchestrator:
             f"secondaries={[a.value for a in decision.secondary_agents]}"
         )
 
-        # Step 2: 调用主Agent
+        # Step 2: 主Agent (决策允许时与辅助Agent并行启动)
         primary_agent = self._agents.get(decision.primary_agent)
         if not primary_agent:
             raise ValueError(
                 f"Primary agent {decision.primary_agent.value} not registered"
             )
-        primary_response = await primary_agent.process(
-            user_input, user_id, session_id, db
-        )
 
-        # Step 3: 调用辅助Agent
-        overlay_responses = []
+        started = time.monotonic()
+        timings: Dict[str, float] = {}
+        dropped: List[Dict[str, Any]] = []
+        overlay_types = []
         for agent_type in decision.secondary_agents:
-            agent = self._agents.get(agent_type)
-            if agent:
+            if agent_type in self._agents:
+                overlay_types.append(agent_type)
+            else:
+                dropped.append({"agent": agent_type.value, "reason": "not_registered"})
+
+        isolated = db is not None and self._session_factory is not None
+
+        async def run(agent_type: ExpertAgentType, agent_db) -> AgentResponse:
+            agent_started = time.monotonic()
+            try:
+                return await self._agents[agent_type].process(
+                    user_input, user_id, session_id, agent_db
+                )
+            finally:
+                timings[agent_type.value] = round((time.monotonic() - agent_started) * 1000, 1)
+
+        async def run_overlay(agent_type: ExpertAgentType) -> AgentResponse:
+            timeout = self._timeout_for(agent_type)
+            if not isolated:
+                return await asyncio.wait_for(run(agent_type, db), timeout)
+            async with self._session_factory() as own_db:
+                response = await asyncio.wait_for(run(agent_type, own_db), timeout)
+                # 截止时间只约束处理过程, 提交不会被超时取消打断; 超时则随会话关闭回滚
+                await own_db.commit()
+                return response
+
+        # Step 3: 执行并收集辅助Agent (超时/失败丢弃并记录原因)
+        overlay_responses: List[AgentResponse] = []
+        if db is not None and not isolated:
+            # 共用调用方会话: 逐个执行, 不设截止时间, 避免并发操作会话或在 flush/commit 中途取消
+            primary_response = await run(decision.primary_agent, db)
+            for agent_type in overlay_types:
+                await self._collect(agent_type, run(agent_type, db), overlay_responses, dropped)
+        else:
+            if decision.parallel_primary:
+                primary_task = asyncio.ensure_future(run(decision.primary_agent, db))
+                overlay_tasks = self._start_overlays(overlay_types, run_overlay)
                 try:
-                    overlay = await agent.process(
-                        user_input, user_id, session_id, db
-                    )
-                    overlay_responses.append(overlay)
-                except Exception as e:
-                    logger.warning(
-                        f"Secondary agent {agent_type.value} failed: {e}"
-                    )
+                    primary_response = await primary_task
+                except BaseException:
+                    for task in overlay_tasks.values():
+                        task.cancel()
+                    raise
+            else:
+                primary_response = await run(decision.primary_agent, db)
+                overlay_tasks = self._start_overlays(overlay_types, run_overlay)
+            for agent_type, task in overlay_tasks.items():
+                await self._collect(agent_type, task, overlay_responses, dropped)
+        timings["total"] = round((time.monotonic() - started) * 1000, 1)
 
         # Step 4: 合并
         merged_msg, merged_content = self._merge_responses(
@@ -366,8 +446,42 @@ class AgentCollaborationOrchestrator:
             merged_message=merged_msg,
             merged_content=merged_content,
             collaboration=decision,
+            dropped_overlays=dropped,
+            timings_ms=timings,
         )
 
+    def _timeout_for(self, agent_type: ExpertAgentType) -> float:
+        return self._agent_timeouts.get(agent_type, self._overlay_timeout)
+
+    def _start_overlays(
+        self, overlay_types: List[ExpertAgentType], run_overlay
+    ) -> Dict[ExpertAgentType, "asyncio.Future"]:
+        """并发启动辅助Agent (run_overlay 内带独立截止时间, 超时即取消)"""
+        return {
+            agent_type: asyncio.ensure_future(run_overlay(agent_type))
+            for agent_type in overlay_types
+        }
+
+    async def _collect(
+        self,
+        agent_type: ExpertAgentType,
+        pending,
+        responses: List[AgentResponse],
+        dropped: List[Dict[str, Any]],
+    ) -> None:
+        """等待辅助Agent结果; 超时/失败记入 dropped 而不是抛出"""
+        try:
+            responses.append(await pending)
+        except asyncio.TimeoutError:
+            reason = f"timeout>{self._timeout_for(agent_type)}s"
+            dropped.append({"agent": agent_type.value, "reason": reason})
+            logger.warning(f"Secondary agent {agent_type.value} dropped: {reason}")
+        except Exception as e:
+            dropped.append({"agent": agent_type.value, "reason": f"error: {e}"})
+            logger.warning(
+                f"Secondary agent {agent_type.value} failed: {e}"
+            )
+
     # ---------------------------------------------------------------
     # 阶段回退检测
     # ---------------------------------------------------------------
@@ -14,6 +14,7 @@ BehaviorOS — BehaviorRxEngine 行为处方核心引擎
 设计原则:
   - 纯函数式计算, 无副作用
   - 每次调用生成完整 RxPrescription 对象
+  - 处方主体按量化输入 LRU 记忆化 (见 rx_memo), 批量接口按相同区间共享计算
   - 上层 Agent 拿到处方后进行领域包装
   - <200ms P99 延迟要求
 """
@@ -26,8 +27,9 @@ import os
 import uuid
 from datetime import datetime
 from pathlib import Path
-from typing import Any, Dict, List, Optional, Tuple
+from typing import Any, Dict, Iterable, List, NamedTuple, Optional, Tuple
 
+from .rx_memo import RxMemo, rx_memo_key
 from .rx_schemas import (
     BigFiveProfile,
     CommunicationStyle,
@@ -267,6 +269,33 @@ def _generate_escalation_rules(
     return rules
 
 
+# =====================================================================
+# 处方主体 (可记忆化部分)
+# =====================================================================
+
+class _RxCore(NamedTuple):
+    """同一量化 key 下不变的处方字段"""
+    primary_strategy: RxStrategyType
+    secondary_strategies: List[RxStrategyType]
+    communication_style: CommunicationStyle
+    intensity: RxIntensity
+    pace: str
+    micro_actions: List[MicroAction]
+    reward_triggers: List[RewardTrigger]
+    escalation_rules: List[EscalationRule]
+    goal_behavior: str
+    reasoning: str
+
+    def frozen(self) -> "_RxCore":
+        """子对象转为 dict 元组后可安全复用, 组装时由 pydantic 重新构造实例"""
+        return self._replace(
+            secondary_strategies=tuple(self.secondary_strategies),
+            micro_actions=tuple(ma.model_dump() for ma in self.micro_actions),
+            reward_triggers=tuple(rt.model_dump() for rt in self.reward_triggers),
+            escalation_rules=tuple(er.model_dump() for er in self.escalation_rules),
+        )
+
+
 # =====================================================================
 # BehaviorRxEngine — 主引擎
 # =====================================================================
@@ -282,17 +311,22 @@ class BehaviorRxEngine:
 
     或异步:
         rx = await engine.compute_rx_async(context, agent_type, db)
+
+    批量 (夜间重新开方):
+        rxs = engine.compute_rx_batch(contexts, agent_type)
     """
 
-    def __init__(self, strategies_path: Optional[str] = None):
+    def __init__(self, strategies_path: Optional[str] = None, memo_size: int = 4096):
         """
         初始化引擎
 
         Args:
             strategies_path: rx_strategies.json 路径, None 则使用默认路径
+            memo_size: 处方主体 LRU 容量, 0 则关闭记忆化
         """
         self._strategy_templates: Dict[str, Dict] = {}
         self._load_strategy_templates(strategies_path)
+        self._memo = RxMemo(memo_size)
         logger.info(
             f"BehaviorRxEngine initialized with {len(self._strategy_templates)} strategies"
         )
@@ -341,6 +375,74 @@ class BehaviorRxEngine:
         Returns:
             RxPrescriptionDTO 完整处方对象
         """
+        core = self._compute_core(context, agent_type, override_strategy, override_intensity)
+        rx = self._assemble_rx(core, context, agent_type)
+
+        logger.info(
+            f"RxPrescription computed: user={context.user_id} "
+            f"agent={agent_type.value} stage=S{context.ttm_stage} "
+            f"strategy={rx.strategy_type.value} intensity={rx.intensity.value}"
+        )
+        return rx
+
+    def compute_rx_batch(
+        self,
+        contexts: Iterable[RxContext],
+        agent_type: ExpertAgentType,
+        override_strategy: Optional[RxStrategyType] = None,
+        override_intensity: Optional[RxIntensity] = None,
+    ) -> List[RxPrescriptionDTO]:
+        """
+        批量处方计算 (夜间重新开方)
+
+        按量化 key 分组, 每组只做一次策略评分/微行动/奖励/升级规则计算,
+        组内每个用户只计算阻力阈值与置信度。结果与逐个 compute_rx 一致 (rx_id 除外)。
+
+        Returns:
+            与 contexts 顺序一致的 RxPrescriptionDTO 列表
+        """
+        cores: Dict[Any, _RxCore] = {}
+        results: List[RxPrescriptionDTO] = []
+        for context in contexts:
+            key = rx_memo_key(context, agent_type, override_strategy, override_intensity)
+            core = cores.get(key)
+            if core is None:
+                core = self._compute_core(
+                    context, agent_type, override_strategy, override_intensity, key=key
+                ).frozen()
+                cores[key] = core
+            results.append(self._assemble_rx(core, context, agent_type))
+
+        logger.info(
+            f"RxPrescription batch computed: agent={agent_type.value} "
+            f"users={len(results)} bands={len(cores)}"
+        )
+        return results
+
+    def memo_stats(self) -> Dict[str, Any]:
+        """记忆表命中统计"""
+        return self._memo.stats()
+
+    def clear_memo(self) -> None:
+        """清空记忆表 (策略模板变更后调用)"""
+        self._memo.clear()
+
+    def _compute_core(
+        self,
+        context: RxContext,
+        agent_type: ExpertAgentType,
+        override_strategy: Optional[RxStrategyType] = None,
+        override_intensity: Optional[RxIntensity] = None,
+        key: Any = None,
+    ) -> _RxCore:
+        """处方主体计算 (带记忆化)"""
+        if self._memo.enabled:
+            if key is None:
+                key = rx_memo_key(context, agent_type, override_strategy, override_intensity)
+            core = self._memo.get(key)
+            if core is not None:
+                return core
+
         stage = context.ttm_stage
         personality = context.personality
         capacity = context.capacity_score
@@ -375,49 +477,59 @@ class BehaviorRxEngine:
             primary_strategy, personality
         )
 
-        # ---- Step 6: 阻力阈值 ----
-        resistance_threshold = _calculate_resistance_threshold(
-            personality, capacity, stage
-        )
-
-        # ---- Step 7: 升级规则 ----
+        # ---- Step 6: 升级规则 ----
         escalation_rules = _generate_escalation_rules(
             agent_type, stage, personality
         )
 
-        # ---- Step 8: 目标行为描述 ----
+        # ---- Step 7: 目标行为描述 ----
         goal_behavior = self._formulate_goal_behavior(
             primary_strategy, agent_type, stage, context.domain_data
         )
 
-        # ---- 组装处方 ----
-        rx = RxPrescriptionDTO(
-            rx_id=uuid.uuid4(),
-            agent_type=agent_type,
-            goal_behavior=goal_behavior,
-            strategy_type=primary_strategy,
+        core = _RxCore(
+            primary_strategy=primary_strategy,
             secondary_strategies=secondary_strategies,
+            communication_style=comm_style,
             intensity=intensity,
             pace=pace,
-            communication_style=comm_style,
             micro_actions=micro_actions,
             reward_triggers=reward_triggers,
-            resistance_threshold=resistance_threshold,
             escalation_rules=escalation_rules,
-            domain_context=context.domain_data,
-            ttm_stage=stage,
-            confidence=self._calculate_confidence(context, primary_strategy),
+            goal_behavior=goal_behavior,
             reasoning=self._generate_reasoning(
                 stage, primary_strategy, comm_style, intensity, pace, personality
             ),
         )
+        if self._memo.enabled:
+            core = core.frozen()
+            self._memo.put(key, core)
+        return core
 
-        logger.info(
-            f"RxPrescription computed: user={context.user_id} "
-            f"agent={agent_type.value} stage=S{stage} "
-            f"strategy={primary_strategy.value} intensity={intensity.value}"
+    def _assemble_rx(
+        self, core: _RxCore, context: RxContext, agent_type: ExpertAgentType
+    ) -> RxPrescriptionDTO:
+        """组装处方: 主体来自 core (复用时为 frozen 形式), 阻力阈值与置信度逐个计算"""
+        return RxPrescriptionDTO(
+            rx_id=uuid.uuid4(),
+            agent_type=agent_type,
+            goal_behavior=core.goal_behavior,
+            strategy_type=core.primary_strategy,
+            secondary_strategies=list(core.secondary_strategies),
+            intensity=core.intensity,
+            pace=core.pace,
+            communication_style=core.communication_style,
+            micro_actions=list(core.micro_actions),
+            reward_triggers=list(core.reward_triggers),
+            resistance_threshold=_calculate_resistance_threshold(
+                context.personality, context.capacity_score, context.ttm_stage
+            ),
+            escalation_rules=list(core.escalation_rules),
+            domain_context=context.domain_data,
+            ttm_stage=context.ttm_stage,
+            confidence=self._calculate_confidence(context, core.primary_strategy),
+            reasoning=core.reasoning,
         )
-        return rx
 
     # ---------------------------------------------------------------
     # 异步版本 (含持久化)
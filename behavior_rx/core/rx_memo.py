@@ -0,0 +1,108 @@
+"""
+BehaviorOS — 处方计算记忆化
+===========================
+BehaviorRxEngine.compute_rx 的输出只依赖少数离散判定:
+
+  - TTM 阶段 / Agent 类型 / 障碍集合 / 强制策略与强度
+  - BigFive 各维度是否 ≥65 (高) 或 ≤35 (低), 以及主导特质
+  - CAPACITY 落在哪个区间 (0.3 / 0.35 / 0.5 / 0.65 / 0.7 五个切点)
+  - 阶段稳定度落在哪个区间 (0.4 / 0.6 两个切点)
+
+rx_memo_key() 把连续输入量化到这些区间, 同一 key 下策略评分、沟通风格、强度、节奏、
+微行动、奖励触发器、升级规则、目标行为和推理说明完全相同, 可以安全复用。
+阻力阈值与置信度随 capacity / stability / adherence 连续变化, 每次单独计算。
+"""
+
+from __future__ import annotations
+
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional, Tuple
+
+from .rx_schemas import ExpertAgentType, RxContext, RxIntensity, RxStrategyType
+
+_TRAITS = ("O", "C", "E", "A", "N")
+
+# 引擎规则中出现过的全部 capacity / stability 比较
+_CAPACITY_CUTS = (("<", 0.3), ("<", 0.35), ("<", 0.5), (">", 0.65), (">", 0.7))
+_STABILITY_CUTS = (("<", 0.4), (">", 0.6))
+
+
+def _bands(value: float, cuts) -> Tuple[bool, ...]:
+    return tuple([value < t if op == "<" else value > t for op, t in cuts])
+
+
+def rx_memo_key(
+    context: RxContext,
+    agent_type: ExpertAgentType,
+    override_strategy: Optional[RxStrategyType] = None,
+    override_intensity: Optional[RxIntensity] = None,
+) -> Hashable:
+    """量化输入 → 记忆化 key (同 key 的处方主体完全一致)"""
+    p = context.personality
+    scores = (p.O, p.C, p.E, p.A, p.N)
+    top = max(scores)
+    return (
+        context.ttm_stage,
+        agent_type,
+        # 与 BigFiveProfile.is_high / is_low / dominant_trait 同口径 (≥65 / ≤35 / 首个最大值)
+        tuple(s >= 65.0 for s in scores),
+        (p.C <= 35.0, p.O <= 35.0, p.E <= 35.0),   # 规则只用到 C/O/E 偏低
+        _TRAITS[scores.index(top)],
+        _bands(context.capacity_score, _CAPACITY_CUTS),
+        _bands(context.stage_stability, _STABILITY_CUTS),
+        tuple(sorted(context.active_barriers)),
+        override_strategy,
+        override_intensity,
+    )
+
+
+class RxMemo:
+    """线程安全的 LRU 记忆表 (maxsize=0 表示关闭)"""
+
+    def __init__(self, maxsize: int = 4096):
+        self.maxsize = maxsize
+        self._data: "OrderedDict[Hashable, Any]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.maxsize > 0
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        if self.maxsize <= 0:
+            return None
+        with self._lock:
+            value = self._data.get(key)
+            if value is None:
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key: Hashable, value: Any) -> None:
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+            self.hits = self.misses = 0
+
+    def stats(self) -> Dict[str, Any]:
+        total = self.hits + self.misses
+        return {
+            "size": len(self._data),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 4) if total else 0.0,
+        }
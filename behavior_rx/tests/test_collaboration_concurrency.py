@@ -0,0 +1,308 @@
+"""
+BehaviorOS — 协作编排并发执行测试
+=================================
+  - 多病共管会话 (代谢 + 心血管 + 依从性) 耗时 ≈ max() 而非 sum()
+  - 超时/失败的辅助Agent被丢弃并记录原因
+  - coach_override 场景主Agent先于辅助Agent执行
+  - 共用调用方会话时逐个执行且不取消; session_factory 为辅助Agent各开独立会话
+  - timings_ms 按Agent自身耗时计
+  - /collaborate 路由的默认编排器配置 AsyncSessionLocal, 辅助Agent并发执行且超时丢弃
+"""
+
+from __future__ import annotations
+
+import asyncio
+import time
+import uuid
+
+import pytest
+
+from behavior_rx.agents.base_expert_agent import AgentResponse
+from behavior_rx.core.agent_collaboration_orchestrator import (
+    AgentCollaborationOrchestrator,
+)
+from behavior_rx.core.rx_schemas import (
+    CommunicationStyle, ExpertAgentType, RxIntensity, RxPrescriptionDTO, RxStrategyType,
+)
+
+USER_ID = uuid.uuid4()
+
+MULTI_MORBIDITY_INPUT = {
+    "message": "血糖和心脏康复一起怎么安排?",
+    "behavioral_profile": {"ttm_stage": 3, "stage_stability": 0.7},
+    "domain_data": {"hba1c": 7.4, "rehab_phase": 2},
+}
+
+REGRESSION_INPUT = {
+    "message": "太难了, 我想放弃",
+    "behavioral_profile": {"ttm_stage": 4, "stage_stability": 0.7},
+}
+
+
+class SlowAgent:
+    """按固定延迟返回的假Agent, 记录起止顺序"""
+
+    def __init__(self, agent_type, delay=0.0, fail=False, log=None):
+        self.agent_type = agent_type
+        self.delay = delay
+        self.fail = fail
+        self.log = log if log is not None else []
+
+    async def process(self, user_input, user_id, session_id=None, db=None):
+        self.log.append(("start", self.agent_type))
+        await asyncio.sleep(self.delay)
+        if self.fail:
+            raise RuntimeError("boom")
+        self.log.append(("end", self.agent_type))
+        return AgentResponse(
+            agent_type=self.agent_type,
+            rx=RxPrescriptionDTO(
+                agent_type=self.agent_type,
+                goal_behavior="test",
+                strategy_type=RxStrategyType.SELF_MONITORING,
+                intensity=RxIntensity.MODERATE,
+                communication_style=CommunicationStyle.EMPATHETIC,
+                ttm_stage=3,
+            ),
+            domain_content={"agent": self.agent_type.value},
+            user_message=f"{self.agent_type.value} says hi",
+        )
+
+
+def _orchestrator(delays, **kw):
+    log = []
+    orch = AgentCollaborationOrchestrator(**kw)
+    for agent_type, delay in delays.items():
+        fail = delay is None
+        orch.register_agent(SlowAgent(agent_type, delay or 0.0, fail=fail, log=log))
+    return orch, log
+
+
+def _run(coro):
+    return asyncio.run(coro)
+
+
+def test_multi_expert_runs_in_max_latency():
+    orch, _ = _orchestrator({
+        ExpertAgentType.METABOLIC_EXPERT: 0.2,
+        ExpertAgentType.CARDIAC_EXPERT: 0.2,
+        ExpertAgentType.ADHERENCE_EXPERT: 0.2,
+    })
+    t0 = time.monotonic()
+    merged = _run(orch.orchestrate(MULTI_MORBIDITY_INPUT, USER_ID))
+    elapsed = time.monotonic() - t0
+
+    assert merged.collaboration.scenario.value == "multi_morbidity"
+    assert len(merged.overlays) == 2
+    assert merged.dropped_overlays == []
+    assert elapsed < 0.45  # 串行需要 ≥0.6s
+
+
+def test_late_overlay_is_dropped_with_reason():
+    orch, _ = _orchestrator(
+        {
+            ExpertAgentType.METABOLIC_EXPERT: 0.05,
+            ExpertAgentType.CARDIAC_EXPERT: 5.0,
+            ExpertAgentType.ADHERENCE_EXPERT: 0.05,
+        },
+        overlay_timeout=1.0,
+        agent_timeouts={ExpertAgentType.CARDIAC_EXPERT: 0.1},
+    )
+    t0 = time.monotonic()
+    merged = _run(orch.orchestrate(MULTI_MORBIDITY_INPUT, USER_ID))
+
+    assert time.monotonic() - t0 < 1.0
+    assert [o.agent_type for o in merged.overlays] == [ExpertAgentType.ADHERENCE_EXPERT]
+    assert merged.dropped_overlays == [
+        {"agent": "cardiac_expert", "reason": "timeout>0.1s"}
+    ]
+    assert merged.to_dict()["dropped_overlays"][0]["agent"] == "cardiac_expert"
+
+
+def test_failed_and_missing_overlays_are_recorded():
+    orch, _ = _orchestrator({
+        ExpertAgentType.METABOLIC_EXPERT: 0.0,
+        ExpertAgentType.CARDIAC_EXPERT: None,
+    })
+    merged = _run(orch.orchestrate(MULTI_MORBIDITY_INPUT, USER_ID))
+
+    reasons = {d["agent"]: d["reason"] for d in merged.dropped_overlays}
+    assert reasons == {"cardiac_expert": "error: boom", "adherence_expert": "not_registered"}
+    assert merged.overlays == []
+
+
+def test_coach_override_runs_primary_first():
+    orch, log = _orchestrator({
+        ExpertAgentType.BEHAVIOR_COACH: 0.05,
+        ExpertAgentType.METABOLIC_EXPERT: 0.0,
+    })
+    merged = _run(orch.orchestrate(
+        REGRESSION_INPUT, USER_ID, current_agent=ExpertAgentType.METABOLIC_EXPERT,
+    ))
+
+    assert merged.collaboration.merge_strategy == "coach_override"
+    assert merged.collaboration.parallel_primary is False
+    assert log[:2] == [
+        ("start", ExpertAgentType.BEHAVIOR_COACH),
+        ("end", ExpertAgentType.BEHAVIOR_COACH),
+    ]
+
+
+class FakeAsyncSession:
+    """记录并发 flush 数与提交/关闭的假会话"""
+
+    def __init__(self, name, registry=None):
+        self.name = name
+        self.active = 0
+        self.max_active = 0
+        self.committed = False
+        self.closed = False
+        if registry is not None:
+            registry.append(self)
+
+    async def flush(self):
+        self.active += 1
+        self.max_active = max(self.max_active, self.active)
+        await asyncio.sleep(0.01)
+        self.active -= 1
+
+    async def commit(self):
+        self.committed = True
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        self.closed = True
+
+
+class FlushingAgent(SlowAgent):
+    """处理过程中对传入会话 flush 并记录所用会话"""
+
+    def __init__(self, agent_type, delay=0.0, sessions=None):
+        super().__init__(agent_type, delay)
+        self.sessions = sessions if sessions is not None else {}
+
+    async def process(self, user_input, user_id, session_id=None, db=None):
+        self.sessions[self.agent_type] = db
+        await db.flush()
+        return await super().process(user_input, user_id, session_id, db)
+
+
+def _flushing_orchestrator(delays, **kw):
+    sessions = {}
+    orch = AgentCollaborationOrchestrator(**kw)
+    for agent_type, delay in delays.items():
+        orch.register_agent(FlushingAgent(agent_type, delay, sessions))
+    return orch, sessions
+
+
+def test_shared_session_runs_agents_one_at_a_time_without_deadline():
+    orch, sessions = _flushing_orchestrator(
+        {
+            ExpertAgentType.METABOLIC_EXPERT: 0.0,
+            ExpertAgentType.CARDIAC_EXPERT: 0.15,
+            ExpertAgentType.ADHERENCE_EXPERT: 0.0,
+        },
+        overlay_timeout=0.05,
+    )
+    db = FakeAsyncSession("caller")
+    merged = _run(orch.orchestrate(MULTI_MORBIDITY_INPUT, USER_ID, db=db))
+
+    assert db.max_active == 1
+    assert set(sessions.values()) == {db}
+    # 共用会话时不取消 (不会在 flush 中途中断), 慢Agent仍被采纳
+    assert merged.dropped_overlays == [] and len(merged.overlays) == 2
+
+
+def test_session_factory_gives_each_overlay_its_own_session():
+    opened = []
+    orch, sessions = _flushing_orchestrator(
+        {
+            ExpertAgentType.METABOLIC_EXPERT: 0.1,
+            ExpertAgentType.CARDIAC_EXPERT: 5.0,
+            ExpertAgentType.ADHERENCE_EXPERT: 0.1,
+        },
+        agent_timeouts={ExpertAgentType.CARDIAC_EXPERT: 0.05},
+        session_factory=lambda: FakeAsyncSession(f"own{len(opened)}", opened),
+    )
+    db = FakeAsyncSession("caller")
+    t0 = time.monotonic()
+    merged = _run(orch.orchestrate(MULTI_MORBIDITY_INPUT, USER_ID, db=db))
+
+    assert time.monotonic() - t0 < 0.18  # 主Agent与辅助Agent并发
+    assert sessions[ExpertAgentType.METABOLIC_EXPERT] is db and not db.committed
+    by_agent = {s.name: s for s in opened}
+    cardiac = sessions[ExpertAgentType.CARDIAC_EXPERT]
+    adherence = sessions[ExpertAgentType.ADHERENCE_EXPERT]
+    assert cardiac is not adherence and len(by_agent) == 2
+    # 超时的辅助Agent会话关闭且不提交, 完成的辅助Agent各自提交
+    assert cardiac.closed and not cardiac.committed
+    assert adherence.closed and adherence.committed
+    assert merged.dropped_overlays == [{"agent": "cardiac_expert", "reason": "timeout>0.05s"}]
+
+
+def test_timings_are_measured_per_agent():
+    orch, _ = _orchestrator({
+        ExpertAgentType.BEHAVIOR_COACH: 0.1,
+        ExpertAgentType.METABOLIC_EXPERT: 0.0,
+    })
+    merged = _run(orch.orchestrate(
+        REGRESSION_INPUT, USER_ID, current_agent=ExpertAgentType.METABOLIC_EXPERT,
+    ))
+
+    timings = merged.timings_ms
+    # 辅助Agent在主Agent之后启动, 其耗时不包含主Agent的 100ms
+    assert timings["behavior_coach"] >= 100
+    assert timings["metabolic_expert"] < 50
+    assert timings["total"] >= timings["behavior_coach"]
+
+
+def test_collaborate_route_runs_overlays_concurrently(monkeypatch):
+    TestClient = pytest.importorskip("fastapi.testclient").TestClient
+    from fastapi import FastAPI
+
+    import core.database
+    from api.dependencies import require_coach_or_admin
+    from behavior_rx import rx_routes
+
+    opened = []
+    monkeypatch.setattr(
+        core.database, "AsyncSessionLocal", lambda: FakeAsyncSession(f"own{len(opened)}", opened),
+    )
+    monkeypatch.setattr(rx_routes, "_orchestrator", None)
+    orch = rx_routes.get_orchestrator()
+    log = []
+    for agent_type, delay in {
+        ExpertAgentType.METABOLIC_EXPERT: 0.05,
+        ExpertAgentType.CARDIAC_EXPERT: 5.0,  # 超过默认截止时间 2s
+        ExpertAgentType.ADHERENCE_EXPERT: 0.3,
+    }.items():
+        orch.register_agent(SlowAgent(agent_type, delay, log=log))
+
+    def caller_db():
+        yield FakeAsyncSession("caller")
+
+    app = FastAPI()
+    app.include_router(rx_routes.router)
+    app.dependency_overrides[rx_routes.get_db] = caller_db
+    app.dependency_overrides[require_coach_or_admin] = lambda: None
+    client = TestClient(app)
+
+    t0 = time.monotonic()
+    resp = client.post("/api/v1/rx/collaborate", json={
+        "user_id": str(USER_ID), "user_input": MULTI_MORBIDITY_INPUT,
+    })
+    elapsed = time.monotonic() - t0
+
+    assert resp.status_code == 200, resp.text
+    body = resp.json()
+    assert body["scenario"] == "multi_morbidity"
+    # 两个辅助Agent在任一完成前都已启动, 且各自使用工厂打开的会话
+    overlay_events = [e for e in log if e[1] != ExpertAgentType.METABOLIC_EXPERT]
+    assert [e[0] for e in overlay_events] == ["start", "start", "end"]
+    assert len(opened) == 2 and all(s.closed for s in opened)
+    # 超时的心血管Agent被丢弃, 请求不等待其 5s
+    assert body["dropped_overlays"] == [{"agent": "cardiac_expert", "reason": "timeout>2.0s"}]
+    assert elapsed < 4.0
+    assert "adherence_expert" in body["timings_ms"]
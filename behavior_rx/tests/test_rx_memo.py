@@ -0,0 +1,109 @@
+"""
+BehaviorOS — 处方记忆化与批量计算测试
+=====================================
+  - 记忆化开启/关闭结果一致 (网格覆盖所有量化切点)
+  - compute_rx_batch 与逐个 compute_rx 一致
+  - 命中统计与 LRU 上限
+  - 调用方修改处方不会污染记忆表
+"""
+
+from __future__ import annotations
+
+import itertools
+import uuid
+
+import pytest
+
+from behavior_rx.core.behavior_rx_engine import BehaviorRxEngine
+from behavior_rx.core.rx_schemas import (
+    BigFiveProfile, ExpertAgentType, RxContext, RxStrategyType,
+)
+
+CAPACITIES = (0.1, 0.3, 0.33, 0.35, 0.45, 0.5, 0.6, 0.65, 0.68, 0.7, 0.9)
+STABILITIES = (0.2, 0.4, 0.5, 0.6, 0.8)
+PERSONALITIES = (
+    {},
+    {"N": 80},
+    {"C": 70, "E": 20},
+    {"E": 65, "A": 66},
+    {"O": 90, "C": 30},
+    {"O": 35, "E": 35, "C": 35},
+)
+BARRIERS = ((), ("fear",), ("forgetfulness", "fear"), ("fear", "fear"))
+
+
+def _contexts():
+    for stage, cap, stab, bf, barriers in itertools.product(
+        range(7), CAPACITIES, STABILITIES, PERSONALITIES, BARRIERS
+    ):
+        yield RxContext(
+            user_id=uuid.uuid4(),
+            ttm_stage=stage,
+            capacity_score=cap,
+            stage_stability=stab,
+            personality=BigFiveProfile(**bf),
+            active_barriers=list(barriers),
+            recent_adherence=cap,
+        )
+
+
+def _body(rx):
+    return rx.model_dump(exclude={"rx_id"})
+
+
+@pytest.fixture(scope="module")
+def contexts():
+    return list(_contexts())
+
+
+@pytest.mark.parametrize("agent_type", list(ExpertAgentType))
+def test_memo_matches_uncached(contexts, agent_type):
+    plain = BehaviorRxEngine(memo_size=0)
+    memo = BehaviorRxEngine()
+    for ctx in contexts:
+        assert _body(memo.compute_rx(ctx, agent_type)) == _body(plain.compute_rx(ctx, agent_type))
+    assert memo.memo_stats()["hits"] > 0
+
+
+@pytest.mark.parametrize("agent_type", list(ExpertAgentType))
+def test_batch_matches_per_user(contexts, agent_type):
+    plain = BehaviorRxEngine(memo_size=0)
+    batch = BehaviorRxEngine(memo_size=0).compute_rx_batch(contexts, agent_type)
+
+    assert len(batch) == len(contexts)
+    for ctx, rx in zip(contexts, batch):
+        assert _body(rx) == _body(plain.compute_rx(ctx, agent_type))
+    assert len({rx.rx_id for rx in batch}) == len(batch)
+
+
+def test_override_is_part_of_key():
+    engine = BehaviorRxEngine()
+    ctx = RxContext(user_id=uuid.uuid4(), ttm_stage=3)
+    base = engine.compute_rx(ctx, ExpertAgentType.BEHAVIOR_COACH)
+    forced = engine.compute_rx(
+        ctx, ExpertAgentType.BEHAVIOR_COACH,
+        override_strategy=RxStrategyType.RELAPSE_PREVENTION,
+    )
+    assert forced.strategy_type == RxStrategyType.RELAPSE_PREVENTION
+    assert base.strategy_type != forced.strategy_type or base.secondary_strategies != forced.secondary_strategies
+
+
+def test_lru_is_bounded():
+    engine = BehaviorRxEngine(memo_size=8)
+    for ctx in itertools.islice(_contexts(), 500):
+        engine.compute_rx(ctx, ExpertAgentType.METABOLIC_EXPERT)
+    assert engine.memo_stats()["size"] <= 8
+
+
+def test_caller_mutation_does_not_leak():
+    engine = BehaviorRxEngine()
+    ctx = RxContext(user_id=uuid.uuid4(), ttm_stage=3, capacity_score=0.5)
+    first = engine.compute_rx(ctx, ExpertAgentType.ADHERENCE_EXPERT)
+    if not first.micro_actions:
+        pytest.skip("strategy template has no micro actions")
+    first.micro_actions[0].difficulty = 0.99
+    first.micro_actions.clear()
+
+    second = engine.compute_rx(ctx, ExpertAgentType.ADHERENCE_EXPERT)
+    assert second.micro_actions
+    assert second.micro_actions[0].difficulty != 0.99
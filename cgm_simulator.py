@@ -1,66 +1,648 @@
-import requests
-import time
-import random
+#!/usr/bin/env python3
+"""
+设备遥测压测器 — 多用户 CGM / HR / HRV / 睡眠 / 血压 上传负载生成
+==================================================================
+
+用途: 量化设备数据接入链路 (小程序批量同步 + 设备 REST API) 的容量与回归。
+
+  - 数千虚拟用户, 设备组合可配置 (cgm / hr / hrv / sleep / bp)
+  - 仿真日内曲线: 血糖三餐峰 + 昼夜节律, 心率/HRV 日夜变化, 早晚血压
+  - 迟到上传 (补传历史窗口) 与重复上传 (同批次重发), 比例可配
+  - 目标端点:
+      mp    → POST /api/v1/mp/device/sync/batch   (glucose / heart_rate / hrv / sleep), 不发血压
+      rest  → POST /api/v1/health-data/glucose, /api/v1/health-data/vitals (bp), 不发 hr / hrv / sleep
+      both  → 批量类型走 mp, 血压走 rest
+    mp 与 rest 覆盖的数据流不同, 两者的数字不可直接对比; 报告列出本次未发送的数据流。
+  - 传输方式: --asgi 进程内 (httpx.ASGITransport 直接驱动 api.main:app) 或 --base-url 走 HTTP
+  - 报告: 吞吐 (req/s, readings/s), p50/p95/p99 延迟, 状态码分布, DB 新增行/秒
+
+同一 --seed 下, 虚拟用户、设备、读数、迟到/重复决策完全一致; 模拟时钟从 --start 起按
+--tick-minutes 推进, 与墙钟无关, 便于在不同版本间对比接入性能。
+
+用法:
+  # 进程内 (需要可连接的 DATABASE_URL), 自动创建 loadgen 用户与设备
+  python cgm_simulator.py --asgi --provision --users 2000 --ticks 12 --seed 42
+
+  # 针对运行中的服务, 设备组合 70% CGM + 100% 手表
+  python cgm_simulator.py --base-url http://127.0.0.1:8000 --provision \\
+      --users 500 --mix cgm=0.7,hr=1,hrv=1,sleep=1,bp=0.3 --concurrency 128
+
+  # 只打报告不写 DB 计数 (无数据库访问权限时)
+  python cgm_simulator.py --base-url http://staging:8000 --tokens tokens.json --no-db-count
+"""
+
+import argparse
+import asyncio
+import json
 import math
-from datetime import datetime
+import os
+import random
+import sys
+import time
+from collections import Counter, defaultdict
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Tuple
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+MP_BATCH_PATH = "/api/v1/mp/device/sync/batch"
+REST_GLUCOSE_PATH = "/api/v1/health-data/glucose"
+REST_VITALS_PATH = "/api/v1/health-data/vitals"
+
+DEVICE_KINDS = ("cgm", "hr", "hrv", "sleep", "bp")
+DEFAULT_MIX = {"cgm": 0.6, "hr": 0.8, "hrv": 0.5, "sleep": 0.7, "bp": 0.3}
+
+# 各设备类型落库表 (用于 DB 行数统计)
+KIND_TABLES = {
+    "cgm": "glucose_readings",
+    "hr": "heart_rate_readings",
+    "hrv": "hrv_readings",
+    "sleep": "sleep_records",
+    "bp": "vital_signs",
+}
+
+# 各目标实际发送的数据流: REST 没有 hr / hrv / sleep 的写入端点 (/health-data/sleep 只读),
+# 批量同步没有血压类型
+TARGET_STREAMS = {
+    "mp": ("cgm", "hr", "hrv", "sleep"),
+    "rest": ("cgm", "bp"),
+    "both": DEVICE_KINDS,
+}
+
+LOADGEN_USER_PREFIX = "loadgen_"
+
+
+# ══════════════════════════════════════════════
+# 配置
+# ══════════════════════════════════════════════
+
+@dataclass
+class LoadConfig:
+    users: int = 1000
+    ticks: int = 12                      # 每个虚拟用户上传轮数
+    tick_minutes: int = 15               # 每轮覆盖的模拟时长
+    seed: int = 42
+    start: datetime = datetime(2026, 3, 2, 6, 0, 0)
+    mix: Dict[str, float] = field(default_factory=lambda: dict(DEFAULT_MIX))
+    late_ratio: float = 0.05             # 本轮批次延后到之后某轮补传的概率
+    late_max_ticks: int = 4
+    duplicate_ratio: float = 0.03        # 已发送批次被再次发送的概率
+    target: str = "both"                 # mp / rest / both
+    concurrency: int = 256               # 全局在途请求上限
+    base_url: Optional[str] = None
+    asgi: bool = False
+    timeout: float = 30.0
+
+
+# ══════════════════════════════════════════════
+# 生理曲线 (纯函数, 只依赖传入的 rng)
+# ══════════════════════════════════════════════
+
+MEALS = ((7.5, 1.0), (12.0, 1.2), (18.5, 1.1))   # (小时, 相对强度)
+
+
+def glucose_at(minute_of_day: float, baseline: float, meal_gain: float, rng: random.Random) -> float:
+    """空腹基线 + 三餐后 ~45min 达峰的对数正态样波形 + 黎明现象 + 传感器噪声 (mmol/L)"""
+    hour = minute_of_day / 60.0
+    value = baseline
+    for meal_hour, weight in MEALS:
+        dt = hour - meal_hour
+        if 0 < dt < 4:
+            value += meal_gain * weight * (dt / 0.75) * math.exp(1 - dt / 0.75)
+    value += 0.6 * math.exp(-((hour - 5.5) ** 2) / 2.0)     # 黎明现象
+    value += rng.gauss(0, 0.25)
+    return round(min(max(value, 2.2), 30.0), 1)
+
+
+def heart_rate_at(minute_of_day: float, resting: float, rng: random.Random) -> int:
+    """夜间低谷 + 日间活动叠加"""
+    hour = minute_of_day / 60.0
+    circadian = -8 * math.cos((hour - 15) / 24 * 2 * math.pi)
+    active = 25 if rng.random() < (0.08 if 8 <= hour <= 21 else 0.01) else 0
+    return int(max(38, min(190, resting + circadian + active + rng.gauss(0, 3))))
+
+
+def hrv_at(minute_of_day: float, rmssd_base: float, rng: random.Random) -> Dict[str, float]:
+    """RMSSD 夜间升高, 日间下降; 压力分与 RMSSD 反相关"""
+    hour = minute_of_day / 60.0
+    rmssd = rmssd_base * (1 + 0.25 * math.cos((hour - 3) / 24 * 2 * math.pi)) + rng.gauss(0, 3)
+    rmssd = max(5.0, rmssd)
+    return {
+        "rmssd": round(rmssd, 1),
+        "sdnn": round(rmssd * 1.3 + rng.gauss(0, 2), 1),
+        "stress_score": int(max(0, min(100, 100 - rmssd * 1.2))),
+    }
+
+
+def blood_pressure_at(minute_of_day: float, sbp_base: float, rng: random.Random) -> Tuple[int, int, int]:
+    """晨峰 + 夜间下降"""
+    hour = minute_of_day / 60.0
+    surge = 8 * math.exp(-((hour - 8) ** 2) / 4.0) - 6 * math.exp(-((hour - 2) ** 2) / 6.0)
+    sbp = int(sbp_base + surge + rng.gauss(0, 4))
+    dbp = int(sbp * 0.62 + rng.gauss(0, 3))
+    pulse = int(72 + rng.gauss(0, 6))
+    return max(80, min(240, sbp)), max(40, min(150, dbp)), max(40, min(180, pulse))
+
+
+def sleep_record_for(night: datetime, rng: random.Random) -> Dict[str, Any]:
+    """以入睡当晚为 sleep_date 的整夜记录"""
+    start = night.replace(hour=22, minute=0) + timedelta(minutes=rng.randint(0, 120))
+    total = rng.randint(330, 510)
+    deep = int(total * rng.uniform(0.12, 0.22))
+    rem = int(total * rng.uniform(0.18, 0.25))
+    awake = rng.randint(5, 40)
+    light = max(total - deep - rem - awake, 0)
+    return {
+        "date": night.date().isoformat(),
+        "sleep_start": start.isoformat(),
+        "sleep_end": (start + timedelta(minutes=total)).isoformat(),
+        "total_duration_min": total,
+        "deep_min": deep, "light_min": light, "rem_min": rem, "awake_min": awake,
+        "awakenings": rng.randint(0, 5),
+        "efficiency": round((total - awake) / total * 100, 1),
+        "sleep_score": rng.randint(55, 95),
+    }
+
+
+def _meal_tag(minute_of_day: float) -> str:
+    hour = minute_of_day / 60.0
+    if hour < 7:
+        return "fasting"
+    if hour >= 21.5:
+        return "bedtime"
+    for meal_hour, _ in MEALS:
+        if meal_hour - 1 <= hour < meal_hour:
+            return "before_meal"
+        if meal_hour <= hour < meal_hour + 2:
+            return "after_meal"
+    return "before_meal"
+
+
+# ══════════════════════════════════════════════
+# 虚拟用户
+# ══════════════════════════════════════════════
+
+@dataclass
+class VirtualUser:
+    index: int
+    kinds: Tuple[str, ...]
+    rng: random.Random
+    user_id: Optional[int] = None
+    token: Optional[str] = None
+    cgm_device_id: Optional[str] = None
+    watch_device_id: Optional[str] = None
+    # 个体参数
+    glucose_baseline: float = 5.6
+    meal_gain: float = 3.0
+    resting_hr: float = 64.0
+    rmssd_base: float = 38.0
+    sbp_base: float = 124.0
+
+    @property
+    def username(self) -> str:
+        return f"{LOADGEN_USER_PREFIX}{self.index:06d}"
+
+
+def build_users(cfg: LoadConfig) -> List[VirtualUser]:
+    """按 seed 生成虚拟用户与设备组合; 每个用户拥有独立 rng, 与调度顺序无关"""
+    master = random.Random(cfg.seed)
+    users = []
+    for i in range(cfg.users):
+        urng = random.Random(master.getrandbits(64))
+        kinds = tuple(k for k in DEVICE_KINDS if urng.random() < cfg.mix.get(k, 0.0))
+        if not kinds:
+            kinds = ("cgm",)
+        diabetic = urng.random() < 0.35
+        users.append(VirtualUser(
+            index=i, kinds=kinds, rng=urng,
+            glucose_baseline=urng.uniform(6.5, 9.0) if diabetic else urng.uniform(4.6, 5.8),
+            meal_gain=urng.uniform(3.5, 7.0) if diabetic else urng.uniform(1.5, 3.2),
+            resting_hr=urng.uniform(52, 78),
+            rmssd_base=urng.uniform(18, 60),
+            sbp_base=urng.uniform(108, 150),
+        ))
+    return users
+
+
+# ══════════════════════════════════════════════
+# 批次生成: 一轮 = tick_minutes 模拟时长
+# ══════════════════════════════════════════════
+
+@dataclass
+class Upload:
+    """一次 HTTP 请求的描述 (path + body), readings 为其中的数据点数"""
+    path: str
+    body: Dict[str, Any]
+    kind: str
+    readings: int
+    tick: int
+    late: bool = False
+    duplicate: bool = False
+
+
+def _minute_of_day(ts: datetime) -> float:
+    return ts.hour * 60 + ts.minute + ts.second / 60.0
+
+
+def build_tick_uploads(user: VirtualUser, tick: int, cfg: LoadConfig) -> List[Upload]:
+    window_start = cfg.start + timedelta(minutes=tick * cfg.tick_minutes)
+    window_end = window_start + timedelta(minutes=cfg.tick_minutes)
+    rng = user.rng
+    batch_data: Dict[str, Any] = {}
+    rest: List[Upload] = []
+    use_mp = cfg.target in ("mp", "both")
+    use_rest = cfg.target in ("rest", "both")
+    kinds = [k for k in user.kinds if k in TARGET_STREAMS[cfg.target]]
 
-# 配置后端地址
-API_URL = "http://127.0.0.1:8002/intervene"
-USER_ID = 1001
-USER_NAME = "老张"
+    if "cgm" in kinds:
+        readings = []
+        ts = window_start
+        while ts < window_end:                       # CGM 5 分钟一个点
+            v = glucose_at(_minute_of_day(ts), user.glucose_baseline, user.meal_gain, rng)
+            readings.append({"timestamp": ts.isoformat(), "value": v})
+            ts += timedelta(minutes=5)
+        if use_mp:
+            batch_data["glucose"] = {"readings": readings}
+        elif use_rest:
+            for r in readings:
+                rest.append(Upload(REST_GLUCOSE_PATH, {
+                    "value": r["value"],
+                    "meal_tag": _meal_tag(_minute_of_day(datetime.fromisoformat(r["timestamp"]))),
+                    "recorded_at": r["timestamp"],
+                }, "cgm", 1, tick))
 
-def generate_glucose(tick):
+    if "hr" in kinds:
+        readings = []
+        ts = window_start
+        while ts < window_end:                       # 心率 1 分钟一个点
+            hr = heart_rate_at(_minute_of_day(ts), user.resting_hr, rng)
+            readings.append({"timestamp": ts.isoformat(), "hr": hr})
+            ts += timedelta(minutes=1)
+        batch_data["heart_rate"] = {"readings": readings}
+
+    if "hrv" in kinds:
+        mid = window_start + timedelta(minutes=cfg.tick_minutes // 2)
+        hrv = hrv_at(_minute_of_day(mid), user.rmssd_base, rng)
+        batch_data["hrv"] = {"readings": [dict(timestamp=mid.isoformat(), **hrv)]}
+
+    if "sleep" in kinds:
+        # 起床后 (06:00/07:00/08:00 按用户错开) 的首个窗口同步上一晚整夜记录
+        if window_start.hour == 6 + user.index % 3 and window_start.minute < cfg.tick_minutes:
+            batch_data["sleep"] = {"records": [sleep_record_for(window_start - timedelta(days=1), rng)]}
+
+    if "bp" in kinds:
+        # 早晚各测一次 (落在各自窗口内的用户自定时刻)
+        for hour in (7, 20):
+            m = (user.index * 7) % 60
+            shot = window_start.replace(hour=hour, minute=m, second=0)
+            if window_start <= shot < window_end:
+                sbp, dbp, pulse = blood_pressure_at(_minute_of_day(shot), user.sbp_base, rng)
+                rest.append(Upload(REST_VITALS_PATH, {
+                    "data_type": "blood_pressure",
+                    "systolic": sbp, "diastolic": dbp, "pulse": pulse,
+                    "recorded_at": shot.isoformat(),
+                }, "bp", 1, tick))
+
+    uploads = []
+    if batch_data:
+        # 血糖与手表数据来自不同设备, 分开同步
+        if "glucose" in batch_data and user.cgm_device_id:
+            uploads.append(_mp_upload(user.cgm_device_id, {"glucose": batch_data.pop("glucose")},
+                                      window_start, window_end, tick))
+        if batch_data:
+            device_id = user.watch_device_id or user.cgm_device_id
+            uploads.append(_mp_upload(device_id, batch_data, window_start, window_end, tick))
+    uploads.extend(rest)
+    return uploads
+
+
+def _mp_upload(device_id: Optional[str], data: Dict[str, Any], start: datetime, end: datetime, tick: int) -> Upload:
+    readings = sum(len(v.get("readings") or v.get("records") or []) for v in data.values())
+    kind = "cgm" if "glucose" in data else "+".join(sorted(data))
+    return Upload(MP_BATCH_PATH, {
+        "device_id": device_id or "",
+        "sync_type": "incremental",
+        "data_types": sorted(data),
+        "start_time": start.isoformat(),
+        "end_time": end.isoformat(),
+        "data": data,
+    }, kind, readings, tick)
+
+
+def plan_user_schedule(user: VirtualUser, cfg: LoadConfig) -> List[List[Upload]]:
     """
-    模拟血糖波动曲线
-    使用正弦函数模拟餐后波动 + 随机噪声
+    预先生成整个运行的发送计划: schedule[t] 为第 t 轮实际发出的请求。
+    迟到: 本轮批次顺延 1..late_max_ticks 轮 (可能超过最后一轮, 则在收尾轮补传)。
+    重复: 已发送批次在下一轮再次发出 (模拟 App 未收到 ACK 后重试)。
     """
-    base = 7.0  # 基准血糖
-    amplitude = 4.0  # 波动幅度
-    # 模拟一个周期性的起伏
-    variation = amplitude * math.sin(tick / 5.0)
-    noise = random.uniform(-0.5, 0.5)
-    return round(base + variation + noise, 1)
-
-def start_simulation():
-    print(f"🚀 CGM 模拟器已启动，正在向 {API_URL} 推送数据...")
-    tick = 0
-    
-    try:
-        while True:
-            # 1. 生成模拟血糖
-            current_val = generate_glucose(tick)
-            
-            # 2. 模拟行为标签（例如在特定波动下模拟“饮食超标”）
-            tags = []
-            if current_val > 10.5:
-                tags = ["diet_excess"]
-                print(f"⚠️ 检测到高血糖状态: {current_val}")
-
-            # 3. 构造请求体
-            payload = {
-                "user_id": USER_ID,
-                "user_name": USER_NAME,
-                "current_glucose": current_val,
-                "behavioral_tags": tags
-            }
-
-            # 4. 推送数据
+    rng = random.Random(user.rng.getrandbits(64))
+    schedule: List[List[Upload]] = [[] for _ in range(cfg.ticks)]
+    for tick in range(cfg.ticks):
+        for up in build_tick_uploads(user, tick, cfg):
+            send_at = tick
+            if rng.random() < cfg.late_ratio:
+                send_at = min(tick + rng.randint(1, cfg.late_max_ticks), cfg.ticks - 1)
+                up.late = send_at != tick
+            schedule[send_at].append(up)
+            if rng.random() < cfg.duplicate_ratio:
+                dup = Upload(up.path, up.body, up.kind, up.readings, up.tick, late=up.late, duplicate=True)
+                schedule[min(send_at + 1, cfg.ticks - 1)].append(dup)
+    return schedule
+
+
+# ══════════════════════════════════════════════
+# 准备: 用户 / 设备 / token
+# ══════════════════════════════════════════════
+
+def provision_users(users: List[VirtualUser]) -> None:
+    """在 DATABASE_URL 指向的库中幂等创建 loadgen 用户与绑定设备, 并签发 access token"""
+    from core.auth import create_access_token, hash_password
+    from core.database import db_transaction
+    from core.models import User, UserRole, UserDevice, DeviceType, DeviceStatus
+
+    pwd_hash = hash_password("loadgen-not-for-login")
+    with db_transaction() as db:
+        names = [u.username for u in users]
+        existing = {u.username: u for u in db.query(User).filter(User.username.in_(names)).all()}
+        for vu in users:
+            if vu.username not in existing:
+                row = User(username=vu.username, email=f"{vu.username}@loadgen.local",
+                           password_hash=pwd_hash, role=UserRole.GROWER, is_active=True)
+                db.add(row)
+                existing[vu.username] = row
+        db.flush()
+
+        ids = [existing[vu.username].id for vu in users]
+        devices = defaultdict(dict)
+        for d in db.query(UserDevice).filter(UserDevice.user_id.in_(ids)).all():
+            devices[d.user_id][d.device_type] = d.device_id
+        for vu in users:
+            vu.user_id = existing[vu.username].id
+            owned = devices[vu.user_id]
+            for dtype, attr in ((DeviceType.CGM, "cgm_device_id"), (DeviceType.SMARTWATCH, "watch_device_id")):
+                if dtype not in owned:
+                    device_id = f"LG-{dtype.value.upper()}-{vu.index:06d}"
+                    db.add(UserDevice(user_id=vu.user_id, device_id=device_id, device_type=dtype,
+                                      manufacturer="loadgen", status=DeviceStatus.CONNECTED))
+                    owned[dtype] = device_id
+                setattr(vu, attr, owned[dtype])
+
+    for vu in users:
+        vu.token = create_access_token({"user_id": vu.user_id, "username": vu.username, "role": "grower"},
+                                       expires_delta=timedelta(hours=6))
+
+
+def load_tokens(users: List[VirtualUser], path: str) -> None:
+    """从 JSON 文件加载已准备好的凭据: [{"user_id", "token", "cgm_device_id", "watch_device_id"}, ...]"""
+    with open(path, encoding="utf-8") as f:
+        creds = json.load(f)
+    if len(creds) < len(users):
+        raise SystemExit(f"tokens 文件只有 {len(creds)} 条, 少于 --users {len(users)}")
+    for vu, c in zip(users, creds):
+        vu.user_id = c.get("user_id")
+        vu.token = c["token"]
+        vu.cgm_device_id = c.get("cgm_device_id")
+        vu.watch_device_id = c.get("watch_device_id")
+
+
+def count_db_rows(user_ids: List[int]) -> Dict[str, int]:
+    from sqlalchemy import bindparam, text
+    from core.database import get_db_session
+
+    if not user_ids:
+        return {}
+    counts = {}
+    with get_db_session() as db:
+        for table in KIND_TABLES.values():
+            try:
+                stmt = text(f"SELECT COUNT(*) FROM {table} WHERE user_id IN :ids").bindparams(
+                    bindparam("ids", expanding=True))
+                counts[table] = db.execute(stmt, {"ids": user_ids}).scalar() or 0
+            except Exception:
+                db.rollback()
+    return counts
+
+
+# ══════════════════════════════════════════════
+# 执行与统计
+# ══════════════════════════════════════════════
+
+@dataclass
+class RunStats:
+    latencies_ms: Dict[str, List[float]] = field(default_factory=lambda: defaultdict(list))
+    statuses: Counter = field(default_factory=Counter)
+    readings_sent: int = 0
+    readings_accepted: int = 0
+    late_sent: int = 0
+    duplicate_sent: int = 0
+    errors: Counter = field(default_factory=Counter)
+
+    def record(self, up: Upload, status: int, elapsed_ms: float, body: Any) -> None:
+        self.latencies_ms[up.path].append(elapsed_ms)
+        self.statuses[status] += 1
+        self.readings_sent += up.readings
+        self.late_sent += up.late
+        self.duplicate_sent += up.duplicate
+        if 200 <= status < 300:
+            if isinstance(body, dict) and "records_new" in body:
+                self.readings_accepted += int(body.get("records_new") or 0)
+            else:
+                self.readings_accepted += up.readings
+
+
+def percentile(sorted_values: List[float], pct: float) -> float:
+    """nearest-rank 百分位"""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, math.ceil(pct / 100.0 * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+
+async def _send(client, up: Upload, user: VirtualUser, sem: asyncio.Semaphore, stats: RunStats) -> None:
+    headers = {"Authorization": f"Bearer {user.token}"} if user.token else {}
+    async with sem:
+        t0 = time.perf_counter()
+        try:
+            resp = await client.post(up.path, json=up.body, headers=headers)
+            status = resp.status_code
             try:
-                response = requests.post(API_URL, json=payload, timeout=5)
-                if response.status_code == 200:
-                    data = response.json()
-                    print(f"[{datetime.now().strftime('%H:%M:%S')}] 推送成功: {current_val} mmol/L | AI建议: {data['content'][:20]}...")
-                else:
-                    print(f"❌ 推送失败: {response.status_code}")
-            except Exception as e:
-                print(f"📡 连接后端失败，请确保 FastAPI 正在 8002 端口运行: {e}")
-
-            # 5. 每隔 5 秒推送一次（模拟加速的时间流）
-            tick += 1
-            time.sleep(5)
-            
-    except KeyboardInterrupt:
-        print("\n🛑 模拟器已停止")
+                body = resp.json()
+            except ValueError:
+                body = None
+        except Exception as e:
+            status, body = 0, None
+            stats.errors[type(e).__name__] += 1
+        stats.record(up, status, (time.perf_counter() - t0) * 1000, body)
+
+
+async def _run_user_tick(client, user: VirtualUser, uploads: List[Upload], sem, stats: RunStats) -> None:
+    # 同一设备 App 内顺序上传, 用户之间并发
+    for up in uploads:
+        await _send(client, up, user, sem, stats)
+
+
+def _make_client(cfg: LoadConfig):
+    import httpx
+
+    limits = httpx.Limits(max_connections=cfg.concurrency, max_keepalive_connections=cfg.concurrency)
+    if cfg.asgi:
+        from api.main import app
+        transport = httpx.ASGITransport(app=app)
+        return httpx.AsyncClient(transport=transport, base_url="http://loadgen", timeout=cfg.timeout)
+    return httpx.AsyncClient(base_url=cfg.base_url, timeout=cfg.timeout, limits=limits)
+
+
+async def run_load(cfg: LoadConfig, users: List[VirtualUser]) -> Tuple[RunStats, float]:
+    """按轮推进: 第 t 轮所有用户并发发送完毕后才进入第 t+1 轮, 使各轮负载形状可复现"""
+    schedules = [plan_user_schedule(u, cfg) for u in users]
+    stats = RunStats()
+    sem = asyncio.Semaphore(cfg.concurrency)
+
+    async with _make_client(cfg) as client:
+        t0 = time.perf_counter()
+        for tick in range(cfg.ticks):
+            await asyncio.gather(*(
+                _run_user_tick(client, u, sched[tick], sem, stats)
+                for u, sched in zip(users, schedules) if sched[tick]
+            ))
+        elapsed = time.perf_counter() - t0
+    return stats, elapsed
+
+
+def build_report(cfg: LoadConfig, users: List[VirtualUser], stats: RunStats, elapsed: float,
+                 rows_before: Dict[str, int], rows_after: Dict[str, int]) -> Dict[str, Any]:
+    total_requests = sum(stats.statuses.values())
+    endpoints = {}
+    for path, values in stats.latencies_ms.items():
+        s = sorted(values)
+        endpoints[path] = {
+            "requests": len(s),
+            "p50_ms": round(percentile(s, 50), 2),
+            "p95_ms": round(percentile(s, 95), 2),
+            "p99_ms": round(percentile(s, 99), 2),
+            "max_ms": round(s[-1], 2) if s else 0.0,
+        }
+    all_lat = sorted(v for vs in stats.latencies_ms.values() for v in vs)
+    db_rows = {t: rows_after.get(t, 0) - rows_before.get(t, 0) for t in rows_after}
+    total_rows = sum(db_rows.values())
+    kinds = Counter(k for u in users for k in u.kinds)
+    return {
+        "config": {
+            "seed": cfg.seed, "users": cfg.users, "ticks": cfg.ticks, "tick_minutes": cfg.tick_minutes,
+            "target": cfg.target, "transport": "asgi" if cfg.asgi else cfg.base_url,
+            "concurrency": cfg.concurrency, "late_ratio": cfg.late_ratio,
+            "duplicate_ratio": cfg.duplicate_ratio, "device_mix": dict(kinds),
+            "streams_skipped": {k: n for k, n in kinds.items() if k not in TARGET_STREAMS[cfg.target]},
+        },
+        "elapsed_s": round(elapsed, 3),
+        "requests": total_requests,
+        "throughput_rps": round(total_requests / elapsed, 1) if elapsed else 0.0,
+        "readings_sent": stats.readings_sent,
+        "readings_accepted": stats.readings_accepted,
+        "readings_per_s": round(stats.readings_sent / elapsed, 1) if elapsed else 0.0,
+        "late_uploads": stats.late_sent,
+        "duplicate_uploads": stats.duplicate_sent,
+        "latency_ms": {
+            "p50": round(percentile(all_lat, 50), 2),
+            "p95": round(percentile(all_lat, 95), 2),
+            "p99": round(percentile(all_lat, 99), 2),
+        },
+        "endpoints": endpoints,
+        "status_codes": {str(k): v for k, v in sorted(stats.statuses.items())},
+        "transport_errors": dict(stats.errors),
+        "db_rows_new": db_rows,
+        "db_rows_per_s": round(total_rows / elapsed, 1) if elapsed and rows_after else None,
+    }
+
+
+def print_report(report: Dict[str, Any]) -> None:
+    c = report["config"]
+    print("=" * 64)
+    print(f"  设备遥测压测  seed={c['seed']} users={c['users']} ticks={c['ticks']}x{c['tick_minutes']}min "
+          f"target={c['target']}")
+    print(f"  transport={c['transport']} concurrency={c['concurrency']} mix={c['device_mix']}")
+    if c["streams_skipped"]:
+        print(f"  未发送流    {c['streams_skipped']}  "
+              f"(target={c['target']} 无对应写入端点, 与其他 target 不可直接对比)")
+    print("=" * 64)
+    print(f"  请求数      {report['requests']}  ({report['throughput_rps']} req/s, {report['elapsed_s']}s)")
+    print(f"  读数        sent={report['readings_sent']} accepted={report['readings_accepted']} "
+          f"({report['readings_per_s']} readings/s)")
+    print(f"  迟到/重复   {report['late_uploads']} / {report['duplicate_uploads']}")
+    lat = report["latency_ms"]
+    print(f"  延迟 (ms)   p50={lat['p50']} p95={lat['p95']} p99={lat['p99']}")
+    for path, e in sorted(report["endpoints"].items()):
+        print(f"    {path:<40} n={e['requests']:<7} p50={e['p50_ms']:<8} p95={e['p95_ms']:<8} p99={e['p99_ms']}")
+    print(f"  状态码      {report['status_codes']}")
+    if report["transport_errors"]:
+        print(f"  传输错误    {report['transport_errors']}")
+    if report["db_rows_per_s"] is not None:
+        print(f"  DB 新增行   {report['db_rows_new']}  ({report['db_rows_per_s']} rows/s)")
+    print("=" * 64)
+
+
+def _parse_mix(raw: str) -> Dict[str, float]:
+    mix = {k: 0.0 for k in DEVICE_KINDS}
+    for part in raw.split(","):
+        key, _, val = part.partition("=")
+        key = key.strip()
+        if key not in mix:
+            raise argparse.ArgumentTypeError(f"未知设备类型: {key} (可选 {', '.join(DEVICE_KINDS)})")
+        mix[key] = float(val or 1.0)
+    return mix
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    p = argparse.ArgumentParser(description="多用户设备遥测压测器")
+    p.add_argument("--users", type=int, default=1000)
+    p.add_argument("--ticks", type=int, default=12)
+    p.add_argument("--tick-minutes", type=int, default=15)
+    p.add_argument("--seed", type=int, default=42)
+    p.add_argument("--start", type=datetime.fromisoformat, default=LoadConfig.start,
+                   help="模拟时钟起点 (ISO 格式)")
+    p.add_argument("--mix", type=_parse_mix, default=dict(DEFAULT_MIX),
+                   help="设备组合, 如 cgm=0.7,hr=1,hrv=0.5,sleep=1,bp=0.3")
+    p.add_argument("--late-ratio", type=float, default=0.05)
+    p.add_argument("--duplicate-ratio", type=float, default=0.03)
+    p.add_argument("--target", choices=("mp", "rest", "both"), default="both")
+    p.add_argument("--concurrency", type=int, default=256)
+    p.add_argument("--timeout", type=float, default=30.0)
+    g = p.add_mutually_exclusive_group(required=True)
+    g.add_argument("--asgi", action="store_true", help="进程内驱动 api.main:app")
+    g.add_argument("--base-url", help="HTTP 目标, 如 http://127.0.0.1:8000")
+    creds = p.add_mutually_exclusive_group(required=True)
+    creds.add_argument("--provision", action="store_true", help="在 DB 中创建/复用 loadgen 用户与设备并签发 token")
+    creds.add_argument("--tokens", help="预先准备的凭据 JSON 文件")
+    p.add_argument("--no-db-count", action="store_true", help="不统计 DB 新增行数")
+    p.add_argument("--json", help="将报告写入 JSON 文件")
+    args = p.parse_args(argv)
+
+    cfg = LoadConfig(
+        users=args.users, ticks=args.ticks, tick_minutes=args.tick_minutes, seed=args.seed,
+        start=args.start, mix=args.mix, late_ratio=args.late_ratio, duplicate_ratio=args.duplicate_ratio,
+        target=args.target, concurrency=args.concurrency, base_url=args.base_url, asgi=args.asgi,
+        timeout=args.timeout,
+    )
+    users = build_users(cfg)
+    if args.provision:
+        provision_users(users)
+    else:
+        load_tokens(users, args.tokens)
+
+    user_ids = [u.user_id for u in users if u.user_id is not None]
+    count_rows = not args.no_db_count and bool(user_ids)
+    rows_before = count_db_rows(user_ids) if count_rows else {}
+    stats, elapsed = asyncio.run(run_load(cfg, users))
+    rows_after = count_db_rows(user_ids) if count_rows else {}
+
+    report = build_report(cfg, users, stats, elapsed, rows_before, rows_after)
+    print_report(report)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+    return 0 if report["requests"] and not report["transport_errors"] else 1
+
 
 if __name__ == "__main__":
-    start_simulation()
\ No newline at end of file
+    sys.exit(main())
@@ -0,0 +1,445 @@
+"""
+增量分析事实表 — 按日 / 租户 / 角色物化的运营指标
+Incremental analytics facts (per day × tenant × role)
+
+原每日聚合任务对活动 / 用户表逐指标跑十余条 COUNT(*), 管理端报表再实时重算;
+成本随历史总量增长。现在:
+
+- analytics_daily_facts: (day, tenant_id, role) 一行, 各来源表的计数列
+- analytics_watermarks: 每个来源表一条水位 (已物化到的 created_at 上界)
+- 每次刷新只扫描 [水位所在日 00:00, until) 的增量, 每个来源表一条 GROUP BY 查询;
+  去重用户数不可累加, 故受影响的日分区整体重算 (先清零该来源的列再 upsert),
+  重跑幂等, 任务停摆几天后自动补齐
+- 报表只读事实表 (daily_series); analytics_daily 作为兼容汇总由事实表回写
+- verify_days 用原任务的逐指标实时查询核对抽样日期
+
+租户取 tenant_clients 中的归属 (多租户取最小 tenant_id, 无归属为 ''),
+角色取物化时用户的当前角色; 平台合计与旧口径一致。
+accounts_active 是刷新时的账号快照 (转化率口径与旧任务相同, 不参与逐日核对)。
+"""
+
+import time
+from dataclasses import dataclass, field
+from datetime import date, datetime, timedelta
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from loguru import logger
+from sqlalchemy import text as sa_text
+
+FACT_TABLE = "analytics_daily_facts"
+PLATFORM_TENANT = ""
+
+# 用户维度: 租户归属 + 当前角色
+_USER_DIM = """
+    user_dim AS (
+        SELECT u.id AS user_id,
+               COALESCE(tc.tenant_id, '') AS tenant_id,
+               u.role::text AS role
+        FROM users u
+        LEFT JOIN (
+            SELECT user_id, MIN(tenant_id) AS tenant_id FROM tenant_clients GROUP BY user_id
+        ) tc ON tc.user_id = u.id
+    )
+"""
+
+
+@dataclass(frozen=True)
+class FactSource:
+    """一个来源表: 一条分组查询 + 它负责的事实列"""
+    name: str
+    columns: Tuple[str, ...]
+    sql: str
+    snapshot: Tuple[str, ...] = ()   # 无 day 的快照列, 写入本次刷新的每一天
+
+
+SOURCES: Tuple[FactSource, ...] = (
+    FactSource(
+        "user_activity_logs",
+        ("active_users", "retained_7d", "total_events", "chat_events",
+         "ai_response_ms_sum", "ai_response_count"),
+        "WITH " + _USER_DIM + """,
+        per_user_day AS (
+            SELECT l.user_id, CAST(l.created_at AS DATE) AS day,
+                   COUNT(*) AS events,
+                   COUNT(*) FILTER (WHERE l.activity_type IN ('chat', 'chat_message')) AS chat_events,
+                   SUM(CAST(l.detail->>'response_ms' AS FLOAT)) AS ai_ms_sum,
+                   COUNT(l.detail->>'response_ms') AS ai_ms_count
+            FROM user_activity_logs l
+            WHERE l.created_at >= :lookback AND l.created_at < :end
+            GROUP BY l.user_id, CAST(l.created_at AS DATE)
+        )
+        SELECT cur.day, d.tenant_id, d.role,
+               COUNT(*) AS active_users,
+               COUNT(prev.user_id) AS retained_7d,
+               SUM(cur.events) AS total_events,
+               SUM(cur.chat_events) AS chat_events,
+               COALESCE(SUM(cur.ai_ms_sum), 0) AS ai_response_ms_sum,
+               SUM(cur.ai_ms_count) AS ai_response_count
+        FROM per_user_day cur
+        JOIN user_dim d ON d.user_id = cur.user_id
+        LEFT JOIN per_user_day prev ON prev.user_id = cur.user_id AND prev.day = cur.day - 7
+        WHERE cur.day >= :start_day
+        GROUP BY cur.day, d.tenant_id, d.role
+        """,
+    ),
+    FactSource(
+        "users",
+        ("new_users",),
+        """
+        SELECT CASE WHEN u.created_at >= :start AND u.created_at < :end
+                    THEN CAST(u.created_at AS DATE) END AS day,
+               COALESCE(tc.tenant_id, '') AS tenant_id, u.role::text AS role,
+               COUNT(*) AS new_users,
+               COUNT(*) FILTER (WHERE u.is_active) AS accounts_active
+        FROM users u
+        LEFT JOIN (
+            SELECT user_id, MIN(tenant_id) AS tenant_id FROM tenant_clients GROUP BY user_id
+        ) tc ON tc.user_id = u.id
+        GROUP BY 1, 2, 3
+        """,
+        snapshot=("accounts_active",),
+    ),
+    FactSource(
+        "chat_messages",
+        ("chat_messages",),
+        "WITH " + _USER_DIM + """
+        SELECT CAST(m.created_at AS DATE) AS day, d.tenant_id, d.role, COUNT(*) AS chat_messages
+        FROM chat_messages m
+        JOIN chat_sessions s ON s.id = m.session_id
+        JOIN user_dim d ON d.user_id = s.user_id
+        WHERE m.created_at >= :start AND m.created_at < :end
+        GROUP BY 1, 2, 3
+        """,
+    ),
+    FactSource(
+        # 完成是更新而非插入, 水位按 completed_at 推进
+        "micro_action_tasks",
+        ("tasks_completed",),
+        "WITH " + _USER_DIM + """
+        SELECT CAST(t.completed_at AS DATE) AS day, d.tenant_id, d.role, COUNT(*) AS tasks_completed
+        FROM micro_action_tasks t
+        JOIN user_dim d ON d.user_id = t.user_id
+        WHERE t.status = 'completed' AND t.completed_at >= :start AND t.completed_at < :end
+        GROUP BY 1, 2, 3
+        """,
+    ),
+    FactSource(
+        "assessments",
+        ("assessments", "high_risk_assessments"),
+        "WITH " + _USER_DIM + """
+        SELECT CAST(a.created_at AS DATE) AS day, d.tenant_id, d.role,
+               COUNT(*) AS assessments,
+               COUNT(*) FILTER (WHERE a.risk_level::text IN ('R3', 'R4')) AS high_risk_assessments
+        FROM assessments a
+        JOIN user_dim d ON d.user_id = a.user_id
+        WHERE a.created_at >= :start AND a.created_at < :end
+        GROUP BY 1, 2, 3
+        """,
+    ),
+)
+
+SOURCE_NAMES = tuple(s.name for s in SOURCES)
+
+
+@dataclass
+class RefreshReport:
+    """一次刷新的结果: 每个来源表的扫描区间与写入的事实行数"""
+    until: datetime
+    sources: Dict[str, Dict[str, Any]] = field(default_factory=dict)
+    days: List[date] = field(default_factory=list)
+    duration_ms: float = 0.0
+
+    def summary(self) -> Dict[str, Any]:
+        return {
+            "until": self.until.isoformat(),
+            "days": [d.isoformat() for d in self.days],
+            **{name: info["rows"] for name, info in self.sources.items()},
+            "duration_ms": round(self.duration_ms, 1),
+        }
+
+
+# ============================================
+# 刷新
+# ============================================
+
+async def refresh_facts(
+    db,
+    until: Optional[datetime] = None,
+    since: Optional[datetime] = None,
+    sources: Optional[Iterable[str]] = None,
+) -> RefreshReport:
+    """
+    从各来源表水位刷新到 until (默认今天 00:00, 即物化到昨天为止)
+
+    since 指定时忽略水位 (回填); 区间起点向下取整到日, 受影响日分区整体重算。
+    """
+    until = until or _midnight(date.today())
+    report = RefreshReport(until)
+    started = time.perf_counter()
+    watermarks = await _load_watermarks(db)
+    touched = set()
+
+    for source in SOURCES:
+        if sources is not None and source.name not in sources:
+            continue
+        mark = since or watermarks.get(source.name) or until - timedelta(days=1)
+        start = _midnight(mark.date() if isinstance(mark, datetime) else mark)
+        if start >= until:
+            report.sources[source.name] = {"start": start, "rows": 0}
+            continue
+
+        days = _days(start, until)
+        result = await db.execute(sa_text(source.sql), {
+            "start": start, "end": until, "start_day": start.date(),
+            "lookback": start - timedelta(days=7),
+        })
+        rows = _expand(source, [dict(r) for r in result.mappings().all()], days)
+
+        await db.execute(sa_text(_clear_sql(source)), {"s": days[0], "e": days[-1]})
+        if rows:
+            await db.execute(sa_text(_upsert_sql(source)), rows)
+        await db.execute(sa_text(_WATERMARK_UPSERT), {"src": source.name, "wm": until})
+        report.sources[source.name] = {"start": start, "rows": len(rows)}
+        touched.update(days)
+
+    report.days = sorted(touched)
+    if report.days:
+        await _write_legacy_daily(db, report.days[0], report.days[-1])
+    await db.commit()
+    report.duration_ms = (time.perf_counter() - started) * 1000
+    logger.debug(f"[AnalyticsFacts] refresh {report.summary()}")
+    return report
+
+
+def _expand(source: FactSource, rows: List[Dict], days: List[date]) -> List[Dict]:
+    """查询结果 → 事实行; 快照列 (day 为空的分组) 写入区间内每一天"""
+    facts: Dict[Tuple, Dict] = {}
+    snapshot: Dict[Tuple[str, str], Dict[str, int]] = {}
+
+    def fact(day, tenant, role):
+        key = (day, tenant, role)
+        if key not in facts:
+            facts[key] = {"day": day, "tenant_id": tenant, "role": role,
+                          **{c: 0 for c in source.columns + source.snapshot}}
+        return facts[key]
+
+    for row in rows:
+        tenant, role = row["tenant_id"] or PLATFORM_TENANT, row["role"]
+        if source.snapshot:
+            acc = snapshot.setdefault((tenant, role), {c: 0 for c in source.snapshot})
+            for c in source.snapshot:
+                acc[c] += row[c] or 0
+        if row["day"] is None:
+            continue
+        target = fact(row["day"], tenant, role)
+        for c in source.columns:
+            target[c] += row[c] or 0
+
+    for (tenant, role), values in snapshot.items():
+        for day in days:
+            fact(day, tenant, role).update(values)
+    return list(facts.values())
+
+
+def _clear_sql(source: FactSource) -> str:
+    assignments = ", ".join(f"{c} = 0" for c in source.columns + source.snapshot)
+    return f"UPDATE {FACT_TABLE} SET {assignments} WHERE day BETWEEN :s AND :e"
+
+
+def _upsert_sql(source: FactSource) -> str:
+    columns = source.columns + source.snapshot
+    updates = ", ".join(f"{c} = EXCLUDED.{c}" for c in columns)
+    return (
+        f"INSERT INTO {FACT_TABLE} (day, tenant_id, role, {', '.join(columns)}, updated_at)\n"
+        f"VALUES (:day, :tenant_id, :role, {', '.join(':' + c for c in columns)}, NOW())\n"
+        f"ON CONFLICT (day, tenant_id, role) DO UPDATE SET {updates}, updated_at = NOW()"
+    )
+
+
+_WATERMARK_UPSERT = """
+    INSERT INTO analytics_watermarks (source, watermark, updated_at)
+    VALUES (:src, :wm, NOW())
+    ON CONFLICT (source) DO UPDATE SET
+        watermark = GREATEST(analytics_watermarks.watermark, EXCLUDED.watermark),
+        updated_at = NOW()
+"""
+
+
+async def _load_watermarks(db) -> Dict[str, datetime]:
+    result = await db.execute(sa_text("SELECT source, watermark FROM analytics_watermarks"))
+    return {row["source"]: row["watermark"] for row in result.mappings().all()}
+
+
+def _midnight(d: date) -> datetime:
+    return datetime(d.year, d.month, d.day)
+
+
+def _days(start: datetime, end: datetime) -> List[date]:
+    """[start, end) 覆盖的日期 (end 非整点时含当天)"""
+    first, last = start.date(), (end - timedelta(microseconds=1)).date()
+    return [first + timedelta(days=i) for i in range((last - first).days + 1)]
+
+
+# ============================================
+# 读取 (报表只读事实表)
+# ============================================
+
+_SERIES_SQL = f"""
+    SELECT day, role,
+           SUM(active_users) AS active_users, SUM(retained_7d) AS retained_7d,
+           SUM(new_users) AS new_users, SUM(accounts_active) AS accounts_active,
+           SUM(total_events) AS total_events, SUM(chat_events) AS chat_events,
+           SUM(ai_response_ms_sum) AS ai_response_ms_sum, SUM(ai_response_count) AS ai_response_count,
+           SUM(chat_messages) AS chat_messages, SUM(tasks_completed) AS tasks_completed,
+           SUM(assessments) AS assessments, SUM(high_risk_assessments) AS high_risk_assessments
+    FROM {FACT_TABLE}
+    WHERE day BETWEEN :s AND :e {{tenant_filter}}
+    GROUP BY day, role
+"""
+
+
+async def daily_series(db, start: date, end: date, tenant_id: Optional[str] = None) -> List[Dict[str, Any]]:
+    """[start, end] 每日指标 (与 analytics_daily 同名字段 + 明细计数); 只读事实表"""
+    params = {"s": start - timedelta(days=7), "e": end}
+    tenant_filter = ""
+    if tenant_id is not None:
+        tenant_filter = "AND tenant_id = :t"
+        params["t"] = tenant_id
+    result = await db.execute(sa_text(_SERIES_SQL.format(tenant_filter=tenant_filter)), params)
+    return [row for row in rollup(result.mappings().all()) if start <= row["_day"] <= end]
+
+
+def rollup(rows: Iterable[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """(day, role) 分组和 → 每日指标; 留存分母取 7 天前的活跃用户数"""
+    by_day: Dict[date, Dict[str, float]] = {}
+    for row in rows:
+        day = row["day"]
+        acc = by_day.setdefault(day, {"growers": 0, "converted": 0})
+        for key, value in row.items():
+            if key not in ("day", "role"):
+                acc[key] = acc.get(key, 0) + (value or 0)
+        if row["role"] != "OBSERVER":
+            acc["growers"] += row.get("active_users") or 0
+            acc["converted"] += row.get("accounts_active") or 0
+
+    series = []
+    for day in sorted(by_day):
+        acc = by_day[day]
+        dau = int(acc.get("active_users", 0))
+        prior = by_day.get(day - timedelta(days=7), {}).get("active_users", 0)
+        accounts = acc.get("accounts_active", 0)
+        series.append({
+            "_day": day,
+            "date": day.isoformat(),
+            "dau": dau,
+            "new_users": int(acc.get("new_users", 0)),
+            "active_growers": int(acc["growers"]),
+            "conversion_rate": round(acc["converted"] / accounts, 4) if accounts else 0.0,
+            "retention_7d": round(acc.get("retained_7d", 0) / prior, 4) if prior else 0.0,
+            "avg_tasks_completed": round(acc.get("tasks_completed", 0) / dau, 2) if dau else 0.0,
+            "avg_session_minutes": 0.0,
+            "ai_response_avg_ms": round(acc.get("ai_response_ms_sum", 0) / acc["ai_response_count"], 1)
+            if acc.get("ai_response_count") else 0.0,
+            "total_events": int(acc.get("total_events", 0)),
+            "total_chat_messages": int(acc.get("chat_events", 0)),
+            "chat_messages": int(acc.get("chat_messages", 0)),
+            "tasks_completed": int(acc.get("tasks_completed", 0)),
+            "assessments": int(acc.get("assessments", 0)),
+            "high_risk_assessments": int(acc.get("high_risk_assessments", 0)),
+        })
+    return series
+
+
+def public_row(row: Dict[str, Any]) -> Dict[str, Any]:
+    return {k: v for k, v in row.items() if not k.startswith("_")}
+
+
+_LEGACY_UPSERT = """
+    INSERT INTO analytics_daily
+        (date, dau, new_users, active_growers, conversion_rate,
+         retention_7d, avg_tasks_completed, avg_session_minutes,
+         ai_response_avg_ms, total_events, total_chat_messages)
+    VALUES (:_day, :dau, :new_users, :active_growers, :conversion_rate, :retention_7d,
+            :avg_tasks_completed, :avg_session_minutes, :ai_response_avg_ms,
+            :total_events, :total_chat_messages)
+    ON CONFLICT (date) DO UPDATE SET
+        dau = EXCLUDED.dau, new_users = EXCLUDED.new_users,
+        active_growers = EXCLUDED.active_growers,
+        conversion_rate = EXCLUDED.conversion_rate,
+        retention_7d = EXCLUDED.retention_7d,
+        avg_tasks_completed = EXCLUDED.avg_tasks_completed,
+        ai_response_avg_ms = EXCLUDED.ai_response_avg_ms,
+        total_events = EXCLUDED.total_events,
+        total_chat_messages = EXCLUDED.total_chat_messages
+"""
+
+_LEGACY_KEYS = ("_day", "dau", "new_users", "active_growers", "conversion_rate", "retention_7d",
+                "avg_tasks_completed", "avg_session_minutes", "ai_response_avg_ms",
+                "total_events", "total_chat_messages")
+
+
+async def _write_legacy_daily(db, start: date, end: date):
+    """analytics_daily 兼容汇总 (平台合计), 由事实表回写"""
+    series = await daily_series(db, start, end)
+    if series:
+        await db.execute(sa_text(_LEGACY_UPSERT), [{k: row[k] for k in _LEGACY_KEYS} for row in series])
+
+
+# ============================================
+# 核对 (抽样日期: 事实表 vs 实时查询)
+# ============================================
+
+# 原每日聚合任务的逐指标查询, 作为独立的参照实现
+LIVE_QUERIES: Dict[str, str] = {
+    "dau": "SELECT COUNT(DISTINCT user_id) FROM user_activity_logs WHERE created_at::date = :d",
+    "new_users": "SELECT COUNT(*) FROM users WHERE created_at::date = :d",
+    "active_growers": """
+        SELECT COUNT(DISTINCT u.id) FROM users u
+        JOIN user_activity_logs ual ON ual.user_id = u.id
+        WHERE ual.created_at::date = :d AND u.role::text != 'OBSERVER'
+    """,
+    "retention_7d": """
+        SELECT COALESCE(ROUND(CAST(COUNT(DISTINCT ual1.user_id) AS NUMERIC)
+                              / NULLIF((SELECT COUNT(DISTINCT user_id) FROM user_activity_logs
+                                        WHERE created_at::date = :d0), 0), 4), 0)
+        FROM user_activity_logs ual1
+        WHERE ual1.created_at::date = :d
+          AND ual1.user_id IN (SELECT DISTINCT user_id FROM user_activity_logs WHERE created_at::date = :d0)
+    """,
+    "total_events": "SELECT COUNT(*) FROM user_activity_logs WHERE created_at::date = :d",
+    "total_chat_messages": """
+        SELECT COUNT(*) FROM user_activity_logs
+        WHERE created_at::date = :d AND activity_type IN ('chat', 'chat_message')
+    """,
+    "ai_response_avg_ms": """
+        SELECT COALESCE(ROUND(CAST(AVG(CAST(detail->>'response_ms' AS FLOAT)) AS NUMERIC), 1), 0)
+        FROM user_activity_logs
+        WHERE created_at::date = :d AND detail->>'response_ms' IS NOT NULL
+    """,
+    "chat_messages": "SELECT COUNT(*) FROM chat_messages WHERE created_at::date = :d",
+    "tasks_completed": """
+        SELECT COUNT(*) FROM micro_action_tasks WHERE status = 'completed' AND completed_at::date = :d
+    """,
+    "assessments": "SELECT COUNT(*) FROM assessments WHERE created_at::date = :d",
+    "high_risk_assessments": """
+        SELECT COUNT(*) FROM assessments
+        WHERE created_at::date = :d AND risk_level::text IN ('R3', 'R4')
+    """,
+}
+
+_TOLERANCE = {"retention_7d": 1e-4, "ai_response_avg_ms": 0.11}
+
+
+async def verify_days(db, days: Iterable[date]) -> List[Dict[str, Any]]:
+    """逐个抽样日期比对物化值与实时查询, 返回不一致项 (空列表即一致)"""
+    mismatches = []
+    for day in sorted(set(days)):
+        materialized = await daily_series(db, day, day)
+        values = materialized[0] if materialized else {}
+        for metric, sql in LIVE_QUERIES.items():
+            live = (await db.execute(sa_text(sql), {"d": day, "d0": day - timedelta(days=7)})).scalar() or 0
+            got = values.get(metric, 0)
+            if abs(float(got) - float(live)) > _TOLERANCE.get(metric, 0):
+                mismatches.append({"date": day.isoformat(), "metric": metric,
+                                   "materialized": got, "live": float(live)})
+    return mismatches
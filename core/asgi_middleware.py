@@ -0,0 +1,446 @@
+"""
+纯 ASGI 中间件栈
+Pure-ASGI middleware stack
+
+把 SecurityHeaders / RequestLogging / RateLimit / CSRFAudit / LegacyAuth / HTTPSRedirect
+(以及未启用的 GlobalRateLimit) 合并为一个 ASGI 中间件, 行为与原 BaseHTTPMiddleware 实现一致:
+
+  - 每个关注点是一个 Layer: on_request() 可放行 / 旁路 / 直接返回响应,
+    on_response() 在 http.response.start 时改写响应头, on_error() 处理下游异常
+  - 层序与原先 add_middleware 的嵌套顺序相同 (layers[0] 最外层);
+    某层直接返回响应时, 只有它外侧的层处理该响应 (与原嵌套语义一致)
+  - 不再为每层创建任务 / 包装响应流, 流式响应 (SSE / 大文件) 原样透传
+  - MIDDLEWARE_LAYER_TIMING=true 时按层统计耗时, 导出 Prometheus 直方图
+    bhp_middleware_layer_seconds{layer=...}
+
+设置 ASGI_MIDDLEWARE=false 可回退到原 BaseHTTPMiddleware 实现 (见 core/middleware.py)。
+"""
+
+import inspect
+import json
+import math
+import os
+import re
+import time
+import uuid
+from typing import Any, Dict, List, Optional, Sequence
+
+from loguru import logger
+from starlette.datastructures import URL, Headers, MutableHeaders
+from starlette.responses import JSONResponse, RedirectResponse, Response
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+ASGI_MIDDLEWARE_ENABLED = os.getenv("ASGI_MIDDLEWARE", "true").lower() == "true"
+LAYER_TIMING_ENABLED = os.getenv("MIDDLEWARE_LAYER_TIMING", "false").lower() == "true"
+
+# on_request() 返回 BYPASS: 本请求跳过该层 (不执行其 on_response)
+BYPASS = object()
+
+
+class RequestContext:
+    """单个请求在各层之间共享的数据"""
+
+    __slots__ = ("scope", "path", "values", "_headers")
+
+    def __init__(self, scope: Scope):
+        self.scope = scope
+        self.path: str = scope["path"]
+        self.values: Dict[Any, Any] = {}
+        self._headers: Optional[Headers] = None
+
+    @property
+    def headers(self) -> Headers:
+        if self._headers is None:
+            self._headers = Headers(scope=self.scope)
+        return self._headers
+
+    @property
+    def state(self) -> Dict[str, Any]:
+        """与 request.state 共用 scope["state"]"""
+        return self.scope.setdefault("state", {})
+
+
+class Layer:
+    """中间件层基类; 子类只需覆盖用到的钩子"""
+
+    name = "layer"
+
+    def on_request(self, ctx: RequestContext):
+        """返回 None 继续, BYPASS 跳过本层, Response 直接响应 (可定义为 async, 如限流)"""
+        return None
+
+    def on_response(self, ctx: RequestContext, status: int, headers: MutableHeaders) -> None:
+        pass
+
+    def on_error(self, ctx: RequestContext, exc: BaseException) -> None:
+        pass
+
+
+def _overrides(layer: Layer, hook: str) -> bool:
+    return getattr(type(layer), hook) is not getattr(Layer, hook)
+
+
+# ============================================
+# 层实现
+# ============================================
+
+class HTTPSRedirectLayer(Layer):
+    """生产环境强制 HTTPS (FIX-16)"""
+
+    name = "https_redirect"
+    HSTS = "max-age=31536000; includeSubDomains; preload"
+
+    def __init__(self, environment: Optional[str] = None):
+        env = environment or os.getenv("ENVIRONMENT", "production")
+        self.enabled = env not in ("development", "test")
+
+    def on_request(self, ctx):
+        if not self.enabled or ctx.path in ("/", "/health"):
+            return BYPASS
+        proto = ctx.headers.get("x-forwarded-proto", ctx.scope.get("scheme", "http"))
+        if proto == "http":
+            url = URL(scope=ctx.scope).replace(scheme="https")
+            return RedirectResponse(url=str(url), status_code=301)
+        return None
+
+    def on_response(self, ctx, status, headers):
+        headers["Strict-Transport-Security"] = self.HSTS
+
+
+class LegacyAuthLayer(Layer):
+    """旧版端点强制 Bearer Token (FIX-14)"""
+
+    name = "legacy_auth"
+
+    def __init__(self, protected: Sequence[re.Pattern] = None, public: Sequence[re.Pattern] = None):
+        from core.legacy_auth_middleware import LEGACY_PROTECTED, LEGACY_PUBLIC
+
+        self.protected = list(LEGACY_PROTECTED if protected is None else protected)
+        self.public = list(LEGACY_PUBLIC if public is None else public)
+
+    def on_request(self, ctx):
+        path = ctx.path
+        if not any(p.match(path) for p in self.protected):
+            return BYPASS
+        if any(p.match(path) for p in self.public):
+            return BYPASS
+        auth = ctx.headers.get("authorization", "")
+        if not auth.startswith("Bearer ") or len(auth) < 20:
+            return JSONResponse(
+                status_code=401,
+                content={
+                    "error": "Unauthorized",
+                    "message": "请先登录",
+                    "detail": "此端点需要认证, 请提供有效的 Bearer Token",
+                },
+            )
+        return BYPASS
+
+
+class CSRFAuditLayer(Layer):
+    """生产环境移除疑似认证 cookie (FIX-18)"""
+
+    name = "csrf_audit"
+    KEYWORDS = ("session", "token", "auth", "jwt")
+
+    def __init__(self, environment: Optional[str] = None):
+        self.enabled = (environment or os.getenv("ENVIRONMENT", "production")) == "production"
+
+    def on_request(self, ctx):
+        return None if self.enabled else BYPASS
+
+    def on_response(self, ctx, status, headers):
+        set_cookie = headers.get("set-cookie", "")
+        if any(kw in set_cookie.lower() for kw in self.KEYWORDS):
+            logger.warning(
+                f"[CSRF-AUDIT] API 响应包含疑似认证 cookie: "
+                f"path={ctx.path} cookie={set_cookie[:80]}"
+            )
+            del headers["set-cookie"]
+
+
+class RateLimitLayer(Layer):
+    """
+    速率限制 — GCRA, Redis 优先 + 内存回退 (FIX-11)
+
+    按 RateLimitPolicies 解析路由 / 租户策略, 异步客户端一次往返完成检查。
+    租户只取自验签通过的访问令牌中的 tenant_id 声明; X-Tenant-ID 请求头可伪造, 不参与计数,
+    无可信租户时只按客户端 IP 计数。
+    默认参数对应 RateLimitMiddleware; global_rate_limit_layer() 对应 GlobalRateLimitMiddleware。
+    """
+
+    name = "rate_limit"
+
+    def __init__(
+        self,
+        requests_per_minute: int = 60,
+        skip_paths: Sequence[str] = ("/health", "/metrics"),
+        client_fallback: str = "unknown",
+        reject_body: str = '{"detail": "Rate limit exceeded"}',
+        limit_header: bool = True,
+        remaining_on_reject: bool = False,
+        policies=None,
+    ):
+        from core.rate_limiter import RateLimitPolicies, RateLimitPolicy
+
+        self.rpm = requests_per_minute
+        self.policies = policies or RateLimitPolicies(default=RateLimitPolicy("global", requests_per_minute, 60))
+        self.skip_paths = frozenset(skip_paths)
+        self.client_fallback = client_fallback
+        self.reject_body = reject_body
+        self.limit_header = limit_header
+        self.remaining_on_reject = remaining_on_reject
+
+    async def on_request(self, ctx):
+        if ctx.path in self.skip_paths:
+            return BYPASS
+        client = ctx.scope.get("client")
+        client_ip = client[0] if client else self.client_fallback
+
+        from core.rate_limiter import rate_limiter
+        checks = self.policies.resolve(ctx.path, client_ip, self._trusted_tenant(ctx))
+        result = await rate_limiter.hit_async(checks, prefix="rl:")
+        if not result.allowed:
+            response = Response(
+                content=self.reject_body,
+                status_code=429,
+                media_type="application/json",
+                headers={"Retry-After": str(max(1, math.ceil(result.retry_after)))},
+            )
+            if self.remaining_on_reject:
+                response.headers["X-RateLimit-Remaining"] = str(result.remaining)
+            return response
+        ctx.values[self] = result  # 可能同时挂多个限流层, 按实例区分
+        return None
+
+    def _trusted_tenant(self, ctx) -> Optional[str]:
+        if not self.policies.tenants:
+            return None  # 未配置租户配额时不解码令牌
+        auth = ctx.headers.get("authorization", "")
+        if not auth.startswith("Bearer "):
+            return None
+        from core.auth import verify_token
+        payload = verify_token(auth[7:])
+        tenant = payload.get("tenant_id") if payload else None
+        return str(tenant) if tenant else None
+
+    def on_response(self, ctx, status, headers):
+        result = ctx.values[self]
+        if self.limit_header:
+            headers["X-RateLimit-Limit"] = str(result.limit)
+        headers["X-RateLimit-Remaining"] = str(result.remaining)
+
+
+def global_rate_limit_layer() -> RateLimitLayer:
+    """GlobalRateLimitMiddleware 的等价配置 (每IP每分钟60次)"""
+    layer = RateLimitLayer(
+        requests_per_minute=60,
+        skip_paths=("/", "/health", "/docs", "/openapi.json"),
+        client_fallback="0.0.0.0",
+        reject_body=json.dumps({"detail": "请求过于频繁，请稍后再试"}, ensure_ascii=False, separators=(",", ":")),
+        limit_header=False,
+        remaining_on_reject=True,
+    )
+    layer.name = "global_rate_limit"
+    return layer
+
+
+class RequestLoggingLayer(Layer):
+    """结构化请求/响应日志, 注入 request_id"""
+
+    name = "request_logging"
+    QUIET_PATHS = ("/health", "/metrics")
+
+    def on_request(self, ctx):
+        request_id = ctx.headers.get("X-Request-ID", str(uuid.uuid4())[:8])
+        ctx.state["request_id"] = request_id
+        ctx.values["request_id"] = request_id
+        ctx.values["request_start"] = time.time()
+        return None
+
+    def on_response(self, ctx, status, headers):
+        request_id = ctx.values["request_id"]
+        duration = time.time() - ctx.values["request_start"]
+        if ctx.path not in self.QUIET_PATHS:
+            logger.info(
+                f"req_id={request_id} method={ctx.scope['method']} path={ctx.path} "
+                f"status={status} duration={duration:.3f}s"
+            )
+        headers["X-Request-ID"] = request_id
+        headers["X-Response-Time"] = f"{duration:.3f}s"
+
+    def on_error(self, ctx, exc):
+        duration = time.time() - ctx.values["request_start"]
+        logger.error(
+            f"req_id={ctx.values['request_id']} method={ctx.scope['method']} path={ctx.path} "
+            f"duration={duration:.3f}s error={type(exc).__name__}: {exc}"
+        )
+
+
+class SecurityHeadersLayer(Layer):
+    """添加安全响应头"""
+
+    name = "security_headers"
+
+    def __init__(self, environment: Optional[str] = None):
+        env = environment or os.getenv("ENVIRONMENT", "production")
+        headers = [
+            ("X-Content-Type-Options", "nosniff"),
+            ("X-Frame-Options", "DENY"),
+            ("X-XSS-Protection", "1; mode=block"),
+            ("Referrer-Policy", "strict-origin-when-cross-origin"),
+            ("Permissions-Policy", "camera=(), microphone=(), geolocation=()"),
+        ]
+        # 生产环境启用 HSTS + CSP
+        if env == "production" or os.getenv("ENABLE_HSTS", "false").lower() == "true":
+            headers.append(("Strict-Transport-Security", "max-age=31536000; includeSubDomains"))
+            headers.append(("Content-Security-Policy", (
+                "default-src 'self'; "
+                "script-src 'self' 'unsafe-inline' 'unsafe-eval'; "
+                "style-src 'self' 'unsafe-inline'; "
+                "img-src 'self' data: blob:; "
+                "connect-src 'self' wss: ws:; "
+                "frame-ancestors 'none'"
+            )))
+        # FIX-08: 隐藏 Server 实现细节
+        headers.append(("Server", "BHP"))
+        self.headers = headers
+
+    def on_response(self, ctx, status, headers):
+        for key, value in self.headers:
+            headers[key] = value
+
+
+# ============================================
+# 中间件栈
+# ============================================
+
+class _LayerTimer:
+    """按层累计耗时并写入 Prometheus 直方图 (prometheus_client 未安装时静默)"""
+
+    _histogram = None
+    _children: Dict[str, Any] = {}
+
+    @classmethod
+    def histogram(cls):
+        if cls._histogram is None:
+            try:
+                from prometheus_client import Histogram
+                cls._histogram = Histogram(
+                    "bhp_middleware_layer_seconds",
+                    "Time spent in each ASGI middleware layer per request",
+                    ["layer"],
+                    buckets=(0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.05),
+                )
+            except Exception as e:
+                logger.warning(f"[Middleware] 层耗时指标不可用: {e}")
+                cls._histogram = False
+        return cls._histogram or None
+
+    @classmethod
+    def child(cls, layer: str):
+        """按层缓存 labels() 结果, 避免每次观测都查标签表"""
+        child = cls._children.get(layer)
+        if child is None:
+            histogram = cls.histogram()
+            if histogram is None:
+                return None
+            child = cls._children[layer] = histogram.labels(layer=layer)
+        return child
+
+
+class ASGIMiddlewareStack:
+    """
+    单个纯 ASGI 中间件按顺序执行多个 Layer
+
+    Args:
+        app: 下游 ASGI 应用
+        layers: 外层在前
+        timing: 是否按层统计耗时 (默认读 MIDDLEWARE_LAYER_TIMING)
+    """
+
+    def __init__(self, app: ASGIApp, layers: Sequence[Layer] = (), timing: Optional[bool] = None):
+        self.app = app
+        self.layers: List[Layer] = list(layers)
+        self.timing = LAYER_TIMING_ENABLED if timing is None else timing
+        # 钩子是否被覆盖在构建时确定, 请求路径上不再反射
+        self._plan = [
+            (layer, _overrides(layer, "on_request"), _overrides(layer, "on_response"),
+             _overrides(layer, "on_error"), inspect.iscoroutinefunction(layer.on_request))
+            for layer in self.layers
+        ]
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or not self.layers:
+            await self.app(scope, receive, send)
+            return
+
+        ctx = RequestContext(scope)
+        timings: Optional[Dict[str, float]] = {} if self.timing else None
+        active: list = []  # 已进入的层 (外层在前)
+        early: Optional[Response] = None
+
+        for step in self._plan:
+            layer, has_request = step[0], step[1]
+            if has_request:
+                t0 = time.perf_counter() if timings is not None else 0.0
+                result = layer.on_request(ctx)
+                if step[4]:
+                    result = await result
+                if timings is not None:
+                    timings[layer.name] = timings.get(layer.name, 0.0) + time.perf_counter() - t0
+                if result is BYPASS:
+                    continue
+                if result is not None:
+                    early = result
+                    break
+            active.append(step)
+
+        responders = [step[0] for step in reversed(active) if step[2]]
+
+        async def send_wrapper(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                headers = MutableHeaders(scope=message)
+                status = message["status"]
+                for layer in responders:
+                    t0 = time.perf_counter() if timings is not None else 0.0
+                    layer.on_response(ctx, status, headers)
+                    if timings is not None:
+                        timings[layer.name] = timings.get(layer.name, 0.0) + time.perf_counter() - t0
+                if timings is not None:
+                    self._observe(timings)
+            await send(message)
+
+        if early is not None:
+            await early(scope, receive, send_wrapper)
+            return
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        except Exception as exc:
+            for layer, _, _, has_error, _ in reversed(active):
+                if has_error:
+                    layer.on_error(ctx, exc)
+            raise
+
+    @staticmethod
+    def _observe(timings: Dict[str, float]) -> None:
+        for name, seconds in timings.items():
+            child = _LayerTimer.child(name)
+            if child is None:
+                return
+            child.observe(seconds)
+
+
+def production_layers(requests_per_minute: int) -> List[Layer]:
+    """setup_production_middleware 的层 (外层在前): 限流 → 日志 → 安全头"""
+    from core.rate_limiter import RateLimitPolicies
+
+    return [
+        RateLimitLayer(
+            requests_per_minute=requests_per_minute,
+            policies=RateLimitPolicies.from_env(requests_per_minute),
+        ),
+        RequestLoggingLayer(),
+        SecurityHeadersLayer(),
+    ]
@@ -8,6 +8,8 @@ Authentication and Authorization Module
 - 用户认证
 """
 import os
+import threading
+import time
 from datetime import datetime, timedelta
 from typing import Optional, Dict
 from jose import JWTError, jwt
@@ -15,6 +17,14 @@ from passlib.context import CryptContext
 from dotenv import load_dotenv
 from loguru import logger
 
+from core.auth_cache import (
+    AUTH_EVENTS_CHANNEL,
+    REVOCATION_RESYNC_SECONDS,
+    apply_auth_event,
+    publish_auth_event,
+    revocation_filter,
+)
+
 # 加载环境变量
 load_dotenv()
 
@@ -185,7 +195,8 @@ def authenticate_user(username: str, password: str, get_user_func) -> Optional[D
     return user
 
 
-def create_user_tokens(user_id: int, username: str, role: str) -> Dict[str, str]:
+def create_user_tokens(user_id: int, username: str, role: str,
+                       tenant_id: Optional[str] = None) -> Dict[str, str]:
     """
     为用户创建访问令牌和刷新令牌
 
@@ -193,6 +204,7 @@ def create_user_tokens(user_id: int, username: str, role: str) -> Dict[str, str]
         user_id: 用户ID
         username: 用户名
         role: 用户角色
+        tenant_id: 所属租户ID, 签入令牌 (限流按此声明计租户配额)
 
     Returns:
         包含access_token和refresh_token的字典
@@ -202,6 +214,8 @@ def create_user_tokens(user_id: int, username: str, role: str) -> Dict[str, str]
         "username": username,
         "role": role
     }
+    if tenant_id:
+        token_data["tenant_id"] = tenant_id
 
     access_token = create_access_token(token_data)
     refresh_token = create_refresh_token(token_data)
@@ -224,6 +238,9 @@ class TokenBlacklist:
     使用 Redis SET + TTL 存储已撤销的 token 哈希，
     跨 worker 共享，token 过期后自动清理。
     Redis 不可用时降级为内存 set（单 worker 有效）。
+
+    查询走进程内 Bloom 过滤器 (core/auth_cache.py)：后台线程订阅撤销事件并定期
+    全量重建，同步正常时未命中过滤器的 token 无需访问 Redis。
     """
 
     _PREFIX = "bhp:token_blacklist:"
@@ -232,6 +249,8 @@ class TokenBlacklist:
         self._fallback: set = set()
         self._redis = None
         self._redis_checked = False
+        self._sync_started = False
+        self._sync_lock = threading.Lock()
 
     def _get_redis(self):
         """延迟初始化 Redis 客户端（db=2，与 scheduler lock db=1 隔离）"""
@@ -274,25 +293,86 @@ class TokenBlacklist:
         if r is not None:
             try:
                 r.setex(f"{self._PREFIX}{token_hash}", ttl, "1")
+                publish_auth_event(r, f"revoke:{token_hash}")
                 logger.info(f"Token 已撤销 (Redis, TTL={ttl}s): {token_hash[:16]}...")
                 return
             except Exception as e:
                 logger.warning(f"[TokenBlacklist] Redis write 失败，降级内存: {e}")
         # fallback
         self._fallback.add(token_hash)
+        apply_auth_event(f"revoke:{token_hash}")
         logger.info(f"Token 已撤销 (内存降级): {token_hash[:16]}...")
 
     def is_revoked(self, token: str) -> bool:
         """检查 token 是否已撤销"""
-        token_hash = self._hash(token)
+        return self.is_hash_revoked(self._hash(token))
+
+    def is_hash_revoked(self, token_hash: str) -> bool:
+        """按 token 哈希检查; 过滤器已同步且未命中时不访问 Redis"""
         r = self._get_redis()
         if r is not None:
+            self._ensure_sync()
+            if revocation_filter.synced and not revocation_filter.might_contain(token_hash):
+                return False
             try:
                 return r.exists(f"{self._PREFIX}{token_hash}") > 0
             except Exception:
                 pass
         return token_hash in self._fallback
 
+    # ── 过滤器同步 ──
+
+    def _ensure_sync(self):
+        if self._sync_started:
+            return
+        with self._sync_lock:
+            if self._sync_started:
+                return
+            self._sync_started = True
+            threading.Thread(target=self._sync_loop, name="token-revocation-sync", daemon=True).start()
+
+    def _resync(self, r):
+        """SCAN 全量撤销哈希重建过滤器 (同时清除已过期的 token)"""
+        prefix_len = len(self._PREFIX)
+        hashes = [key[prefix_len:] for key in r.scan_iter(match=f"{self._PREFIX}*", count=1000)]
+        revocation_filter.rebuild(hashes)
+        logger.info(f"[TokenBlacklist] 撤销过滤器已同步: {len(hashes)} 条")
+
+    def _sync_loop(self):
+        """先订阅再全量加载, 避免两者之间的撤销丢失; 断线后重新订阅并全量重建"""
+        backoff = 1.0
+        while True:
+            r = self._get_redis()
+            pubsub = None
+            try:
+                pubsub = r.pubsub(ignore_subscribe_messages=True)
+                pubsub.subscribe(AUTH_EVENTS_CHANNEL)
+                self._resync(r)
+                backoff = 1.0
+                last_sync = time.monotonic()
+                while True:
+                    message = pubsub.get_message(timeout=1.0)
+                    if message and message.get("type") == "message":
+                        try:
+                            apply_auth_event(message["data"])
+                        except Exception as e:
+                            logger.warning(f"[TokenBlacklist] 无效认证事件 {message['data']!r}: {e}")
+                    if time.monotonic() - last_sync >= REVOCATION_RESYNC_SECONDS:
+                        self._resync(r)
+                        last_sync = time.monotonic()
+            except Exception as e:
+                # 同步中断期间不信任过滤器, 回退为逐次查询 Redis
+                revocation_filter.synced = False
+                logger.warning(f"[TokenBlacklist] 撤销事件订阅中断, {backoff:.0f}s 后重试: {e}")
+                time.sleep(backoff)
+                backoff = min(backoff * 2, 60.0)
+            finally:
+                if pubsub is not None:
+                    try:
+                        pubsub.close()
+                    except Exception:
+                        pass
+
 
 # 全局黑名单实例
 token_blacklist = TokenBlacklist()
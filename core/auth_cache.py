@@ -0,0 +1,267 @@
+"""
+认证热路径缓存
+Authentication hot-path caches
+
+get_current_user 每次请求原本需要: JWT 解码 + Redis 黑名单查询 + users 表查询。
+
+- RevocationFilter: 进程内 Bloom 过滤器, 保存已撤销 token 的哈希。
+  由 Redis 全量加载, 并订阅 AUTH_EVENTS_CHANNEL 增量同步; 同步正常时
+  "不在过滤器中" 即可判定未撤销, 无需访问 Redis (命中过滤器再回 Redis 确认)。
+- PrincipalCache: token 哈希 → 精简用户快照 (id / role / is_active), 短 TTL,
+  不超过 token 自身过期时间。命中时跳过 JWT 解码与 users 查询。
+- 用户 role / is_active 变更或删除: ORM 会话提交后自动失效该用户的所有快照,
+  并通过同一频道通知其他 worker; 原生 SQL 修改角色需显式调用 invalidate_principal()。
+"""
+
+import math
+import os
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Dict, Iterable, Optional, Set, Tuple
+
+from loguru import logger
+from sqlalchemy import event, inspect as sa_inspect
+from sqlalchemy.orm import Session
+from sqlalchemy.orm.session import make_transient_to_detached
+
+AUTH_EVENTS_CHANNEL = "bhp:auth_events"
+PRINCIPAL_CACHE_TTL = float(os.getenv("AUTH_PRINCIPAL_CACHE_TTL", "60"))
+PRINCIPAL_CACHE_MAX = int(os.getenv("AUTH_PRINCIPAL_CACHE_MAX", "50000"))
+REVOCATION_FILTER_CAPACITY = int(os.getenv("AUTH_REVOCATION_FILTER_CAPACITY", "100000"))
+REVOCATION_FILTER_ERROR_RATE = float(os.getenv("AUTH_REVOCATION_FILTER_ERROR_RATE", "0.001"))
+REVOCATION_RESYNC_SECONDS = float(os.getenv("AUTH_REVOCATION_RESYNC_SECONDS", "3600"))
+
+
+# ============================================
+# 撤销过滤器 (Bloom)
+# ============================================
+
+class RevocationFilter:
+    """
+    已撤销 token 哈希的 Bloom 过滤器
+
+    只会误报 (回 Redis 确认), 不会漏报。synced=False 时调用方不得信任否定结果。
+    Bloom 不支持删除: 过期 token 由定期 rebuild() 清除。
+    """
+
+    def __init__(self, capacity: int = REVOCATION_FILTER_CAPACITY,
+                 error_rate: float = REVOCATION_FILTER_ERROR_RATE):
+        self.synced = False
+        self.error_rate = error_rate
+        self.count = 0
+        # (位图, 位数, 哈希数) 作为整体替换, 重建时读者看到的要么是旧位图要么是新位图
+        self._state = self._alloc(capacity)
+
+    def _alloc(self, capacity: int) -> Tuple[bytearray, int, int]:
+        capacity = max(capacity, 1000)
+        num_bits = int(math.ceil(-capacity * math.log(self.error_rate) / (math.log(2) ** 2)))
+        num_hashes = max(1, round(num_bits / capacity * math.log(2)))
+        return bytearray((num_bits + 7) // 8), num_bits, num_hashes
+
+    @property
+    def capacity(self) -> int:
+        _, num_bits, _ = self._state
+        return int(num_bits * (math.log(2) ** 2) / -math.log(self.error_rate))
+
+    @staticmethod
+    def _positions(token_hash: str, num_bits: int, num_hashes: int):
+        # token_hash 本身是 sha256 十六进制, 直接双重哈希派生 k 个位置
+        h1 = int(token_hash[:16], 16)
+        h2 = int(token_hash[16:32], 16) | 1
+        return [(h1 + i * h2) % num_bits for i in range(num_hashes)]
+
+    @classmethod
+    def _set(cls, state, token_hash: str):
+        bits, num_bits, num_hashes = state
+        for pos in cls._positions(token_hash, num_bits, num_hashes):
+            bits[pos >> 3] |= 1 << (pos & 7)
+
+    def add(self, token_hash: str):
+        self._set(self._state, token_hash)
+        self.count += 1
+
+    def might_contain(self, token_hash: str) -> bool:
+        bits, num_bits, num_hashes = self._state
+        return all(bits[pos >> 3] & (1 << (pos & 7))
+                   for pos in self._positions(token_hash, num_bits, num_hashes))
+
+    def rebuild(self, token_hashes: Iterable[str]):
+        """用全量哈希重建 (容量至少为实际数量的 2 倍), 并标记为已同步"""
+        hashes = list(token_hashes)
+        state = self._alloc(max(self.capacity, len(hashes) * 2))
+        for h in hashes:
+            self._set(state, h)
+        self._state = state
+        self.count = len(hashes)
+        self.synced = True
+
+
+# ============================================
+# 认证主体缓存
+# ============================================
+
+@dataclass(frozen=True)
+class Principal:
+    """精简用户快照"""
+    user_id: int
+    role: Any
+    is_active: bool
+
+    @classmethod
+    def from_user(cls, user) -> "Principal":
+        return cls(user_id=user.id, role=user.role, is_active=bool(user.is_active))
+
+    def attach(self, db: Session):
+        """
+        以快照构造 User 并挂到请求会话 (不发 SELECT)
+
+        id / role / is_active 已就绪; 首次访问其他字段时 ORM 按主键一次性加载,
+        修改后 commit 照常生成 UPDATE。
+        """
+        from core.models import User
+
+        user = User(id=self.user_id, role=self.role, is_active=self.is_active)
+        make_transient_to_detached(user)
+        return db.merge(user, load=False)
+
+
+class PrincipalCache:
+    """token 哈希 → Principal (线程安全: 同步依赖在线程池中执行)"""
+
+    def __init__(self, ttl: float = PRINCIPAL_CACHE_TTL, max_entries: int = PRINCIPAL_CACHE_MAX):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[str, Tuple[float, Principal]]" = OrderedDict()
+        self._by_user: Dict[int, Set[str]] = {}
+
+    def get(self, token_hash: str) -> Optional[Principal]:
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(token_hash)
+            if entry is None:
+                return None
+            if entry[0] <= now:
+                self._remove(token_hash)
+                return None
+            return entry[1]
+
+    def put(self, token_hash: str, principal: Principal, token_exp: Optional[float] = None):
+        if self.ttl <= 0:
+            return
+        expires_at = time.time() + self.ttl
+        if token_exp:
+            expires_at = min(expires_at, float(token_exp))
+        with self._lock:
+            self._remove(token_hash)
+            self._entries[token_hash] = (expires_at, principal)
+            self._by_user.setdefault(principal.user_id, set()).add(token_hash)
+            while len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries)))
+
+    def invalidate_token(self, token_hash: str):
+        with self._lock:
+            self._remove(token_hash)
+
+    def invalidate_user(self, user_id: int):
+        with self._lock:
+            for token_hash in list(self._by_user.get(user_id, ())):
+                self._remove(token_hash)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._by_user.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _remove(self, token_hash: str):
+        entry = self._entries.pop(token_hash, None)
+        if entry is None:
+            return
+        hashes = self._by_user.get(entry[1].user_id)
+        if hashes is not None:
+            hashes.discard(token_hash)
+            if not hashes:
+                del self._by_user[entry[1].user_id]
+
+
+revocation_filter = RevocationFilter()
+principal_cache = PrincipalCache()
+
+
+# ============================================
+# 跨 worker 事件
+# 消息格式: "revoke:<token_hash>" / "user:<user_id>"
+# ============================================
+
+def apply_auth_event(message: str):
+    """处理一条认证事件 (本进程发出的事件也会经订阅回到这里, 操作幂等)"""
+    kind, _, value = message.partition(":")
+    if kind == "revoke" and value:
+        revocation_filter.add(value)
+        principal_cache.invalidate_token(value)
+    elif kind == "user" and value.isdigit():
+        principal_cache.invalidate_user(int(value))
+
+
+def publish_auth_event(redis_client, message: str):
+    """本进程立即生效, 再广播给其他 worker (Redis 不可用时只影响本进程)"""
+    apply_auth_event(message)
+    if redis_client is None:
+        return
+    try:
+        redis_client.publish(AUTH_EVENTS_CHANNEL, message)
+    except Exception as e:
+        logger.warning(f"[AuthCache] 认证事件广播失败: {e}")
+
+
+def invalidate_principal(*user_ids: int):
+    """用户角色 / 启用状态变更后调用 (ORM 修改会自动触发, 原生 SQL 需手动调用)"""
+    from core.auth import token_blacklist
+
+    redis_client = token_blacklist._get_redis()
+    for user_id in user_ids:
+        if user_id is not None:
+            publish_auth_event(redis_client, f"user:{int(user_id)}")
+
+
+# ============================================
+# ORM 钩子: role / is_active 变更或删除用户后失效快照
+# ============================================
+
+_PENDING_KEY = "_principal_invalidate"
+
+
+@event.listens_for(Session, "after_flush")
+def _collect_principal_changes(session, flush_context):
+    from core.models import User
+
+    changed = [
+        obj.id for obj in session.dirty
+        if isinstance(obj, User) and (
+            sa_inspect(obj).attrs.role.history.has_changes()
+            or sa_inspect(obj).attrs.is_active.history.has_changes()
+        )
+    ]
+    changed += [obj.id for obj in session.deleted if isinstance(obj, User)]
+    if changed:
+        session.info.setdefault(_PENDING_KEY, set()).update(changed)
+
+
+@event.listens_for(Session, "after_commit")
+def _flush_principal_changes(session):
+    user_ids = session.info.pop(_PENDING_KEY, None)
+    if user_ids:
+        try:
+            invalidate_principal(*user_ids)
+        except Exception as e:
+            logger.warning(f"[AuthCache] 用户快照失效失败: {e}")
+
+
+@event.listens_for(Session, "after_soft_rollback")
+def _discard_principal_changes(session, previous_transaction):
+    session.info.pop(_PENDING_KEY, None)
@@ -15,6 +15,7 @@ from .questionnaires import (
     TTM7Questionnaire
 )
 from .scoring_engine import BAPSScoringEngine
+from .cohort_scoring import CohortScorer
 from .report_generator import BAPSReportGenerator
 
 __version__ = "1.0.0"
@@ -25,5 +26,6 @@ __all__ = [
     "SPIQuestionnaire",
     "TTM7Questionnaire",
     "BAPSScoringEngine",
+    "CohortScorer",
     "BAPSReportGenerator"
 ]
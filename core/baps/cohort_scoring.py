@@ -0,0 +1,217 @@
+# -*- coding: utf-8 -*-
+"""
+BAPS 批量计分
+机构入组批量测评 / 常模调整后的重新计分
+
+每份问卷编译一次为题目索引 + 权重矩阵 (题目 × 维度, 反向题权重为 -1),
+整批答卷组成 (用户 × 题目) 矩阵后一次矩阵乘法得到全部维度分;
+水平区间用 searchsorted 查表。结果对象与 BAPSScoringEngine 单人计分完全一致
+(组装逻辑复用引擎的 _xxx_result 方法)。
+
+用法:
+    scorer = CohortScorer()
+    results = scorer.score("spi", answer_sheets, user_ids)
+    dims, scores = scorer.dimension_scores("big_five", answer_sheets)  # 仅要分数矩阵
+
+常模 (水平区间) 调整后新建 CohortScorer 即按新区间重新计分。
+"""
+
+from dataclasses import dataclass
+from typing import Any, Dict, Iterable, List, Mapping, Optional, Sequence, Tuple, Union
+
+import numpy as np
+
+from .scoring_engine import (
+    BAPSScoringEngine, BigFiveResult, BPT6Result, CAPACITYResult, SPIResult,
+)
+
+AnswerSheets = Union[Sequence[Mapping[str, Any]], np.ndarray]
+
+
+@dataclass
+class CompiledQuestionnaire:
+    """编译后的问卷: 题目顺序、维度顺序与 (题目 × 维度) 权重矩阵"""
+    name: str
+    items: List[str]
+    dimensions: List[str]
+    weights: np.ndarray
+    index: Dict[str, int]
+
+    def matrix(self, sheets: AnswerSheets) -> np.ndarray:
+        """答卷列表 -> (用户 × 题目) 矩阵, 缺答记 0, 未知题号忽略"""
+        if isinstance(sheets, np.ndarray):
+            if sheets.ndim != 2 or sheets.shape[1] != len(self.items):
+                raise ValueError(f"{self.name}: 答卷矩阵应为 (N, {len(self.items)})")
+            return sheets
+        items = self.items
+        zeros = (0,) * len(items)
+        x = np.array([list(map(sheet.get, items, zeros)) for sheet in sheets],
+                     dtype=np.float64).reshape(len(sheets), len(items))
+        # 整数答卷保持整数运算, 与单人计分的 int 求和逐位一致
+        if np.array_equal(x, np.rint(x)):
+            return x.astype(np.int64)
+        return x
+
+    def score(self, sheets: AnswerSheets) -> np.ndarray:
+        """(用户 × 题目) @ (题目 × 维度) -> (用户 × 维度)"""
+        x = self.matrix(sheets)
+        weights = self.weights if x.dtype.kind == "i" else self.weights.astype(np.float64)
+        return x @ weights
+
+
+def compile_questionnaire(name: str, dimension_items: Mapping[str, Iterable[str]],
+                          reverse_items: Iterable[str] = ()) -> CompiledQuestionnaire:
+    """把 {维度: [题号]} 编译为权重矩阵"""
+    reverse = set(reverse_items)
+    dimensions = list(dimension_items)
+    items: List[str] = []
+    index: Dict[str, int] = {}
+    entries = []
+    for d, dim in enumerate(dimensions):
+        for item in dimension_items[dim]:
+            if item not in index:
+                index[item] = len(items)
+                items.append(item)
+            entries.append((index[item], d, -1 if item in reverse else 1))
+    weights = np.zeros((len(items), len(dimensions)), dtype=np.int64)
+    for i, d, w in entries:
+        weights[i, d] += w
+    return CompiledQuestionnaire(name=name, items=items, dimensions=dimensions,
+                                 weights=weights, index=index)
+
+
+class LevelTable:
+    """
+    水平区间查表
+
+    levels 为引擎中的 [{"range": (min, max), ...}] 列表 (闭区间, 互不重叠);
+    resolve() 返回每个分数所在区间在原列表中的下标, 落在区间外为 -1。
+    """
+
+    def __init__(self, levels: List[Dict[str, Any]]):
+        order = sorted(range(len(levels)), key=lambda i: levels[i]["range"][0])
+        self.levels = levels
+        self._order = np.array(order, dtype=np.int64)
+        self._lows = np.array([levels[i]["range"][0] for i in order], dtype=np.float64)
+        self._highs = np.array([levels[i]["range"][1] for i in order], dtype=np.float64)
+
+    def resolve(self, scores: np.ndarray) -> np.ndarray:
+        scores = np.asarray(scores, dtype=np.float64)
+        pos = np.searchsorted(self._lows, scores, side="right") - 1
+        clipped = np.clip(pos, 0, None)
+        hit = (pos >= 0) & (scores <= self._highs[clipped])
+        return np.where(hit, self._order[clipped], -1)
+
+    def lookup(self, scores: Sequence[Any], fallback) -> List[Dict[str, Any]]:
+        """分数 -> 水平字典; 区间外交给引擎的单人查表 (返回默认水平)"""
+        idx = self.resolve(np.asarray(scores)).tolist()
+        return [self.levels[i] if i >= 0 else fallback(s) for i, s in zip(idx, scores)]
+
+
+class CohortScorer:
+    """BAPS 批量计分器 (大五 / BPT-6 / CAPACITY / SPI)"""
+
+    QUESTIONNAIRES = ("big_five", "bpt6", "capacity", "spi")
+
+    def __init__(self, engine: Optional[BAPSScoringEngine] = None):
+        self.engine = engine or BAPSScoringEngine()
+        e = self.engine
+        self.compiled = {
+            "big_five": compile_questionnaire("big_five", e.BIG_FIVE_ITEMS, e.BIG_FIVE_REVERSE),
+            "bpt6": compile_questionnaire("bpt6", e.BPT6_ITEMS),
+            "capacity": compile_questionnaire("capacity", e.CAPACITY_ITEMS),
+            "spi": compile_questionnaire("spi", e.SPI_ITEMS),
+        }
+        self.big_five_levels = LevelTable(e.big_five_levels)
+        self.capacity_dimension_levels = LevelTable(e.capacity_dimension_levels)
+        self.capacity_total_levels = LevelTable(e.capacity_total_levels)
+        self.spi_levels = LevelTable(e.spi_levels)
+
+    def dimension_scores(self, questionnaire: str, sheets: AnswerSheets) -> Tuple[List[str], np.ndarray]:
+        """只计算 (用户 × 维度) 分数矩阵"""
+        compiled = self._compiled(questionnaire)
+        return compiled.dimensions, compiled.score(sheets)
+
+    def score(self, questionnaire: str, sheets: AnswerSheets,
+              user_ids: Optional[Sequence[str]] = None) -> list:
+        """按问卷名批量计分, 返回与单人计分相同的结果对象列表"""
+        self._compiled(questionnaire)
+        return getattr(self, f"score_{questionnaire}")(sheets, user_ids)
+
+    def spi_scores(self, sheets: AnswerSheets) -> Tuple[np.ndarray, List[float]]:
+        """SPI 维度分矩阵与加权总分"""
+        compiled = self.compiled["spi"]
+        scores = compiled.score(sheets)
+        # 按维度顺序逐列累加, 与单人计分 sum(d * w) 的浮点运算顺序一致
+        weighted = np.zeros(scores.shape[0], dtype=np.float64)
+        for j, dim in enumerate(compiled.dimensions):
+            weighted = weighted + scores[:, j] * self.engine.SPI_WEIGHTS[dim]
+        # Python round 为十进制正确舍入, np.round 在 .xx5 边界可能不同
+        return scores, [round(v, 2) for v in weighted.tolist()]
+
+    # ── 各问卷 ──
+
+    def score_big_five(self, sheets: AnswerSheets, user_ids: Optional[Sequence[str]] = None) -> List[BigFiveResult]:
+        dims, scores = self.dimension_scores("big_five", sheets)
+        columns = scores.T.tolist()
+        levels = [self.big_five_levels.lookup(col, self.engine._get_big_five_level) for col in columns]
+        return [
+            self.engine._big_five_result(
+                uid,
+                {dim: columns[j][row] for j, dim in enumerate(dims)},
+                {dim: levels[j][row] for j, dim in enumerate(dims)},
+            )
+            for row, uid in enumerate(self._user_ids(user_ids, scores.shape[0]))
+        ]
+
+    def score_bpt6(self, sheets: AnswerSheets, user_ids: Optional[Sequence[str]] = None) -> List[BPT6Result]:
+        dims, scores = self.dimension_scores("bpt6", sheets)
+        rows = scores.tolist()
+        return [
+            self.engine._bpt6_result(uid, dict(zip(dims, rows[row])))
+            for row, uid in enumerate(self._user_ids(user_ids, scores.shape[0]))
+        ]
+
+    def score_capacity(self, sheets: AnswerSheets, user_ids: Optional[Sequence[str]] = None) -> List[CAPACITYResult]:
+        dims, scores = self.dimension_scores("capacity", sheets)
+        columns = scores.T.tolist()
+        totals = scores.sum(axis=1).tolist()
+        levels = [self.capacity_dimension_levels.lookup(col, self.engine._get_capacity_dimension_level)
+                  for col in columns]
+        total_levels = self.capacity_total_levels.lookup(totals, self.engine._get_capacity_total_level)
+        return [
+            self.engine._capacity_result(
+                uid,
+                {dim: columns[j][row] for j, dim in enumerate(dims)},
+                {dim: levels[j][row] for j, dim in enumerate(dims)},
+                totals[row],
+                total_levels[row],
+            )
+            for row, uid in enumerate(self._user_ids(user_ids, scores.shape[0]))
+        ]
+
+    def score_spi(self, sheets: AnswerSheets, user_ids: Optional[Sequence[str]] = None) -> List[SPIResult]:
+        dims = self.compiled["spi"].dimensions
+        scores, spi = self.spi_scores(sheets)
+        rows = scores.tolist()
+        levels = self.spi_levels.lookup(spi, self.engine._get_spi_level)
+        return [
+            self.engine._spi_result(uid, dict(zip(dims, rows[row])), spi[row], levels[row])
+            for row, uid in enumerate(self._user_ids(user_ids, scores.shape[0]))
+        ]
+
+    # ── 内部 ──
+
+    def _compiled(self, questionnaire: str) -> CompiledQuestionnaire:
+        compiled = self.compiled.get(questionnaire)
+        if compiled is None:
+            raise ValueError(f"不支持的问卷类型: {questionnaire}，可选: {', '.join(self.QUESTIONNAIRES)}")
+        return compiled
+
+    @staticmethod
+    def _user_ids(user_ids: Optional[Sequence[str]], n: int) -> List[str]:
+        if user_ids is None:
+            return ["anonymous"] * n
+        if len(user_ids) != n:
+            raise ValueError(f"user_ids 数量 ({len(user_ids)}) 与答卷数量 ({n}) 不一致")
+        return list(user_ids)
@@ -101,6 +101,30 @@ class TTM7Result:
 class BAPSScoringEngine:
     """BAPS综合评分引擎"""
 
+    # 题目-维度映射 (类级常量, 不在每次计分时重建; 批量计分据此编译题目矩阵)
+    BIG_FIVE_ITEMS = {dim: tuple(f"{dim}{i}" for i in range(1, 11)) for dim in "ENCAO"}
+    BIG_FIVE_REVERSE = frozenset({"E3"})  # 反向计分题
+
+    BPT6_ITEMS = {
+        "action": ("BPT1", "BPT2", "BPT3"),
+        "knowledge": ("BPT4", "BPT5", "BPT6"),
+        "emotion": ("BPT7", "BPT8", "BPT9"),
+        "relation": ("BPT10", "BPT11", "BPT12"),
+        "environment": ("BPT13", "BPT14", "BPT15"),
+        "ambivalent": ("BPT16", "BPT17", "BPT18"),
+    }
+
+    CAPACITY_ITEMS = {
+        dim: tuple(f"CAP{4 * k + i}" for i in range(1, 5))
+        for k, dim in enumerate(("C1", "A1", "P", "A2", "C2", "I", "T", "Y"))
+    }
+
+    SPI_ITEMS = {
+        dim: tuple(f"SPI{10 * k + i}" for i in range(1, 11))
+        for k, dim in enumerate(("M", "A", "S", "E", "H"))
+    }
+    SPI_WEIGHTS = {"M": 0.30, "A": 0.25, "S": 0.20, "E": 0.15, "H": 0.10}
+
     def __init__(self):
         """初始化评分引擎"""
         # 大五人格解读标准
@@ -214,29 +238,27 @@ class BAPSScoringEngine:
         返回:
             BigFiveResult 对象
         """
-        reverse_items = ["E3"]  # 反向计分题
-
-        dimensions = {
-            "E": [f"E{i}" for i in range(1, 11)],
-            "N": [f"N{i}" for i in range(1, 11)],
-            "C": [f"C{i}" for i in range(1, 11)],
-            "A": [f"A{i}" for i in range(1, 11)],
-            "O": [f"O{i}" for i in range(1, 11)]
-        }
-
-        dimension_scores = {}
-        dominant_traits = []
-
-        for dim, items in dimensions.items():
+        totals = {}
+        for dim, items in self.BIG_FIVE_ITEMS.items():
             total = 0
             for item in items:
                 score = answers.get(item, 0)
-                if item in reverse_items:
+                if item in self.BIG_FIVE_REVERSE:
                     score = -score  # 反向计分
                 total += score
+            totals[dim] = total
+
+        levels = {dim: self._get_big_five_level(total) for dim, total in totals.items()}
+        return self._big_five_result(user_id, totals, levels)
+
+    def _big_five_result(self, user_id: str, totals: Dict[str, int],
+                         levels: Dict[str, Dict[str, str]]) -> BigFiveResult:
+        """由各维度得分与水平组装结果 (单人与批量计分共用)"""
+        dimension_scores = {}
+        dominant_traits = []
 
-            # 确定水平
-            level_info = self._get_big_five_level(total)
+        for dim, total in totals.items():
+            level_info = levels[dim]
 
             dimension_scores[dim] = DimensionScore(
                 dimension=dim,
@@ -350,20 +372,15 @@ class BAPSScoringEngine:
         返回:
             BPT6Result 对象
         """
-        type_items = {
-            "action": ["BPT1", "BPT2", "BPT3"],
-            "knowledge": ["BPT4", "BPT5", "BPT6"],
-            "emotion": ["BPT7", "BPT8", "BPT9"],
-            "relation": ["BPT10", "BPT11", "BPT12"],
-            "environment": ["BPT13", "BPT14", "BPT15"],
-            "ambivalent": ["BPT16", "BPT17", "BPT18"]
-        }
-
         # 计算各类型得分
         type_scores = {}
-        for type_name, items in type_items.items():
+        for type_name, items in self.BPT6_ITEMS.items():
             type_scores[type_name] = sum(answers.get(item, 0) for item in items)
 
+        return self._bpt6_result(user_id, type_scores)
+
+    def _bpt6_result(self, user_id: str, type_scores: Dict[str, int]) -> BPT6Result:
+        """由各类型得分判定分型并组装结果 (单人与批量计分共用)"""
         # 确定主导类型
         dominant_types = [t for t, s in type_scores.items() if s >= 12]
         mixed_threshold_types = [t for t, s in type_scores.items() if s >= 10]
@@ -417,28 +434,26 @@ class BAPSScoringEngine:
         返回:
             CAPACITYResult 对象
         """
-        dimension_items = {
-            "C1": ["CAP1", "CAP2", "CAP3", "CAP4"],
-            "A1": ["CAP5", "CAP6", "CAP7", "CAP8"],
-            "P": ["CAP9", "CAP10", "CAP11", "CAP12"],
-            "A2": ["CAP13", "CAP14", "CAP15", "CAP16"],
-            "C2": ["CAP17", "CAP18", "CAP19", "CAP20"],
-            "I": ["CAP21", "CAP22", "CAP23", "CAP24"],
-            "T": ["CAP25", "CAP26", "CAP27", "CAP28"],
-            "Y": ["CAP29", "CAP30", "CAP31", "CAP32"]
-        }
-
-        dimension_scores = {}
+        scores = {}
         total_score = 0
+        for dim, items in self.CAPACITY_ITEMS.items():
+            scores[dim] = sum(answers.get(item, 0) for item in items)
+            total_score += scores[dim]
+
+        # 确定维度水平与总体潜力水平
+        levels = {dim: self._get_capacity_dimension_level(score) for dim, score in scores.items()}
+        return self._capacity_result(user_id, scores, levels, total_score,
+                                     self._get_capacity_total_level(total_score))
+
+    def _capacity_result(self, user_id: str, scores: Dict[str, int], levels: Dict[str, Dict[str, Any]],
+                         total_score: int, total_level_info: Dict[str, str]) -> CAPACITYResult:
+        """由各维度得分与水平组装结果 (单人与批量计分共用)"""
+        dimension_scores = {}
         weak_dimensions = []
         strong_dimensions = []
 
-        for dim, items in dimension_items.items():
-            score = sum(answers.get(item, 0) for item in items)
-            total_score += score
-
-            # 确定维度水平
-            level_info = self._get_capacity_dimension_level(score)
+        for dim, score in scores.items():
+            level_info = levels[dim]
 
             dimension_scores[dim] = DimensionScore(
                 dimension=dim,
@@ -455,9 +470,6 @@ class BAPSScoringEngine:
             elif level_info["level"] == "high":
                 strong_dimensions.append(self.capacity_names[dim])
 
-        # 确定总体潜力水平
-        total_level_info = self._get_capacity_total_level(total_score)
-
         return CAPACITYResult(
             user_id=user_id,
             assessed_at=datetime.now(),
@@ -501,28 +513,23 @@ class BAPSScoringEngine:
 
         公式: SPI = M×0.30 + A×0.25 + S×0.20 + E×0.15 + H×0.10
         """
-        dimension_items = {
-            "M": [f"SPI{i}" for i in range(1, 11)],
-            "A": [f"SPI{i}" for i in range(11, 21)],
-            "S": [f"SPI{i}" for i in range(21, 31)],
-            "E": [f"SPI{i}" for i in range(31, 41)],
-            "H": [f"SPI{i}" for i in range(41, 51)]
-        }
-
-        weights = {"M": 0.30, "A": 0.25, "S": 0.20, "E": 0.15, "H": 0.10}
+        weights = self.SPI_WEIGHTS
 
         # 计算各维度得分
         dimension_scores = {}
-        for dim, items in dimension_items.items():
+        for dim, items in self.SPI_ITEMS.items():
             dimension_scores[dim] = sum(answers.get(item, 0) for item in items)
 
         # 计算SPI加权得分
-        spi_score = sum(dimension_scores[d] * weights[d] for d in dimension_items)
+        spi_score = sum(dimension_scores[d] * weights[d] for d in self.SPI_ITEMS)
         spi_score = round(spi_score, 2)
 
         # 确定成功可能性水平
-        level_info = self._get_spi_level(spi_score)
+        return self._spi_result(user_id, dimension_scores, spi_score, self._get_spi_level(spi_score))
 
+    def _spi_result(self, user_id: str, dimension_scores: Dict[str, int], spi_score: float,
+                    level_info: Dict[str, str]) -> SPIResult:
+        """由维度得分、SPI 与水平组装结果 (单人与批量计分共用)"""
         # 维度分析
         dimension_analysis = {}
         for dim, score in dimension_scores.items():
@@ -0,0 +1,449 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+batch_extractor.py - 健康报告批量提取
+
+用于机构批量入驻: 扫描整个目录树中的生理 / 心理测评 Excel 与心理健康 PDF,
+多进程提取, 按文件内容哈希缓存结果, 分块批量写入 health_data。
+
+与 data_extractor.extract_health_data 的区别:
+- 覆盖目录树中所有用户的所有报告 (而非单用户每类最新一份)
+- 工作簿只打开一次 (read_physio_workbook)
+- 按 SHA-256 缓存提取结果, 重跑只处理新增 / 变更文件
+- 写库前按 (device_id, 文件内容 SHA-256) 去重 (存于 metadata), 重跑或仅 mtime 变化都不重复入库
+- 报告 files/sec 与失败类别
+
+用户标识: 文件名中的 12 位设备 ID (如 【FDBC03D79348】), 否则取所在目录名,
+经 user_devices.device_id 映射为 users.id; 未绑定设备的报告计入 unmapped_device。
+
+用法:
+  python -m core.batch_extractor /data/cohort_2026-10 --workers 8
+  python -m core.batch_extractor /data/cohort_2026-10 --no-db --cache-dir /tmp/extract-cache
+"""
+
+import contextlib
+import hashlib
+import io
+import json
+import os
+import re
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+from dataclasses import asdict, dataclass, field
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional
+
+from loguru import logger
+
+from core.data_extractor import (
+    classify_report_file,
+    extract_from_pdf_with_regex,
+    read_physio_workbook,
+    read_psych_workbook,
+)
+
+# 提取逻辑变化时递增, 使旧缓存失效
+EXTRACTOR_VERSION = 1
+
+DEFAULT_CACHE_DIR = os.getenv("EXTRACTION_CACHE_DIR", os.path.join("data", "cache", "extraction"))
+DEFAULT_CHUNK_SIZE = 500
+
+DEVICE_ID_PATTERN = re.compile(r'[【\[]([A-F0-9]{12})[】\]]', re.IGNORECASE)
+
+# 报告类别 -> health_data.data_type / 主指标 / 单位
+DATA_TYPES = {
+    "physio_excel": ("hrv_report", "SDNN", "ms"),
+    "psych_excel": ("psych_report", "anxiety_score", None),
+    "pdf": ("psych_report", "anxiety_score", None),
+}
+
+SOURCE = "report_import"
+
+# 失败类别
+FAIL_UNREADABLE = "unreadable"              # 文件损坏 / 格式错误
+FAIL_NO_DATA = "no_data"                    # 可读但没有可识别的指标
+FAIL_SCANNED_PDF = "scanned_pdf"            # PDF 无文本层且 OCR 不可用 / 失败
+FAIL_MISSING_DEPENDENCY = "missing_dependency"  # openpyxl / pdfplumber 等未安装
+FAIL_WORKER_CRASH = "worker_crash"          # 子进程异常退出
+FAIL_UNMAPPED_DEVICE = "unmapped_device"    # 设备未绑定用户
+FAIL_DB_ERROR = "db_error"
+
+
+@dataclass
+class ReportFile:
+    path: str
+    category: str
+    device_id: str
+    size: int
+    mtime: float
+    sha256: str = ""
+
+
+@dataclass
+class FileResult:
+    """单个文件的提取结果 (可 JSON 序列化, 用于缓存与跨进程传递)"""
+    path: str
+    category: str
+    ok: bool
+    data: Dict[str, Any] = field(default_factory=dict)
+    failure: Optional[str] = None
+    error: Optional[str] = None
+    seconds: float = 0.0
+
+
+@dataclass
+class BatchReport:
+    files_total: int = 0
+    files_cached: int = 0
+    files_extracted: int = 0
+    files_ok: int = 0
+    rows_written: int = 0
+    rows_skipped_existing: int = 0
+    failures: Counter = field(default_factory=Counter)
+    failed_files: Dict[str, List[str]] = field(default_factory=dict)
+    elapsed: float = 0.0
+
+    @property
+    def files_per_sec(self) -> float:
+        return self.files_total / self.elapsed if self.elapsed > 0 else 0.0
+
+    def fail(self, category: str, path: str):
+        self.failures[category] += 1
+        self.failed_files.setdefault(category, []).append(path)
+
+    def summary(self) -> str:
+        lines = [
+            f"文件 {self.files_total} 个 (缓存命中 {self.files_cached}, 新提取 {self.files_extracted}), "
+            f"成功 {self.files_ok}, 耗时 {self.elapsed:.1f}s, {self.files_per_sec:.1f} files/sec",
+            f"写入 {self.rows_written} 行 (已存在跳过 {self.rows_skipped_existing})",
+        ]
+        for category, count in self.failures.most_common():
+            lines.append(f"  失败 {category}: {count}")
+        return "\n".join(lines)
+
+    def as_dict(self) -> Dict[str, Any]:
+        d = asdict(self)
+        d["failures"] = dict(self.failures)
+        d["files_per_sec"] = round(self.files_per_sec, 2)
+        return d
+
+
+# ============ 扫描 ============
+
+def device_id_for(path: Path) -> str:
+    match = DEVICE_ID_PATTERN.search(path.name)
+    return match.group(1).upper() if match else path.parent.name.upper()
+
+
+def scan_directory(root: str) -> Iterator[ReportFile]:
+    """递归扫描目录树, 产出可识别的报告文件 (不读取内容)"""
+    for dirpath, _dirnames, filenames in os.walk(root):
+        for name in filenames:
+            category = classify_report_file(name)
+            if category is None:
+                continue
+            path = Path(dirpath) / name
+            try:
+                st = path.stat()
+            except OSError as e:
+                # 失效的符号链接 / 扫描期间被删除: 跳过该文件, 不中断整批
+                logger.warning(f"[BatchExtract] 跳过无法访问的文件 {path}: {e}")
+                continue
+            yield ReportFile(str(path), category, device_id_for(path), st.st_size, st.st_mtime)
+
+
+def file_sha256(path: str, chunk_size: int = 1 << 20) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+# ============ 提取 (在子进程中执行) ============
+
+def extract_report_file(path: str, category: str) -> FileResult:
+    """提取单个文件; 不抛异常, 失败类别写入 FileResult.failure"""
+    t0 = time.perf_counter()
+    result = FileResult(path, category, ok=False)
+    # data_extractor 的逐步日志在批量模式下没有意义, 直接丢弃
+    with contextlib.redirect_stdout(io.StringIO()):
+        try:
+            if category == "physio_excel":
+                data, _ = read_physio_workbook(path, verbose=False)
+            elif category == "psych_excel":
+                data, _ = read_psych_workbook(path)
+            else:
+                data, raw_text = extract_from_pdf_with_regex(path)
+                if not data and not raw_text.strip():
+                    result.failure = _empty_pdf_reason()
+        except ImportError as e:
+            result.failure, result.error = FAIL_MISSING_DEPENDENCY, str(e)
+            data = {}
+        except Exception as e:
+            result.failure, result.error = FAIL_UNREADABLE, f"{type(e).__name__}: {e}"
+            data = {}
+    result.data = data
+    result.ok = bool(data)
+    if not result.ok and result.failure is None:
+        result.failure = FAIL_NO_DATA
+    result.seconds = time.perf_counter() - t0
+    return result
+
+
+def _empty_pdf_reason() -> str:
+    """PDF 没有文本: 解析库都没装 (extract_from_pdf_with_regex 内部吞掉了 ImportError) 还是扫描件"""
+    for module in ("pdfplumber", "fitz"):
+        try:
+            __import__(module)
+            return FAIL_SCANNED_PDF
+        except ImportError:
+            continue
+    return FAIL_MISSING_DEPENDENCY
+
+
+# ============ 缓存 ============
+
+class ExtractionCache:
+    """按文件 SHA-256 缓存提取结果, 每个结果一个 JSON 文件 (由主进程读写)"""
+
+    def __init__(self, cache_dir: Optional[str] = DEFAULT_CACHE_DIR):
+        self.dir = Path(cache_dir) if cache_dir else None
+        if self.dir is not None:
+            self.dir.mkdir(parents=True, exist_ok=True)
+
+    def _path(self, sha256: str) -> Path:
+        return self.dir / sha256[:2] / f"{sha256}.v{EXTRACTOR_VERSION}.json"
+
+    def get(self, sha256: str) -> Optional[Dict[str, Any]]:
+        if self.dir is None:
+            return None
+        try:
+            return json.loads(self._path(sha256).read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            return None
+
+    def put(self, sha256: str, result: FileResult):
+        # 缺依赖 / 子进程崩溃是环境问题, 不缓存, 修复后重跑即可
+        if self.dir is None or result.failure in (FAIL_MISSING_DEPENDENCY, FAIL_WORKER_CRASH):
+            return
+        path = self._path(sha256)
+        path.parent.mkdir(exist_ok=True)
+        payload = {"category": result.category, "ok": result.ok, "data": result.data,
+                   "failure": result.failure, "error": result.error}
+        tmp = path.with_suffix(".tmp")
+        tmp.write_text(json.dumps(payload, ensure_ascii=False, default=str), encoding="utf-8")
+        os.replace(tmp, path)
+
+
+# ============ 写库 ============
+
+def _recorded_at(mtime: float) -> datetime:
+    return datetime.fromtimestamp(mtime, timezone.utc).replace(tzinfo=None)
+
+
+def build_row(report: ReportFile, result: FileResult, user_id: int) -> Dict[str, Any]:
+    data_type, primary, unit = DATA_TYPES[report.category]
+    value = result.data.get(primary)
+    return {
+        "user_id": user_id,
+        "data_type": data_type,
+        "value": value if isinstance(value, (int, float)) else None,
+        "values": result.data,
+        "unit": unit,
+        "data_metadata": {"file": os.path.basename(report.path), "sha256": report.sha256,
+                          "category": report.category, "extractor_version": EXTRACTOR_VERSION},
+        "source": SOURCE,
+        "device_id": report.device_id,
+        "recorded_at": _recorded_at(report.mtime),
+    }
+
+
+class HealthDataWriter:
+    """把提取结果分块批量写入 health_data; 每块一次设备映射查询 + 一次去重查询 + 一次批量插入
+
+    去重键为 (device_id, 文件内容 SHA-256): 同一份报告重跑 / 被复制或 touch 后都不会重复入库。
+    """
+
+    def __init__(self, session_factory: Optional[Callable] = None, chunk_size: int = DEFAULT_CHUNK_SIZE):
+        if session_factory is None:
+            from core.database import SessionLocal
+            session_factory = SessionLocal
+        self.session_factory = session_factory
+        self.chunk_size = chunk_size
+        self._pending: List[tuple] = []
+        self._user_ids: Dict[str, Optional[int]] = {}
+
+    def add(self, report: ReportFile, result: FileResult, batch: BatchReport):
+        self._pending.append((report, result))
+        if len(self._pending) >= self.chunk_size:
+            self.flush(batch)
+
+    def flush(self, batch: BatchReport):
+        pending, self._pending = self._pending, []
+        if not pending:
+            return
+        from core.models import HealthData, UserDevice
+
+        db = self.session_factory()
+        unmapped = set()
+        try:
+            unknown = {r.device_id for r, _ in pending} - self._user_ids.keys()
+            if unknown:
+                found = dict(
+                    db.query(UserDevice.device_id, UserDevice.user_id)
+                    .filter(UserDevice.device_id.in_(unknown)).all()
+                )
+                for device_id in unknown:
+                    self._user_ids[device_id] = found.get(device_id)
+
+            rows = []
+            for report, result in pending:
+                user_id = self._user_ids.get(report.device_id)
+                if user_id is None:
+                    batch.fail(FAIL_UNMAPPED_DEVICE, report.path)
+                    unmapped.add(report.path)
+                    continue
+                rows.append(build_row(report, result, user_id))
+
+            if rows:
+                sha256 = HealthData.data_metadata["sha256"].as_string()
+                existing = set(
+                    db.query(HealthData.device_id, sha256)
+                    .filter(
+                        HealthData.source == SOURCE,
+                        HealthData.device_id.in_({r["device_id"] for r in rows}),
+                        sha256.in_({r["data_metadata"]["sha256"] for r in rows}),
+                    ).all()
+                )
+                fresh, seen = [], set()
+                for row in rows:
+                    key = (row["device_id"], row["data_metadata"]["sha256"])
+                    if key in existing or key in seen:
+                        batch.rows_skipped_existing += 1
+                        continue
+                    seen.add(key)
+                    fresh.append(row)
+                if fresh:
+                    db.bulk_insert_mappings(HealthData, fresh)
+                db.commit()
+                batch.rows_written += len(fresh)
+        except Exception as e:
+            db.rollback()
+            failed = [report for report, _ in pending if report.path not in unmapped]
+            logger.error(f"[BatchExtract] 写库失败 ({len(failed)} 个文件): {e}")
+            # 已计入 unmapped_device 的文件不再重复计为 db_error
+            for report in failed:
+                batch.fail(FAIL_DB_ERROR, report.path)
+        finally:
+            db.close()
+
+
+# ============ 主流程 ============
+
+def _result_from_cache(report: ReportFile, cached: Dict[str, Any]) -> FileResult:
+    return FileResult(report.path, report.category, cached["ok"], cached.get("data") or {},
+                      cached.get("failure"), cached.get("error"))
+
+
+def run_batch(
+    root: str,
+    workers: Optional[int] = None,
+    cache: Optional[ExtractionCache] = None,
+    writer: Optional[HealthDataWriter] = None,
+    extractor: Callable[[str, str], FileResult] = extract_report_file,
+    files: Optional[Iterable[ReportFile]] = None,
+) -> BatchReport:
+    """
+    批量提取 root 目录树中的报告
+
+    Args:
+        root: 目录
+        workers: 进程数 (默认 CPU 数; 0 表示在当前进程内顺序执行)
+        cache: 结果缓存 (None 表示不缓存)
+        writer: 写库器 (None 表示只提取不写库)
+        extractor: 单文件提取函数, 须为模块级函数以便跨进程传递
+        files: 指定文件列表 (默认扫描 root)
+    """
+    t0 = time.perf_counter()
+    batch = BatchReport()
+    reports = list(files if files is not None else scan_directory(root))
+    batch.files_total = len(reports)
+
+    todo: List[ReportFile] = []
+    for report in reports:
+        try:
+            report.sha256 = report.sha256 or file_sha256(report.path)
+        except OSError as e:
+            batch.fail(FAIL_UNREADABLE, report.path)
+            logger.warning(f"[BatchExtract] 无法读取 {report.path}: {e}")
+            continue
+        cached = cache.get(report.sha256) if cache else None
+        if cached is not None:
+            batch.files_cached += 1
+            _collect(report, _result_from_cache(report, cached), batch, writer)
+        else:
+            todo.append(report)
+
+    batch.files_extracted = len(todo)
+
+    def done(report: ReportFile, result: FileResult):
+        if cache:
+            cache.put(report.sha256, result)
+        _collect(report, result, batch, writer)
+
+    if todo and workers == 0:
+        for report in todo:
+            done(report, extractor(report.path, report.category))
+    elif todo:
+        n_workers = min(workers or os.cpu_count() or 1, len(todo))
+        with ProcessPoolExecutor(max_workers=n_workers) as pool:
+            futures = {pool.submit(extractor, r.path, r.category): r for r in todo}
+            for future in as_completed(futures):
+                report = futures[future]
+                try:
+                    result = future.result()
+                except BrokenProcessPool as e:
+                    result = FileResult(report.path, report.category, False,
+                                        failure=FAIL_WORKER_CRASH, error=str(e))
+                done(report, result)
+
+    if writer is not None:
+        writer.flush(batch)
+    batch.elapsed = time.perf_counter() - t0
+    logger.info(f"[BatchExtract] {root}: " + batch.summary().replace("\n", " | "))
+    return batch
+
+
+def _collect(report: ReportFile, result: FileResult, batch: BatchReport, writer: Optional[HealthDataWriter]):
+    if not result.ok:
+        batch.fail(result.failure or FAIL_NO_DATA, report.path)
+        return
+    batch.files_ok += 1
+    if writer is not None:
+        writer.add(report, result, batch)
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="健康报告批量提取 (Excel / PDF → health_data)")
+    parser.add_argument("root", help="报告目录 (递归扫描)")
+    parser.add_argument("--workers", type=int, default=None, help="进程数, 0 = 当前进程顺序执行")
+    parser.add_argument("--cache-dir", default=DEFAULT_CACHE_DIR)
+    parser.add_argument("--no-cache", action="store_true")
+    parser.add_argument("--no-db", action="store_true", help="只提取, 不写库")
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE)
+    parser.add_argument("--json", action="store_true", help="以 JSON 输出报告")
+    args = parser.parse_args()
+
+    report = run_batch(
+        args.root,
+        workers=args.workers,
+        cache=None if args.no_cache else ExtractionCache(args.cache_dir),
+        writer=None if args.no_db else HealthDataWriter(chunk_size=args.chunk_size),
+    )
+    print(json.dumps(report.as_dict(), ensure_ascii=False, indent=2) if args.json else report.summary())
@@ -0,0 +1,440 @@
+"""
+V007 Step 06 / Phase A
+Budget Ledger: 预算台账的实时计数层
+
+CostController 每次 LLM 调用都读-改-写 cost_budget_ledger 并提交, 并发下会丢更新,
+且每次补全多一次往返 + commit。BudgetLedger 把实时用量放在原子存储里:
+
+- 配置 REDIS_URL 时, 计数放在 Redis 哈希 (Lua 脚本一次完成初始化 + HINCRBY),
+  多 worker 共享同一份实时用量; 否则使用带锁的进程内计数
+- check_budget 读取短 TTL 的本地状态缓存 (默认 2s), 命中时不访问数据库和 Redis;
+  预算行元数据 (id / 上限 / 超额策略) 缓存 30s, 包括"未配置预算"的负缓存
+- 后台线程定期把聚合后的增量写回数据库:
+  UPDATE cost_budget_ledger SET used_tokens = used_tokens + :tok ...
+  写库失败时增量放回待刷队列, 下次重试
+"""
+
+import atexit
+import logging
+import os
+import threading
+import time
+from dataclasses import dataclass
+from datetime import date
+from typing import Callable, Dict, Optional, Tuple
+
+from sqlalchemy import text as sa_text
+from sqlalchemy.orm import Session
+
+logger = logging.getLogger(__name__)
+
+_FLUSH_SQL = sa_text(
+    "UPDATE cost_budget_ledger "
+    "SET used_tokens = COALESCE(used_tokens, 0) + :tok, "
+    "used_cost_cny = COALESCE(used_cost_cny, 0) + :cost, "
+    "updated_at = CURRENT_TIMESTAMP "
+    "WHERE id = :id"
+)
+
+# KEYS[1] = 实时用量哈希, KEYS[2] = 待刷增量哈希
+# ARGV = 增量 tokens, 增量 cost, 库内 tokens, 库内 cost, 键 TTL (s)
+# 实时用量键不存在时以 "库内值 + 未刷增量" 初始化; 返回 {tokens, cost}
+_RECORD_SCRIPT = """
+if redis.call('EXISTS', KEYS[1]) == 0 then
+  local ptok = tonumber(redis.call('HGET', KEYS[2], 'tok') or '0')
+  local pcost = tonumber(redis.call('HGET', KEYS[2], 'cost') or '0')
+  redis.call('HSET', KEYS[1], 'tok', tonumber(ARGV[3]) + ptok, 'cost', tonumber(ARGV[4]) + pcost)
+end
+local tok = redis.call('HINCRBY', KEYS[1], 'tok', ARGV[1])
+local cost = redis.call('HINCRBYFLOAT', KEYS[1], 'cost', ARGV[2])
+if tonumber(ARGV[1]) ~= 0 or tonumber(ARGV[2]) ~= 0 then
+  redis.call('HINCRBY', KEYS[2], 'tok', ARGV[1])
+  redis.call('HINCRBYFLOAT', KEYS[2], 'cost', ARGV[2])
+end
+redis.call('EXPIRE', KEYS[1], ARGV[5])
+return {tok, cost}
+"""
+
+# 原子取走待刷增量: 返回 {tokens, cost}
+_TAKE_SCRIPT = """
+local v = redis.call('HMGET', KEYS[1], 'tok', 'cost')
+redis.call('DEL', KEYS[1])
+return {v[1] or '0', v[2] or '0'}
+"""
+
+
+@dataclass
+class BudgetStatus:
+    """某个预算行的当前状态 (实时用量)"""
+    ledger_id: int
+    max_tokens: int
+    used_tokens: int
+    used_cost_cny: float
+    overflow_action: Optional[str]
+
+    @property
+    def remaining_tokens(self) -> int:
+        return max(0, (self.max_tokens or 0) - (self.used_tokens or 0))
+
+    @property
+    def usage_ratio(self) -> float:
+        if not self.max_tokens:
+            return 1.0
+        return (self.used_tokens or 0) / self.max_tokens
+
+
+def find_active_budget(db: Session, tenant_id: str, user_id: Optional[int]):
+    """当前生效的预算行: 优先用户预算, 否则租户级预算 (user_id 为空)"""
+    from core.models import CostBudgetLedger
+    today = date.today()
+
+    query = db.query(CostBudgetLedger).filter(
+        CostBudgetLedger.tenant_id == tenant_id,
+        CostBudgetLedger.is_active.is_(True),
+        CostBudgetLedger.period_start <= today,
+        CostBudgetLedger.period_end >= today,
+    )
+
+    if user_id:
+        user_budget = query.filter(CostBudgetLedger.user_id == user_id).first()
+        if user_budget:
+            return user_budget
+
+    return query.filter(CostBudgetLedger.user_id.is_(None)).first()
+
+
+class BudgetLedger:
+    """
+    预算实时计数 + 定期回写
+
+    - record(): 原子累加实时用量与待刷增量, 不访问数据库 (预算元数据缓存命中时)
+    - status(): 短 TTL 缓存的预算状态, 供 check_budget 使用
+    - flush(): 把各预算行的聚合增量用 used = used + :delta 写回
+    - live_usage(): 报表用, 库内值叠加尚未落库的增量
+    """
+
+    def __init__(
+        self,
+        session_factory: Optional[Callable[[], Session]] = None,
+        redis_client=None,
+        flush_interval: float = 5.0,
+        status_ttl: float = 2.0,
+        meta_ttl: float = 30.0,
+        key_ttl: int = 3 * 86400,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self._session_factory = session_factory
+        # None: 按 REDIS_URL 自动连接; False: 强制进程内计数
+        self._redis = redis_client
+        self.flush_interval = flush_interval
+        self.status_ttl = status_ttl
+        self.meta_ttl = meta_ttl
+        self.key_ttl = key_ttl
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._meta: Dict[tuple, Tuple[float, Optional[dict]]] = {}
+        self._status: Dict[tuple, Tuple[float, Optional[BudgetStatus]]] = {}
+        # 进程内计数: ledger_id -> [库内基线 tokens, cost, 刷新序号]
+        self._base: Dict[int, list] = {}
+        self._pending: Dict[int, list] = {}
+        self._inflight: Dict[int, list] = {}
+        self._known: set = set()
+        self._record_script = None
+        self._take_script = None
+        self._cond = threading.Condition(self._lock)
+        self._flush_lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._stopped = False
+        self.stats = {"recorded": 0, "flushed_rows": 0, "flush_errors": 0, "redis_errors": 0}
+
+    # ── Redis ──
+
+    def _get_redis(self):
+        if self._redis is None:
+            self._redis = False
+            redis_url = os.getenv("REDIS_URL")
+            if redis_url:
+                try:
+                    import redis
+                    self._redis = redis.from_url(redis_url, decode_responses=True)
+                    self._record_script = self._redis.register_script(_RECORD_SCRIPT)
+                    self._take_script = self._redis.register_script(_TAKE_SCRIPT)
+                except Exception as e:
+                    logger.warning(f"BudgetLedger: Redis 不可用 ({e}), 使用进程内计数")
+                    self._redis = False
+        elif self._redis and self._record_script is None:
+            self._record_script = self._redis.register_script(_RECORD_SCRIPT)
+            self._take_script = self._redis.register_script(_TAKE_SCRIPT)
+        return self._redis or None
+
+    @staticmethod
+    def _keys(ledger_id: int) -> list:
+        return [f"budget:used:{ledger_id}", f"budget:pending:{ledger_id}"]
+
+    # ── 元数据 ──
+
+    def _get_meta(self, db: Session, tenant_id: str, user_id: Optional[int]) -> Optional[dict]:
+        key = (tenant_id, user_id or None, date.today())
+        now = self._clock()
+        with self._lock:
+            cached = self._meta.get(key)
+            if cached and cached[0] > now:
+                return cached[1]
+            seqs = {lid: b[2] for lid, b in self._base.items()}
+
+        row = find_active_budget(db, tenant_id, user_id)
+        meta = None
+        if row is not None:
+            meta = {
+                "ledger_id": row.id,
+                "max_tokens": row.max_tokens,
+                "overflow_action": row.overflow_action,
+                "db_tokens": int(row.used_tokens or 0),
+                "db_cost": float(row.used_cost_cny or 0),
+            }
+        with self._lock:
+            self._meta[key] = (now + self.meta_ttl, meta)
+            if meta is not None:
+                lid = meta["ledger_id"]
+                base = self._base.get(lid)
+                if base is None:
+                    self._base[lid] = [meta["db_tokens"], meta["db_cost"], 0]
+                elif lid in seqs and base[2] == seqs[lid] and lid not in self._inflight:
+                    # 读库期间没有本进程的回写, 可用库内值 (含其他 worker 的用量) 校准基线
+                    base[0], base[1] = meta["db_tokens"], meta["db_cost"]
+        return meta
+
+    # ── 计数 ──
+
+    def _add(self, meta: dict, tokens: int, cost: float) -> Tuple[int, float]:
+        """累加并返回实时用量"""
+        lid = meta["ledger_id"]
+        r = self._get_redis()
+        if r is not None:
+            try:
+                tok, total_cost = self._record_script(
+                    keys=self._keys(lid),
+                    args=[int(tokens), repr(float(cost)), meta["db_tokens"], repr(meta["db_cost"]), self.key_ttl],
+                )
+                with self._lock:
+                    self._known.add(lid)
+                return int(tok), float(total_cost)
+            except Exception as e:
+                self.stats["redis_errors"] += 1
+                logger.warning(f"BudgetLedger: Redis 计数失败 ({e}), 本次记入进程内计数")
+
+        with self._lock:
+            self._known.add(lid)
+            base = self._base.setdefault(lid, [meta["db_tokens"], meta["db_cost"], 0])
+            pending = self._pending.setdefault(lid, [0, 0.0])
+            pending[0] += tokens
+            pending[1] += cost
+            inflight = self._inflight.get(lid, (0, 0.0))
+            return base[0] + pending[0] + inflight[0], base[1] + pending[1] + inflight[1]
+
+    def status(self, db: Session, tenant_id: str, user_id: Optional[int]) -> Optional[BudgetStatus]:
+        """当前预算状态; None 表示未配置预算"""
+        key = (tenant_id, user_id or None)
+        now = self._clock()
+        with self._lock:
+            cached = self._status.get(key)
+            if cached and cached[0] > now:
+                return cached[1]
+
+        meta = self._get_meta(db, tenant_id, user_id)
+        result = None
+        if meta is not None:
+            tok, cost = self._add(meta, 0, 0.0)
+            result = self._make_status(meta, tok, cost)
+        with self._lock:
+            self._status[key] = (now + self.status_ttl, result)
+        return result
+
+    def record(self, db: Session, tenant_id: str, user_id: Optional[int],
+               tokens: int, cost: float) -> Optional[BudgetStatus]:
+        """记录一次用量; 返回记录后的预算状态, 未配置预算时返回 None"""
+        meta = self._get_meta(db, tenant_id, user_id)
+        if meta is None:
+            return None
+        tok, total_cost = self._add(meta, tokens, cost)
+        result = self._make_status(meta, tok, total_cost)
+        key = (tenant_id, user_id or None)
+        with self._lock:
+            self.stats["recorded"] += 1
+            cached = self._status.get(key)
+            if cached and cached[1] is not None and cached[1].ledger_id == result.ledger_id:
+                if result.used_tokens >= cached[1].used_tokens:
+                    self._status[key] = (cached[0], result)
+        self._ensure_started()
+        return result
+
+    @staticmethod
+    def _make_status(meta: dict, tokens: int, cost: float) -> BudgetStatus:
+        return BudgetStatus(
+            ledger_id=meta["ledger_id"], max_tokens=meta["max_tokens"],
+            used_tokens=tokens, used_cost_cny=cost, overflow_action=meta["overflow_action"],
+        )
+
+    def live_usage(self, ledger_id: int, db_tokens: int, db_cost: float) -> Tuple[int, float]:
+        """报表用: 库内值叠加尚未落库的增量"""
+        r = self._get_redis()
+        if r is not None:
+            try:
+                tok, cost = r.hmget(self._keys(ledger_id)[0], "tok", "cost")
+                if tok is not None:
+                    return int(tok), float(cost or 0)
+            except Exception as e:
+                logger.warning(f"BudgetLedger: 读取 Redis 实时用量失败 ({e})")
+        with self._lock:
+            pending = self._pending.get(ledger_id, (0, 0.0))
+            inflight = self._inflight.get(ledger_id, (0, 0.0))
+            return (db_tokens + pending[0] + inflight[0], db_cost + pending[1] + inflight[1])
+
+    # ── 回写 ──
+
+    def _take_deltas(self) -> Dict[int, list]:
+        deltas: Dict[int, list] = {}
+        with self._lock:
+            known = list(self._known)
+            for lid, (tok, cost) in self._pending.items():
+                if tok or cost:
+                    deltas[lid] = [tok, cost]
+            self._pending.clear()
+            for lid, d in deltas.items():
+                self._inflight[lid] = list(d)
+
+        r = self._get_redis()
+        if r is not None:
+            for lid in known:
+                try:
+                    tok, cost = self._take_script(keys=[self._keys(lid)[1]])
+                except Exception as e:
+                    self.stats["redis_errors"] += 1
+                    logger.warning(f"BudgetLedger: 读取 Redis 待刷增量失败 ({e})")
+                    continue
+                tok, cost = int(tok), float(cost)
+                if tok or cost:
+                    d = deltas.setdefault(lid, [0, 0.0])
+                    d[0] += tok
+                    d[1] += cost
+        return deltas
+
+    def _restore(self, deltas: Dict[int, list]):
+        """写库失败: 增量放回待刷队列"""
+        r = self._get_redis()
+        with self._lock:
+            local = {lid: self._inflight.pop(lid) for lid in list(self._inflight)}
+        for lid, (tok, cost) in deltas.items():
+            ltok, lcost = local.get(lid, (0, 0.0))
+            rtok, rcost = tok - ltok, cost - lcost
+            if r is not None and (rtok or rcost):
+                try:
+                    key = self._keys(lid)[1]
+                    r.hincrby(key, "tok", rtok)
+                    r.hincrbyfloat(key, "cost", rcost)
+                    rtok, rcost = 0, 0.0
+                except Exception as e:
+                    logger.error(f"BudgetLedger: 增量放回 Redis 失败 ({e}), 转入进程内队列")
+            with self._lock:
+                pending = self._pending.setdefault(lid, [0, 0.0])
+                pending[0] += ltok + rtok
+                pending[1] += lcost + rcost
+
+    def flush(self) -> int:
+        """把聚合增量写回 cost_budget_ledger, 返回更新的预算行数"""
+        with self._flush_lock:
+            return self._flush()
+
+    def _flush(self) -> int:
+        deltas = self._take_deltas()
+        if not deltas:
+            return 0
+
+        factory = self._session_factory
+        if factory is None:
+            from core.database import SessionLocal
+            factory = SessionLocal
+        db = None
+        try:
+            db = factory()
+            db.execute(_FLUSH_SQL, [
+                {"id": lid, "tok": int(tok), "cost": float(cost)} for lid, (tok, cost) in deltas.items()
+            ])
+            db.commit()
+        except Exception as e:
+            if db is not None:
+                db.rollback()
+            self._restore(deltas)
+            with self._lock:
+                self.stats["flush_errors"] += 1
+            logger.error(f"BudgetLedger: 回写 {len(deltas)} 条预算增量失败, 稍后重试: {e}")
+            return 0
+        finally:
+            if db is not None:
+                db.close()
+
+        with self._lock:
+            for lid, (tok, cost) in deltas.items():
+                local = self._inflight.pop(lid, None)
+                base = self._base.get(lid)
+                if local is not None and base is not None:
+                    base[0] += local[0]
+                    base[1] += local[1]
+                    base[2] += 1
+            self.stats["flushed_rows"] += len(deltas)
+        return len(deltas)
+
+    def _ensure_started(self):
+        if self.flush_interval <= 0 or (self._thread is not None and self._thread.is_alive()):
+            return
+        with self._cond:
+            if self._stopped or (self._thread is not None and self._thread.is_alive()):
+                return
+            self._thread = threading.Thread(target=self._run, name="budget-ledger-flush", daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                if not self._stopped:
+                    self._cond.wait(self.flush_interval)
+                if self._stopped:
+                    return
+            try:
+                self.flush()
+            except Exception as e:
+                logger.error(f"BudgetLedger flush loop error: {e}")
+
+    def shutdown(self, timeout: float = 5.0):
+        """停止后台线程并刷出剩余增量"""
+        with self._cond:
+            self._stopped = True
+            self._cond.notify_all()
+        if self._thread is not None:
+            self._thread.join(timeout)
+        self.flush()
+
+
+_default_ledger: Optional[BudgetLedger] = None
+_default_ledger_lock = threading.Lock()
+
+
+def get_budget_ledger() -> BudgetLedger:
+    """进程级共享台账 (首次调用时创建, 退出时自动 flush)"""
+    global _default_ledger
+    if _default_ledger is None:
+        with _default_ledger_lock:
+            if _default_ledger is None:
+                _default_ledger = BudgetLedger(
+                    flush_interval=float(os.getenv("BUDGET_FLUSH_SECONDS", "5")),
+                    status_ttl=float(os.getenv("BUDGET_STATUS_TTL", "2")),
+                    meta_ttl=float(os.getenv("BUDGET_META_TTL", "30")),
+                )
+                atexit.register(_default_ledger.shutdown)
+    return _default_ledger
+
+
+def shutdown_budget_ledger():
+    """应用关闭时调用 (lifespan)"""
+    if _default_ledger is not None:
+        _default_ledger.shutdown()
@@ -1,14 +1,18 @@
 """
 V007 Step 06 / Phase A
 Cost Controller: LLM调用预算管理
+
+实时用量由 BudgetLedger 原子计数并定期回写 cost_budget_ledger,
+check_budget / record_usage 不在请求路径上读-改-写预算行。
 """
 
 import logging
-from datetime import date
 from typing import Optional, Dict, Any
 
 from sqlalchemy.orm import Session
 
+from core.budget_ledger import BudgetLedger, BudgetStatus, find_active_budget, get_budget_ledger
+
 logger = logging.getLogger(__name__)
 
 MODEL_COST_TABLE = {
@@ -29,12 +33,13 @@ DOWNGRADE_PATH = [
 
 
 class CostController:
-    def __init__(self, db_session: Session):
+    def __init__(self, db_session: Session, ledger: Optional[BudgetLedger] = None):
         self._db = db_session
+        self._ledger = ledger or get_budget_ledger()
 
     def check_budget(self, tenant_id: str, user_id: Optional[int],
                      requested_model: str, estimated_tokens: int = 1000) -> Dict[str, Any]:
-        budget = self._get_active_budget(tenant_id, user_id)
+        budget = self._ledger.status(self._db, tenant_id, user_id)
 
         if not budget:
             return {"allowed": True, "model": requested_model, "downgraded": False,
@@ -75,12 +80,8 @@ class CostController:
         total_tokens = input_tokens + output_tokens
         cost = self._calculate_cost(model, input_tokens, output_tokens)
 
-        budget = self._get_active_budget(tenant_id, user_id)
+        budget = self._ledger.record(self._db, tenant_id, user_id, total_tokens, cost)
         if budget:
-            budget.used_tokens = (budget.used_tokens or 0) + total_tokens
-            budget.used_cost_cny = float(budget.used_cost_cny or 0) + cost
-            self._db.commit()
-
             return {"tokens_used": total_tokens, "cost_cny": round(cost, 4),
                     "new_ratio": round(budget.usage_ratio, 4),
                     "remaining_tokens": budget.remaining_tokens}
@@ -93,7 +94,7 @@ class CostController:
 
         query = self._db.query(CostBudgetLedger).filter(
             CostBudgetLedger.tenant_id == tenant_id,
-            CostBudgetLedger.is_active == True,
+            CostBudgetLedger.is_active.is_(True),
         )
         if user_id:
             query = query.filter(CostBudgetLedger.user_id == user_id)
@@ -103,19 +104,24 @@ class CostController:
                   "budgets": [], "total_used_tokens": 0, "total_cost_cny": 0.0}
 
         for b in budgets:
+            # 叠加尚未回写的实时用量
+            used_tokens, used_cost = self._ledger.live_usage(
+                b.id, int(b.used_tokens or 0), float(b.used_cost_cny or 0))
+            live = BudgetStatus(ledger_id=b.id, max_tokens=b.max_tokens, used_tokens=used_tokens,
+                                used_cost_cny=used_cost, overflow_action=b.overflow_action)
             report['budgets'].append({
                 "type": b.budget_type,
                 "max_tokens": b.max_tokens,
-                "used_tokens": b.used_tokens,
-                "remaining_tokens": b.remaining_tokens,
-                "usage_ratio": round(b.usage_ratio, 4),
+                "used_tokens": used_tokens,
+                "remaining_tokens": live.remaining_tokens,
+                "usage_ratio": round(live.usage_ratio, 4),
                 "max_cost_cny": float(b.max_cost_cny) if b.max_cost_cny else None,
-                "used_cost_cny": float(b.used_cost_cny) if b.used_cost_cny else 0,
+                "used_cost_cny": used_cost,
                 "period": f"{b.period_start} ~ {b.period_end}",
                 "overflow_action": b.overflow_action,
             })
-            report['total_used_tokens'] += b.used_tokens or 0
-            report['total_cost_cny'] += float(b.used_cost_cny) if b.used_cost_cny else 0
+            report['total_used_tokens'] += used_tokens
+            report['total_cost_cny'] += used_cost
 
         report['total_cost_cny'] = round(report['total_cost_cny'], 4)
         return report
@@ -133,22 +139,7 @@ class CostController:
         }
 
     def _get_active_budget(self, tenant_id: str, user_id: Optional[int]):
-        from core.models import CostBudgetLedger
-        today = date.today()
-
-        query = self._db.query(CostBudgetLedger).filter(
-            CostBudgetLedger.tenant_id == tenant_id,
-            CostBudgetLedger.is_active == True,
-            CostBudgetLedger.period_start <= today,
-            CostBudgetLedger.period_end >= today,
-        )
-
-        if user_id:
-            user_budget = query.filter(CostBudgetLedger.user_id == user_id).first()
-            if user_budget:
-                return user_budget
-
-        return query.filter(CostBudgetLedger.user_id == None).first()
+        return find_active_budget(self._db, tenant_id, user_id)
 
     @staticmethod
     def _calculate_cost(model: str, input_tokens: int, output_tokens: int) -> float:
@@ -15,11 +15,12 @@ import sys
 import io
 import os
 from pathlib import Path
-from typing import Dict, Any, Optional, List, Tuple
+from typing import TYPE_CHECKING, Dict, Any, Optional, List, Tuple
 from dataclasses import dataclass, field
 from datetime import datetime
 
-import pandas as pd
+if TYPE_CHECKING:  # pandas 导入较重, 仅在解析 Excel 时加载
+    import pandas as pd
 
 # Windows 控制台编码修复（仅在直接运行时执行，避免重复包装）
 def _fix_windows_encoding():
@@ -57,8 +58,8 @@ class ExtractionResult:
     warnings: List[str] = field(default_factory=list)
 
     # 原始数据（用于调试）
-    raw_excel_physio: Optional[pd.DataFrame] = None
-    raw_excel_psych: Optional[pd.DataFrame] = None
+    raw_excel_physio: Optional["pd.DataFrame"] = None
+    raw_excel_psych: Optional["pd.DataFrame"] = None
     raw_pdf_text: str = ""
 
 
@@ -133,6 +134,24 @@ EXCEL_COLUMN_MAP = {
 }
 
 
+def classify_report_file(name: str) -> Optional[str]:
+    """
+    按文件名判断报告类别
+
+    Returns:
+        'physio_excel' / 'psych_excel' / 'pdf'，无法识别返回 None
+    """
+    if name.endswith('.xlsx'):
+        if '生理测评' in name:
+            return "physio_excel"
+        if '心理测评' in name:
+            return "psych_excel"
+    elif name.endswith('.pdf'):
+        if '心理健康' in name or '测评报告' in name:
+            return "pdf"
+    return None
+
+
 def find_matching_files(data_dir: str, user_id: str = None) -> Dict[str, List[Path]]:
     """
     在数据目录中查找匹配的 Excel 和 PDF 文件
@@ -164,14 +183,9 @@ def find_matching_files(data_dir: str, user_id: str = None) -> Dict[str, List[Pa
         if user_id and user_id not in name:
             continue
 
-        if name.endswith('.xlsx'):
-            if '生理测评' in name:
-                result["physio_excel"].append(file)
-            elif '心理测评' in name:
-                result["psych_excel"].append(file)
-        elif name.endswith('.pdf'):
-            if '心理健康' in name or '测评报告' in name:
-                result["pdf"].append(file)
+        category = classify_report_file(name)
+        if category:
+            result[category].append(file)
 
     # 按修改时间排序，最新的在前
     for key in result:
@@ -199,6 +213,10 @@ def _clean_column_name(col_name: str) -> str:
     return cleaned
 
 
+# 清洗后的列名映射（模块加载时构建一次）
+_CLEANED_COLUMN_MAP = {_clean_column_name(k): v for k, v in EXCEL_COLUMN_MAP.items()}
+
+
 def _get_sheet_count(excel_path: str) -> int:
     """
     使用 openpyxl 获取 Sheet 数量
@@ -219,6 +237,27 @@ def _get_sheet_count(excel_path: str) -> int:
         return 1
 
 
+# Sheet 名优先级关键词（生理测评）
+SHEET_PRIORITY_KEYWORDS = [
+    ['生理', '测评'],
+    ['生理'],
+    ['HRV'],
+    ['physio'],
+    ['心率', '变异'],
+    ['数据'],
+]
+
+
+def _select_sheet_index(sheet_names: List[str]) -> int:
+    """按优先级关键词选择 Sheet 索引，没有匹配返回 0"""
+    for keywords in SHEET_PRIORITY_KEYWORDS:
+        for idx, sheet in enumerate(sheet_names):
+            sheet_lower = sheet.lower()
+            if all(kw.lower() in sheet_lower for kw in keywords):
+                return idx
+    return 0
+
+
 def _find_best_sheet_index(excel_path: str) -> Tuple[int, List[str]]:
     """
     使用 openpyxl 查找最佳 Sheet 索引
@@ -237,39 +276,19 @@ def _find_best_sheet_index(excel_path: str) -> Tuple[int, List[str]]:
         sheet_names = wb.sheetnames
         wb.close()
 
-        if not sheet_names:
-            return 0, []
-
-        # 优先级匹配关键词
-        priority_keywords = [
-            ['生理', '测评'],
-            ['生理'],
-            ['HRV'],
-            ['physio'],
-            ['心率', '变异'],
-            ['数据'],
-        ]
-
-        for keywords in priority_keywords:
-            for idx, sheet in enumerate(sheet_names):
-                sheet_lower = sheet.lower()
-                if all(kw.lower() in sheet_lower for kw in keywords):
-                    return idx, sheet_names
-
-        # 如果没有匹配，返回第一个 Sheet（索引 0）
-        return 0, sheet_names
+        return _select_sheet_index(sheet_names), sheet_names
 
     except Exception as e:
         print(f"[警告] 读取 Sheet 列表失败: {e}")
         return 0, []
 
 
-def extract_from_excel_physio(excel_path: str) -> Tuple[Dict[str, Any], pd.DataFrame]:
+def extract_from_excel_physio(excel_path: str) -> Tuple[Dict[str, Any], "pd.DataFrame"]:
     """
     从生理测评 Excel 文件中提取数据
 
     改进：
-    1. 使用 openpyxl 作为引擎
+    1. 使用 openpyxl 作为引擎，工作簿只打开一次（Sheet 列表 / 目标 Sheet / 回退 Sheet 共用）
     2. 通过 Sheet 索引加载数据（避免编码问题）
     3. 清洗列名（去掉空格和换行符）
 
@@ -279,23 +298,35 @@ def extract_from_excel_physio(excel_path: str) -> Tuple[Dict[str, Any], pd.DataF
     Returns:
         (提取的数据字典, 原始 DataFrame)
     """
+    import pandas as pd
+
     try:
-        # 使用 openpyxl 查找最佳 Sheet 索引
-        target_idx, all_sheets = _find_best_sheet_index(excel_path)
+        return read_physio_workbook(excel_path)
+    except Exception as e:
+        print(f"[错误] 读取生理测评 Excel 失败: {e}")
+        return {}, pd.DataFrame()
+
+
+def read_physio_workbook(excel_path: str, verbose: bool = True) -> Tuple[Dict[str, Any], "pd.DataFrame"]:
+    """
+    extract_from_excel_physio 的实现：文件损坏 / 无法读取时抛出异常（批量模式据此区分失败类别）
+    """
+    import pandas as pd
+
+    log = print if verbose else (lambda *args, **kwargs: None)
 
+    with pd.ExcelFile(excel_path, engine='openpyxl') as xls:
+        all_sheets = list(xls.sheet_names)
         if not all_sheets:
-            print(f"[警告] Excel 文件中没有找到任何 Sheet")
+            log(f"[警告] Excel 文件中没有找到任何 Sheet")
             return {}, pd.DataFrame()
+        target_idx = _select_sheet_index(all_sheets)
 
-        print(f"  [Sheet 匹配] 找到 {len(all_sheets)} 个 Sheet: {all_sheets}")
-        print(f"  [Sheet 匹配] 选择读取索引 {target_idx}: '{all_sheets[target_idx]}'")
+        log(f"  [Sheet 匹配] 找到 {len(all_sheets)} 个 Sheet: {all_sheets}")
+        log(f"  [Sheet 匹配] 选择读取索引 {target_idx}: '{all_sheets[target_idx]}'")
 
-        # 使用 openpyxl 引擎，通过索引加载
-        df = pd.read_excel(
-            excel_path,
-            sheet_name=target_idx,  # 使用索引而非名称
-            engine='openpyxl'
-        )
+        # 通过索引加载
+        df = xls.parse(target_idx)
 
         if df.empty:
             return {}, df
@@ -306,26 +337,26 @@ def extract_from_excel_physio(excel_path: str) -> Tuple[Dict[str, Any], pd.DataF
         df.columns = cleaned_columns
 
         # 打印列名映射（调试用）
-        print(f"  [列名清洗] 原始 -> 清洗后:")
+        log(f"  [列名清洗] 原始 -> 清洗后:")
         for orig, clean in zip(original_columns, cleaned_columns):
             if orig != clean:
-                print(f"    '{orig}' -> '{clean}'")
+                log(f"    '{orig}' -> '{clean}'")
 
         # 过滤掉全零行，获取有效数据
         numeric_cols = df.select_dtypes(include=['number']).columns
         if len(numeric_cols) == 0:
-            print(f"[警告] Sheet 索引 {target_idx} 中没有数值列")
+            log(f"[警告] Sheet 索引 {target_idx} 中没有数值列")
             return {}, df
 
         df_valid = df[df[numeric_cols].sum(axis=1) > 0]
 
         if df_valid.empty:
-            # 尝试读取其他 Sheet（通过索引）
+            # 尝试读取其他 Sheet（通过索引，复用已打开的工作簿）
             for other_idx in range(len(all_sheets)):
                 if other_idx == target_idx:
                     continue
-                print(f"  [回退] 尝试读取 Sheet 索引 {other_idx}: '{all_sheets[other_idx]}'")
-                df_other = pd.read_excel(excel_path, sheet_name=other_idx, engine='openpyxl')
+                log(f"  [回退] 尝试读取 Sheet 索引 {other_idx}: '{all_sheets[other_idx]}'")
+                df_other = xls.parse(other_idx)
                 # 清洗列名
                 df_other.columns = [_clean_column_name(col) for col in df_other.columns]
                 numeric_cols_other = df_other.select_dtypes(include=['number']).columns
@@ -334,38 +365,31 @@ def extract_from_excel_physio(excel_path: str) -> Tuple[Dict[str, Any], pd.DataF
                     if not df_valid_other.empty:
                         df = df_other
                         df_valid = df_valid_other
-                        print(f"  [回退] 成功从索引 {other_idx} 读取到数据")
+                        log(f"  [回退] 成功从索引 {other_idx} 读取到数据")
                         break
 
-        if df_valid.empty:
-            return {}, df
-
-        # 取最后 5 行的中位数
-        last_rows = df_valid.tail(5)
-
-        extracted = {}
+    if df_valid.empty:
+        return {}, df
 
-        # 构建清洗后的列名映射
-        cleaned_column_map = {_clean_column_name(k): v for k, v in EXCEL_COLUMN_MAP.items()}
+    # 取最后 5 行的中位数
+    last_rows = df_valid.tail(5)
 
-        for clean_col in df.columns:
-            if clean_col in cleaned_column_map:
-                std_name = cleaned_column_map[clean_col]
-                values = last_rows[clean_col].dropna()
-                if len(values) > 0:
-                    if values.dtype in ['int64', 'float64']:
-                        extracted[std_name] = round(float(values.median()), 2)
-                    else:
-                        extracted[std_name] = str(values.iloc[-1])
+    extracted = {}
 
-        return extracted, df
+    for clean_col in df.columns:
+        if clean_col in _CLEANED_COLUMN_MAP:
+            std_name = _CLEANED_COLUMN_MAP[clean_col]
+            values = last_rows[clean_col].dropna()
+            if len(values) > 0:
+                if values.dtype in ['int64', 'float64']:
+                    extracted[std_name] = round(float(values.median()), 2)
+                else:
+                    extracted[std_name] = str(values.iloc[-1])
 
-    except Exception as e:
-        print(f"[错误] 读取生理测评 Excel 失败: {e}")
-        return {}, pd.DataFrame()
+    return extracted, df
 
 
-def extract_from_excel_psych(excel_path: str) -> Tuple[Dict[str, Any], pd.DataFrame]:
+def extract_from_excel_psych(excel_path: str) -> Tuple[Dict[str, Any], "pd.DataFrame"]:
     """
     从心理测评 Excel 文件中提取数据
 
@@ -375,37 +399,45 @@ def extract_from_excel_psych(excel_path: str) -> Tuple[Dict[str, Any], pd.DataFr
     Returns:
         (提取的数据字典, 原始 DataFrame)
     """
+    import pandas as pd
+
     try:
-        df = pd.read_excel(excel_path)
+        return read_psych_workbook(excel_path)
+    except Exception as e:
+        print(f"[错误] 读取心理测评 Excel 失败: {e}")
+        return {}, pd.DataFrame()
 
-        if df.empty:
-            return {}, df
 
-        # 取最后一行数据
-        last_row = df.iloc[-1]
+def read_psych_workbook(excel_path: str) -> Tuple[Dict[str, Any], "pd.DataFrame"]:
+    """extract_from_excel_psych 的实现：无法读取时抛出异常"""
+    import pandas as pd
+
+    df = pd.read_excel(excel_path)
+
+    if df.empty:
+        return {}, df
+
+    # 取最后一行数据
+    last_row = df.iloc[-1]
 
-        extracted = {}
+    extracted = {}
 
-        for excel_col, std_name in EXCEL_COLUMN_MAP.items():
-            if excel_col in df.columns:
-                value = last_row[excel_col]
-                if pd.notna(value):
-                    if isinstance(value, (int, float)):
+    for excel_col, std_name in EXCEL_COLUMN_MAP.items():
+        if excel_col in df.columns:
+            value = last_row[excel_col]
+            if pd.notna(value):
+                if isinstance(value, (int, float)):
+                    extracted[std_name] = round(float(value), 2)
+                elif std_name in ['mood_state']:  # 保留文本字段
+                    extracted[std_name] = str(value)
+                else:
+                    # 尝试转换为数值
+                    try:
                         extracted[std_name] = round(float(value), 2)
-                    elif std_name in ['mood_state']:  # 保留文本字段
+                    except (ValueError, TypeError):
                         extracted[std_name] = str(value)
-                    else:
-                        # 尝试转换为数值
-                        try:
-                            extracted[std_name] = round(float(value), 2)
-                        except (ValueError, TypeError):
-                            extracted[std_name] = str(value)
-
-        return extracted, df
 
-    except Exception as e:
-        print(f"[错误] 读取心理测评 Excel 失败: {e}")
-        return {}, pd.DataFrame()
+    return extracted, df
 
 
 def _extract_value_after_anchor(text: str, anchor: str, search_range: int = 200) -> Optional[float]:
@@ -1,22 +1,239 @@
 """
 V007 Step 05 / Phase A
 Decision Trace: 决策追踪器
+
+record() 默认同步写库; PolicyEngine 使用 buffered=True, 经 DecisionTraceSink
+进入有界内存队列, 由后台线程按条数/时间批量 INSERT, 不占用请求的关键路径。
 """
 
+import atexit
 import logging
+import os
+import random
+import threading
+import time
 import uuid
-from typing import Optional, List, Dict, Any
+from collections import deque
+from types import SimpleNamespace
+from typing import Callable, Optional, List, Dict, Any
 
 from sqlalchemy.orm import Session
 
 logger = logging.getLogger(__name__)
 
 
+class DecisionTraceSink:
+    """
+    决策追踪缓冲写入器
+
+    - 有界队列 (capacity), 满 batch_size 条或每 flush_interval_ms 由后台线程批量插入
+    - 队列超过 high_watermark 后按剩余容量线性降采样, 满时丢弃新 trace
+    - 写入失败后按 flush_interval 指数退避 (上限 max_retry_interval_s) 再由后台线程重试
+    - 进程退出 (atexit) 或 shutdown() 时刷出剩余 trace
+    - pending() 供查询接口读取尚未落库的 trace
+    - created_at 统一取数据库 server_default now(), 与同步写入同一时钟
+    """
+
+    def __init__(
+        self,
+        session_factory: Optional[Callable[[], Session]] = None,
+        capacity: int = 10000,
+        batch_size: int = 200,
+        flush_interval_ms: int = 500,
+        high_watermark: float = 0.75,
+        max_retry_interval_s: float = 30.0,
+    ):
+        self._session_factory = session_factory
+        self.capacity = capacity
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval_ms / 1000.0
+        self.high_watermark = high_watermark
+        self.max_retry_interval = max_retry_interval_s
+        self._buffer: deque = deque()
+        # 正在写入的批次 (flush 可能被后台线程与 shutdown/调用方并发执行)
+        self._inflight: List[List[dict]] = []
+        self._failures = 0
+        self._retry_at = 0.0
+        self._cond = threading.Condition()
+        self._thread: Optional[threading.Thread] = None
+        self._stopped = False
+        self.stats = {"accepted": 0, "sampled_out": 0, "dropped": 0, "flushed": 0, "flush_errors": 0}
+
+    # ── 写入 ──
+
+    def submit(self, row: dict) -> bool:
+        """放入队列; 返回 False 表示因背压被采样丢弃"""
+        with self._cond:
+            size = len(self._buffer)
+            if size >= self.capacity:
+                self.stats["dropped"] += 1
+                return False
+            threshold = int(self.capacity * self.high_watermark)
+            if size >= threshold:
+                keep_ratio = (self.capacity - size) / max(self.capacity - threshold, 1)
+                if random.random() >= keep_ratio:
+                    self.stats["sampled_out"] += 1
+                    return False
+            self._buffer.append(row)
+            self.stats["accepted"] += 1
+            if len(self._buffer) >= self.batch_size:
+                self._cond.notify()
+        self._ensure_started()
+        return True
+
+    def _ensure_started(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._cond:
+            if self._stopped or (self._thread is not None and self._thread.is_alive()):
+                return
+            self._thread = threading.Thread(target=self._run, name="decision-trace-sink", daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._stopped:
+                    # 写入失败后的退避期内不重试, 即使队列已满一批
+                    delay = self._retry_at - time.monotonic()
+                    if delay > 0:
+                        self._cond.wait(delay)
+                        continue
+                    if len(self._buffer) < self.batch_size:
+                        self._cond.wait(self.flush_interval)
+                    break
+                if self._stopped:
+                    return  # 剩余 trace 由 shutdown() 刷出
+            self.flush()
+
+    def flush(self) -> int:
+        """把当前队列全部批量写入, 返回写入条数"""
+        written = 0
+        while True:
+            with self._cond:
+                if not self._buffer:
+                    return written
+                n = min(self.batch_size, len(self._buffer))
+                batch = [self._buffer.popleft() for _ in range(n)]
+                self._inflight.append(batch)
+            try:
+                self._bulk_insert(batch)
+                written += len(batch)
+                with self._cond:
+                    self.stats["flushed"] += len(batch)
+                    self._failures = 0
+                    self._retry_at = 0.0
+            except Exception as e:
+                with self._cond:
+                    self.stats["flush_errors"] += 1
+                    self._failures += 1
+                    backoff = min(self.flush_interval * 2 ** (self._failures - 1), self.max_retry_interval)
+                    self._retry_at = time.monotonic() + backoff
+                    # 放回队首等待下次重试, 超出容量的部分丢弃
+                    room = max(self.capacity - len(self._buffer), 0)
+                    self._buffer.extendleft(reversed(batch[:room]))
+                    self.stats["dropped"] += len(batch) - min(room, len(batch))
+                logger.error(
+                    f"DecisionTrace bulk insert failed ({len(batch)} traces, retry in {backoff:.1f}s): {e}")
+                return written
+            finally:
+                with self._cond:
+                    self._inflight = [b for b in self._inflight if b is not batch]
+
+    def _bulk_insert(self, rows: List[dict]):
+        from sqlalchemy import insert
+        from core.models import DecisionTrace
+
+        factory = self._session_factory
+        if factory is None:
+            from core.database import SessionLocal
+            factory = SessionLocal
+        db = factory()
+        try:
+            db.execute(insert(DecisionTrace), rows)
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+    def shutdown(self, timeout: float = 5.0):
+        """停止后台线程并刷出剩余 trace"""
+        with self._cond:
+            self._stopped = True
+            self._cond.notify_all()
+        if self._thread is not None:
+            self._thread.join(timeout)
+        self.flush()
+
+    # ── 读取 ──
+
+    def pending(self) -> List[dict]:
+        """尚未落库 (含正在写入) 的 trace, 新→旧"""
+        with self._cond:
+            rows = [row for batch in self._inflight for row in batch] + list(self._buffer)
+        return rows[::-1]
+
+
+_default_sink: Optional[DecisionTraceSink] = None
+_default_sink_lock = threading.Lock()
+
+
+def get_trace_sink() -> DecisionTraceSink:
+    """进程级共享 sink (首次调用时创建, 退出时自动 flush)"""
+    global _default_sink
+    if _default_sink is None:
+        with _default_sink_lock:
+            if _default_sink is None:
+                _default_sink = DecisionTraceSink(
+                    capacity=int(os.getenv("DECISION_TRACE_BUFFER", "10000")),
+                    batch_size=int(os.getenv("DECISION_TRACE_BATCH", "200")),
+                    flush_interval_ms=int(os.getenv("DECISION_TRACE_FLUSH_MS", "500")),
+                )
+                atexit.register(_default_sink.shutdown)
+    return _default_sink
+
+
+def shutdown_trace_sink():
+    """应用关闭时调用 (lifespan)"""
+    if _default_sink is not None:
+        _default_sink.shutdown()
+
+
 class DecisionTraceRecorder:
     """决策追踪记录器"""
 
-    def __init__(self, db_session: Session):
+    def __init__(self, db_session: Session, sink: Optional[DecisionTraceSink] = None,
+                 buffered: bool = False):
         self._db = db_session
+        if sink is None and buffered and os.getenv("DECISION_TRACE_BUFFERED", "1") != "0":
+            sink = get_trace_sink()
+        self._sink = sink
+
+    def _pending(self) -> List[SimpleNamespace]:
+        sink = self._sink or _default_sink
+        if sink is None:
+            return []
+        return [SimpleNamespace(created_at=None, **row) for row in sink.pending()]
+
+    @staticmethod
+    def _merge_recent(pending: List[Any], persisted: List[Any]) -> List[Any]:
+        """
+        合并未落库与已落库 trace, 按 id 去重, 新→旧
+
+        未落库 trace 的 created_at 在写入时才由数据库生成, 必然晚于已落库的行,
+        因此排在前面 (pending 本身已是新→旧), 不与应用时钟混排。
+        """
+        seen = set()
+        merged = []
+        for t in pending + persisted:
+            key = str(t.id)
+            if key in seen:
+                continue
+            seen.add(key)
+            merged.append(t)
+        return merged
 
     def record(
         self, event_id: str, user_id: int,
@@ -31,7 +248,7 @@ class DecisionTraceRecorder:
     ) -> str:
         from core.models import DecisionTrace
 
-        trace = DecisionTrace(
+        row = dict(
             id=uuid.uuid4(),
             event_id=event_id,
             user_id=user_id,
@@ -48,6 +265,13 @@ class DecisionTraceRecorder:
             latency_ms=latency_ms,
         )
 
+        if self._sink is not None:
+            # created_at 留给数据库 server_default, 与同步写入路径同一时钟
+            if not self._sink.submit(row):
+                logger.debug(f"DecisionTrace sampled out under backpressure: {row['id']}")
+            return str(row["id"])
+
+        trace = DecisionTrace(**row)
         self._db.add(trace)
         self._db.commit()
 
@@ -61,11 +285,18 @@ class DecisionTraceRecorder:
     def query_by_user(self, user_id: int, limit: int = 20, offset: int = 0) -> List[dict]:
         from core.models import DecisionTrace
 
+        pending = [t for t in self._pending() if t.user_id == user_id]
+        if not pending:
+            rows = self._db.query(DecisionTrace).filter(
+                DecisionTrace.user_id == user_id
+            ).order_by(DecisionTrace.created_at.desc()).offset(offset).limit(limit).all()
+            return [self._to_dict(r) for r in rows]
+
         rows = self._db.query(DecisionTrace).filter(
             DecisionTrace.user_id == user_id
-        ).order_by(DecisionTrace.created_at.desc()).offset(offset).limit(limit).all()
-
-        return [self._to_dict(r) for r in rows]
+        ).order_by(DecisionTrace.created_at.desc()).limit(offset + limit).all()
+        merged = self._merge_recent(pending, rows)
+        return [self._to_dict(r) for r in merged[offset:offset + limit]]
 
     def query_by_agent(self, agent_id: str, tenant_id=None, limit: int = 50) -> Dict[str, Any]:
         from core.models import DecisionTrace
@@ -75,6 +306,9 @@ class DecisionTraceRecorder:
             query = query.filter(DecisionTrace.tenant_id == tenant_id)
 
         traces = query.order_by(DecisionTrace.created_at.desc()).limit(limit * 3).all()
+        pending = [t for t in self._pending() if not tenant_id or t.tenant_id == tenant_id]
+        if pending:
+            traces = self._merge_recent(pending, traces)[:limit * 3]
 
         stats = {
             "agent_id": agent_id,
@@ -129,9 +363,11 @@ class DecisionTraceRecorder:
     def get_explainable_trace(self, trace_id: str) -> Optional[dict]:
         from core.models import DecisionTrace
 
-        trace = self._db.query(DecisionTrace).filter(
-            DecisionTrace.id == trace_id
-        ).first()
+        trace = next((t for t in self._pending() if str(t.id) == str(trace_id)), None)
+        if trace is None:
+            trace = self._db.query(DecisionTrace).filter(
+                DecisionTrace.id == trace_id
+            ).first()
         if not trace:
             return None
 
@@ -0,0 +1,290 @@
+"""
+信任分下降预警 / 教练自动升级 — 集合化定时任务
+Set-based trust-engagement monitor and coach auto-escalation
+
+原实现逐用户循环: 每人一次去重查询 + 单条 INSERT, 用户量大时长时间占用调度锁。
+现在每类写入是一条 INSERT ... SELECT:
+
+- 候选集 (低信任 / 失联 + 有活跃处方) 以 CTE 一次选出, 最近打卡日取自 user_streaks
+- 去重用 NOT EXISTS 写在同一条语句里
+- 文案直接在 SQL 中拼接; to_char(double, 'FM0.00') 按 C printf 舍入,
+  与 Python f"{x:.2f}" 逐字一致
+- 每条 INSERT 单独提交: 某类写入失败只回滚该条 (记入 report.errors), 已提交的其他写入照常推送
+- RETURNING 返回新写入的行, 提交后按批 (batch_size) 推送 WebSocket
+
+dry_run=True 时执行同一段 SELECT (不含 INSERT), 返回将要写入的行, 用于与旧逻辑核对;
+每次运行的耗时写入 bhp_scheduler_job_seconds 直方图 (prometheus_client 可用时)。
+
+去重规则:
+  trust_engagement_monitor: 同一用户同一天只发一次 (调度重跑不重复写入; 旧逻辑每天一次)
+  coach_auto_escalation:    7 天内已有 pending 的 auto_escalation 则跳过 (与旧逻辑相同)
+"""
+
+import asyncio
+import time
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from loguru import logger
+from sqlalchemy import text as sa_text
+
+PushFn = Callable[[List[Tuple[str, dict]]], None]
+
+FANOUT_BATCH_SIZE = 500
+
+# ── 信任分下降 + 参与度预警 ──
+
+_TRUST_CANDIDATES = """
+    WITH candidates AS (
+        SELECT u.id AS user_id,
+               u.trust_score,
+               CURRENT_DATE - us.last_checkin_date AS days_inactive,
+               (u.profile->>'coach_id')::int AS coach_id
+        FROM users u
+        JOIN user_streaks us ON us.user_id = u.id
+        WHERE u.is_active = true
+          AND u.trust_score < 0.3
+          AND us.last_checkin_date < CURRENT_DATE - INTERVAL '3 days'
+          AND EXISTS (
+              SELECT 1 FROM behavior_prescriptions bp
+              WHERE bp.user_id = u.id AND bp.status = 'active'
+          )
+    )
+"""
+
+_TRUST_NOTIFICATIONS_SELECT = _TRUST_CANDIDATES + """
+    SELECT c.user_id,
+           '我们注意到了变化' AS title,
+           '最近几天参与度有所下降，没关系，随时可以回来，我们在这里支持您。' AS body,
+           'trust_decline' AS type, 'normal' AS priority, false AS is_read, NOW() AS created_at
+    FROM candidates c
+    WHERE NOT EXISTS (
+        SELECT 1 FROM notifications n
+        WHERE n.user_id = c.user_id AND n.type = 'trust_decline'
+          AND n.created_at >= CURRENT_DATE
+    )
+"""
+
+_TRUST_ALERTS_SELECT = _TRUST_CANDIDATES + """
+    SELECT c.coach_id, c.user_id AS student_id, 'trust_decline' AS source_type,
+           '学员参与度下降预警' AS title,
+           '信任分 ' || to_char(COALESCE(c.trust_score, 0), 'FM0.00')
+             || '，已 ' || c.days_inactive || ' 天未打卡，建议主动关怀' AS content,
+           'high' AS priority, 'pending' AS status, NOW() AS created_at
+    FROM candidates c
+    WHERE c.coach_id IS NOT NULL AND c.coach_id <> 0
+      AND NOT EXISTS (
+          SELECT 1 FROM coach_push_queue q
+          WHERE q.student_id = c.user_id AND q.source_type = 'trust_decline'
+            AND q.created_at >= CURRENT_DATE
+      )
+"""
+
+_TRUST_CANDIDATE_COUNT = _TRUST_CANDIDATES + "SELECT COUNT(*) FROM candidates"
+
+# ── 教练自动升级 (失联 7 天) ──
+
+_ESCALATION_CANDIDATES = """
+    WITH candidates AS (
+        SELECT u.id AS user_id,
+               (u.profile->>'coach_id')::int AS coach_id,
+               CURRENT_DATE - us.last_checkin_date AS days_inactive,
+               u.trust_score,
+               COUNT(bp.id) AS rx_count
+        FROM users u
+        JOIN user_streaks us ON us.user_id = u.id
+        JOIN behavior_prescriptions bp
+            ON bp.user_id = u.id AND bp.status = 'active'
+        WHERE u.is_active = true
+          AND u.profile->>'coach_id' IS NOT NULL
+          AND us.last_checkin_date < CURRENT_DATE - INTERVAL '7 days'
+        GROUP BY u.id, us.last_checkin_date, u.trust_score
+    )
+"""
+
+_ESCALATION_SELECT = _ESCALATION_CANDIDATES + """
+    SELECT c.coach_id, c.user_id AS student_id, 'auto_escalation' AS source_type,
+           '学员失联预警 (' || c.days_inactive || '天未打卡)' AS title,
+           '已 ' || c.days_inactive || ' 天未打卡，信任分 '
+             || to_char(COALESCE(c.trust_score, 0), 'FM0.00')
+             || '，有 ' || c.rx_count || ' 个活跃处方未执行，建议主动联系。' AS content,
+           'high' AS priority, 'pending' AS status, NOW() AS created_at
+    FROM candidates c
+    WHERE c.coach_id IS NOT NULL AND c.coach_id <> 0
+      AND NOT EXISTS (
+          SELECT 1 FROM coach_push_queue q
+          WHERE q.student_id = c.user_id AND q.source_type = 'auto_escalation'
+            AND q.status = 'pending'
+            AND q.created_at > CURRENT_DATE - INTERVAL '7 days'
+      )
+"""
+
+_ESCALATION_CANDIDATE_COUNT = _ESCALATION_CANDIDATES + "SELECT COUNT(*) FROM candidates"
+
+_NOTIFICATION_COLUMNS = "user_id, title, body, type, priority, is_read, created_at"
+_PUSH_QUEUE_COLUMNS = "coach_id, student_id, source_type, title, content, priority, status, created_at"
+
+
+def _insert(table: str, columns: str, select_sql: str, returning: str) -> str:
+    """INSERT ... SELECT ... RETURNING; SELECT 部分与 dry_run 执行的完全相同"""
+    return f"INSERT INTO {table} ({columns})\n{select_sql}\nRETURNING {returning}"
+
+
+@dataclass
+class JobReport:
+    """一次运行的结果; dry_run 时 rows 为将要写入的行"""
+    job: str
+    dry_run: bool
+    candidates: int = 0
+    rows: Dict[str, List[Dict[str, Any]]] = field(default_factory=dict)
+    errors: Dict[str, str] = field(default_factory=dict)
+    pushed: int = 0
+    duration_ms: float = 0.0
+
+    def count(self, kind: str) -> int:
+        return len(self.rows.get(kind, []))
+
+    def summary(self) -> Dict[str, Any]:
+        return {
+            "job": self.job,
+            "dry_run": self.dry_run,
+            "candidates": self.candidates,
+            **{kind: len(rows) for kind, rows in self.rows.items()},
+            **({"errors": self.errors} if self.errors else {}),
+            "pushed": self.pushed,
+            "duration_ms": round(self.duration_ms, 1),
+        }
+
+
+# ============================================
+# 任务
+# ============================================
+
+async def run_trust_engagement_monitor(
+    db, dry_run: bool = False, push: Optional[PushFn] = None, batch_size: int = FANOUT_BATCH_SIZE,
+) -> JobReport:
+    """低信任 (<0.3) + 3 天未打卡 + 有活跃处方 → 用户关怀通知 + 教练预警"""
+    report = JobReport("trust_engagement_monitor", dry_run)
+    started = time.perf_counter()
+    try:
+        report.candidates = (await db.execute(sa_text(_TRUST_CANDIDATE_COUNT))).scalar() or 0
+        await _select_or_insert(
+            report, db, "notifications", "notifications", _NOTIFICATION_COLUMNS, _TRUST_NOTIFICATIONS_SELECT,
+            "id, user_id, title, body")
+        await _select_or_insert(
+            report, db, "coach_alerts", "coach_push_queue", _PUSH_QUEUE_COLUMNS, _TRUST_ALERTS_SELECT,
+            "id, coach_id, student_id, title, content")
+        if not dry_run:
+            report.pushed = await _fan_out(report, push, batch_size)
+    finally:
+        _observe(report, started)
+    return report
+
+
+async def run_coach_auto_escalation(
+    db, dry_run: bool = False, push: Optional[PushFn] = None, batch_size: int = FANOUT_BATCH_SIZE,
+) -> JobReport:
+    """有教练 + 7 天未打卡 + 有活跃处方 → 教练失联预警 (7 天内不重复)"""
+    report = JobReport("coach_auto_escalation", dry_run)
+    started = time.perf_counter()
+    try:
+        report.candidates = (await db.execute(sa_text(_ESCALATION_CANDIDATE_COUNT))).scalar() or 0
+        await _select_or_insert(
+            report, db, "coach_alerts", "coach_push_queue", _PUSH_QUEUE_COLUMNS, _ESCALATION_SELECT,
+            "id, coach_id, student_id, title, content")
+        if not dry_run:
+            report.pushed = await _fan_out(report, push, batch_size)
+    finally:
+        _observe(report, started)
+    return report
+
+
+async def _select_or_insert(report: JobReport, db, kind: str, table: str, columns: str,
+                            select_sql: str, returning: str) -> None:
+    """一类写入, 单独提交; 失败时只回滚这一条, 不丢弃此前已提交的写入"""
+    try:
+        if report.dry_run:
+            result = await db.execute(sa_text(select_sql))
+        else:
+            result = await db.execute(sa_text(_insert(table, columns, select_sql, returning)))
+        rows = [dict(row) for row in result.mappings().all()]
+        if not report.dry_run:
+            await db.commit()
+    except Exception as e:
+        await db.rollback()
+        logger.warning(f"[Scheduler] {report.job}: 写入 {table} 失败, 已回滚该条: {e}")
+        report.errors[kind] = str(e)
+        rows = []
+    report.rows[kind] = rows
+
+
+# ============================================
+# 推送 (提交后按批)
+# ============================================
+
+def _default_push(notifications: List[Tuple[str, dict]]) -> None:
+    from api.websocket_api import push_user_notifications_sync
+    push_user_notifications_sync(notifications)
+
+
+def _messages(report: JobReport) -> List[Tuple[str, dict]]:
+    messages = []
+    for row in report.rows.get("notifications", []):
+        messages.append((str(row["user_id"]), {
+            "type": "trust_decline",
+            "title": row["title"],
+            "body": row["body"],
+            "notification_id": str(row["id"]),
+        }))
+    for row in report.rows.get("coach_alerts", []):
+        # 教练端待审核提醒; 学员侧内容仍需教练审核后推送
+        messages.append((str(row["coach_id"]), {
+            "type": "coach_push_pending",
+            "title": row["title"],
+            "body": row["content"] or "",
+            "student_id": row["student_id"],
+            "push_id": str(row["id"]),
+        }))
+    return messages
+
+
+async def _fan_out(report: JobReport, push: Optional[PushFn], batch_size: int) -> int:
+    messages = _messages(report)
+    push = push or _default_push
+    sent = 0
+    for start in range(0, len(messages), batch_size):
+        batch = messages[start:start + batch_size]
+        try:
+            await asyncio.to_thread(push, batch)
+            sent += len(batch)
+        except Exception as e:
+            # 推送失败不影响已提交的记录 (通知中心 / 教练队列仍可见)
+            logger.warning(f"[{report.job}] WebSocket 推送失败 ({len(batch)} 条): {e}")
+    return sent
+
+
+# ============================================
+# 指标
+# ============================================
+
+_job_histogram = None
+
+
+def _observe(report: JobReport, started: float):
+    global _job_histogram
+    report.duration_ms = (time.perf_counter() - started) * 1000
+    if _job_histogram is None:
+        try:
+            from prometheus_client import Histogram
+            _job_histogram = Histogram(
+                "bhp_scheduler_job_seconds",
+                "Duration of set-based scheduler jobs",
+                ["job", "dry_run"],
+                buckets=(0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60),
+            )
+        except Exception as e:
+            logger.debug(f"[Scheduler] 任务耗时指标不可用: {e}")
+            _job_histogram = False
+    if _job_histogram:
+        _job_histogram.labels(job=report.job, dry_run=str(report.dry_run).lower()).observe(
+            report.duration_ms / 1000)
@@ -35,13 +35,19 @@
   A 分享者内生: 直接学习 (有实践基础)
   B 交费学员:   M0补课+20学时平台认知, 培训期学习=成长分
   E 意向早标记: 自然衔接 (成长者已启蒙)
+
+状态持久化:
+  考生状态由 CandidateStateStore 保存 (core/exam_400_store.py, exam_400_candidates 表),
+  读穿缓存 + 版本校验写入, 多 worker 共享同一份进度; 修改冲突时重新读取并重放。
 """
 
 from __future__ import annotations
+import asyncio
+import random
 from datetime import datetime, timezone, timedelta
 from enum import Enum
 from typing import Optional, Dict, Any, List, Tuple
-from dataclasses import dataclass, field
+from dataclasses import asdict, dataclass, field
 
 
 # ══════════════════════════════════════════
@@ -254,6 +260,35 @@ class CandidateExamState:
     training_growth_points: int = 0  # B轨: 培训期积累成长分
 
 
+def state_to_dict(state: CandidateExamState) -> Dict[str, Any]:
+    """考生状态 -> 可 JSON 序列化的字典 (枚举存值)"""
+    data = asdict(state)
+    data["coach_track"] = state.coach_track.value
+    data["certification_result"] = state.certification_result.value
+    for key, progress in state.modules.items():
+        data["modules"][key]["module"] = progress.module.value
+        data["modules"][key]["status"] = progress.status.value
+    return data
+
+
+def state_from_dict(data: Dict[str, Any]) -> CandidateExamState:
+    """state_to_dict 的逆过程 (每次构建新对象, 不与缓存共享)"""
+    modules = {}
+    for key, m in data.get("modules", {}).items():
+        modules[key] = ModuleProgress(**{
+            **m,
+            "module": ExamModule(m["module"]),
+            "status": ExamStatus(m["status"]),
+            "sub_scores": [SubModuleScore(**s) for s in m.get("sub_scores", [])],
+        })
+    return CandidateExamState(**{
+        **data,
+        "coach_track": CoachTrack(data["coach_track"]),
+        "certification_result": CertificationResult(data["certification_result"]),
+        "modules": modules,
+    })
+
+
 # ══════════════════════════════════════════
 # 3. 400分制考核引擎
 # ══════════════════════════════════════════
@@ -277,10 +312,52 @@ class Exam400Engine:
       - CreditsAPI (学分追踪)
     """
 
-    def __init__(self, stage_service=None, points_service=None):
+    # 版本冲突时的最大重放次数
+    MAX_WRITE_RETRIES = 30
+
+    def __init__(self, stage_service=None, points_service=None, store=None):
+        from core.exam_400_store import CandidateStateStore
+
         self.stage_service = stage_service
         self.points_service = points_service
-        self._candidates: Dict[int, CandidateExamState] = {}
+        self._store = store if store is not None else CandidateStateStore()
+
+    # ── 状态读写 ──
+
+    def _load(self, user_id: int) -> Optional[CandidateExamState]:
+        current = self._store.get(user_id)
+        return state_from_dict(current[1]) if current else None
+
+    async def _io(self, fn, *args, **kwargs):
+        """存储读写放到线程池执行, 不阻塞事件循环 (纯内存存储直接调用)"""
+        if getattr(self._store, "persistent", True):
+            return await asyncio.to_thread(fn, *args, **kwargs)
+        return fn(*args, **kwargs)
+
+    async def _aload(self, user_id: int) -> Optional[CandidateExamState]:
+        current = await self._io(self._store.get, user_id)
+        return state_from_dict(current[1]) if current else None
+
+    async def _mutate(self, user_id: int, apply) -> Dict[str, Any]:
+        """
+        读取 → apply(state) 修改 → 版本校验写回;
+        版本冲突 (其他进程已写入) 时随机退避后重新读取最新状态再执行 apply
+        """
+        fresh = False
+        for attempt in range(self.MAX_WRITE_RETRIES):
+            if attempt:
+                await asyncio.sleep(random.uniform(0, min(0.002 * 2 ** attempt, 0.05)))
+            current = await self._io(self._store.get, user_id, fresh=fresh)
+            if current is None:
+                return {"error": "not_enrolled"}
+            version, data = current
+            state = state_from_dict(data)
+            result = apply(state)
+            new_data = state_to_dict(state)
+            if new_data == data or await self._io(self._store.update, user_id, new_data, version):
+                return result
+            fresh = True
+        return {"error": "conflict", "message": "考核状态并发修改冲突, 请稍后重试"}
 
     # ── 3.1 注册考核 ──
 
@@ -288,8 +365,8 @@ class Exam400Engine:
         self, user_id: int, coach_track: CoachTrack
     ) -> Dict[str, Any]:
         """注册400分制考核"""
-        if user_id in self._candidates:
-            state = self._candidates[user_id]
+        state = await self._aload(user_id)
+        if state is not None:
             if state.certification_result == CertificationResult.CERTIFIED:
                 return {"error": "already_certified", "message": "已通过认证"}
             if state.certification_result == CertificationResult.ETHICS_VETO:
@@ -327,7 +404,9 @@ class Exam400Engine:
         # 三轨差异
         track_info = self._get_track_requirements(coach_track)
 
-        self._candidates[user_id] = state
+        if not await self._io(self._store.create, user_id, state_to_dict(state)):
+            # 其他进程已并发注册, 以已保存的状态为准
+            return await self.enroll(user_id, coach_track)
 
         return {
             "enrolled": True,
@@ -384,10 +463,11 @@ class Exam400Engine:
         self, user_id: int, module: ExamModule, scores: Dict[str, float]
     ) -> Dict[str, Any]:
         """提交单模块成绩"""
-        state = self._candidates.get(user_id)
-        if not state:
-            return {"error": "not_enrolled"}
+        return await self._mutate(user_id, lambda state: self._apply_module_score(state, module, scores))
 
+    def _apply_module_score(
+        self, state: CandidateExamState, module: ExamModule, scores: Dict[str, float]
+    ) -> Dict[str, Any]:
         if state.ethics_veto:
             return {"error": "ethics_veto", "message": "伦理一票否决, 考核已终止"}
 
@@ -511,14 +591,14 @@ class Exam400Engine:
 
     def get_exam_status(self, user_id: int) -> Dict[str, Any]:
         """查询考核状态全景"""
-        state = self._candidates.get(user_id)
+        state = self._load(user_id)
         if not state:
             return {"enrolled": False}
         return self._build_status_response(state)
 
     def get_module_detail(self, user_id: int, module: ExamModule) -> Dict[str, Any]:
         """查询单模块详情"""
-        state = self._candidates.get(user_id)
+        state = self._load(user_id)
         if not state:
             return {"enrolled": False}
 
@@ -549,7 +629,7 @@ class Exam400Engine:
 
     def get_retake_eligibility(self, user_id: int, module: ExamModule) -> Dict[str, Any]:
         """检查重考资格"""
-        state = self._candidates.get(user_id)
+        state = self._load(user_id)
         if not state:
             return {"eligible": False, "reason": "未注册考核"}
 
@@ -602,19 +682,18 @@ class Exam400Engine:
 
     async def complete_m0(self, user_id: int) -> Dict[str, Any]:
         """B轨学员完成M0平台认知补课"""
-        state = self._candidates.get(user_id)
-        if not state:
-            return {"error": "not_enrolled"}
+        def apply(state: CandidateExamState) -> Dict[str, Any]:
+            if state.coach_track != CoachTrack.B_PAID:
+                return {"info": "非B轨学员, 无需M0补课"}
 
-        if state.coach_track != CoachTrack.B_PAID:
-            return {"info": "非B轨学员, 无需M0补课"}
+            state.m0_completed = True
+            return {
+                "m0_completed": True,
+                "message": "M0平台认知补课完成 (20学时), 可正式开始M1-M4学习",
+                "growth_points_awarded": 20,  # 补课=成长分
+            }
 
-        state.m0_completed = True
-        return {
-            "m0_completed": True,
-            "message": "M0平台认知补课完成 (20学时), 可正式开始M1-M4学习",
-            "growth_points_awarded": 20,  # 补课=成长分
-        }
+        return await self._mutate(user_id, apply)
 
     # ── 3.6 B轨 培训学分→成长分 ──
 
@@ -622,20 +701,19 @@ class Exam400Engine:
         self, user_id: int, credits: int, module_id: str
     ) -> Dict[str, Any]:
         """B轨: 培训学习=成长分"""
-        state = self._candidates.get(user_id)
-        if not state:
-            return {"error": "not_enrolled"}
+        def apply(state: CandidateExamState) -> Dict[str, Any]:
+            if state.coach_track == CoachTrack.B_PAID:
+                state.training_growth_points += credits
+                return {
+                    "growth_points_earned": credits,
+                    "total_training_points": state.training_growth_points,
+                    "module": module_id,
+                    "message": f"培训学习+{credits}成长分",
+                }
 
-        if state.coach_track == CoachTrack.B_PAID:
-            state.training_growth_points += credits
-            return {
-                "growth_points_earned": credits,
-                "total_training_points": state.training_growth_points,
-                "module": module_id,
-                "message": f"培训学习+{credits}成长分",
-            }
+            return {"info": "非B轨学员, 学分正常计入"}
 
-        return {"info": "非B轨学员, 学分正常计入"}
+        return await self._mutate(user_id, apply)
 
     # ── 响应构建 ──
 
@@ -742,49 +820,57 @@ class TrainingCreditRequest(BaseModel):
     module_id: str
 
 
-# 共享引擎实例
-_engine = Exam400Engine()
+# 共享引擎实例 (状态存于 exam_400_candidates, 各 worker 一致)
+_engine: Optional[Exam400Engine] = None
+
+
+def get_exam_engine() -> Exam400Engine:
+    global _engine
+    if _engine is None:
+        from core.exam_400_store import get_candidate_store
+        _engine = Exam400Engine(store=get_candidate_store())
+    return _engine
 
 
 @router.post("/enroll")
 async def enroll_exam(req: EnrollRequest):
     """注册400分制考核"""
     track = CoachTrack(req.coach_track)
-    return await _engine.enroll(req.user_id, track)
+    return await get_exam_engine().enroll(req.user_id, track)
 
 
 @router.post("/submit")
 async def submit_module_score(req: ModuleScoreSubmit):
     """提交模块成绩"""
     module = ExamModule(req.module)
-    return await _engine.submit_module_score(req.user_id, module, req.scores)
+    return await get_exam_engine().submit_module_score(req.user_id, module, req.scores)
 
 
 @router.get("/status/{user_id}")
-async def get_exam_status(user_id: int):
+def get_exam_status(user_id: int):
     """查询考核全景状态"""
-    return _engine.get_exam_status(user_id)
+    return get_exam_engine().get_exam_status(user_id)
 
 
 @router.get("/module/{user_id}/{module}")
-async def get_module_detail(user_id: int, module: str):
+def get_module_detail(user_id: int, module: str):
     """查询单模块详情"""
-    return _engine.get_module_detail(user_id, ExamModule(module))
+    return get_exam_engine().get_module_detail(user_id, ExamModule(module))
 
 
 @router.get("/retake/{user_id}/{module}")
-async def check_retake(user_id: int, module: str):
+def check_retake(user_id: int, module: str):
     """检查重考资格"""
-    return _engine.get_retake_eligibility(user_id, ExamModule(module))
+    return get_exam_engine().get_retake_eligibility(user_id, ExamModule(module))
 
 
 @router.post("/m0-complete")
 async def complete_m0(req: M0CompleteRequest):
     """B轨M0补课完成"""
-    return await _engine.complete_m0(req.user_id)
+    return await get_exam_engine().complete_m0(req.user_id)
 
 
 @router.post("/training-credits")
 async def record_credits(req: TrainingCreditRequest):
     """B轨培训学分→成长分"""
-    return await _engine.record_training_credits(req.user_id, req.credits, req.module_id)
+    return await get_exam_engine().record_training_credits(req.user_id, req.credits, req.module_id)
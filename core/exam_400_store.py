@@ -0,0 +1,225 @@
+"""
+400分制考核 — 考生状态持久化
+Exam 400 Candidate State Store
+
+exam_400_candidates 表为记录源 (每考生一行, 状态整体存 JSON + version 版本号),
+多 worker / 重启后看到同一份考核进度:
+
+- 读: 进程内有界 LRU 读穿缓存; cache_ttl 内直接命中, 过期后只查 version,
+  版本未变沿用缓存, 否则重新加载整行
+- 写: 乐观并发 UPDATE ... WHERE user_id = :uid AND version = :ver,
+  影响 0 行说明已被其他进程修改, 调用方重新读取最新状态后重放修改
+- 注册: INSERT, 主键冲突说明已被其他进程注册
+
+未配置 session_factory 时为进程内存储 (同样带版本号), 供单进程与测试使用。
+"""
+
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, Optional, Tuple
+
+from sqlalchemy import JSON, Column, DateTime, ForeignKey, Integer, String, insert, update
+from sqlalchemy import text as sa_text
+from sqlalchemy.exc import IntegrityError
+
+from core.models import Base
+
+logger = logging.getLogger(__name__)
+
+# (version, 状态字典)
+Versioned = Tuple[int, Dict]
+
+
+class Exam400Candidate(Base):
+    """400分制考核考生状态"""
+    __tablename__ = "exam_400_candidates"
+
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), primary_key=True)
+    coach_track = Column(String(20), nullable=False)
+    certification_result = Column(String(30), nullable=False, index=True)
+    state = Column(JSON, nullable=False)
+    version = Column(Integer, nullable=False, server_default="1")
+    created_at = Column(DateTime, server_default=sa_text("now()"), nullable=False)
+    updated_at = Column(DateTime, server_default=sa_text("now()"), nullable=False)
+
+
+class CandidateStateStore:
+    """考生状态存储 (读穿缓存 + 版本校验写入)"""
+
+    def __init__(
+        self,
+        session_factory: Optional[Callable] = None,
+        cache_size: int = 5000,
+        cache_ttl: float = 1.0,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self._session_factory = session_factory
+        self.cache_size = cache_size
+        self.cache_ttl = cache_ttl
+        self._clock = clock
+        self._lock = threading.Lock()
+        # user_id -> (version, state, 上次与库核对的时间)
+        self._cache: "OrderedDict[int, Tuple[int, Dict, float]]" = OrderedDict()
+        self._memory: Dict[int, Versioned] = {}
+        self.stats = {"hits": 0, "revalidated": 0, "loads": 0, "writes": 0, "conflicts": 0}
+
+    @property
+    def persistent(self) -> bool:
+        return self._session_factory is not None
+
+    # ── 读取 ──
+
+    def get(self, user_id: int, fresh: bool = False) -> Optional[Versioned]:
+        """读取考生状态; fresh=True 时跳过 TTL 直接与库核对版本"""
+        if not self.persistent:
+            with self._lock:
+                return self._memory.get(user_id)
+
+        now = self._clock()
+        with self._lock:
+            entry = self._cache.get(user_id)
+            if entry is not None and not fresh and now - entry[2] < self.cache_ttl:
+                self._cache.move_to_end(user_id)
+                self.stats["hits"] += 1
+                return entry[0], entry[1]
+
+        t = Exam400Candidate
+        db = self._session_factory()
+        try:
+            if entry is not None:
+                version = db.query(t.version).filter(t.user_id == user_id).scalar()
+                if version == entry[0]:
+                    with self._lock:
+                        self._remember(user_id, entry[0], entry[1], now)
+                        self.stats["revalidated"] += 1
+                    return entry[0], entry[1]
+            row = db.query(t.version, t.state).filter(t.user_id == user_id).first()
+        finally:
+            db.close()
+
+        with self._lock:
+            self.stats["loads"] += 1
+            if row is None:
+                self._cache.pop(user_id, None)
+                return None
+            self._remember(user_id, row.version, row.state, now)
+        return row.version, row.state
+
+    # ── 写入 ──
+
+    def create(self, user_id: int, state: Dict) -> bool:
+        """注册新考生; 已存在 (含其他进程并发注册) 返回 False"""
+        if not self.persistent:
+            with self._lock:
+                if user_id in self._memory:
+                    return False
+                self._memory[user_id] = (1, state)
+                self.stats["writes"] += 1
+                return True
+
+        db = self._session_factory()
+        try:
+            db.execute(insert(Exam400Candidate).values(
+                user_id=user_id, version=1, state=state, **_columns(state)))
+            db.commit()
+        except IntegrityError:
+            db.rollback()
+            with self._lock:
+                self._cache.pop(user_id, None)
+            return False
+        finally:
+            db.close()
+
+        with self._lock:
+            self._remember(user_id, 1, state, self._clock())
+            self.stats["writes"] += 1
+        return True
+
+    def update(self, user_id: int, state: Dict, expected_version: int) -> bool:
+        """版本校验写入; 版本已变化返回 False (调用方重新读取后重试)"""
+        if not self.persistent:
+            with self._lock:
+                current = self._memory.get(user_id)
+                if current is None or current[0] != expected_version:
+                    self.stats["conflicts"] += 1
+                    return False
+                self._memory[user_id] = (expected_version + 1, state)
+                self.stats["writes"] += 1
+                return True
+
+        t = Exam400Candidate
+        db = self._session_factory()
+        try:
+            result = db.execute(
+                update(t)
+                .where(t.user_id == user_id, t.version == expected_version)
+                .values(state=state, version=t.version + 1,
+                        updated_at=sa_text("CURRENT_TIMESTAMP"), **_columns(state))
+                .execution_options(synchronize_session=False)
+            )
+            db.commit()
+            written = result.rowcount == 1
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+        with self._lock:
+            if written:
+                self._remember(user_id, expected_version + 1, state, self._clock())
+                self.stats["writes"] += 1
+            else:
+                self._cache.pop(user_id, None)
+                self.stats["conflicts"] += 1
+        return written
+
+    def invalidate(self, user_id: Optional[int] = None):
+        with self._lock:
+            if user_id is None:
+                self._cache.clear()
+            else:
+                self._cache.pop(user_id, None)
+
+    def _remember(self, user_id: int, version: int, state: Dict, checked_at: float):
+        """写入 LRU (调用方持锁)"""
+        self._cache[user_id] = (version, state, checked_at)
+        self._cache.move_to_end(user_id)
+        while len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+
+
+def _columns(state: Dict) -> Dict:
+    """冗余列 (便于按认证结果统计)"""
+    return {
+        "coach_track": state["coach_track"],
+        "certification_result": state["certification_result"],
+    }
+
+
+_default_store: Optional[CandidateStateStore] = None
+_default_store_lock = threading.Lock()
+
+
+def get_candidate_store() -> CandidateStateStore:
+    """进程级共享存储 (以 exam_400_candidates 为记录源; EXAM400_PERSIST=0 时仅内存)"""
+    global _default_store
+    if _default_store is None:
+        with _default_store_lock:
+            if _default_store is None:
+                session_factory = None
+                if os.getenv("EXAM400_PERSIST", "1") != "0":
+                    try:
+                        from core.database import SessionLocal
+                        session_factory = SessionLocal
+                    except Exception as e:
+                        logger.warning(f"[Exam400] 数据库不可用, 考生状态仅保存在内存: {e}")
+                _default_store = CandidateStateStore(
+                    session_factory=session_factory,
+                    cache_size=int(os.getenv("EXAM400_CACHE_SIZE", "5000")),
+                    cache_ttl=float(os.getenv("EXAM400_CACHE_TTL", "1")),
+                )
+    return _default_store
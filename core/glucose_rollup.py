@@ -0,0 +1,519 @@
+# -*- coding: utf-8 -*-
+"""
+血糖聚合存储 (Glucose Rollups)
+
+按用户维护日/小时两级聚合桶 (表 glucose_rollups), 每个桶保存可合并的充分统计量:
+计数、和、平方和、极值与各血糖区间计数。由此可直接合成任意时间窗的 CGM 标准指标
+(均值/SD/CV/TIR/TBR/TAR 分级/GMI), 7/14 天的教练视图读 O(天数) 行而非 O(读数)。
+
+维护方式:
+- 写入时增量: rollup_on_ingest() 在读数入库的同一事务内 UPSERT 对应桶
+  (ON CONFLICT 累加, 并发安全); 日桶的 MAGE 置空待重算
+- 回填: backfill() 用 NumPy 按桶分组整体重算, 用于迁移后/批量导入后/纠偏
+- MAGE 不可增量合并, 读取时对 MAGE 为空的日桶只加载当天读数重算
+
+图表降采样: lttb() (Largest-Triangle-Three-Buckets), 保形压缩到指定点数。
+
+CLI:
+  python -m core.glucose_rollup --backfill [--user-id N] [--days 90]
+"""
+from __future__ import annotations
+
+from collections import defaultdict
+from datetime import date, datetime, timedelta, timezone
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+from loguru import logger
+from sqlalchemy.orm import Session
+
+from core.models import GlucoseReading, GlucoseRollup
+
+# 国际共识 CGM 区间 (mmol/L), 与 api/device_data.py 既有口径一致: TIR 含两端
+VERY_LOW = 3.0
+TARGET_LOW = 3.9
+TARGET_HIGH = 10.0
+VERY_HIGH = 13.9
+MGDL_PER_MMOL = 18.0182
+
+DAY = "day"
+HOUR = "hour"
+
+_SUM_FIELDS = (
+    "count", "sum_value", "sum_sq",
+    "n_very_low", "n_low", "n_in_range", "n_high", "n_very_high",
+)
+
+
+# ============================================
+# 指标计算 (NumPy)
+# ============================================
+
+def band_masks(values: np.ndarray) -> Tuple[np.ndarray, ...]:
+    """五个区间的布尔掩码: very_low / low / in_range / high / very_high"""
+    return (
+        values < VERY_LOW,
+        (values >= VERY_LOW) & (values < TARGET_LOW),
+        (values >= TARGET_LOW) & (values <= TARGET_HIGH),
+        (values > TARGET_HIGH) & (values <= VERY_HIGH),
+        values > VERY_HIGH,
+    )
+
+
+def stats_from_values(values: Sequence[float]) -> Dict[str, Any]:
+    """一组读数的充分统计量 (与 GlucoseRollup 字段同名)"""
+    v = np.asarray(values, dtype=float)
+    if v.size == 0:
+        return {f: 0 for f in _SUM_FIELDS} | {"min_value": None, "max_value": None}
+    very_low, low, in_range, high, very_high = band_masks(v)
+    return {
+        "count": int(v.size),
+        "sum_value": float(v.sum()),
+        "sum_sq": float(np.dot(v, v)),
+        "min_value": float(v.min()),
+        "max_value": float(v.max()),
+        "n_very_low": int(very_low.sum()),
+        "n_low": int(low.sum()),
+        "n_in_range": int(in_range.sum()),
+        "n_high": int(high.sum()),
+        "n_very_high": int(very_high.sum()),
+    }
+
+
+def mage(values: Sequence[float]) -> Optional[float]:
+    """
+    平均血糖波动幅度 (MAGE), 按时间排序的读数
+
+    以全体读数 SD 为阈值做 zigzag: 只有反向幅度超过 1 SD 的转折才确认为峰/谷,
+    MAGE 为相邻峰谷幅度的均值 (升降双向)。先用 NumPy 提取局部极值点缩小输入,
+    峰谷必然在其中。读数不足或无有效波动时返回 None。
+    """
+    v = np.asarray(values, dtype=float)
+    if v.size < 3:
+        return None
+    sd = float(v.std())
+    if sd == 0:
+        return None
+    # 去掉连续相等值后取符号变化处 (局部极值) 与两端
+    v = v[np.concatenate(([True], np.diff(v) != 0))]
+    d = np.sign(np.diff(v))
+    turns = np.flatnonzero(d[1:] != d[:-1]) + 1
+    points = v[np.concatenate(([0], turns, [v.size - 1]))] if v.size > 1 else v
+
+    legs: List[float] = []
+    lo = hi = float(points[0])
+    direction, pivot, extreme = 0, 0.0, 0.0
+    for x in points[1:]:
+        x = float(x)
+        if direction == 0:
+            lo, hi = min(lo, x), max(hi, x)
+            if x - lo > sd:
+                direction, pivot, extreme = 1, lo, x
+            elif hi - x > sd:
+                direction, pivot, extreme = -1, hi, x
+        elif direction == 1:
+            if x > extreme:
+                extreme = x
+            elif extreme - x > sd:
+                legs.append(extreme - pivot)
+                direction, pivot, extreme = -1, extreme, x
+        else:
+            if x < extreme:
+                extreme = x
+            elif x - extreme > sd:
+                legs.append(pivot - extreme)
+                direction, pivot, extreme = 1, extreme, x
+    if direction and abs(extreme - pivot) > sd:
+        legs.append(abs(extreme - pivot))
+    return round(float(np.mean(legs)), 2) if legs else None
+
+
+def summarize(rows: Iterable[Any]) -> Dict[str, Any]:
+    """
+    合并若干桶 (GlucoseRollup 或同名字段的对象) 为时间窗指标
+
+    百分比保留 1 位小数; mage 为有值日桶 MAGE 的均值 (多日 MAGE 的常用近似)。
+    """
+    totals = dict.fromkeys(_SUM_FIELDS, 0)
+    lows, highs, mages = [], [], []
+    for r in rows:
+        for f in _SUM_FIELDS:
+            totals[f] += getattr(r, f) or 0
+        if r.min_value is not None:
+            lows.append(r.min_value)
+            highs.append(r.max_value)
+        if getattr(r, "mage", None) is not None:
+            mages.append(r.mage)
+
+    n = totals["count"]
+    if not n:
+        return {"readings_count": 0}
+    mean = totals["sum_value"] / n
+    sd = max(totals["sum_sq"] / n - mean * mean, 0.0) ** 0.5 if n > 1 else 0.0
+
+    def pct(k):
+        return round(k / n * 100, 1)
+
+    return {
+        "readings_count": n,
+        "in_range_count": totals["n_in_range"],
+        "mean": round(mean, 2),
+        "sd": round(sd, 2),
+        "cv": round(sd / mean * 100, 1) if mean > 0 else 0.0,
+        "min": round(min(lows), 2),
+        "max": round(max(highs), 2),
+        "tir": pct(totals["n_in_range"]),
+        "tbr": pct(totals["n_very_low"] + totals["n_low"]),
+        "tbr_level1": pct(totals["n_low"]),
+        "tbr_level2": pct(totals["n_very_low"]),
+        "tar": pct(totals["n_high"] + totals["n_very_high"]),
+        "tar_level1": pct(totals["n_high"]),
+        "tar_level2": pct(totals["n_very_high"]),
+        "gmi": round(3.31 + 0.02392 * mean * MGDL_PER_MMOL, 2),
+        "mage": round(sum(mages) / len(mages), 2) if mages else None,
+    }
+
+
+def lttb(x: Sequence[float], y: Sequence[float], threshold: int) -> np.ndarray:
+    """
+    Largest-Triangle-Three-Buckets 降采样, 返回保留点的下标 (含首尾)
+
+    x 须单调递增; 点数不超过 threshold 或 threshold < 3 时原样返回全部下标。
+    """
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    n = x.size
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+
+    every = (n - 2) / (threshold - 2)
+    keep = np.empty(threshold, dtype=int)
+    keep[0], keep[-1] = 0, n - 1
+    a = 0
+    for i in range(threshold - 2):
+        start, end = int(i * every) + 1, int((i + 1) * every) + 1
+        nxt_end = min(int((i + 2) * every) + 1, n)
+        avg_x, avg_y = x[end:nxt_end].mean(), y[end:nxt_end].mean()
+        area = np.abs(
+            (x[a] - avg_x) * (y[start:end] - y[a]) - (x[a] - x[start:end]) * (avg_y - y[a])
+        )
+        a = start + int(area.argmax())
+        keep[i + 1] = a
+    return keep
+
+
+# ============================================
+# 分桶
+# ============================================
+
+def _naive_utc(ts: datetime) -> datetime:
+    """同步接口传入带时区时间, 统一为库内的 naive UTC"""
+    if ts.tzinfo is not None:
+        ts = ts.astimezone(timezone.utc).replace(tzinfo=None)
+    return ts
+
+
+def _bucket(ts: datetime, granularity: str) -> datetime:
+    if granularity == DAY:
+        return datetime(ts.year, ts.month, ts.day)
+    return ts.replace(minute=0, second=0, microsecond=0)
+
+
+def group_buckets(times: np.ndarray, values: np.ndarray) -> Dict[Tuple[str, datetime], Dict[str, Any]]:
+    """
+    按日/小时分组计算充分统计量 (NumPy reduceat, 用于回填)
+
+    times 为 datetime64 数组; 返回 {(granularity, bucket_start): stats}。
+    """
+    out: Dict[Tuple[str, datetime], Dict[str, Any]] = {}
+    if times.size == 0:
+        return out
+    order = np.argsort(times, kind="stable")
+    times, values = times[order].astype("datetime64[s]"), values[order].astype(float)
+    bands = np.stack(band_masks(values)).astype(np.int64)
+
+    for granularity, unit in ((DAY, "D"), (HOUR, "h")):
+        keys = times.astype(f"datetime64[{unit}]")
+        starts = np.flatnonzero(np.concatenate(([True], keys[1:] != keys[:-1])))
+        counts = np.diff(np.append(starts, values.size))
+        sums = np.add.reduceat(values, starts)
+        sqs = np.add.reduceat(values * values, starts)
+        mins = np.minimum.reduceat(values, starts)
+        maxs = np.maximum.reduceat(values, starts)
+        band_counts = np.add.reduceat(bands, starts, axis=1)
+        lasts = np.append(starts[1:], values.size) - 1
+        for j, s in enumerate(starts):
+            out[(granularity, keys[s].astype("datetime64[s]").item())] = {
+                "count": int(counts[j]),
+                "sum_value": float(sums[j]),
+                "sum_sq": float(sqs[j]),
+                "min_value": float(mins[j]),
+                "max_value": float(maxs[j]),
+                "n_very_low": int(band_counts[0, j]),
+                "n_low": int(band_counts[1, j]),
+                "n_in_range": int(band_counts[2, j]),
+                "n_high": int(band_counts[3, j]),
+                "n_very_high": int(band_counts[4, j]),
+                "first_at": times[s].item(),
+                "last_at": times[lasts[j]].item(),
+            }
+    return out
+
+
+# ============================================
+# 写入时增量维护
+# ============================================
+
+def _upsert_insert(db: Session):
+    """按方言取支持 ON CONFLICT 的 insert 与两参数 min/max 函数"""
+    from sqlalchemy import func
+
+    dialect = db.get_bind().dialect.name
+    if dialect == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+        return insert, func.least, func.greatest
+    if dialect == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert
+        return insert, func.min, func.max
+    raise NotImplementedError(f"glucose_rollups UPSERT 不支持方言: {dialect}")
+
+
+def record_readings(db: Session, user_id: int, readings: Iterable[Tuple[datetime, float]]) -> int:
+    """
+    把新读数累加进对应的日/小时桶 (不提交, 随调用方事务)
+
+    readings 为 (recorded_at, value); 同一批内先在内存合并, 每个桶一条
+    INSERT ... ON CONFLICT DO UPDATE, 累加在数据库端完成, 并发写入不丢计数。
+    日桶的 MAGE 置空, 下次读取时重算。返回更新的桶数。
+    """
+    buckets: Dict[Tuple[str, datetime], List[Tuple[datetime, float]]] = defaultdict(list)
+    for recorded_at, value in readings:
+        ts = _naive_utc(recorded_at)
+        for granularity in (DAY, HOUR):
+            buckets[(granularity, _bucket(ts, granularity))].append((ts, float(value)))
+    if not buckets:
+        return 0
+
+    insert, least, greatest = _upsert_insert(db)
+    table = GlucoseRollup.__table__
+    for (granularity, start), items in buckets.items():
+        stats = stats_from_values([v for _, v in items])
+        stamps = [t for t, _ in items]
+        row = {
+            "user_id": user_id, "granularity": granularity, "bucket_start": start,
+            **stats, "first_at": min(stamps), "last_at": max(stamps), "mage": None,
+        }
+        stmt = insert(table).values(**row)
+        ex = stmt.excluded
+        stmt = stmt.on_conflict_do_update(
+            index_elements=["user_id", "granularity", "bucket_start"],
+            set_={
+                **{f: table.c[f] + ex[f] for f in _SUM_FIELDS},
+                "min_value": least(table.c.min_value, ex.min_value),
+                "max_value": greatest(table.c.max_value, ex.max_value),
+                "first_at": least(table.c.first_at, ex.first_at),
+                "last_at": greatest(table.c.last_at, ex.last_at),
+                "mage": None,
+                "updated_at": datetime.utcnow(),
+            },
+        )
+        db.execute(stmt)
+    return len(buckets)
+
+
+def rollup_on_ingest(db: Session, user_id: int, readings: Iterable[Tuple[datetime, float]]) -> None:
+    """
+    写入路径调用: 在 SAVEPOINT 内累加聚合, 失败只记日志不影响读数入库
+
+    聚合漂移 (如表尚未迁移) 可用 backfill() 纠正。
+    """
+    try:
+        with db.begin_nested():
+            record_readings(db, user_id, readings)
+    except Exception as e:
+        logger.warning(f"[GlucoseRollup] 增量聚合失败 user={user_id}: {e}")
+
+
+# ============================================
+# 回填 (NumPy)
+# ============================================
+
+def backfill(
+    db: Session,
+    user_id: Optional[int] = None,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+) -> Dict[str, int]:
+    """
+    从原始读数整体重算聚合 (覆盖式, 调用方提交)
+
+    start/end 会对齐到整天, 避免写出残缺桶; 逐用户加载 (recorded_at, value) 两列,
+    NumPy 分组后先删后插该范围内的桶, 并计算日桶 MAGE。
+    """
+    start = _bucket(start, DAY) if start else None
+    end = _bucket(end, DAY) + timedelta(days=1) if end else None
+
+    users_q = db.query(GlucoseReading.user_id).distinct()
+    if user_id is not None:
+        users_q = users_q.filter(GlucoseReading.user_id == user_id)
+    user_ids = [u for (u,) in users_q.all()]
+
+    totals = {"users": 0, "readings": 0, "buckets": 0}
+    for uid in user_ids:
+        q = db.query(GlucoseReading.recorded_at, GlucoseReading.value).filter(
+            GlucoseReading.user_id == uid)
+        rq = db.query(GlucoseRollup).filter(GlucoseRollup.user_id == uid)
+        if start:
+            q = q.filter(GlucoseReading.recorded_at >= start)
+            rq = rq.filter(GlucoseRollup.bucket_start >= start)
+        if end:
+            q = q.filter(GlucoseReading.recorded_at < end)
+            rq = rq.filter(GlucoseRollup.bucket_start < end)
+        rows = q.all()
+        rq.delete(synchronize_session=False)
+        if not rows:
+            continue
+
+        times = np.array([_naive_utc(t) for t, _ in rows], dtype="datetime64[us]")
+        values = np.array([v for _, v in rows], dtype=float)
+        grouped = group_buckets(times, values)
+        day_mage = _mage_by_day(times, values)
+
+        db.bulk_insert_mappings(GlucoseRollup, [
+            {"user_id": uid, "granularity": g, "bucket_start": b, **stats,
+             "mage": day_mage.get(b) if g == DAY else None}
+            for (g, b), stats in grouped.items()
+        ])
+        totals["users"] += 1
+        totals["readings"] += len(rows)
+        totals["buckets"] += len(grouped)
+    return totals
+
+
+def _mage_by_day(times: np.ndarray, values: np.ndarray) -> Dict[datetime, Optional[float]]:
+    order = np.argsort(times, kind="stable")
+    times, values = times[order], values[order]
+    days = times.astype("datetime64[D]")
+    starts = np.flatnonzero(np.concatenate(([True], days[1:] != days[:-1])))
+    ends = np.append(starts[1:], values.size)
+    return {
+        days[s].astype("datetime64[s]").item(): mage(values[s:e])
+        for s, e in zip(starts, ends)
+    }
+
+
+# ============================================
+# 读取
+# ============================================
+
+def load_rollups(
+    db: Session, user_id: int, start: datetime, end: datetime, granularity: str = DAY,
+) -> List[GlucoseRollup]:
+    """[start, end) 内的桶, 按时间升序"""
+    return (
+        db.query(GlucoseRollup)
+        .filter(
+            GlucoseRollup.user_id == user_id,
+            GlucoseRollup.granularity == granularity,
+            GlucoseRollup.bucket_start >= start,
+            GlucoseRollup.bucket_start < end,
+        )
+        .order_by(GlucoseRollup.bucket_start)
+        .all()
+    )
+
+
+def refresh_mage(db: Session, days: List[GlucoseRollup]) -> int:
+    """为 MAGE 为空的日桶按天加载读数重算 (只读两列); 返回重算天数"""
+    stale = [r for r in days if r.mage is None and r.count >= 3]
+    if not stale:
+        return 0
+    first = min(r.bucket_start for r in stale)
+    last = max(r.bucket_start for r in stale) + timedelta(days=1)
+    rows = (
+        db.query(GlucoseReading.recorded_at, GlucoseReading.value)
+        .filter(
+            GlucoseReading.user_id == stale[0].user_id,
+            GlucoseReading.recorded_at >= first,
+            GlucoseReading.recorded_at < last,
+        )
+        .order_by(GlucoseReading.recorded_at)
+        .all()
+    )
+    per_day: Dict[datetime, List[float]] = defaultdict(list)
+    for recorded_at, value in rows:
+        per_day[_bucket(_naive_utc(recorded_at), DAY)].append(value)
+    for r in stale:
+        r.mage = mage(per_day.get(r.bucket_start, []))
+    db.flush()
+    return len(stale)
+
+
+def daily_metrics(row: GlucoseRollup) -> Dict[str, Any]:
+    """单个日桶的指标 (图表/列表用)"""
+    return {"date": row.bucket_start.date().isoformat(), **summarize([row])}
+
+
+def glucose_summary(db: Session, user_id: int, start_day: date, end_day: date) -> Dict[str, Any]:
+    """
+    [start_day, end_day] (含) 的血糖汇总与逐日指标
+
+    只读日桶; 若有 MAGE 待重算的日桶 (当天有新读数), 仅加载这些天的读数。
+    """
+    start = datetime.combine(start_day, datetime.min.time())
+    end = datetime.combine(end_day + timedelta(days=1), datetime.min.time())
+    days = load_rollups(db, user_id, start, end, DAY)
+    refresh_mage(db, days)
+    return {
+        "period": {"start": start_day.isoformat(), "end": end_day.isoformat(),
+                   "days_with_data": len(days)},
+        "summary": summarize(days),
+        "daily": [daily_metrics(r) for r in days],
+    }
+
+
+def hourly_trend(
+    db: Session, user_id: int, start: datetime, end: datetime, max_points: int = 200,
+) -> Dict[str, List[Any]]:
+    """小时均值曲线, LTTB 降采样到 max_points 个点"""
+    rows = load_rollups(db, user_id, _bucket(start, HOUR), end, HOUR)
+    if not rows:
+        return {"timestamps": [], "values": []}
+    x = [r.bucket_start.timestamp() for r in rows]
+    y = [r.sum_value / r.count for r in rows]
+    keep = lttb(x, y, max_points)
+    return {
+        "timestamps": [rows[i].bucket_start.isoformat() for i in keep],
+        "values": [round(y[i], 2) for i in keep],
+    }
+
+
+def window_summary(db: Session, user_id: int, since: datetime, until: Optional[datetime] = None) -> Dict[str, Any]:
+    """任意时间窗 (按小时对齐) 的汇总, 不含 MAGE; 供推送/报告等批量场景"""
+    until = until or datetime.utcnow() + timedelta(hours=1)
+    return summarize(load_rollups(db, user_id, _bucket(since, HOUR), until, HOUR))
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    import argparse
+
+    from core.database import SessionLocal
+
+    parser = argparse.ArgumentParser(description="血糖聚合回填")
+    parser.add_argument("--backfill", action="store_true", required=True)
+    parser.add_argument("--user-id", type=int, default=None)
+    parser.add_argument("--days", type=int, default=None, help="只回填最近 N 天 (默认全部)")
+    args = parser.parse_args(argv)
+
+    start = datetime.utcnow() - timedelta(days=args.days) if args.days else None
+    db = SessionLocal()
+    try:
+        totals = backfill(db, user_id=args.user_id, start=start)
+        db.commit()
+        print(f"[GlucoseRollup] 回填完成: {totals}")
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,172 @@
+"""
+首页快照缓存 — stale-while-revalidate
+
+/home 是每次打开 App 的第一个请求, 也是 QPS 最高的读接口。快照按 (profile, user_id)
+缓存 (专家/管理员首页为全局数据, user_id 为 None 即按角色共享):
+
+  - 新鲜期内 (HOME_SNAPSHOT_FRESH_TTL, 默认 15s) 直接返回
+  - 过期但仍在陈旧窗口内 (HOME_SNAPSHOT_STALE_TTL, 默认 60s) 先返回旧快照, 后台刷新
+  - 超出陈旧窗口或无快照时同步加载; 同一 key 的并发加载/刷新只执行一次
+
+领域事件 (打卡完成 / 审核通过或退回 / 新评估) 调用 invalidate_user() 让快照立即失效;
+失效期间仍在进行的加载不会把旧数据写回。读取在事件循环中进行, 失效可能来自线程池中的
+同步路由 (如 submit_assessment), 因此内部状态由 threading.Lock 保护 (临界区内无 await)。
+
+失效只作用于当前进程: 多 worker 部署时, 其他进程在陈旧窗口 (HOME_SNAPSHOT_STALE_TTL)
+内仍可能返回事件前的快照, 需要更强一致性时调低该值或关闭缓存。
+"""
+
+import asyncio
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+HOME_SNAPSHOT_ENABLED = os.getenv("HOME_SNAPSHOT_ENABLED", "true").lower() == "true"
+HOME_SNAPSHOT_FRESH_TTL = float(os.getenv("HOME_SNAPSHOT_FRESH_TTL", "15"))
+HOME_SNAPSHOT_STALE_TTL = float(os.getenv("HOME_SNAPSHOT_STALE_TTL", "60"))
+HOME_SNAPSHOT_MAX_ENTRIES = int(os.getenv("HOME_SNAPSHOT_MAX_ENTRIES", "20000"))
+
+SnapshotKey = Tuple[str, Optional[int]]
+# loader 返回 (数据, 是否可缓存); 有分区降级时不缓存, 下次请求重新加载
+SnapshotLoader = Callable[[], Awaitable[Tuple[Dict[str, Any], bool]]]
+
+
+class HomeSnapshotCache:
+    """进程内首页快照缓存 (读取在事件循环, 失效可来自任意线程)"""
+
+    def __init__(
+        self,
+        fresh_ttl: float = HOME_SNAPSHOT_FRESH_TTL,
+        stale_ttl: float = HOME_SNAPSHOT_STALE_TTL,
+        max_entries: int = HOME_SNAPSHOT_MAX_ENTRIES,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.fresh_ttl = fresh_ttl
+        self.stale_ttl = max(stale_ttl, fresh_ttl)
+        self.max_entries = max_entries
+        self._clock = clock
+        self._entries: "OrderedDict[SnapshotKey, Tuple[float, Dict[str, Any]]]" = OrderedDict()
+        # key → (加载任务, 写回许可); 失效时撤销许可, 进行中的加载结果不再写回
+        self._inflight: Dict[SnapshotKey, Tuple[asyncio.Task, Dict[str, bool]]] = {}
+        self._stats = {"fresh": 0, "stale": 0, "miss": 0, "refresh_errors": 0, "invalidations": 0}
+        self._lock = threading.Lock()
+
+    # ── 读取 ──
+
+    async def get(
+        self, key: SnapshotKey, loader: SnapshotLoader, allow_stale: bool = True,
+    ) -> Tuple[Dict[str, Any], str]:
+        """
+        读取快照
+
+        Args:
+            key: (profile, user_id)
+            loader: 无参协程工厂; 后台刷新时请求已结束, loader 不能依赖请求级会话
+            allow_stale: False 时不走后台刷新 (loader 绑定请求会话时使用)
+
+        Returns:
+            (数据, 状态) 状态为 "fresh" / "stale" / "miss"
+        """
+        now = self._clock()
+        status = "miss"
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                age = now - entry[0]
+                if age < self.fresh_ttl:
+                    status = "fresh"
+                elif allow_stale and age < self.stale_ttl:
+                    status = "stale"
+                if status != "miss":
+                    self._entries.move_to_end(key)
+            self._stats[status] += 1
+
+        if status == "fresh":
+            return entry[1], status
+        if status == "stale":
+            self._refresh(key, loader)
+            return entry[1], status
+        data = await asyncio.shield(self._refresh(key, loader))
+        return data, "miss"
+
+    def _refresh(self, key: SnapshotKey, loader: SnapshotLoader) -> asyncio.Task:
+        with self._lock:
+            inflight = self._inflight.get(key)
+            if inflight is not None:
+                return inflight[0]
+            permit = {"store": True}
+            task = asyncio.ensure_future(self._load(key, loader, permit))
+            self._inflight[key] = (task, permit)
+        # 后台刷新无人等待: 取走异常, 避免 "exception was never retrieved"
+        task.add_done_callback(lambda t: t.cancelled() or t.exception())
+        return task
+
+    async def _load(
+        self, key: SnapshotKey, loader: SnapshotLoader, permit: Dict[str, bool],
+    ) -> Dict[str, Any]:
+        try:
+            data, cacheable = await loader()
+        except Exception as e:
+            # 刷新失败时保留旧快照; 同步加载的等待方会收到同一异常
+            with self._lock:
+                self._stats["refresh_errors"] += 1
+            logger.warning(f"[home] snapshot load failed {key}: {e}")
+            raise
+        finally:
+            with self._lock:
+                inflight = self._inflight.get(key)
+                if inflight is not None and inflight[1] is permit:
+                    del self._inflight[key]
+        with self._lock:
+            if cacheable and permit["store"]:
+                self._entries[key] = (self._clock(), data)
+                self._entries.move_to_end(key)
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+        return data
+
+    # ── 失效 ──
+
+    def invalidate_user(self, *user_ids: Optional[int]) -> None:
+        """用户相关领域事件后调用: 该用户在所有角色下的快照立即失效"""
+        targets = {uid for uid in user_ids if uid is not None}
+        if not targets:
+            return
+        self._drop(lambda key: key[1] in targets)
+
+    def invalidate_profile(self, profile: str) -> None:
+        """按首页类型失效 (如 "admin" 全局 KPI)"""
+        self._drop(lambda key: key[0] == profile)
+
+    def _drop(self, match: Callable[[SnapshotKey], bool]) -> None:
+        with self._lock:
+            for key in [k for k in self._entries if match(k)]:
+                del self._entries[key]
+            # 进行中的加载可能已读到事件前的数据: 撤销写回, 后续请求重新加载
+            for key in [k for k in self._inflight if match(k)]:
+                _, permit = self._inflight.pop(key)
+                permit["store"] = False
+            self._stats["invalidations"] += 1
+
+    def clear(self) -> None:
+        self._drop(lambda key: True)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {**self._stats, "entries": len(self._entries), "inflight": len(self._inflight)}
+
+
+home_snapshot_cache = HomeSnapshotCache()
+
+
+def invalidate_home_snapshot(*user_ids: Optional[int]) -> None:
+    """领域事件钩子 (可在线程池中的同步路由调用, 仅本进程生效): 失败不影响主流程"""
+    try:
+        home_snapshot_cache.invalidate_user(*user_ids)
+    except Exception as e:
+        logger.debug(f"[home] snapshot invalidate failed: {e}")
@@ -10,6 +10,8 @@ InterventionMatcher - 领域干预匹配引擎
 """
 import json
 import os
+import threading
+import time
 from dataclasses import dataclass, field
 from datetime import datetime
 from typing import Dict, Any, Optional, List
@@ -76,30 +78,199 @@ class InterventionPlan:
     generated_at: str = ""
 
 
+# 难度等级 → 建议难度上限 (仅保留难度 <= 上限的建议)
+DIFFICULTY_CAP = {"challenging": 5, "moderate": 3, "easy": 2, "minimal": 1}
+
+# SPI 分段: (下限, spi_ranges 键, 默认等级, 默认强度系数), 自高到低
+_SPI_BANDS = (
+    (70, ">=70", "challenging", 1.0),
+    (50, "50-69", "moderate", 0.7),
+    (30, "30-49", "easy", 0.4),
+    (float("-inf"), "<30", "minimal", 0.2),
+)
+
+_MAX_ADVICE = 5
+_MAX_KNOWLEDGE = 3
+
+
+@dataclass(frozen=True)
+class _DomainEntry:
+    """预编译的单领域干预 (类别 × 难度等级 × 阶段策略)"""
+    domain_name: Optional[str]     # None: categories 中无此类别, 用领域键
+    rx_id: str
+    rx_name: str
+    tone: str
+    core_goal: str
+    scripts: Dict[str, str]
+    do_list: List[str]
+    dont_list: List[str]
+    advice: List[Dict]
+    knowledge: List[Dict]
+
+
+class CompiledLibrary:
+    """
+    加载时把 JSON 库编译为查表结构:
+    - bands: SPI 分段 → (难度等级, 强度系数)
+    - entries: (category, difficulty_level, strategy_key) → _DomainEntry,
+      建议已按难度过滤并截取前 5 条, 知识点截取前 3 条
+    """
+
+    def __init__(self, rx_library: Dict, strategy_library: Dict, spi_mapping: Dict):
+        self.rx_library = rx_library
+        self.strategy_library = strategy_library
+        self.spi_mapping = spi_mapping
+
+        self.rx_by_category: Dict[str, List[Dict]] = {}
+        for rx in rx_library.get("prescriptions", []):
+            self.rx_by_category.setdefault(rx.get("category", ""), []).append(rx)
+
+        spi_ranges = (
+            strategy_library
+            .get("prescription_framework", {})
+            .get("smart_goal_rules", {})
+            .get("spi_ranges", {})
+        )
+        self.bands = tuple(
+            (floor, spi_ranges.get(key, {}).get("level", level),
+             spi_ranges.get(key, {}).get("intensity_multiplier", multiplier))
+            for floor, key, level, multiplier in _SPI_BANDS
+        )
+
+        levels = set(DIFFICULTY_CAP) | {level for _, level, _ in self.bands}
+        strategy_keys = set(STAGE_TO_STRATEGY_KEY.values())
+        categories = rx_library.get("categories", {})
+        self.entries: Dict[tuple, _DomainEntry] = {}
+        for category, prescriptions in self.rx_by_category.items():
+            # 取该类别的第一个处方 (后续可扩展选择逻辑)
+            rx = prescriptions[0]
+            content = rx.get("content", {})
+            advice_list = content.get("constructive_advice", [])
+            knowledge = [
+                {"id": k.get("knowledge_id"), "title": k.get("title"), "content": k.get("content")}
+                for k in content.get("knowledge_points", [])[:_MAX_KNOWLEDGE]
+            ]
+            for strategy_key in strategy_keys:
+                # 缺失时回退到 intention
+                stage_strategy = (rx.get("stage_strategy", {}).get(strategy_key)
+                                  or rx.get("stage_strategy", {}).get("intention", {}))
+                for level in levels:
+                    cap = DIFFICULTY_CAP.get(level, 3)
+                    advice = [
+                        {
+                            "id": a.get("advice_id"),
+                            "title": a.get("title"),
+                            "description": a.get("description"),
+                            "difficulty": a.get("difficulty"),
+                            "priority": a.get("priority"),
+                        }
+                        for a in advice_list if a.get("difficulty", 3) <= cap
+                    ][:_MAX_ADVICE]
+                    self.entries[(category, level, strategy_key)] = _DomainEntry(
+                        domain_name=categories.get(category),
+                        rx_id=rx.get("rx_id", ""),
+                        rx_name=rx.get("name", ""),
+                        tone=stage_strategy.get("tone", "gentle_accepting"),
+                        core_goal=stage_strategy.get("core_goal", ""),
+                        scripts={
+                            "opening": stage_strategy.get("script_opening", ""),
+                            "motivation": stage_strategy.get("script_motivation", ""),
+                            "closing": stage_strategy.get("script_closing", ""),
+                        },
+                        do_list=stage_strategy.get("do", []),
+                        dont_list=stage_strategy.get("dont", []),
+                        advice=advice,
+                        knowledge=knowledge,
+                    )
+
+    def difficulty(self, spi_score: float) -> tuple:
+        for floor, level, multiplier in self.bands:
+            if spi_score >= floor:
+                return level, multiplier
+        return self.bands[-1][1], self.bands[-1][2]  # NaN
+
+
+def _load_json(path: str) -> Dict:
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except Exception as e:
+        logger.warning(f"Failed to load {path}: {e}")
+        return {}
+
+
+def _signature(paths: tuple) -> tuple:
+    sig = []
+    for path in paths:
+        try:
+            st = os.stat(path)
+            sig.append((st.st_mtime_ns, st.st_size))
+        except OSError:
+            sig.append(None)
+    return tuple(sig)
+
+
+# 进程内共享: 多处模块级实例共用同一份编译结果, 文件变化时重新编译
+_compiled_cache: Dict[tuple, tuple] = {}
+_compiled_lock = threading.Lock()
+
+
+def load_compiled_library(paths: tuple) -> CompiledLibrary:
+    """按 (rx, strategy, spi_mapping) 路径取编译结果; 文件 mtime/大小变化时重新编译"""
+    sig = _signature(paths)
+    cached = _compiled_cache.get(paths)
+    if cached is not None and cached[0] == sig:
+        return cached[1]
+    with _compiled_lock:
+        cached = _compiled_cache.get(paths)
+        if cached is not None and cached[0] == sig:
+            return cached[1]
+        library = CompiledLibrary(*(_load_json(p) for p in paths))
+        _compiled_cache[paths] = (sig, library)
+        if cached is not None:
+            logger.info(f"InterventionMatcher libraries reloaded: {len(library.entries)} entries")
+        return library
+
+
 class InterventionMatcher:
     """领域干预匹配引擎"""
 
-    def __init__(self):
-        self.rx_library = self._load_json(_RX_PATH)
-        self.strategy_library = self._load_json(_STRATEGY_PATH)
-        self.spi_mapping = self._load_json(_SPI_MAPPING_PATH)
-
-        # 构建 category → prescription 索引
-        self._rx_by_category: Dict[str, List[Dict]] = {}
-        for rx in self.rx_library.get("prescriptions", []):
-            cat = rx.get("category", "")
-            if cat not in self._rx_by_category:
-                self._rx_by_category[cat] = []
-            self._rx_by_category[cat].append(rx)
-
-    @staticmethod
-    def _load_json(path: str) -> Dict:
-        try:
-            with open(path, "r", encoding="utf-8") as f:
-                return json.load(f)
-        except Exception as e:
-            logger.warning(f"Failed to load {path}: {e}")
-            return {}
+    def __init__(
+        self,
+        rx_path: str = _RX_PATH,
+        strategy_path: str = _STRATEGY_PATH,
+        spi_mapping_path: str = _SPI_MAPPING_PATH,
+        reload_interval: float = 2.0,
+    ):
+        self._paths = (rx_path, strategy_path, spi_mapping_path)
+        self.reload_interval = reload_interval
+        self._library = load_compiled_library(self._paths)
+        self._checked_at = time.monotonic()
+
+    @property
+    def library(self) -> CompiledLibrary:
+        """编译后的库; 距上次检查超过 reload_interval 时按文件 mtime 热加载"""
+        now = time.monotonic()
+        if now - self._checked_at >= self.reload_interval:
+            self._checked_at = now
+            self._library = load_compiled_library(self._paths)
+        return self._library
+
+    @property
+    def rx_library(self) -> Dict:
+        return self.library.rx_library
+
+    @property
+    def strategy_library(self) -> Dict:
+        return self.library.strategy_library
+
+    @property
+    def spi_mapping(self) -> Dict:
+        return self.library.spi_mapping
+
+    @property
+    def _rx_by_category(self) -> Dict[str, List[Dict]]:
+        return self.library.rx_by_category
 
     def match(
         self,
@@ -126,13 +297,15 @@ class InterventionMatcher:
         Returns:
             InterventionPlan
         """
+        library = self.library
+
         # 1. 确定难度等级
-        difficulty_level, intensity_multiplier = self._get_difficulty(spi_score)
+        difficulty_level, intensity_multiplier = library.difficulty(spi_score)
 
         # 2. 确定阶段策略键
         strategy_key = STAGE_TO_STRATEGY_KEY.get(current_stage, "intention")
 
-        # 3. 为每个领域匹配干预
+        # 3. 为每个领域查表
         domain_interventions = []
         for domain in target_domains:
             intervention = self._match_domain(
@@ -140,6 +313,7 @@ class InterventionMatcher:
                 strategy_key=strategy_key,
                 difficulty_level=difficulty_level,
                 intensity_multiplier=intensity_multiplier,
+                library=library,
             )
             if intervention:
                 domain_interventions.append(intervention)
@@ -165,6 +339,7 @@ class InterventionMatcher:
         strategy_key: str,
         difficulty_level: str,
         intensity_multiplier: float,
+        library: Optional[CompiledLibrary] = None,
     ) -> Optional[DomainIntervention]:
         """匹配单个领域的干预方案"""
         category = DOMAIN_TO_CATEGORY.get(domain)
@@ -172,95 +347,32 @@ class InterventionMatcher:
             logger.warning(f"Unknown domain: {domain}")
             return None
 
-        # 找到该类别的第一个处方 (后续可扩展选择逻辑)
-        prescriptions = self._rx_by_category.get(category, [])
-        if not prescriptions:
+        entry = (library or self.library).entries.get((category, difficulty_level, strategy_key))
+        if entry is None:
             logger.warning(f"No prescriptions for category: {category}")
             return None
 
-        rx = prescriptions[0]
-        rx_id = rx.get("rx_id", "")
-        rx_name = rx.get("name", "")
-
-        # 获取阶段策略
-        stage_strategy = rx.get("stage_strategy", {}).get(strategy_key, {})
-        if not stage_strategy:
-            # 回退到 intention
-            stage_strategy = rx.get("stage_strategy", {}).get("intention", {})
-
-        # 获取内容
-        content = rx.get("content", {})
-        advice_list = content.get("constructive_advice", [])
-        knowledge_list = content.get("knowledge_points", [])
-
-        # 根据难度过滤建议 (仅保留难度 <= 当前级别的)
-        difficulty_cap = {"challenging": 5, "moderate": 3, "easy": 2, "minimal": 1}
-        cap = difficulty_cap.get(difficulty_level, 3)
-        filtered_advice = [
-            a for a in advice_list
-            if a.get("difficulty", 3) <= cap
-        ]
-
-        domain_name = self.rx_library.get("categories", {}).get(category, domain)
-
+        # 返回副本, 调用方修改不影响编译结果
         return DomainIntervention(
             domain=domain,
-            domain_name=domain_name,
-            rx_id=rx_id,
-            rx_name=rx_name,
+            domain_name=domain if entry.domain_name is None else entry.domain_name,
+            rx_id=entry.rx_id,
+            rx_name=entry.rx_name,
             stage_strategy=strategy_key,
-            tone=stage_strategy.get("tone", "gentle_accepting"),
-            core_goal=stage_strategy.get("core_goal", ""),
-            scripts={
-                "opening": stage_strategy.get("script_opening", ""),
-                "motivation": stage_strategy.get("script_motivation", ""),
-                "closing": stage_strategy.get("script_closing", ""),
-            },
-            do_list=stage_strategy.get("do", []),
-            dont_list=stage_strategy.get("dont", []),
-            advice=[
-                {
-                    "id": a.get("advice_id"),
-                    "title": a.get("title"),
-                    "description": a.get("description"),
-                    "difficulty": a.get("difficulty"),
-                    "priority": a.get("priority"),
-                }
-                for a in filtered_advice[:5]  # 最多5条
-            ],
-            knowledge=[
-                {
-                    "id": k.get("knowledge_id"),
-                    "title": k.get("title"),
-                    "content": k.get("content"),
-                }
-                for k in knowledge_list[:3]  # 最多3条
-            ],
+            tone=entry.tone,
+            core_goal=entry.core_goal,
+            scripts=dict(entry.scripts),
+            do_list=list(entry.do_list),
+            dont_list=list(entry.dont_list),
+            advice=[dict(a) for a in entry.advice],
+            knowledge=[dict(k) for k in entry.knowledge],
             difficulty_level=difficulty_level,
             intensity_multiplier=intensity_multiplier,
         )
 
     def _get_difficulty(self, spi_score: float) -> tuple:
         """根据 SPI 分数确定目标难度和强度系数"""
-        spi_ranges = (
-            self.strategy_library
-            .get("prescription_framework", {})
-            .get("smart_goal_rules", {})
-            .get("spi_ranges", {})
-        )
-
-        if spi_score >= 70:
-            cfg = spi_ranges.get(">=70", {})
-            return cfg.get("level", "challenging"), cfg.get("intensity_multiplier", 1.0)
-        elif spi_score >= 50:
-            cfg = spi_ranges.get("50-69", {})
-            return cfg.get("level", "moderate"), cfg.get("intensity_multiplier", 0.7)
-        elif spi_score >= 30:
-            cfg = spi_ranges.get("30-49", {})
-            return cfg.get("level", "easy"), cfg.get("intensity_multiplier", 0.4)
-        else:
-            cfg = spi_ranges.get("<30", {})
-            return cfg.get("level", "minimal"), cfg.get("intensity_multiplier", 0.2)
+        return self.library.difficulty(spi_score)
 
     def plan_to_dict(self, plan: InterventionPlan) -> Dict[str, Any]:
         """将干预计划转为可序列化字典"""
@@ -1,14 +1,31 @@
 """
 批量知识灌注编排服务
 
-流程: 上传文件 → 检测类型 → 解压(压缩包) → 转换Markdown → 分块 → 嵌入 → 入库
-复用现有 embedding_service + chunker + document_service
+流程: 上传文件 → 检测类型 → 创建任务(pending) → 后台流水线 → 入库
+复用现有 embedding_service + chunker + file_converter
+
+流水线阶段 (BatchIngestionJob.stage):
+  extract  — 解压压缩包 (单文件直接进入下一阶段)
+  convert  — PDF/DOCX 在进程池中并行转换 Markdown, TXT/MD 直接读取
+  chunk    — chunk_markdown 分块
+  embed    — 按 INGEST_EMBED_BATCH 批量嵌入
+  insert   — 单条 executemany 批量插入 chunk, 与文档/进度同一事务提交
+
+每个文件完成后记录到 completed_files 并提交, 任务失败后可从最后完成的文件续跑。
+各阶段 items / seconds / per_sec 写入 stage_stats。
 """
 import hashlib
+import json
+import multiprocessing
 import os
 import shutil
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime
-from typing import Optional
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from sqlalchemy import insert
 from sqlalchemy.orm import Session
 from loguru import logger
 
@@ -16,9 +33,19 @@ from core.models import BatchIngestionJob, KnowledgeDocument, KnowledgeChunk
 from core.knowledge.file_converter import convert_file_to_markdown, SUPPORTED_EXTENSIONS
 from core.knowledge.archive_extractor import extract_archive, is_archive, ARCHIVE_EXTENSIONS
 from core.knowledge.chunker import chunk_markdown
+from core.knowledge.chunk_sync import chunk_content_hash
 
+INGEST_DIR = os.getenv("KNOWLEDGE_INGEST_DIR", os.path.join("data", "ingest"))
+CONVERT_WORKERS = int(os.getenv("INGEST_CONVERT_WORKERS", str(min(4, os.cpu_count() or 1))))
+EMBED_BATCH_SIZE = int(os.getenv("INGEST_EMBED_BATCH", "32"))
 
-def process_batch_upload(
+# 需要进程池转换的格式 (CPU 密集); 其余格式主进程直接读取
+POOL_EXTENSIONS = {".pdf", ".docx"}
+
+STAGES = ("convert", "chunk", "embed", "insert")
+
+
+def create_batch_job(
     db: Session,
     user_id: int,
     file_path: str,
@@ -30,19 +57,10 @@ def process_batch_upload(
     priority: int = 5,
 ) -> BatchIngestionJob:
     """
-    处理批量上传
-
-    Args:
-        db: 数据库会话
-        user_id: 上传用户 ID
-        file_path: 上传文件的临时路径
-        filename: 原始文件名
-        scope: 知识范围 (platform/domain/tenant)
-        domain_id: 领域 ID
-        tenant_id: 租户 ID
+    创建批量灌注任务 (pending), 上传文件移入任务目录供后台流水线与续跑使用
 
-    Returns:
-        BatchIngestionJob 记录
+    Raises:
+        ValueError: 不支持的文件格式
     """
     ext = os.path.splitext(filename)[1].lower()
 
@@ -54,66 +72,180 @@ def process_batch_upload(
     else:
         raise ValueError(f"不支持的文件格式: {ext}")
 
-    # 创建任务记录
+    os.makedirs(INGEST_DIR, exist_ok=True)
+    source_path = os.path.join(INGEST_DIR, f"{uuid.uuid4().hex}{ext}")
+    shutil.move(file_path, source_path)
+
     job = BatchIngestionJob(
         user_id=user_id,
         filename=filename,
         file_type=file_type,
-        status="processing",
+        status="pending",
+        source_path=source_path,
+        job_params={
+            "scope": scope,
+            "domain_id": domain_id,
+            "tenant_id": tenant_id,
+            "evidence_tier": evidence_tier,
+            "priority": priority,
+        },
+        completed_files=[],
         created_at=datetime.utcnow(),
         updated_at=datetime.utcnow(),
     )
     db.add(job)
     db.commit()
     db.refresh(job)
+    return job
+
+
+def process_batch_upload(
+    db: Session,
+    user_id: int,
+    file_path: str,
+    filename: str,
+    scope: str = "platform",
+    domain_id: Optional[str] = None,
+    tenant_id: Optional[str] = None,
+    evidence_tier: str = "T3",
+    priority: int = 5,
+) -> BatchIngestionJob:
+    """
+    同步处理批量上传 (脚本/测试用; API 走 create_batch_job + 后台任务)
+
+    Args:
+        db: 数据库会话
+        user_id: 上传用户 ID
+        file_path: 上传文件的临时路径 (会被移入任务目录)
+        filename: 原始文件名
+        scope: 知识范围 (platform/domain/tenant)
+        domain_id: 领域 ID
+        tenant_id: 租户 ID
+
+    Returns:
+        BatchIngestionJob 记录
+    """
+    job = create_batch_job(
+        db, user_id, file_path, filename, scope, domain_id, tenant_id,
+        evidence_tier=evidence_tier, priority=priority,
+    )
+    return run_ingestion_job(db, job.id)
+
+
+def run_ingestion_job_background(job_id: int) -> None:
+    """后台任务入口 (FastAPI BackgroundTasks), 使用独立会话"""
+    from core.database import SessionLocal
+    db = SessionLocal()
+    try:
+        run_ingestion_job(db, job_id)
+    except Exception as e:
+        logger.error(f"批量灌注后台任务异常 job={job_id}: {e}")
+    finally:
+        db.close()
+
+
+def run_ingestion_job(
+    db: Session,
+    job_id: int,
+    convert_workers: Optional[int] = None,
+    embed_batch_size: Optional[int] = None,
+    embedder=None,
+) -> BatchIngestionJob:
+    """
+    执行 (或续跑) 批量灌注流水线
+
+    Args:
+        db: 数据库会话
+        job_id: BatchIngestionJob.id
+        convert_workers: PDF/DOCX 转换进程数, 0 表示主进程内转换
+        embed_batch_size: 每次嵌入请求的 chunk 数
+        embedder: 嵌入服务 (需提供 embed_many), 默认 EmbeddingService
+
+    Returns:
+        BatchIngestionJob 记录
+    """
+    job = db.query(BatchIngestionJob).filter(BatchIngestionJob.id == job_id).first()
+    if not job:
+        raise ValueError(f"任务不存在: {job_id}")
+    if job.status == "completed":
+        return job
+
+    workers = CONVERT_WORKERS if convert_workers is None else convert_workers
+    batch_size = embed_batch_size or EMBED_BATCH_SIZE
+    params = job.job_params or {}
+    stats = _StageStats(job.stage_stats)
+    completed = list(job.completed_files or [])
+    doc_ids = list(job.result_doc_ids or [])
+    resumed = bool(completed)
+
+    job.status = "processing"
+    job.error_message = None
+    job.updated_at = datetime.utcnow()
+    db.commit()
+
+    own_embedder = embedder is None
+    if own_embedder:
+        embedder = _default_embedder()
 
     tmp_dir = None
+    started = time.perf_counter()
     try:
-        if is_archive(file_path):
-            # 压缩包: 解压 → 逐文件处理
-            tmp_dir, files = extract_archive(file_path)
-            job.total_files = len(files)
-            db.commit()
+        if not job.source_path or not os.path.exists(job.source_path):
+            raise FileNotFoundError(f"上传文件不存在: {job.source_path}")
 
-            doc_ids = []
-            total_chunks = 0
-            for fpath in files:
-                try:
-                    fname = os.path.basename(fpath)
-                    md_text = convert_file_to_markdown(fpath)
-                    doc_id, n_chunks = _ingest_single_document(
-                        db, user_id, fname, md_text, scope, domain_id, tenant_id,
-                        evidence_tier=evidence_tier, priority=priority,
-                    )
-                    doc_ids.append(doc_id)
-                    total_chunks += n_chunks
-                    job.processed_files += 1
-                    db.commit()
-                except Exception as e:
-                    logger.warning(f"跳过文件 {fpath}: {e}")
-
-            job.total_chunks = total_chunks
-            job.result_doc_ids = doc_ids
+        # Stage: extract
+        _set_stage(db, job, "extract")
+        if is_archive(job.source_path):
+            tmp_dir, files = extract_archive(job.source_path)
+            files = sorted(files)
+            rel_names = [os.path.relpath(f, tmp_dir) for f in files]
         else:
-            # 单文件处理
-            job.total_files = 1
-            db.commit()
+            files = [job.source_path]
+            rel_names = [job.filename]
+        job.total_files = len(files)
+
+        done = set(completed)
+        pending = [(f, rel) for f, rel in zip(files, rel_names) if rel not in done]
+        if resumed:
+            logger.info(f"续跑批量灌注 job={job.id}: 已完成 {len(done)}, 剩余 {len(pending)}")
 
-            md_text = convert_file_to_markdown(file_path)
-            doc_id, n_chunks = _ingest_single_document(
-                db, user_id, filename, md_text, scope, domain_id, tenant_id,
-                evidence_tier=evidence_tier, priority=priority,
-            )
-            job.processed_files = 1
-            job.total_chunks = n_chunks
-            job.result_doc_ids = [doc_id]
+        _set_stage(db, job, "convert")
+        for rel, md_text, error in _convert_stage(pending, workers, stats):
+            if error is not None:
+                logger.warning(f"跳过文件 {rel}: {error}")
+                stats.skip(rel, error)
+            else:
+                doc_id, n_chunks = _ingest_document(
+                    db, job, rel, md_text, params, embedder, batch_size, stats,
+                )
+                doc_ids.append(doc_id)
+                job.total_chunks = (job.total_chunks or 0) + n_chunks
+                job.processed_files = (job.processed_files or 0) + 1
+
+            # 文档 + chunks + 进度同一事务提交 → 续跑从下一个文件开始
+            completed.append(rel)
+            job.completed_files = list(completed)
+            job.result_doc_ids = list(doc_ids)
+            job.stage_stats = stats.to_dict(time.perf_counter() - started)
+            job.updated_at = datetime.utcnow()
+            db.commit()
 
         job.status = "completed"
+        job.stage = "done"
+        job.stage_stats = stats.to_dict(time.perf_counter() - started)
         job.updated_at = datetime.utcnow()
         db.commit()
 
+        _remove_source(job.source_path)
+        logger.info(
+            f"批量灌注完成 job={job.id}: {job.processed_files}/{job.total_files} 文件, "
+            f"{job.total_chunks} chunks"
+        )
+
     except Exception as e:
-        logger.error(f"批量灌注失败 job={job.id}: {e}")
+        logger.error(f"批量灌注失败 job={job.id} stage={job.stage}: {e}")
+        db.rollback()
+        job = db.query(BatchIngestionJob).filter(BatchIngestionJob.id == job_id).first()
         job.status = "failed"
         job.error_message = str(e)[:500]
         job.updated_at = datetime.utcnow()
@@ -121,34 +253,101 @@ def process_batch_upload(
     finally:
         if tmp_dir and os.path.exists(tmp_dir):
             shutil.rmtree(tmp_dir, ignore_errors=True)
+        if own_embedder and hasattr(embedder, "close"):
+            embedder.close()
 
     return job
 
 
-def _ingest_single_document(
+def delete_job_source(job: BatchIngestionJob) -> None:
+    """删除任务目录中的上传文件 (任务删除时调用)"""
+    _remove_source(job.source_path)
+
+
+# =====================================================================
+# 阶段实现
+# =====================================================================
+
+def _convert_timed(file_path: str) -> Tuple[str, float]:
+    """进程池 worker: 转换并返回耗时 (秒)"""
+    t0 = time.perf_counter()
+    text = convert_file_to_markdown(file_path)
+    return text, time.perf_counter() - t0
+
+
+def _convert_stage(
+    pending: List[Tuple[str, str]],
+    workers: int,
+    stats: "_StageStats",
+) -> Iterator[Tuple[str, Optional[str], Optional[str]]]:
+    """
+    按原顺序产出 (相对路径, markdown, 错误信息)
+
+    PDF/DOCX 提前提交到进程池 (最多 workers*2 个在途), 主进程同时处理已完成的文件,
+    转换与后续 chunk/embed/insert 形成流水线。
+    """
+    use_pool = workers > 0 and sum(
+        1 for f, _ in pending if os.path.splitext(f)[1].lower() in POOL_EXTENSIONS
+    ) > 1
+    if not use_pool:
+        for path, rel in pending:
+            try:
+                text, seconds = _convert_timed(path)
+            except Exception as e:
+                yield rel, None, str(e)[:200]
+                continue
+            stats.add("convert", 1, seconds)
+            yield rel, text, None
+        return
+
+    ctx = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=workers, mp_context=ctx) as pool:
+        futures: Dict[int, Any] = {}
+        window = workers * 2
+        next_submit = 0
+
+        def submit_until(limit: int):
+            nonlocal next_submit
+            while next_submit < len(pending) and next_submit < limit:
+                path = pending[next_submit][0]
+                if os.path.splitext(path)[1].lower() in POOL_EXTENSIONS:
+                    futures[next_submit] = pool.submit(_convert_timed, path)
+                next_submit += 1
+
+        submit_until(window)
+        for idx, (path, rel) in enumerate(pending):
+            submit_until(idx + window)
+            try:
+                future = futures.pop(idx, None)
+                text, seconds = future.result() if future else _convert_timed(path)
+            except Exception as e:
+                yield rel, None, str(e)[:200]
+                continue
+            stats.add("convert", 1, seconds)
+            yield rel, text, None
+
+
+def _ingest_document(
     db: Session,
-    user_id: int,
-    filename: str,
+    job: BatchIngestionJob,
+    rel_name: str,
     markdown_text: str,
-    scope: str,
-    domain_id: Optional[str],
-    tenant_id: Optional[str],
-    evidence_tier: str = "T3",
-    priority: int = 5,
-) -> tuple:
+    params: Dict[str, Any],
+    embedder,
+    batch_size: int,
+    stats: "_StageStats",
+) -> Tuple[int, int]:
     """
-    灌注单个文档
+    灌注单个文档: 分块 → 批量嵌入 → 批量插入 (不提交, 由调用方与进度一起提交)
 
     Returns:
         (document_id, chunk_count)
     """
     # 去掉扩展名作为标题
-    title = os.path.splitext(filename)[0]
+    title = os.path.splitext(os.path.basename(rel_name))[0]
 
     # 计算内容哈希（去重防重复导入）
     file_hash = hashlib.sha256(markdown_text.encode("utf-8", errors="replace")).hexdigest()
-
-    # 去重检查：若已存在相同 hash 的文档则跳过
     existing = db.query(KnowledgeDocument).filter(
         KnowledgeDocument.file_hash == file_hash
     ).first()
@@ -156,81 +355,135 @@ def _ingest_single_document(
         logger.info(f"文档已存在(hash重复)，跳过: {title} → doc_id={existing.id}")
         return existing.id, existing.chunk_count or 0
 
-    # 创建 KnowledgeDocument
+    scope = params.get("scope", "platform")
+    domain_id = params.get("domain_id")
+    tenant_id = params.get("tenant_id")
+    author = f"user_{job.user_id}"
+
+    # Stage: chunk
+    t0 = time.perf_counter()
+    chunks = chunk_markdown(markdown_text)
+    stats.add("chunk", len(chunks), time.perf_counter() - t0)
+
+    # Stage: embed
+    _set_stage(db, job, "embed", commit=False)
+    t0 = time.perf_counter()
+    texts = [c["content"] for c in chunks]
+    vectors = embedder.embed_many(texts, batch_size=batch_size) if (texts and embedder) else []
+    stats.add("embed", len(texts), time.perf_counter() - t0)
+
+    # Stage: insert
+    _set_stage(db, job, "insert", commit=False)
+    t0 = time.perf_counter()
+    now = datetime.utcnow()
     doc = KnowledgeDocument(
         title=title,
-        author=f"user_{user_id}",
+        author=author,
         source="batch_upload",
         domain_id=domain_id,
         scope=scope,
         tenant_id=tenant_id,
-        priority=priority,
+        priority=params.get("priority", 5),
         is_active=True,
         status="ready",
         raw_content=markdown_text,
-        evidence_tier=evidence_tier,
+        evidence_tier=params.get("evidence_tier", "T3"),
         file_hash=file_hash,
         file_type="md",
         review_status="not_required",
-        created_at=datetime.utcnow(),
-        updated_at=datetime.utcnow(),
+        chunk_count=len(chunks),
+        created_at=now,
+        updated_at=now,
     )
     db.add(doc)
     db.flush()
 
-    # 分块
-    chunks = chunk_markdown(markdown_text)
-    chunk_count = len(chunks)
-
-    # 嵌入 + 入库
-    try:
-        from core.knowledge.embedding_service import get_embedding
+    if chunks:
+        rows = []
         for i, chunk_data in enumerate(chunks):
-            chunk_text = chunk_data if isinstance(chunk_data, str) else chunk_data.get("content", "")
-            heading = "" if isinstance(chunk_data, str) else chunk_data.get("heading", "")
+            vec = vectors[i] if i < len(vectors) else None
+            rows.append({
+                "document_id": doc.id,
+                "content": chunk_data["content"],
+                "heading": chunk_data.get("heading", ""),
+                "chunk_index": i,
+                "content_hash": chunk_content_hash(chunk_data.get("heading", ""), chunk_data["content"]),
+                "doc_title": title,
+                "doc_author": author,
+                "doc_source": "batch_upload",
+                "scope": scope,
+                "domain_id": domain_id,
+                "tenant_id": tenant_id,
+                "embedding_1024": json.dumps(vec) if vec else None,
+                "created_at": now,
+            })
+        db.execute(insert(KnowledgeChunk), rows)
+    stats.add("insert", len(chunks), time.perf_counter() - t0)
+    _set_stage(db, job, "convert", commit=False)
 
-            embedding = None
-            try:
-                embedding = get_embedding(chunk_text)
-            except Exception:
-                pass  # 嵌入失败仍存储文本
-
-            import json
-            chunk = KnowledgeChunk(
-                document_id=doc.id,
-                content=chunk_text,
-                heading=heading,
-                chunk_index=i,
-                doc_title=title,
-                doc_author=doc.author,
-                doc_source="batch_upload",
-                scope=scope,
-                domain_id=domain_id,
-                tenant_id=tenant_id,
-                embedding=json.dumps(embedding) if embedding else None,
-                created_at=datetime.utcnow(),
-            )
-            db.add(chunk)
+    logger.info(f"文档入库: {title} ({len(chunks)} chunks)")
+    return doc.id, len(chunks)
+
+
+# =====================================================================
+# 辅助
+# =====================================================================
+
+class _StageStats:
+    """各阶段累计计数与耗时 (续跑时从 stage_stats 恢复)"""
+
+    def __init__(self, saved: Optional[Dict[str, Any]] = None):
+        saved = saved or {}
+        self._stages = {
+            name: {
+                "items": saved.get(name, {}).get("items", 0),
+                "seconds": saved.get(name, {}).get("seconds", 0.0),
+            }
+            for name in STAGES
+        }
+        self._skipped = list(saved.get("skipped", []))
+        self._wall_before = saved.get("wall_seconds", 0.0)
+
+    def add(self, stage: str, items: int, seconds: float) -> None:
+        self._stages[stage]["items"] += items
+        self._stages[stage]["seconds"] += seconds
+
+    def skip(self, rel_name: str, error: str) -> None:
+        self._skipped.append({"file": rel_name, "error": error})
+
+    def to_dict(self, wall_seconds: float = 0.0) -> Dict[str, Any]:
+        result: Dict[str, Any] = {}
+        for name, s in self._stages.items():
+            seconds = round(s["seconds"], 3)
+            result[name] = {
+                "items": s["items"],
+                "seconds": seconds,
+                "per_sec": round(s["items"] / s["seconds"], 2) if s["seconds"] > 0 else None,
+            }
+        result["skipped"] = list(self._skipped)
+        result["wall_seconds"] = round(self._wall_before + wall_seconds, 3)
+        return result
+
+
+def _set_stage(db: Session, job: BatchIngestionJob, stage: str, commit: bool = True) -> None:
+    job.stage = stage
+    job.updated_at = datetime.utcnow()
+    if commit:
+        db.commit()
+
+
+def _default_embedder():
+    try:
+        from core.knowledge.embedding_service import EmbeddingService
+        return EmbeddingService()
     except ImportError:
         logger.warning("embedding_service 不可用，跳过嵌入")
-        for i, chunk_data in enumerate(chunks):
-            chunk_text = chunk_data if isinstance(chunk_data, str) else chunk_data.get("content", "")
-            heading = "" if isinstance(chunk_data, str) else chunk_data.get("heading", "")
-            chunk = KnowledgeChunk(
-                document_id=doc.id,
-                content=chunk_text,
-                heading=heading,
-                chunk_index=i,
-                doc_title=title,
-                scope=scope,
-                domain_id=domain_id,
-                tenant_id=tenant_id,
-                created_at=datetime.utcnow(),
-            )
-            db.add(chunk)
-
-    doc.chunk_count = chunk_count
-    db.commit()
+        return None
+
 
-    logger.info(f"文档入库: {title} ({chunk_count} chunks)")
-    return doc.id, chunk_count
+def _remove_source(path: Optional[str]) -> None:
+    if path and os.path.exists(path):
+        try:
+            os.unlink(path)
+        except OSError as e:
+            logger.warning(f"删除上传文件失败 {path}: {e}")
@@ -0,0 +1,120 @@
+"""
+Chunk 级增量同步
+
+文档重新发布/重新灌注时按 chunk 内容哈希比对:
+  - 未变化的 chunk 保留原 id 与向量, 仅在位置变化时更新 chunk_index
+  - 新增/修改的 chunk 才调用嵌入
+  - 已不存在的 chunk 直接删除 (向量索引随行删除增量更新)
+
+编辑 200 页指南中的一个段落, 只需嵌入受影响的一两个 chunk。
+"""
+
+import hashlib
+import json
+import logging
+from collections import defaultdict
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy.orm import Session
+
+from core.models import KnowledgeChunk
+
+logger = logging.getLogger(__name__)
+
+
+def chunk_content_hash(heading: Optional[str], content: str) -> str:
+    """chunk 内容哈希 (标题参与哈希: 标题变化会改变检索上下文)"""
+    payload = f"{heading or ''}\n{content}"
+    return hashlib.sha256(payload.encode("utf-8", errors="replace")).hexdigest()
+
+
+def sync_document_chunks(
+    db: Session,
+    document_id: int,
+    chunks: List[Dict[str, str]],
+    embedder,
+    chunk_fields: Optional[Dict[str, Any]] = None,
+    batch_size: int = 32,
+) -> Dict[str, int]:
+    """
+    将 chunk_markdown() 的结果增量同步到 KnowledgeChunk (不提交, 由调用方提交)
+
+    Args:
+        db: 数据库会话
+        document_id: KnowledgeDocument.id
+        chunks: [{"heading": ..., "content": ...}, ...]
+        embedder: 提供 embed_many(texts, batch_size) 的嵌入服务, None 则不嵌入
+        chunk_fields: 写入每个 chunk 的文档级字段 (doc_title/scope/tenant_id 等)
+        batch_size: 每次嵌入请求的 chunk 数
+
+    Returns:
+        {"kept": 复用数, "added": 新建数, "removed": 删除数, "embedded": 嵌入数}
+    """
+    fields = chunk_fields or {}
+    existing = db.query(KnowledgeChunk).filter(
+        KnowledgeChunk.document_id == document_id
+    ).order_by(KnowledgeChunk.chunk_index).all()
+
+    # 旧数据无 content_hash 时按内容现算 (顺带回填), 首次重新发布即可复用
+    pool: Dict[str, List[KnowledgeChunk]] = defaultdict(list)
+    for row in existing:
+        if not row.content_hash:
+            row.content_hash = chunk_content_hash(row.heading, row.content)
+        pool[row.content_hash].append(row)
+
+    kept = 0
+    to_embed: List[KnowledgeChunk] = []
+    now = datetime.utcnow()
+    for index, chunk_data in enumerate(chunks):
+        heading = chunk_data.get("heading", "")
+        content = chunk_data["content"]
+        digest = chunk_content_hash(heading, content)
+
+        if pool.get(digest):
+            row = pool[digest].pop(0)
+            kept += 1
+            if row.chunk_index != index:
+                row.chunk_index = index
+            for key, value in fields.items():
+                if getattr(row, key) != value:
+                    setattr(row, key, value)
+            if not row.embedding_1024:
+                to_embed.append(row)
+            continue
+
+        row = KnowledgeChunk(
+            document_id=document_id,
+            content=content,
+            heading=heading,
+            chunk_index=index,
+            content_hash=digest,
+            created_at=now,
+            **fields,
+        )
+        db.add(row)
+        to_embed.append(row)
+
+    removed = 0
+    for rows in pool.values():
+        for row in rows:
+            db.delete(row)
+            removed += 1
+
+    embedded = 0
+    if to_embed and embedder is not None:
+        vectors = embedder.embed_many([r.content for r in to_embed], batch_size=batch_size)
+        for row, vec in zip(to_embed, vectors):
+            if vec:
+                row.embedding_1024 = json.dumps(vec)
+                embedded += 1
+
+    db.flush()
+    stats = {
+        "kept": kept,
+        "added": len(chunks) - kept,
+        "removed": removed,
+        "embedded": embedded,
+    }
+    logger.info(f"chunk 增量同步 doc={document_id}: {stats}")
+    return stats
@@ -5,16 +5,16 @@
 包含内容治理：证据分层、审核流程、过期降权。
 """
 
-import json
 import logging
 from datetime import datetime
 from typing import List, Optional
 
 from sqlalchemy.orm import Session
 
-from core.models import KnowledgeDocument, KnowledgeChunk, User, TIER_PRIORITY_MAP
+from core.models import KnowledgeDocument, User, TIER_PRIORITY_MAP
 from core.knowledge.embedding_service import EmbeddingService
 from core.knowledge.chunker import chunk_markdown
+from core.knowledge.chunk_sync import sync_document_chunks
 
 logger = logging.getLogger(__name__)
 
@@ -119,7 +119,8 @@ def update_document(
 
 def publish_document(db: Session, doc_id: int, tenant_id: str) -> KnowledgeDocument:
     """
-    发布文档：分块 + 嵌入 + 写入 KnowledgeChunk
+    发布文档：分块 + 增量嵌入 + 写入 KnowledgeChunk
+    重新发布 (编辑后) 只嵌入内容变化的 chunk, 见 chunk_sync
     T4 审核守卫：必须 review_status=approved 才可发布
     """
     doc = db.query(KnowledgeDocument).filter(
@@ -141,43 +142,28 @@ def publish_document(db: Session, doc_id: int, tenant_id: str) -> KnowledgeDocum
 
     embedder = EmbeddingService()
     try:
-        # 2. 删除旧 chunks
-        db.query(KnowledgeChunk).filter(
-            KnowledgeChunk.document_id == doc.id
-        ).delete()
-        db.flush()
-
-        # 3. 分块
+        # 2. 分块
         chunks = chunk_markdown(doc.raw_content)
         if not chunks:
             doc.status = "error"
             db.commit()
             raise ValueError("分块结果为空")
 
-        # 4. 嵌入
-        texts = [c["content"] for c in chunks]
-        logger.info(f"发布文档 [{doc.title}]: {len(chunks)} 块, 开始嵌入...")
-        embeddings = embedder.embed_batch(texts)
-
-        # 5. 创建 chunks
-        for i, (chunk_data, embedding) in enumerate(zip(chunks, embeddings)):
-            chunk = KnowledgeChunk(
-                document_id=doc.id,
-                content=chunk_data["content"],
-                heading=chunk_data.get("heading", ""),
-                chunk_index=i,
-                doc_title=doc.title,
-                doc_author=doc.author,
-                doc_source=f"expert:{tenant_id}",
-                scope="tenant",
-                domain_id=doc.domain_id,
-                tenant_id=tenant_id,
-                embedding=json.dumps(embedding) if embedding else None,
-                created_at=datetime.utcnow(),
-            )
-            db.add(chunk)
-
-        # 6. 更新状态
+        # 3. 按 chunk 内容哈希增量同步: 未变化的保留 id 与向量, 只嵌入新增/修改的
+        logger.info(f"发布文档 [{doc.title}]: {len(chunks)} 块, 增量嵌入...")
+        sync_stats = sync_document_chunks(
+            db, doc.id, chunks, embedder,
+            chunk_fields={
+                "doc_title": doc.title,
+                "doc_author": doc.author,
+                "doc_source": f"expert:{tenant_id}",
+                "scope": "tenant",
+                "domain_id": doc.domain_id,
+                "tenant_id": tenant_id,
+            },
+        )
+
+        # 4. 更新状态
         doc.status = "ready"
         doc.is_active = True
         doc.chunk_count = len(chunks)
@@ -185,7 +171,10 @@ def publish_document(db: Session, doc_id: int, tenant_id: str) -> KnowledgeDocum
         db.commit()
         db.refresh(doc)
 
-        logger.info(f"文档 [{doc.title}] 发布成功: {len(chunks)} 块")
+        logger.info(
+            f"文档 [{doc.title}] 发布成功: {len(chunks)} 块 "
+            f"(复用 {sync_stats['kept']}, 嵌入 {sync_stats['embedded']}, 删除 {sync_stats['removed']})"
+        )
         return doc
 
     except Exception as e:
@@ -57,5 +57,38 @@ class EmbeddingService:
                 logger.info(f"Embedding 进度: {i + 1}/{len(texts)}")
         return results
 
+    def embed_many(self, texts: List[str], batch_size: int = 32) -> List[List[float]]:
+        """
+        批量嵌入 (Ollama /api/embed, 一次请求多条 input)
+
+        旧版 Ollama 无 /api/embed 时回退到 embed_batch 逐条调用。
+        单批失败时该批返回空向量, 与 embed_query 的失败语义一致。
+        """
+        results: List[List[float]] = []
+        for start in range(0, len(texts), batch_size):
+            batch = texts[start:start + batch_size]
+            try:
+                resp = self._client.post(
+                    f"{self.base_url}/api/embed",
+                    json={"model": self.model, "input": batch},
+                )
+                if resp.status_code == 404:
+                    return results + self.embed_batch(texts[start:])
+                resp.raise_for_status()
+                vecs = resp.json().get("embeddings", [])
+            except Exception as e:
+                logger.error(f"Batch embedding 失败 ({len(batch)} 条): {e}")
+                vecs = []
+            if len(vecs) != len(batch):
+                vecs = [[] for _ in batch]
+            for vec in vecs:
+                if vec and len(vec) != self.expected_dim:
+                    logger.error(
+                        f"维度不匹配: 模型返回 {len(vec)} 维, 期望 {self.expected_dim} 维"
+                    )
+                    vec = []
+                results.append(vec)
+        return results
+
     def close(self):
         self._client.close()
@@ -14,14 +14,19 @@ master_agent.py - 中枢 Master Agent
 9. 写回 User Master Profile + 生成今日任务 / 追踪点
 """
 
+import copy
 import uuid
-import json
+import atexit
+import threading
+from collections import OrderedDict
 from datetime import datetime, timedelta
 from pathlib import Path
 from dataclasses import dataclass, field, asdict
 from typing import Dict, Any, Optional, List, Tuple
 from enum import Enum
 
+from core.profile_store import FileProfileStore, ProfileVersionConflict
+
 
 # ============================================================================
 # Core Data Schema v1.0 - 系统最高级别数据协议规范
@@ -808,9 +813,9 @@ class DataFormatConverter:
             "intervention_state", "history_refs"
         ]
 
-        for field in new_format_fields:
-            if field in data and field not in result:
-                result[field] = data[field]
+        for key in new_format_fields:
+            if key in data and key not in result:
+                result[key] = data[key]
 
         return result if result else data
 
@@ -993,9 +998,9 @@ class DataFormatConverter:
             "patterns", "adherence_score", "task_completion_rate",
             "streak_days", "cultivation_phase"
         ]
-        for field in direct_mappings:
-            if field in old:
-                result[field] = old[field]
+        for key in direct_mappings:
+            if key in old:
+                result[key] = old[key]
 
         return result
 
@@ -1013,9 +1018,9 @@ class DataFormatConverter:
         # 体质指标
         constitution_fields = ["bmi", "bmi_category", "metabolic_age",
                               "visceral_fat", "inflammation_risk"]
-        for field in constitution_fields:
-            if field in old:
-                result["constitution"][field] = old[field]
+        for key in constitution_fields:
+            if key in old:
+                result["constitution"][key] = old[key]
 
         # 行为指标
         if "change_stage" in old:
@@ -2937,47 +2942,211 @@ class UserMasterProfile:
 
     基于 user_state_schema.json 的完整用户画像，
     贯穿整个处理流程，支持读取、更新、写回。
+
+    缓存为有界 LRU (cache_size)；update_profile 的深度合并同时累积为待写 delta，
+    save_profile 交给后台 flusher 合并写入 (同一用户多次更新只落一次盘)，
+    写入走 core.profile_store 的增量日志 + 乐观版本校验; 版本冲突时以存储最新版本为底重放
+    delta, 从不无版本覆盖。flush() 只在锁内摘取待写任务, 磁盘 I/O 在锁外进行。
+    flush_interval=0 时 save_profile 同步落盘。
+    画像修改需经 update_profile / set_profile，直接改 get_profile 返回的 dict 不会被记录为 delta。
     """
 
-    def __init__(self, storage_path: str = "data/profiles"):
+    def __init__(self, storage_path: str = "data/profiles", cache_size: int = 1024,
+                 flush_interval: float = 0.5, store: Optional[FileProfileStore] = None):
         self.storage_path = Path(storage_path)
-        self.storage_path.mkdir(parents=True, exist_ok=True)
-        self._cache: Dict[str, Dict[str, Any]] = {}
+        self.store = store or FileProfileStore(storage_path)
+        self.cache_size = max(1, cache_size)
+        self.flush_interval = flush_interval
+        self._cache: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._versions: Dict[str, int] = {}          # 缓存副本对应的存储版本 (0 = 未落盘)
+        self._pending: Dict[str, Dict[str, Any]] = {}  # 尚未写入的合并 delta
+        self._full_write: set = set()                # 需要整份写入 (新用户 / set_profile)
+        self._queued: set = set()                    # 已 save_profile、等待 flusher
+        self._lock = threading.RLock()
+        self._wakeup = threading.Event()
+        self._flusher: Optional[threading.Thread] = None
+        self._closed = False
+        self._atexit_registered = False
+
+    # ------------------------------------------------------------------
+    # 缓存
+    # ------------------------------------------------------------------
+
+    def _cache_put(self, user_id: str, profile: Dict[str, Any]) -> None:
+        self._cache[user_id] = profile
+        self._cache.move_to_end(user_id)
+        while len(self._cache) > self.cache_size:
+            victim = next(iter(self._cache))
+            if victim in self._pending or victim in self._queued:
+                # 淘汰前先落盘，避免丢失未写入的更新
+                self._flush_user(victim)
+            self._cache.pop(victim, None)
+            self._versions.pop(victim, None)
+            self._queued.discard(victim)
 
     def get_profile(self, user_id: str) -> Dict[str, Any]:
         """获取用户画像"""
-        # 优先从缓存读取
-        if user_id in self._cache:
-            return self._cache[user_id]
-
-        # 从文件读取
-        profile_path = self.storage_path / f"{user_id}.json"
-        if profile_path.exists():
-            with open(profile_path, 'r', encoding='utf-8') as f:
-                profile = json.load(f)
-                self._cache[user_id] = profile
+        with self._lock:
+            # 优先从缓存读取
+            profile = self._cache.get(user_id)
+            if profile is not None:
+                self._cache.move_to_end(user_id)
                 return profile
 
-        # 新用户，创建默认画像
-        return self._create_default_profile(user_id)
+            # 从存储读取
+            profile, version = self.store.load(user_id)
+            if profile is not None:
+                self._versions[user_id] = version
+                self._cache_put(user_id, profile)
+                return profile
+
+            # 新用户，创建默认画像
+            return self._create_default_profile(user_id)
 
     def update_profile(self, user_id: str, updates: Dict[str, Any]) -> Dict[str, Any]:
         """更新用户画像 (深度合并)"""
-        profile = self.get_profile(user_id)
-        self._deep_merge(profile, updates)
-        profile["last_updated"] = datetime.now().isoformat()
-        self._cache[user_id] = profile
-        return profile
+        with self._lock:
+            profile = self.get_profile(user_id)
+            self._deep_merge(profile, updates)
+            profile["last_updated"] = datetime.now().isoformat()
+            pending = self._pending.setdefault(user_id, {})
+            self._deep_merge(pending, updates)
+            pending["last_updated"] = profile["last_updated"]
+            return profile
+
+    # ------------------------------------------------------------------
+    # 持久化
+    # ------------------------------------------------------------------
 
     def save_profile(self, user_id: str) -> bool:
-        """持久化用户画像"""
-        if user_id not in self._cache:
+        """持久化用户画像 (write-behind: 入队后由 flusher 合并写入)"""
+        with self._lock:
+            if user_id not in self._cache:
+                return False
+            if self.flush_interval <= 0 or self._closed:
+                return self._flush_user(user_id)
+            self._queued.add(user_id)
+            self._ensure_flusher()
+        return True
+
+    def flush(self) -> int:
+        """立即写入所有已入队的画像，返回成功写入的用户数 (I/O 不持有画像锁)"""
+        with self._lock:
+            queued = list(self._queued)
+            self._queued.clear()
+            jobs = [job for job in map(self._take_job, queued) if job is not None]
+        written = 0
+        for job in jobs:
+            result = self._write_job(job)
+            with self._lock:
+                written += self._finish_job(job, result)
+        return written
+
+    def close(self) -> None:
+        """停止 flusher 并写入剩余更新"""
+        self._closed = True
+        self._wakeup.set()
+        if self._flusher is not None:
+            self._flusher.join(timeout=5)
+        self.flush()
+
+    def _ensure_flusher(self) -> None:
+        if self._flusher is not None and self._flusher.is_alive():
+            return
+        self._flusher = threading.Thread(target=self._flush_loop, name="profile-flusher", daemon=True)
+        self._flusher.start()
+        if not self._atexit_registered:
+            atexit.register(self.close)
+            self._atexit_registered = True
+
+    def _flush_loop(self) -> None:
+        while not self._closed:
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            try:
+                self.flush()
+            except Exception as e:
+                print(f"[UserMasterProfile] 画像写入失败: {e}")
+
+    def _flush_user(self, user_id: str) -> bool:
+        """同步写入单个用户 (调用方持有 self._lock: 同步保存 / 缓存淘汰)"""
+        if user_id not in self._cache and user_id not in self._pending:
             return False
+        job = self._take_job(user_id)
+        if job is None:
+            return True
+        return self._finish_job(job, self._write_job(job))
+
+    def _take_job(self, user_id: str) -> Optional[Dict[str, Any]]:
+        """摘取待写内容 (调用方持有 self._lock); 写入在锁外进行, 因此快照与 delta 都复制一份"""
+        delta = self._pending.pop(user_id, None)
+        full = user_id in self._full_write and user_id in self._cache
+        self._full_write.discard(user_id)
+        if not full and not delta:
+            return None
+        return {
+            "user_id": user_id,
+            "snapshot": copy.deepcopy(self._cache[user_id]) if full else None,
+            "delta": copy.deepcopy(delta) if delta else None,
+            "expected": self._versions.get(user_id, 0),
+        }
 
-        profile_path = self.storage_path / f"{user_id}.json"
-        with open(profile_path, 'w', encoding='utf-8') as f:
-            json.dump(self._cache[user_id], f, ensure_ascii=False, indent=2)
-        return True
+    def _write_job(self, job: Dict[str, Any]) -> Tuple[str, int, Optional[Dict[str, Any]]]:
+        """执行写入 (不持锁), 返回 (状态, 版本, 变基后的画像)
+
+        新用户/整份替换写快照，其余只写累积 delta；版本冲突时以存储最新画像为底重放 delta。
+        状态: written 已写入 / dropped 只有整份快照而存储已有更新版本, 放弃写入 /
+        conflict 持续冲突, 由 _finish_job 重新入队。
+        """
+        user_id, delta, expected = job["user_id"], job["delta"], job["expected"]
+        snapshot = job["snapshot"]
+        rebased = None
+        for _ in range(3):
+            try:
+                if snapshot is not None:
+                    version = self.store.write_full(user_id, snapshot, expected_version=expected)
+                else:
+                    version = self.store.write_delta(user_id, delta, expected_version=expected)
+                return "written", version, rebased
+            except ProfileVersionConflict:
+                # 其他 worker 已写入: 以存储中的最新画像为底重放本地变更
+                latest, expected = self.store.load(user_id)
+                if latest is None:
+                    continue
+                if not delta:
+                    return "dropped", expected, latest
+                self._deep_merge(latest, copy.deepcopy(delta))
+                rebased = latest
+                snapshot = None
+        return "conflict", expected, rebased
+
+    def _finish_job(self, job: Dict[str, Any], result: Tuple[str, int, Optional[Dict[str, Any]]]) -> bool:
+        """写入结果回填缓存 (调用方持有 self._lock), 返回是否已写入"""
+        user_id = job["user_id"]
+        status, version, rebased = result
+        if status == "conflict":
+            # 不做无版本覆盖: 把 delta 放回待写队列, 下一轮以新版本为底重试
+            requeued = job["delta"] or {}
+            self._deep_merge(requeued, self._pending.get(user_id, {}))
+            if requeued:
+                self._pending[user_id] = requeued
+            elif job["snapshot"] is not None:
+                self._full_write.add(user_id)
+            self._queued.add(user_id)
+            if self.flush_interval > 0 and not self._closed:
+                self._ensure_flusher()
+        profile = self._cache.get(user_id)
+        if profile is None:
+            return status == "written"
+        if rebased is not None:
+            # 缓存副本改为存储版本 + 本地变更, 再叠加写入期间新到的 delta
+            merged = copy.deepcopy(rebased)
+            self._deep_merge(merged, copy.deepcopy(self._pending.get(user_id, {})))
+            profile.clear()
+            profile.update(merged)
+        if status != "conflict" or rebased is not None:
+            self._versions[user_id] = max(version, self._versions.get(user_id, 0))
+        return status == "written"
 
     def _create_default_profile(self, user_id: str) -> Dict[str, Any]:
         """创建默认用户画像 (v2.0 结构)"""
@@ -3104,16 +3273,23 @@ class UserMasterProfile:
             "session_history": []
         }
 
-        self._cache[user_id] = profile
+        with self._lock:
+            self._cache_put(user_id, profile)
+            self._full_write.add(user_id)
+            self._pending.pop(user_id, None)
         return profile
 
     def set_profile(self, user_id: str, profile_data: Dict[str, Any]) -> Dict[str, Any]:
         """直接设置用户画像 (用于初始化已知用户)"""
-        profile = self._create_default_profile(user_id)
-        self._deep_merge(profile, profile_data)
-        profile["updated_at"] = datetime.now().isoformat()
-        self._cache[user_id] = profile
-        self.save_profile(user_id)
+        with self._lock:
+            profile = self._create_default_profile(user_id)
+            self._deep_merge(profile, profile_data)
+            profile["updated_at"] = datetime.now().isoformat()
+            # 同时记为 delta: 整份写入遇到版本冲突时在存储最新版本上重放, 而不是覆盖
+            pending = self._pending.setdefault(user_id, {})
+            self._deep_merge(pending, copy.deepcopy(profile_data))
+            pending["updated_at"] = profile["updated_at"]
+            self.save_profile(user_id)
         return profile
 
     def _deep_merge(self, base: Dict, updates: Dict):
@@ -3923,12 +4099,12 @@ class AgentRouter:
 
         for agent_id, agent_info in self.AGENTS.items():
             data_fields = agent_info.get("data_fields", [])
-            for field in data_fields:
-                if device_data.get(field):
+            for data_field in data_fields:
+                if device_data.get(data_field):
                     matches.append({
                         "agent": agent_id,
                         "priority": agent_info["priority_base"],
-                        "reason": f"设备数据: {field}"
+                        "reason": f"设备数据: {data_field}"
                     })
                     break
 
@@ -8,6 +8,9 @@ Production Middleware Collection
 - 速率限制
 - 请求/响应日志
 - Sentry 集成
+
+BaseHTTPMiddleware 实现保留作参考与回退 (ASGI_MIDDLEWARE=false),
+默认由 core/asgi_middleware.py 的纯 ASGI 中间件栈执行相同逻辑。
 """
 import os
 import time
@@ -161,8 +164,8 @@ class RateLimitMiddleware(BaseHTTPMiddleware):
 
         client_ip = request.client.host if request.client else "unknown"
 
-        from core.rate_limiter import check_rate_limit
-        allowed, remaining = check_rate_limit(
+        from core.rate_limiter import check_rate_limit_async
+        allowed, remaining = await check_rate_limit_async(
             key=f"global:{client_ip}",
             max_attempts=self.rpm,
             window_seconds=60,
@@ -240,15 +243,21 @@ def setup_production_middleware(app: FastAPI):
     # CORS
     setup_cors(app)
 
-    # 安全头
-    app.add_middleware(SecurityHeadersMiddleware)
-
-    # 请求日志
-    app.add_middleware(RequestLoggingMiddleware)
-
-    # 速率限制
     rpm = int(os.getenv("RATE_LIMIT_RPM", "120"))
-    app.add_middleware(RateLimitMiddleware, requests_per_minute=rpm)
+    from core.asgi_middleware import ASGI_MIDDLEWARE_ENABLED
+    if ASGI_MIDDLEWARE_ENABLED:
+        # 速率限制 → 请求日志 → 安全头, 合并为单个纯 ASGI 中间件
+        from core.asgi_middleware import ASGIMiddlewareStack, production_layers
+        app.add_middleware(ASGIMiddlewareStack, layers=production_layers(rpm))
+    else:
+        # 安全头
+        app.add_middleware(SecurityHeadersMiddleware)
+
+        # 请求日志
+        app.add_middleware(RequestLoggingMiddleware)
+
+        # 速率限制
+        app.add_middleware(RateLimitMiddleware, requests_per_minute=rpm)
 
     # Prometheus metrics (after middleware so /metrics route is not wrapped incorrectly)
     from core.metrics import setup_prometheus
@@ -671,6 +671,47 @@ class GlucoseReading(Base):
         return f"<GlucoseReading(user={self.user_id}, value={self.value}, time={self.recorded_at})>"
 
 
+class GlucoseRollup(Base):
+    """
+    血糖聚合 (按用户的日/小时桶)
+
+    保存可合并的充分统计量 (计数/和/平方和/极值/各区间计数), 写入时增量累加,
+    多周视图读 O(天数) 行而非 O(读数)。MAGE 不可增量合并, 新读数写入时置空,
+    读取时按天重算。维护逻辑见 core/glucose_rollup.py。
+    """
+    __tablename__ = "glucose_rollups"
+
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    granularity = Column(String(5), nullable=False)  # day/hour
+    bucket_start = Column(DateTime, nullable=False)  # UTC, 桶起点
+
+    count = Column(Integer, nullable=False, default=0)
+    sum_value = Column(Float, nullable=False, default=0.0)
+    sum_sq = Column(Float, nullable=False, default=0.0)
+    min_value = Column(Float, nullable=True)
+    max_value = Column(Float, nullable=True)
+
+    # 国际共识区间 (mmol/L): <3.0 / 3.0-3.9 / 3.9-10.0 / 10.0-13.9 / >13.9
+    n_very_low = Column(Integer, nullable=False, default=0)
+    n_low = Column(Integer, nullable=False, default=0)
+    n_in_range = Column(Integer, nullable=False, default=0)
+    n_high = Column(Integer, nullable=False, default=0)
+    n_very_high = Column(Integer, nullable=False, default=0)
+
+    mage = Column(Float, nullable=True)  # 仅日桶; NULL = 待重算
+    first_at = Column(DateTime, nullable=True)
+    last_at = Column(DateTime, nullable=True)
+    updated_at = Column(DateTime, server_default=func.now(), onupdate=func.now())
+
+    __table_args__ = (
+        UniqueConstraint("user_id", "granularity", "bucket_start", name="uq_glucose_rollup_bucket"),
+    )
+
+    def __repr__(self):
+        return f"<GlucoseRollup(user={self.user_id}, {self.granularity}={self.bucket_start}, n={self.count})>"
+
+
 class HeartRateReading(Base):
     """
     心率数据�
@@ -1212,6 +1253,7 @@ class MicroActionTask(Base):
         Index('idx_micro_task_user_date', 'user_id', 'scheduled_date'),
         Index('idx_micro_task_status', 'status'),
         Index('idx_micro_task_domain', 'domain'),
+        Index('idx_micro_task_completed_at', 'completed_at'),
     )
 
     def __repr__(self):
@@ -1908,6 +1950,7 @@ class KnowledgeChunk(Base):
 
     content = Column(Text, nullable=False)
     chunk_index = Column(Integer, nullable=False)
+    content_hash = Column(String(64), nullable=True)  # sha256(heading+content), 增量重嵌入比对
 
     # 旧列 768 维 (保留, 蓝绿迁移期间不删)
     if Vector is not None:
@@ -1923,6 +1966,10 @@ class KnowledgeChunk(Base):
 
     document = relationship("KnowledgeDocument", back_populates="chunks")
 
+    __table_args__ = (
+        Index('idx_kchunk_doc_hash', 'document_id', 'content_hash'),
+    )
+
 
 class KnowledgeCitation(Base):
     """
@@ -2376,6 +2423,12 @@ class BatchIngestionJob(Base):
     total_chunks = Column(Integer, default=0)
     error_message = Column(Text, nullable=True)
     result_doc_ids = Column(JSON, nullable=True)  # 创建� KnowledgeDocument IDs
+    # 分阶段流水线 (后台任务 + 断点续跑)
+    stage = Column(String(20), nullable=True)  # extract/convert/chunk/embed/insert/done
+    stage_stats = Column(JSON, nullable=True)  # 各阶段 items/seconds/per_sec + skipped
+    job_params = Column(JSON, nullable=True)  # scope/domain_id/tenant_id/evidence_tier/priority
+    source_path = Column(String(500), nullable=True)  # 任务目录中的上传文件, 完成后删除
+    completed_files = Column(JSON, nullable=True)  # 已完成文件 (相对路径), 续跑时跳过
 
     created_at = Column(DateTime, server_default=func.now(), nullable=False)
     updated_at = Column(DateTime, server_default=func.now(), onupdate=datetime.utcnow, nullable=False)
@@ -5106,6 +5159,41 @@ class AnalyticsDaily(Base):
     created_at = Column(DateTime, server_default=sa_text("now()"))
 
 
+class AnalyticsDailyFact(Base):
+    """增量物化的每日指标事实 (日 × 租户 × 角色), 由 core.analytics_facts 刷新"""
+    __tablename__ = "analytics_daily_facts"
+
+    day = Column(Date, primary_key=True)
+    tenant_id = Column(String(64), primary_key=True, server_default="")  # '' = 无租户归属
+    role = Column(String(30), primary_key=True)
+    active_users = Column(Integer, nullable=False, server_default="0")
+    retained_7d = Column(Integer, nullable=False, server_default="0")
+    new_users = Column(Integer, nullable=False, server_default="0")
+    accounts_active = Column(Integer, nullable=False, server_default="0")
+    total_events = Column(Integer, nullable=False, server_default="0")
+    chat_events = Column(Integer, nullable=False, server_default="0")
+    ai_response_ms_sum = Column(Float, nullable=False, server_default="0")
+    ai_response_count = Column(Integer, nullable=False, server_default="0")
+    chat_messages = Column(Integer, nullable=False, server_default="0")
+    tasks_completed = Column(Integer, nullable=False, server_default="0")
+    assessments = Column(Integer, nullable=False, server_default="0")
+    high_risk_assessments = Column(Integer, nullable=False, server_default="0")
+    updated_at = Column(DateTime, server_default=sa_text("now()"))
+
+    __table_args__ = (
+        Index("idx_adf_tenant_day", "tenant_id", "day"),
+    )
+
+
+class AnalyticsWatermark(Base):
+    """各来源表已物化到的 created_at 上界"""
+    __tablename__ = "analytics_watermarks"
+
+    source = Column(String(40), primary_key=True)
+    watermark = Column(DateTime, nullable=False)
+    updated_at = Column(DateTime, server_default=sa_text("now()"))
+
+
 # ============================================
 # P5C: Feature Flags + A/B Test Events
 # ============================================
@@ -5188,6 +5276,7 @@ class DemoRequest(Base):
         'core.reflection_service',       # ReflectionJournal
         'core.script_library_service',   # ScriptTemplate
         'behavior_rx.core.rx_models',    # RxPrescription, RxStrategyTemplate, AgentHandoffLog
+        'core.exam_400_store',           # Exam400Candidate
         'core.vision_service',           # VisionExamRecord, VisionBehaviorLog, VisionBehaviorGoal, VisionGuardianBinding, VisionProfile
         'core.xzb.xzb_models',          # XZB: XZBExpertProfile, XZBConfig, XZBKnowledge, XZBKnowledgeRule, XZBConversation, XZBRxFragment, XZBExpertIntervention, XZBMedCircle, XZBMedCircleComment, XZBKnowledgeSharing
     ]:
@@ -77,7 +77,7 @@ class PolicyEngine:
     2. Build agent candidates (ApplicabilityMatrix)
     3. Conflict arbitration (ConflictResolver)
     4. Cost control (CostController)
-    5. Record DecisionTrace
+    5. Record DecisionTrace (buffered, flushed in bulk off the request path)
     """
 
     def __init__(self, db_session: Session, rule_registry=None,
@@ -96,7 +96,7 @@ class PolicyEngine:
             db_session=db_session
         )
         self.trace_recorder = trace_recorder or DecisionTraceRecorder(
-            db_session=db_session
+            db_session=db_session, buffered=True
         )
         self.cost_controller = cost_controller or CostController(
             db_session=db_session
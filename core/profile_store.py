@@ -0,0 +1,198 @@
+# -*- coding: utf-8 -*-
+"""
+profile_store.py - 用户主画像持久化存储
+
+为 master_agent_v0.UserMasterProfile 提供可替换的存储层:
+
+- 紧凑序列化: 优先 orjson (无缩进), 未安装时回退 json(separators=(",", ":"))
+- 增量写入: 每次只追加变更子树 (delta), 读取时按深度合并回放
+- 乐观版本: 每次写入携带 expected_version, 与磁盘当前版本不一致时抛 ProfileVersionConflict
+- 定期压实: delta 日志过长时重写完整快照并截断日志
+- 跨进程互斥: 在支持 fcntl 的平台上, 同一用户的读-校验-写在文件锁内完成
+
+文件布局 (storage_path 下):
+    {user_id}.json    完整快照, 附带保留字段 "_version"
+    {user_id}.delta   追加日志, 每行 {"v": 版本号, "d": 变更子树}
+    {user_id}.lock    文件锁
+"""
+
+import json
+import logging
+import os
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Dict, Iterator, Optional, Tuple
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - 可选依赖
+    orjson = None
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - Windows
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+VERSION_KEY = "_version"
+LOCK_STRIPES = 64
+
+
+class ProfileVersionConflict(Exception):
+    """写入时磁盘版本已被其他 worker 推进"""
+
+    def __init__(self, user_id: str, expected: int, actual: int):
+        super().__init__(f"profile {user_id}: expected version {expected}, found {actual}")
+        self.user_id = user_id
+        self.expected = expected
+        self.actual = actual
+
+
+def dumps(obj: Any) -> bytes:
+    """紧凑序列化 (UTF-8 bytes)"""
+    if orjson is not None:
+        return orjson.dumps(obj, default=str)
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":"), default=str).encode("utf-8")
+
+
+def loads(data: bytes) -> Any:
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data.decode("utf-8"))
+
+
+def deep_merge(base: Dict, updates: Dict) -> None:
+    """深度合并字典 (与 UserMasterProfile._deep_merge 语义一致: dict 递归, 其他类型覆盖)"""
+    for key, value in updates.items():
+        if key in base and isinstance(base[key], dict) and isinstance(value, dict):
+            deep_merge(base[key], value)
+        else:
+            base[key] = value
+
+
+class FileProfileStore:
+    """基于本地/共享目录的快照 + delta 日志存储"""
+
+    def __init__(self, storage_path: str = "data/profiles", compact_every: int = 64):
+        self.storage_path = Path(storage_path)
+        self.storage_path.mkdir(parents=True, exist_ok=True)
+        self.compact_every = compact_every
+        # 进程内按 user_id 哈希分段加锁 (固定数量, 不随用户数增长); 跨进程互斥由文件锁负责
+        self._thread_locks = [threading.Lock() for _ in range(LOCK_STRIPES)]
+
+    # ------------------------------------------------------------------
+    # 路径与锁
+    # ------------------------------------------------------------------
+
+    def _snapshot_path(self, user_id: str) -> Path:
+        return self.storage_path / f"{user_id}.json"
+
+    def _delta_path(self, user_id: str) -> Path:
+        return self.storage_path / f"{user_id}.delta"
+
+    @contextmanager
+    def _locked(self, user_id: str) -> Iterator[None]:
+        with self._thread_locks[hash(user_id) % LOCK_STRIPES]:
+            if fcntl is None:
+                yield
+                return
+            with open(self.storage_path / f"{user_id}.lock", "a+b") as lf:
+                fcntl.flock(lf.fileno(), fcntl.LOCK_EX)
+                try:
+                    yield
+                finally:
+                    fcntl.flock(lf.fileno(), fcntl.LOCK_UN)
+
+    # ------------------------------------------------------------------
+    # 读取
+    # ------------------------------------------------------------------
+
+    def _read_snapshot(self, user_id: str) -> Tuple[Optional[Dict[str, Any]], int]:
+        path = self._snapshot_path(user_id)
+        if not path.exists():
+            return None, 0
+        # 兼容旧版带缩进的 JSON 快照 (无 _version, 视为版本 0)
+        profile = loads(path.read_bytes())
+        version = int(profile.pop(VERSION_KEY, 0))
+        return profile, version
+
+    def _read_deltas(self, user_id: str):
+        path = self._delta_path(user_id)
+        if not path.exists():
+            return []
+        entries = []
+        with open(path, "rb") as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    entries.append(loads(line))
+                except ValueError:
+                    # 进程崩溃留下的半行, 之后的写入会以新版本覆盖
+                    logger.warning("profile %s: 跳过损坏的 delta 行", user_id)
+        return entries
+
+    def _load_unlocked(self, user_id: str) -> Tuple[Optional[Dict[str, Any]], int, int]:
+        """返回 (profile, version, 未压实的 delta 条数)"""
+        profile, version = self._read_snapshot(user_id)
+        deltas = self._read_deltas(user_id)
+        if profile is None and not deltas:
+            return None, 0, 0
+        profile = profile or {}
+        applied = 0
+        for entry in deltas:
+            v = int(entry.get("v", 0))
+            if v <= version:
+                continue  # 已包含在快照中 (压实中途失败的残留)
+            deep_merge(profile, entry.get("d") or {})
+            version = v
+            applied += 1
+        return profile, version, applied
+
+    def load(self, user_id: str) -> Tuple[Optional[Dict[str, Any]], int]:
+        """读取画像与当前版本; 不存在时返回 (None, 0)"""
+        with self._locked(user_id):
+            profile, version, _ = self._load_unlocked(user_id)
+        return profile, version
+
+    # ------------------------------------------------------------------
+    # 写入
+    # ------------------------------------------------------------------
+
+    def _write_snapshot_unlocked(self, user_id: str, profile: Dict[str, Any], version: int) -> None:
+        path = self._snapshot_path(user_id)
+        tmp = path.with_suffix(f".json.{os.getpid()}.tmp")
+        tmp.write_bytes(dumps({**profile, VERSION_KEY: version}))
+        os.replace(tmp, path)
+        delta = self._delta_path(user_id)
+        if delta.exists():
+            delta.unlink()
+
+    def write_full(self, user_id: str, profile: Dict[str, Any], expected_version: Optional[int] = None) -> int:
+        """写完整快照; expected_version=None 表示无条件覆盖"""
+        with self._locked(user_id):
+            _, current, _ = self._load_unlocked(user_id)
+            if expected_version is not None and current != expected_version:
+                raise ProfileVersionConflict(user_id, expected_version, current)
+            new_version = current + 1
+            self._write_snapshot_unlocked(user_id, profile, new_version)
+        return new_version
+
+    def write_delta(self, user_id: str, delta: Dict[str, Any], expected_version: int) -> int:
+        """追加一条变更子树; 日志达到 compact_every 条时顺带压实为快照"""
+        with self._locked(user_id):
+            profile, current, pending = self._load_unlocked(user_id)
+            if current != expected_version:
+                raise ProfileVersionConflict(user_id, expected_version, current)
+            new_version = current + 1
+            if pending + 1 >= self.compact_every:
+                profile = profile or {}
+                deep_merge(profile, delta)
+                self._write_snapshot_unlocked(user_id, profile, new_version)
+            else:
+                with open(self._delta_path(user_id), "ab") as f:
+                    f.write(dumps({"v": new_version, "d": delta}) + b"\n")
+        return new_version
@@ -19,7 +19,7 @@ sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from core.models import (
     User, BehavioralProfile,
-    GlucoseReading, HeartRateReading, SleepRecord, ActivityRecord,
+    HeartRateReading, SleepRecord, ActivityRecord,
     AssessmentAssignment,
 )
 from core.behavior_facts_service import BehaviorFactsService
@@ -276,22 +276,15 @@ class PushRecommendationService:
         """收集最近7天设备数据信号"""
         signals = {}
 
-        # Glucose
-        glucose_readings = (
-            db.query(GlucoseReading)
-            .filter(
-                GlucoseReading.user_id == user_id,
-                GlucoseReading.recorded_at >= since,
-            )
-            .all()
-        )
-        if glucose_readings:
-            values = [r.value for r in glucose_readings]
-            signals["glucose_count"] = len(values)
-            signals["glucose_avg"] = round(sum(values) / len(values), 2)
-            signals["glucose_abnormal_count"] = sum(1 for v in values if v > 10.0 or v < 3.9)
-            tir = sum(1 for v in values if 3.9 <= v <= 10.0) / len(values)
-            signals["glucose_tir"] = round(tir * 100, 1)
+        # Glucose: 读小时聚合桶 (窗口起点按小时对齐), 不加载原始读数
+        from core.glucose_rollup import window_summary
+        glucose = window_summary(db, user_id, since)
+        if glucose["readings_count"]:
+            n = glucose["readings_count"]
+            signals["glucose_count"] = n
+            signals["glucose_avg"] = glucose["mean"]
+            signals["glucose_abnormal_count"] = n - glucose["in_range_count"]
+            signals["glucose_tir"] = glucose["tir"]
 
         # Heart Rate
         hr_readings = (
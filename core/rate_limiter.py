@@ -1,19 +1,47 @@
 """
 分布式速率限制器 (FIX-03)
 支持 Redis 后端, 回退到内存
+
+算法: GCRA (Generic Cell Rate Algorithm)
+  每个键只保存一个 "理论到达时间" (TAT), 空间 O(1);
+  Redis 端由单个 Lua 脚本原子完成读取/判定/写回, 每次检查一次往返 (EVALSHA)。
+  一次检查可同时命中多个键 (例如 客户端 + 租户), 全部通过才写回。
+
+  limit 次 / period 秒: 发射间隔 T = period / limit, 容差 tau = period,
+  即空闲客户端可一次性突发 limit 次, 之后按 T 匀速恢复。
+
+组成:
+- RateLimitPolicy / RateLimitPolicies: 全局默认 + 路由前缀策略 + 租户 (令牌 tenant_id 声明) 总配额
+- RateLimiter: 同步 / 异步两套 Redis 客户端, 本地拒绝缓存 (已知超限的键在
+  retry_after 到期前直接拒绝, 不访问 Redis), Redis 不可用时回退到 LRU 有界的本地 GCRA
+- check_rate_limit / check_rate_limit_async / rate_limit_or_429: 单键便捷接口
+
+环境变量:
+  RATE_LIMIT_ROUTE_POLICIES   路由策略, 如 "/api/v1/auth/=20/60,/api/v1/chat=30"  (前缀=次数[/秒])
+  RATE_LIMIT_TENANT_POLICIES  租户总配额, 如 "acme=600,default=1200/60"
+  RATE_LIMIT_LOCAL_MAX_KEYS   本地回退 / 拒绝缓存的最大键数 (默认 100000)
 """
+import math
 import os
+import threading
 import time
-from typing import Optional
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Sequence, Tuple
+
 from loguru import logger
 
+RATE_LIMIT_LOCAL_MAX_KEYS = int(os.getenv("RATE_LIMIT_LOCAL_MAX_KEYS", "100000"))
+
 # Redis 连接 (可选)
 _redis = None
+_async_redis = None
+
 
 def _get_redis():
     global _redis
     if _redis is not None:
-        return _redis
+        return _redis or None
     redis_url = os.getenv("REDIS_URL")
     if redis_url:
         try:
@@ -30,8 +58,301 @@ def _get_redis():
     return None
 
 
-# 内存回退 (单进程)
-_memory_store: dict = {}
+def _get_async_redis():
+    """异步客户端 (redis.asyncio); 同步客户端不可用时同样回退到内存"""
+    global _async_redis
+    if _async_redis is not None:
+        return _async_redis or None
+    if _get_redis() is None:
+        _async_redis = False
+        return None
+    try:
+        import redis.asyncio as aioredis
+        _async_redis = aioredis.from_url(os.getenv("REDIS_URL"), decode_responses=True)
+    except Exception as e:
+        logger.warning(f"Rate limiter: 异步 Redis 客户端不可用 ({e}), 回退到内存")
+        _async_redis = False
+    return _async_redis or None
+
+
+# KEYS[i] = TAT 键; ARGV[2i-1] = 发射间隔 (ms), ARGV[2i] = 容差 (ms)
+# 返回 {allowed, remaining, retry_after_ms}
+_GCRA_SCRIPT = """
+local t = redis.call('TIME')
+local now = tonumber(t[1]) * 1000 + tonumber(t[2]) / 1000
+local allowed, remaining, retry = 1, -1, 0
+local tats = {}
+for i = 1, #KEYS do
+  local interval = tonumber(ARGV[2 * i - 1])
+  local tolerance = tonumber(ARGV[2 * i])
+  local tat = tonumber(redis.call('GET', KEYS[i])) or now
+  if tat < now then tat = now end
+  local new_tat = tat + interval
+  local over = new_tat - now - tolerance
+  if over > 0 then
+    allowed = 0
+    if over > retry then retry = over end
+  else
+    local left = math.floor((tolerance - (new_tat - now)) / interval)
+    if remaining < 0 or left < remaining then remaining = left end
+  end
+  tats[i] = new_tat
+end
+if allowed == 1 then
+  for i = 1, #KEYS do
+    redis.call('SET', KEYS[i], string.format('%.3f', tats[i]), 'PX', math.ceil(tats[i] - now))
+  end
+else
+  remaining = 0
+end
+return {allowed, remaining, math.ceil(retry)}
+"""
+
+
+# ============================================
+# 策略
+# ============================================
+
+@dataclass(frozen=True)
+class RateLimitPolicy:
+    """limit 次 / period 秒"""
+    name: str
+    limit: int
+    period: float = 60
+
+    @property
+    def interval_ms(self) -> float:
+        return self.period * 1000 / max(self.limit, 1)
+
+    @property
+    def tolerance_ms(self) -> float:
+        return self.period * 1000
+
+
+@dataclass
+class RateLimitResult:
+    allowed: bool
+    remaining: int
+    retry_after: float = 0.0  # 秒
+    limit: int = 0
+
+
+def _parse_policy_spec(spec: str, kind: str) -> Dict[str, RateLimitPolicy]:
+    """解析 "名称=次数[/秒],..." 格式"""
+    policies = {}
+    for item in filter(None, (s.strip() for s in spec.split(","))):
+        try:
+            name, _, quota = item.partition("=")
+            limit, _, period = quota.partition("/")
+            policies[name.strip()] = RateLimitPolicy(
+                name=f"{kind}:{name.strip()}", limit=int(limit), period=float(period or 60),
+            )
+        except ValueError:
+            logger.warning(f"Rate limiter: 忽略无效的{kind}策略 {item!r}")
+    return policies
+
+
+@dataclass
+class RateLimitPolicies:
+    """
+    请求 → 需要检查的 (键, 策略) 列表
+
+    - 客户端配额: 匹配的最长路由前缀策略, 否则默认策略; 按客户端 IP 计数
+      (默认策略沿用原 "global:<ip>" 键, 路由策略各自独立计数)
+    - 租户配额: 调用方传入可信租户 (已验签令牌的 tenant_id) 且该租户 (或 "default") 配置了总配额时追加,
+      按租户计数
+    """
+    default: RateLimitPolicy
+    routes: List[Tuple[str, RateLimitPolicy]] = field(default_factory=list)
+    tenants: Dict[str, RateLimitPolicy] = field(default_factory=dict)
+
+    def __post_init__(self):
+        self.routes = sorted(self.routes, key=lambda r: len(r[0]), reverse=True)
+
+    @classmethod
+    def from_env(cls, requests_per_minute: int) -> "RateLimitPolicies":
+        routes = _parse_policy_spec(os.getenv("RATE_LIMIT_ROUTE_POLICIES", ""), "route")
+        tenants = _parse_policy_spec(os.getenv("RATE_LIMIT_TENANT_POLICIES", ""), "tenant")
+        return cls(
+            default=RateLimitPolicy("global", requests_per_minute, 60),
+            routes=list(routes.items()),
+            tenants=tenants,
+        )
+
+    def resolve(self, path: str, client_ip: str,
+                tenant: Optional[str] = None) -> List[Tuple[str, RateLimitPolicy]]:
+        policy = self.default
+        for prefix, route_policy in self.routes:
+            if path.startswith(prefix):
+                policy = route_policy
+                break
+        checks = [(f"{policy.name}:{client_ip}", policy)]
+        if tenant:
+            tenant_policy = self.tenants.get(tenant) or self.tenants.get("default")
+            if tenant_policy is not None:
+                checks.append((f"tenant:{tenant}", tenant_policy))
+        return checks
+
+
+# ============================================
+# 限流器
+# ============================================
+
+class _LRUDict(OrderedDict):
+    """超过 max_entries 时淘汰最久未用的键"""
+
+    def __init__(self, max_entries: int):
+        super().__init__()
+        self.max_entries = max_entries
+
+    def touch(self, key, value):
+        self[key] = value
+        self.move_to_end(key)
+        while len(self) > self.max_entries:
+            self.popitem(last=False)
+
+
+class RateLimiter:
+    """
+    GCRA 限流器
+
+    hit() / hit_async() 对一组 (键, 策略) 做一次原子检查;
+    Redis 可用时一次 EVALSHA, 否则使用本进程 LRU 有界的 TAT 表。
+    """
+
+    KEY_NAMESPACE = "gcra:"  # 与旧版滑动窗口的 zset 键区分, 滚动升级时互不干扰
+
+    def __init__(self, prefix: str = "rl:", local_max_keys: int = RATE_LIMIT_LOCAL_MAX_KEYS,
+                 clock=time.time):
+        self.prefix = prefix
+        self.clock = clock
+        self._lock = threading.Lock()
+        self._tats = _LRUDict(local_max_keys)     # 本地回退: 键 → TAT (秒)
+        self._denied = _LRUDict(local_max_keys)   # 本地预检: 键组 → 拒绝截止时间 (秒)
+        self._script = None
+        self._async_script = None
+        self._redis_error_logged = 0.0
+
+    def _full_key(self, key: str, prefix: Optional[str]) -> str:
+        return f"{self.prefix if prefix is None else prefix}{self.KEY_NAMESPACE}{key}"
+
+    # ---- 本地预检 ----
+
+    # 拒绝时 TAT 不前移, 在 retry_after 之前同一组键必然仍被拒绝 (其他 worker 只会让它更晚),
+    # 因此按整组键缓存截止时间是精确的
+
+    def _precheck(self, keys: Tuple[str, ...], now: float) -> Optional[RateLimitResult]:
+        with self._lock:
+            until = self._denied.get(keys)
+            if until is None:
+                return None
+            if until <= now:
+                del self._denied[keys]
+                return None
+        return RateLimitResult(False, 0, until - now)
+
+    def _remember(self, keys: Tuple[str, ...], result: RateLimitResult, now: float):
+        if result.allowed:
+            return
+        with self._lock:
+            self._denied.touch(keys, now + result.retry_after)
+
+    # ---- 本地 GCRA ----
+
+    def _hit_local(self, checks, keys, now: float) -> RateLimitResult:
+        allowed, remaining, retry = True, None, 0.0
+        new_tats = []
+        with self._lock:
+            for key, policy in zip(keys, (p for _, p in checks)):
+                interval = policy.interval_ms / 1000
+                tolerance = policy.tolerance_ms / 1000
+                tat = max(self._tats.get(key, now), now)
+                new_tat = tat + interval
+                over = new_tat - now - tolerance
+                if over > 0:
+                    allowed = False
+                    retry = max(retry, over)
+                else:
+                    left = math.floor((tolerance - (new_tat - now)) / interval + 1e-9)
+                    remaining = left if remaining is None else min(remaining, left)
+                new_tats.append(new_tat)
+            if allowed:
+                for key, new_tat in zip(keys, new_tats):
+                    self._tats.touch(key, new_tat)
+        return RateLimitResult(allowed, remaining if allowed else 0, retry)
+
+    # ---- Redis ----
+
+    @staticmethod
+    def _args(checks) -> List[float]:
+        args = []
+        for _, policy in checks:
+            args += [policy.interval_ms, policy.tolerance_ms]
+        return args
+
+    def _redis_failed(self, e: Exception):
+        now = time.time()
+        if now - self._redis_error_logged > 60:
+            self._redis_error_logged = now
+            logger.warning(f"Rate limiter: Redis 调用失败 ({e}), 本次使用内存限流")
+
+    @staticmethod
+    def _from_reply(reply) -> RateLimitResult:
+        allowed, remaining, retry_ms = (int(x) for x in reply)
+        return RateLimitResult(bool(allowed), remaining, retry_ms / 1000)
+
+    def hit(self, checks: Sequence[Tuple[str, RateLimitPolicy]],
+            prefix: Optional[str] = None) -> RateLimitResult:
+        keys = tuple(self._full_key(k, prefix) for k, _ in checks)
+        now = self.clock()
+        result = self._precheck(keys, now)
+        if result is None:
+            r = _get_redis()
+            if r is not None:
+                try:
+                    if self._script is None:
+                        self._script = r.register_script(_GCRA_SCRIPT)
+                    result = self._from_reply(self._script(keys=list(keys), args=self._args(checks)))
+                except Exception as e:
+                    self._redis_failed(e)
+            if result is None:
+                result = self._hit_local(checks, keys, now)
+            self._remember(keys, result, now)
+        result.limit = checks[0][1].limit
+        return result
+
+    async def hit_async(self, checks: Sequence[Tuple[str, RateLimitPolicy]],
+                        prefix: Optional[str] = None) -> RateLimitResult:
+        keys = tuple(self._full_key(k, prefix) for k, _ in checks)
+        now = self.clock()
+        result = self._precheck(keys, now)
+        if result is None:
+            r = _get_async_redis()
+            if r is not None:
+                try:
+                    if self._async_script is None:
+                        self._async_script = r.register_script(_GCRA_SCRIPT)
+                    result = self._from_reply(await self._async_script(keys=list(keys), args=self._args(checks)))
+                except Exception as e:
+                    self._redis_failed(e)
+            if result is None:
+                result = self._hit_local(checks, keys, now)
+            self._remember(keys, result, now)
+        result.limit = checks[0][1].limit
+        return result
+
+    def reset(self):
+        """清空本地状态 (测试用)"""
+        with self._lock:
+            self._tats.clear()
+            self._denied.clear()
+
+
+rate_limiter = RateLimiter()
+
+
+def _single(key: str, max_attempts: int, window_seconds: int):
+    return [(key, RateLimitPolicy(key, max_attempts, window_seconds))]
 
 
 def check_rate_limit(
@@ -45,53 +366,29 @@ def check_rate_limit(
 
     Returns: (allowed: bool, remaining: int)
     """
-    full_key = f"{prefix}{key}"
-    r = _get_redis()
-
-    if r:
-        # Redis 滑动窗口
-        pipe = r.pipeline()
-        now = time.time()
-        window_start = now - window_seconds
-
-        pipe.zremrangebyscore(full_key, 0, window_start)
-        pipe.zadd(full_key, {str(now): now})
-        pipe.zcard(full_key)
-        pipe.expire(full_key, window_seconds + 10)
-        results = pipe.execute()
-
-        current_count = results[2]
-        remaining = max(0, max_attempts - current_count)
+    result = rate_limiter.hit(_single(key, max_attempts, window_seconds), prefix=prefix)
+    return result.allowed, result.remaining
 
-        if current_count > max_attempts:
-            return False, 0
-        return True, remaining
-    else:
-        # 内存回退
-        now = time.time()
-        window_start = now - window_seconds
-
-        if full_key in _memory_store:
-            _memory_store[full_key] = [t for t in _memory_store[full_key] if t > window_start]
-        else:
-            _memory_store[full_key] = []
 
-        current_count = len(_memory_store[full_key])
-        if current_count >= max_attempts:
-            return False, 0
-
-        _memory_store[full_key].append(now)
-        return True, max_attempts - current_count - 1
+async def check_rate_limit_async(
+    key: str,
+    max_attempts: int = 10,
+    window_seconds: int = 60,
+    prefix: str = "rl:"
+) -> tuple[bool, int]:
+    """check_rate_limit 的异步版本 (用于中间件 / async 端点)"""
+    result = await rate_limiter.hit_async(_single(key, max_attempts, window_seconds), prefix=prefix)
+    return result.allowed, result.remaining
 
 
 def rate_limit_or_429(key: str, max_attempts: int, window: int, msg: str = "请求过于频繁"):
     """检查限流, 超限则抛出 429"""
     from fastapi import HTTPException
-    allowed, remaining = check_rate_limit(key, max_attempts, window)
-    if not allowed:
+    result = rate_limiter.hit(_single(key, max_attempts, window))
+    if not result.allowed:
         raise HTTPException(
             status_code=429,
             detail=msg,
-            headers={"Retry-After": str(window)}
+            headers={"Retry-After": str(max(1, math.ceil(result.retry_after)))}
         )
-    return remaining
+    return result.remaining
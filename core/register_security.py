@@ -12,6 +12,12 @@ from loguru import logger
 def register_all_security(app):
     """注册全部安全中间件 (按优先级从低到高, 实际执行从高到低)"""
     env = os.getenv("ENVIRONMENT", "production")
+
+    from core.asgi_middleware import ASGI_MIDDLEWARE_ENABLED
+    if ASGI_MIDDLEWARE_ENABLED:
+        _register_asgi_security(app, env)
+        return
+
     registered = []
 
     # 1. CSRF 审计 (最外层, 最后执行)
@@ -43,3 +49,22 @@ def register_all_security(app):
             pass
 
     logger.info(f"[Security] 已注册 {len(registered)} 个安全中间件: {', '.join(registered)}")
+
+
+def _register_asgi_security(app, env):
+    """同上, 合并为单个纯 ASGI 中间件 (层序: HTTPS重定向 → 旧版鉴权 → CSRF审计)"""
+    from core.asgi_middleware import (
+        ASGIMiddlewareStack, CSRFAuditLayer, HTTPSRedirectLayer, LegacyAuthLayer,
+    )
+
+    layers, registered = [], []
+    if env == "production":
+        layers.append(HTTPSRedirectLayer(env))
+        registered.append("HTTPSRedirect")
+    layers.append(LegacyAuthLayer())
+    registered.append("LegacyAuth")
+    layers.append(CSRFAuditLayer(env))
+    registered.append("CSRFAudit")
+
+    app.add_middleware(ASGIMiddlewareStack, layers=layers)
+    logger.info(f"[Security] 已注册 {len(registered)} 个安全中间件 (ASGI): {', '.join(registered)}")
@@ -0,0 +1,391 @@
+# -*- coding: utf-8 -*-
+"""
+ReminderDispatcher - 秒级提醒分发
+
+替代每分钟轮询全表的 reminder_check:
+- TimerWheel: 分层时间轮 (秒 60 槽 / 分 60 槽 / 时 24 槽 + 溢出堆), tick = 1s,
+  由 create_reminder / 提醒 API / cron 重算喂入, 并定期从数据库增量同步近期到期项
+- 到点后按批认领: SELECT ... FOR UPDATE SKIP LOCKED LIMIT batch_size,
+  多 worker 同时分发互不重复
+- 每批按新的 next_fire_at 分组做集合 UPDATE (通常一条语句), 一次提交,
+  WebSocket 推送走一个 Redis pipeline
+
+投递语义: 认领与 next_fire_at 推进先提交再推送 (至多一次), 与多 worker 并发认领配合不重复。
+reminder_check 保留为每分钟兜底扫描, 复用同一认领路径。
+
+环境变量:
+  REMINDER_DISPATCHER_ENABLED  默认 true
+  REMINDER_BATCH_SIZE          每批认领条数, 默认 500
+  REMINDER_RESYNC_SECONDS      从数据库同步时间轮的间隔, 默认 60
+"""
+from __future__ import annotations
+
+import asyncio
+import heapq
+import math
+import os
+import threading
+import time
+from collections import deque
+from datetime import datetime
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+from loguru import logger
+from sqlalchemy import update
+
+from core.models import Reminder
+
+REMINDER_DISPATCHER_ENABLED = os.getenv("REMINDER_DISPATCHER_ENABLED", "true").lower() == "true"
+REMINDER_BATCH_SIZE = int(os.getenv("REMINDER_BATCH_SIZE", "500"))
+REMINDER_RESYNC_SECONDS = float(os.getenv("REMINDER_RESYNC_SECONDS", "60"))
+
+_EPOCH = datetime(1970, 1, 1)
+
+
+def to_epoch(dt: datetime) -> float:
+    """库内 naive UTC 时间 → epoch 秒"""
+    return (dt - _EPOCH).total_seconds()
+
+
+# ============================================
+# 分层时间轮
+# ============================================
+
+class TimerWheel:
+    """
+    分层时间轮 (单位: 秒)
+
+    第 0 层 60 个 1s 槽, 第 1 层 60 个 1min 槽, 第 2 层 24 个 1h 槽, 一天以外进溢出堆。
+    槽按绝对时间取模定位, 走到整分/整点时把上层当前槽下放; 到期时间向上取整到秒,
+    保证触发时数据库侧 next_fire_at <= now 成立。
+
+    重新调度/取消为惰性删除: 以 key 的最新到期 tick 为准, 旧条目出槽时丢弃。
+    非线程安全, 由 ReminderDispatcher 加锁使用。
+    """
+
+    _LEVELS = ((60, 1), (60, 60), (24, 3600))  # (槽数, 每槽秒数)
+
+    def __init__(self, now: float):
+        self.now = int(now)
+        self.slots: List[List[List[Tuple[int, int]]]] = [[[] for _ in range(n)] for n, _ in self._LEVELS]
+        self.overflow: List[Tuple[int, int]] = []
+        self.due: Dict[int, int] = {}
+        self._ready: List[int] = []
+
+    def __len__(self) -> int:
+        return len(self.due)
+
+    def add(self, key: int, when: float) -> None:
+        tick = int(math.ceil(when))
+        self.due[key] = tick
+        self._place(key, tick)
+
+    def remove(self, key: int) -> None:
+        self.due.pop(key, None)
+
+    def _place(self, key: int, tick: int) -> None:
+        delta = tick - self.now
+        if delta <= 0:
+            self._ready.append(key)
+            return
+        for level, (n, span) in enumerate(self._LEVELS):
+            if delta < n * span:
+                self.slots[level][(tick // span) % n].append((tick, key))
+                return
+        heapq.heappush(self.overflow, (tick, key))
+
+    def _live(self, tick: int, key: int) -> bool:
+        return self.due.get(key) == tick
+
+    def advance(self, now: float) -> List[int]:
+        """推进到 now, 返回期间到期的 key (已从时间轮移除)"""
+        fired: List[int] = []
+        self._drain_ready(fired)
+        target = int(now)
+        while self.now < target:
+            self.now += 1
+            t = self.now
+            if t % 3600 == 0:
+                while self.overflow and self.overflow[0][0] - t < 86400:
+                    tick, key = heapq.heappop(self.overflow)
+                    if self._live(tick, key):
+                        self._place(key, tick)
+                self._cascade(2, (t // 3600) % 24)
+            if t % 60 == 0:
+                self._cascade(1, (t // 60) % 60)
+            slot = self.slots[0][t % 60]
+            self.slots[0][t % 60] = []
+            for tick, key in slot:
+                if self._live(tick, key):
+                    del self.due[key]
+                    fired.append(key)
+            self._drain_ready(fired)
+        return fired
+
+    def _cascade(self, level: int, index: int) -> None:
+        entries, self.slots[level][index] = self.slots[level][index], []
+        for tick, key in entries:
+            if self._live(tick, key):
+                self._place(key, tick)
+
+    def _drain_ready(self, fired: List[int]) -> None:
+        ready, self._ready = self._ready, []
+        for key in ready:
+            if key in self.due and self.due[key] <= self.now:
+                del self.due[key]
+                fired.append(key)
+
+
+# ============================================
+# 认领 + 批量推进
+# ============================================
+
+PushFn = Callable[[List[Tuple[str, dict]]], None]
+
+
+def _default_push(notifications: List[Tuple[str, dict]]) -> None:
+    from api.websocket_api import push_user_notifications_sync
+    push_user_notifications_sync(notifications)
+
+
+class ReminderDispatcher:
+    """按批认领到期提醒并推送; 每个进程一个实例, 由 run() 在事件循环中驱动"""
+
+    def __init__(
+        self,
+        session_factory=None,
+        push: Optional[PushFn] = None,
+        batch_size: int = REMINDER_BATCH_SIZE,
+        resync_seconds: float = REMINDER_RESYNC_SECONDS,
+        clock: Callable[[], float] = time.time,
+    ):
+        if session_factory is None:
+            from core.database import SessionLocal
+            session_factory = SessionLocal
+        self.session_factory = session_factory
+        self.push = push or _default_push
+        self.batch_size = batch_size
+        self.resync_seconds = resync_seconds
+        self.clock = clock
+        self.wheel = TimerWheel(clock())
+        self._lock = threading.Lock()
+        self._stop: Optional[asyncio.Event] = None
+        self.fired = 0
+        self.batches = 0
+        self.lateness = deque(maxlen=100_000)  # 秒, 触发时刻 - next_fire_at
+
+    # ---- 时间轮维护 ----
+
+    def schedule(self, reminder_id: int, next_fire_at: Optional[datetime], active: bool = True) -> None:
+        """新建/修改提醒后调用; 无下次时间或已停用则移出时间轮"""
+        with self._lock:
+            if next_fire_at is None or not active:
+                self.wheel.remove(reminder_id)
+            else:
+                self.wheel.add(reminder_id, to_epoch(next_fire_at))
+
+    def resync(self, horizon: Optional[float] = None) -> int:
+        """把 horizon 秒内到期的活跃提醒载入时间轮 (覆盖其他进程创建/直接入库的提醒)"""
+        horizon = horizon if horizon is not None else self.resync_seconds * 2
+        until = datetime.utcfromtimestamp(self.clock() + horizon)
+        db = self.session_factory()
+        try:
+            rows = (
+                db.query(Reminder.id, Reminder.next_fire_at)
+                .filter(
+                    Reminder.is_active.is_(True),
+                    Reminder.next_fire_at.isnot(None),
+                    Reminder.next_fire_at <= until,
+                )
+                .all()
+            )
+        finally:
+            db.close()
+        with self._lock:
+            for rid, next_fire_at in rows:
+                self.wheel.add(rid, to_epoch(next_fire_at))
+        return len(rows)
+
+    def due_ids(self) -> List[int]:
+        with self._lock:
+            return self.wheel.advance(self.clock())
+
+    # ---- 认领/触发 ----
+
+    def dispatch(self, ids: Optional[Sequence[int]] = None) -> int:
+        """
+        触发到期提醒, 返回触发条数
+
+        ids 为时间轮给出的候选 (分块认领); 为 None 时扫描全部到期提醒 (兜底)。
+        """
+        total = 0
+        if ids is None:
+            while True:
+                n = self.fire_batch()
+                total += n
+                if n < self.batch_size:
+                    return total
+        ids = list(ids)
+        for i in range(0, len(ids), self.batch_size):
+            total += self.fire_batch(ids[i:i + self.batch_size])
+        return total
+
+    def fire_batch(self, ids: Optional[Sequence[int]] = None) -> int:
+        """认领一批 (FOR UPDATE SKIP LOCKED), 集合 UPDATE 推进后提交, 再批量推送"""
+        from core.reminder_service import ReminderService
+
+        calc = ReminderService().calc_next_fire
+        now_ts = self.clock()
+        now = datetime.utcfromtimestamp(now_ts)
+        db = self.session_factory()
+        try:
+            q = db.query(
+                Reminder.id, Reminder.user_id, Reminder.type, Reminder.title,
+                Reminder.content, Reminder.cron_expr, Reminder.next_fire_at,
+            ).filter(
+                Reminder.is_active.is_(True),
+                Reminder.next_fire_at.isnot(None),
+                Reminder.next_fire_at <= now,
+            )
+            if ids is not None:
+                q = q.filter(Reminder.id.in_(list(ids)))
+            rows = (
+                q.order_by(Reminder.next_fire_at)
+                .limit(self.batch_size)
+                .with_for_update(skip_locked=True, of=Reminder)
+                .all()
+            )
+            if not rows:
+                db.rollback()
+                return 0
+
+            # 同一 cron 表达式的下次时间只算一次; 按新时间分组集合 UPDATE
+            next_by_cron: Dict[str, Optional[datetime]] = {}
+            groups: Dict[Optional[datetime], List[int]] = {}
+            for r in rows:
+                nxt = None
+                if r.cron_expr:
+                    if r.cron_expr not in next_by_cron:
+                        next_by_cron[r.cron_expr] = calc(r.cron_expr, now=now)
+                    nxt = next_by_cron[r.cron_expr]
+                groups.setdefault(nxt, []).append(r.id)
+            for nxt, group_ids in groups.items():
+                db.execute(
+                    update(Reminder)
+                    .where(Reminder.id.in_(group_ids))
+                    .values(next_fire_at=nxt, is_active=nxt is not None)
+                    .execution_options(synchronize_session=False)
+                )
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+        with self._lock:
+            for nxt, group_ids in groups.items():
+                if nxt is not None:
+                    for rid in group_ids:
+                        self.wheel.add(rid, to_epoch(nxt))
+        self.fired += len(rows)
+        self.batches += 1
+        self.lateness.extend(now_ts - to_epoch(r.next_fire_at) for r in rows)
+
+        try:
+            self.push([
+                (str(r.user_id), {
+                    "type": "reminder",
+                    "reminder_type": r.type,
+                    "title": r.title,
+                    "content": r.content,
+                    "reminder_id": r.id,
+                })
+                for r in rows
+            ])
+        except Exception as e:
+            logger.warning(f"[Reminder] 推送失败 ({len(rows)} 条): {e}")
+        return len(rows)
+
+    # ---- 事件循环 ----
+
+    async def run(self) -> None:
+        """每整秒推进时间轮并分发; 定期从数据库同步"""
+        self._stop = asyncio.Event()
+        next_resync = 0.0
+        while not self._stop.is_set():
+            try:
+                if time.monotonic() >= next_resync:
+                    await asyncio.to_thread(self.resync)
+                    next_resync = time.monotonic() + self.resync_seconds
+                due = self.due_ids()
+                if due:
+                    n = await asyncio.to_thread(self.dispatch, due)
+                    if n:
+                        logger.info(f"[Reminder] 触发 {n} 条提醒")
+            except Exception as e:
+                logger.warning(f"[Reminder] 分发失败: {e}")
+            try:
+                await asyncio.wait_for(self._stop.wait(), timeout=1.0 - self.clock() % 1.0)
+            except asyncio.TimeoutError:
+                pass
+
+    def stop(self) -> None:
+        if self._stop is not None:
+            self._stop.set()
+
+    def stats(self) -> Dict[str, float]:
+        lat = sorted(self.lateness)
+
+        def pct(p):
+            return round(lat[min(len(lat) - 1, int(len(lat) * p))], 3) if lat else 0.0
+
+        return {
+            "scheduled": len(self.wheel),
+            "fired": self.fired,
+            "batches": self.batches,
+            "lateness_p50_s": pct(0.50),
+            "lateness_p99_s": pct(0.99),
+            "lateness_max_s": round(lat[-1], 3) if lat else 0.0,
+        }
+
+
+# ============================================
+# 进程级单例
+# ============================================
+
+_dispatcher: Optional[ReminderDispatcher] = None
+_task: Optional[asyncio.Task] = None
+
+
+def get_dispatcher() -> Optional[ReminderDispatcher]:
+    return _dispatcher
+
+
+def notify_scheduled(reminder_id: int, next_fire_at: Optional[datetime], active: bool = True) -> None:
+    """提醒新建/修改后通知本进程分发器 (未启动时为空操作, 由 resync/兜底扫描覆盖)"""
+    if _dispatcher is not None:
+        _dispatcher.schedule(reminder_id, next_fire_at, active)
+
+
+def start_dispatcher() -> Optional[ReminderDispatcher]:
+    """在 FastAPI lifespan 中调用 (需运行中的事件循环)"""
+    global _dispatcher, _task
+    if not REMINDER_DISPATCHER_ENABLED:
+        return None
+    if _dispatcher is None:
+        _dispatcher = ReminderDispatcher()
+        _task = asyncio.get_running_loop().create_task(_dispatcher.run())
+    return _dispatcher
+
+
+async def stop_dispatcher() -> None:
+    global _dispatcher, _task
+    if _dispatcher is not None:
+        _dispatcher.stop()
+    if _task is not None:
+        try:
+            await asyncio.wait_for(_task, timeout=5)
+        except (asyncio.TimeoutError, asyncio.CancelledError):
+            _task.cancel()
+    _dispatcher = _task = None
@@ -7,6 +7,8 @@ ReminderService - 提醒调度服务
 - 查询到期提醒
 - 计算下次触发时间（基于cron表达式）
 - 触发提醒推送
+
+到期分发由 core/reminder_dispatcher.py 按批认领完成; fire_reminder 为单条路径。
 """
 from datetime import datetime, timedelta
 from typing import List, Optional
@@ -45,8 +47,8 @@ class ReminderService:
 
         # 尝试通过 WebSocket 推送
         try:
-            from api.websocket_api import push_user_notification
-            push_user_notification(
+            from api.websocket_api import push_user_notification_sync
+            push_user_notification_sync(
                 user_id=str(reminder.user_id),
                 notification={
                     "type": "reminder",
@@ -72,15 +74,15 @@ class ReminderService:
 
         db.commit()
 
-    def calc_next_fire(self, cron_expr: str) -> Optional[datetime]:
+    def calc_next_fire(self, cron_expr: str, now: Optional[datetime] = None) -> Optional[datetime]:
         """
-        根据简化的cron表达式计算下次触发时间
+        根据简化的cron表达式计算下次触发时间 (严格晚于 now, 默认当前 UTC)
 
         支持的格式:
         - "HH:MM" → 每天指定时间
         - "0 8 * * *" → 标准cron（简化解析）
         """
-        now = datetime.utcnow()
+        now = now or datetime.utcnow()
 
         # 简单格式: "HH:MM"
         if ":" in cron_expr and " " not in cron_expr:
@@ -139,5 +141,8 @@ class ReminderService:
         db.commit()
         db.refresh(reminder)
 
+        from core.reminder_dispatcher import notify_scheduled
+        notify_scheduled(reminder.id, reminder.next_fire_at)
+
         logger.info(f"创建提醒: id={reminder.id}, user={user_id}, type={type}")
         return reminder
@@ -4,7 +4,7 @@ Scheduler - 定时任务调度
 
 使用 APScheduler 实现:
 - daily_task_generation: 每天06:00为活跃用户生成今日微行动任务
-- reminder_check: 每分钟查询到期提醒并推送
+- reminder_check: 每分钟兜底扫描到期提醒 (秒级分发见 core/reminder_dispatcher.py)
 - expired_task_cleanup: 每天23:59将过期未完成任务标记为 expired
 """
 from datetime import datetime, date, timedelta
@@ -59,23 +59,19 @@ def daily_task_generation():
 
 @with_redis_lock("scheduler:reminder_check", ttl=60)
 def reminder_check():
-    """每分钟查询到期提醒并触发"""
-    from core.database import get_db_session
-    from core.reminder_service import ReminderService
+    """
+    每分钟兜底扫描到期提醒
 
-    service = ReminderService()
+    正常由 ReminderDispatcher 秒级触发; 这里按批认领 (SKIP LOCKED) 补发漏掉的
+    (分发器未启动、提醒由其他进程直接入库等), 与分发器并发也不会重复。
+    """
+    from core.reminder_dispatcher import ReminderDispatcher, get_dispatcher
 
     try:
-        with get_db_session() as db:
-            due_reminders = service.get_due_reminders(db)
-            for reminder in due_reminders:
-                try:
-                    service.fire_reminder(db, reminder)
-                except Exception as e:
-                    logger.warning(f"触发提醒失败 id={reminder.id}: {e}")
-
-            if due_reminders:
-                logger.info(f"[Scheduler] 触发 {len(due_reminders)} 条提醒")
+        dispatcher = get_dispatcher() or ReminderDispatcher()
+        count = dispatcher.dispatch()
+        if count:
+            logger.info(f"[Scheduler] 兜底触发 {count} 条提醒")
     except Exception as e:
         logger.error(f"[Scheduler] 提醒检查失败: {e}")
 
@@ -366,7 +362,7 @@ def setup_scheduler() -> "AsyncIOScheduler | None":
         replace_existing=True,
     )
 
-    # 每分钟检查到期提醒
+    # 每分钟兜底扫描到期提醒 (秒级分发由 ReminderDispatcher 负责)
     scheduler.add_job(
         reminder_check,
         IntervalTrigger(minutes=1),
@@ -521,67 +517,18 @@ def setup_scheduler() -> "AsyncIOScheduler | None":
 
         @with_redis_lock("scheduler:trust_engagement_monitor", ttl=600)
         async def job_trust_engagement_monitor():
-            from sqlalchemy import text as sa_text
+            from core.engagement_jobs import run_trust_engagement_monitor
             async with _R9Async() as db:
-                # Users with trust_score < 0.3 AND inactive 3+ days AND have active Rx
-                stmt = sa_text("""
-                    SELECT u.id AS user_id, u.trust_score,
-                           us.current_streak, us.last_checkin_date,
-                           (u.profile->>'coach_id')::int AS coach_id
-                    FROM users u
-                    JOIN user_streaks us ON us.user_id = u.id
-                    WHERE u.is_active = true
-                      AND u.trust_score < 0.3
-                      AND us.last_checkin_date < CURRENT_DATE - INTERVAL '3 days'
-                      AND EXISTS (
-                          SELECT 1 FROM behavior_prescriptions bp
-                          WHERE bp.user_id = u.id AND bp.status = 'active'
-                      )
-                """)
                 try:
-                    rows = (await db.execute(stmt)).mappings().all()
-                except Exception:
-                    rows = []
-
-                flagged = 0
-                for row in rows:
-                    uid, coach_id = row["user_id"], row["coach_id"]
-                    trust = row["trust_score"] or 0.0
-                    days = (date.today() - row["last_checkin_date"]).days if row["last_checkin_date"] else 0
-
-                    # Notify user
-                    try:
-                        await db.execute(sa_text("""
-                            INSERT INTO notifications
-                              (user_id, title, body, type, priority, is_read, created_at)
-                            VALUES (:uid, '我们注意到了变化',
-                              '最近几天参与度有所下降，没关系，随时可以回来，我们在这里支持您。',
-                              'trust_decline', 'normal', false, NOW())
-                        """), {"uid": uid})
-                    except Exception:
-                        pass
-
-                    # Enqueue coach alert (if coach assigned)
-                    if coach_id:
-                        try:
-                            await db.execute(sa_text("""
-                                INSERT INTO coach_push_queue
-                                  (coach_id, student_id, source_type, title, content,
-                                   priority, status, created_at)
-                                VALUES (:cid, :uid, 'trust_decline',
-                                  '学员参与度下降预警',
-                                  :content, 'high', 'pending', NOW())
-                            """), {
-                                "cid": coach_id, "uid": uid,
-                                "content": f"信任分 {trust:.2f}，已 {days} 天未打卡，建议主动关怀",
-                            })
-                            flagged += 1
-                        except Exception:
-                            pass
-
-                if rows:
-                    await db.commit()
-                logger.info(f"[Scheduler] 信任预警: {len(rows)} 低信任用户, {flagged} 教练通知")
+                    report = await run_trust_engagement_monitor(db)
+                except Exception as e:
+                    logger.warning(f"[Scheduler] 信任预警失败: {e}")
+                    return
+                logger.info(
+                    f"[Scheduler] 信任预警: {report.candidates} 低信任用户, "
+                    f"{report.count('notifications')} 用户通知, {report.count('coach_alerts')} 教练通知 "
+                    f"({report.duration_ms:.0f}ms)"
+                )
 
         scheduler.add_job(
             job_trust_engagement_monitor,
@@ -599,69 +546,17 @@ def setup_scheduler() -> "AsyncIOScheduler | None":
 
         @with_redis_lock("scheduler:coach_auto_escalation", ttl=600)
         async def job_coach_auto_escalation():
-            from sqlalchemy import text as sa_text
+            from core.engagement_jobs import run_coach_auto_escalation
             async with _R10Async() as db:
-                stmt = sa_text("""
-                    SELECT u.id AS user_id,
-                           (u.profile->>'coach_id')::int AS coach_id,
-                           us.last_checkin_date, u.trust_score,
-                           COUNT(bp.id) AS rx_count
-                    FROM users u
-                    JOIN user_streaks us ON us.user_id = u.id
-                    JOIN behavior_prescriptions bp
-                        ON bp.user_id = u.id AND bp.status = 'active'
-                    WHERE u.is_active = true
-                      AND u.profile->>'coach_id' IS NOT NULL
-                      AND us.last_checkin_date < CURRENT_DATE - INTERVAL '7 days'
-                    GROUP BY u.id, us.last_checkin_date, u.trust_score
-                """)
                 try:
-                    rows = (await db.execute(stmt)).mappings().all()
-                except Exception:
-                    rows = []
-
-                escalated = 0
-                for row in rows:
-                    uid, cid = row["user_id"], row["coach_id"]
-                    if not cid:
-                        continue
-                    days = (date.today() - row["last_checkin_date"]).days if row["last_checkin_date"] else 999
-                    trust = row["trust_score"] or 0.0
-
-                    # Dedup: skip if pending escalation exists within 7 days
-                    try:
-                        dup = await db.execute(sa_text("""
-                            SELECT 1 FROM coach_push_queue
-                            WHERE student_id = :uid AND source_type = 'auto_escalation'
-                              AND status = 'pending'
-                              AND created_at > CURRENT_DATE - INTERVAL '7 days'
-                            LIMIT 1
-                        """), {"uid": uid})
-                        if dup.first():
-                            continue
-                    except Exception:
-                        pass
-
-                    try:
-                        await db.execute(sa_text("""
-                            INSERT INTO coach_push_queue
-                              (coach_id, student_id, source_type, title, content,
-                               priority, status, created_at)
-                            VALUES (:cid, :uid, 'auto_escalation',
-                              :title, :content, 'high', 'pending', NOW())
-                        """), {
-                            "cid": cid, "uid": uid,
-                            "title": f"学员失联预警 ({days}天未打卡)",
-                            "content": f"已 {days} 天未打卡，信任分 {trust:.2f}，"
-                                       f"有 {row['rx_count']} 个活跃处方未执行，建议主动联系。",
-                        })
-                        escalated += 1
-                    except Exception:
-                        pass
-
-                if escalated:
-                    await db.commit()
-                logger.info(f"[Scheduler] 教练自动升级: {len(rows)} 候选, {escalated} 升级")
+                    report = await run_coach_auto_escalation(db)
+                except Exception as e:
+                    logger.warning(f"[Scheduler] 教练自动升级失败: {e}")
+                    return
+                logger.info(
+                    f"[Scheduler] 教练自动升级: {report.candidates} 候选, "
+                    f"{report.count('coach_alerts')} 升级 ({report.duration_ms:.0f}ms)"
+                )
 
         scheduler.add_job(
             job_coach_auto_escalation,
@@ -679,102 +574,15 @@ def setup_scheduler() -> "AsyncIOScheduler | None":
 
         @with_redis_lock("scheduler:analytics_daily_aggregate", ttl=600)
         async def job_analytics_daily_aggregate():
-            from sqlalchemy import text as sa_text
+            # 按水位增量刷新事实表 (每来源表一条分组查询), 并回写 analytics_daily 汇总
+            from core.analytics_facts import refresh_facts
             async with _P5bAsync() as db:
-                yesterday = (date.today() - timedelta(days=1)).isoformat()
                 try:
-                    # DAU
-                    dau_r = await db.execute(sa_text(
-                        "SELECT COUNT(DISTINCT user_id) FROM user_activity_logs WHERE created_at::date = :d"
-                    ), {"d": yesterday})
-                    dau = dau_r.scalar() or 0
-
-                    # New users
-                    new_r = await db.execute(sa_text(
-                        "SELECT COUNT(*) FROM users WHERE created_at::date = :d"
-                    ), {"d": yesterday})
-                    new_users = new_r.scalar() or 0
-
-                    # Active growers (role > OBSERVER with activity)
-                    ag_r = await db.execute(sa_text("""
-                        SELECT COUNT(DISTINCT u.id) FROM users u
-                        JOIN user_activity_logs ual ON ual.user_id = u.id
-                        WHERE ual.created_at::date = :d AND u.role::text != 'OBSERVER'
-                    """), {"d": yesterday})
-                    active_growers = ag_r.scalar() or 0
-
-                    # Conversion rate (growers+ / total)
-                    total_r = await db.execute(sa_text("SELECT COUNT(*) FROM users WHERE is_active = true"))
-                    total = total_r.scalar() or 1
-                    non_obs_r = await db.execute(sa_text(
-                        "SELECT COUNT(*) FROM users WHERE is_active = true AND role::text != 'OBSERVER'"
-                    ))
-                    non_obs = non_obs_r.scalar() or 0
-                    conversion_rate = round(non_obs / total, 4) if total else 0.0
-
-                    # 7-day retention
-                    d7_ago = (date.today() - timedelta(days=8)).isoformat()
-                    d7_users_r = await db.execute(sa_text(
-                        "SELECT COUNT(DISTINCT user_id) FROM user_activity_logs WHERE created_at::date = :d"
-                    ), {"d": d7_ago})
-                    d7_users = d7_users_r.scalar() or 0
-                    if d7_users:
-                        retained_r = await db.execute(sa_text("""
-                            SELECT COUNT(DISTINCT ual1.user_id) FROM user_activity_logs ual1
-                            WHERE ual1.created_at::date = :d1
-                              AND ual1.user_id IN (
-                                SELECT DISTINCT user_id FROM user_activity_logs WHERE created_at::date = :d0
-                              )
-                        """), {"d0": d7_ago, "d1": yesterday})
-                        retained = retained_r.scalar() or 0
-                        retention_7d = round(retained / d7_users, 4)
-                    else:
-                        retention_7d = 0.0
-
-                    # Total events
-                    ev_r = await db.execute(sa_text(
-                        "SELECT COUNT(*) FROM user_activity_logs WHERE created_at::date = :d"
-                    ), {"d": yesterday})
-                    total_events = ev_r.scalar() or 0
-
-                    # Chat messages
-                    chat_r = await db.execute(sa_text(
-                        "SELECT COUNT(*) FROM user_activity_logs WHERE created_at::date = :d AND activity_type IN ('chat', 'chat_message')"
-                    ), {"d": yesterday})
-                    total_chat = chat_r.scalar() or 0
-
-                    # AI response avg ms
-                    ai_r = await db.execute(sa_text("""
-                        SELECT AVG(CAST(detail->>'response_ms' AS FLOAT))
-                        FROM user_activity_logs
-                        WHERE created_at::date = :d AND detail->>'response_ms' IS NOT NULL
-                    """), {"d": yesterday})
-                    ai_avg = ai_r.scalar() or 0.0
-
-                    # Upsert
-                    await db.execute(sa_text("""
-                        INSERT INTO analytics_daily
-                            (date, dau, new_users, active_growers, conversion_rate,
-                             retention_7d, avg_tasks_completed, avg_session_minutes,
-                             ai_response_avg_ms, total_events, total_chat_messages)
-                        VALUES (:d, :dau, :nu, :ag, :cr, :r7, 0.0, 0.0, :ai, :te, :tc)
-                        ON CONFLICT (date) DO UPDATE SET
-                            dau = EXCLUDED.dau, new_users = EXCLUDED.new_users,
-                            active_growers = EXCLUDED.active_growers,
-                            conversion_rate = EXCLUDED.conversion_rate,
-                            retention_7d = EXCLUDED.retention_7d,
-                            ai_response_avg_ms = EXCLUDED.ai_response_avg_ms,
-                            total_events = EXCLUDED.total_events,
-                            total_chat_messages = EXCLUDED.total_chat_messages
-                    """), {
-                        "d": yesterday, "dau": dau, "nu": new_users, "ag": active_growers,
-                        "cr": conversion_rate, "r7": retention_7d,
-                        "ai": round(ai_avg, 1), "te": total_events, "tc": total_chat,
-                    })
-                    await db.commit()
-                    logger.info(f"[Scheduler] 分析聚合完成: date={yesterday} DAU={dau} events={total_events}")
+                    report = await refresh_facts(db)
                 except Exception as e:
                     logger.warning(f"[Scheduler] 分析聚合失败: {e}")
+                    return
+                logger.info(f"[Scheduler] 分析聚合完成: {report.summary()}")
 
         scheduler.add_job(
             job_analytics_daily_aggregate,
@@ -793,17 +601,12 @@ def setup_scheduler() -> "AsyncIOScheduler | None":
         @with_redis_lock("scheduler:weekly_report_generation", ttl=600)
         async def job_weekly_report_generation():
             from sqlalchemy import text as sa_text
+            from core.analytics_facts import daily_series
             async with _P5bWeekly() as db:
                 end_date = date.today() - timedelta(days=1)
                 start_date = end_date - timedelta(days=6)
                 try:
-                    result = await db.execute(sa_text("""
-                        SELECT date::text, dau, new_users, conversion_rate, retention_7d,
-                               total_events, total_chat_messages
-                        FROM analytics_daily
-                        WHERE date BETWEEN :s AND :e ORDER BY date
-                    """), {"s": start_date, "e": end_date})
-                    rows = result.mappings().all()
+                    rows = await daily_series(db, start_date, end_date)
 
                     if not rows:
                         logger.info("[Scheduler] 周报: 无数据")
@@ -0,0 +1,223 @@
+"""
+启动耗时剖析
+Startup profiler
+
+两部分:
+- 导入树: 解析 `python -X importtime` 输出, 按累计耗时给出最重的模块及其子树
+- 路由注册: api/router_manifest.load_routers() 把每条清单项的导入 / 挂载耗时、
+  新增路由数、跳过 / 失败原因记入 startup_profile
+
+用法:
+  python -m core.startup_profiler                    # 导入 api.main, 打印两份报告
+  python -m core.startup_profiler --top 40 --min-ms 20
+  ROUTER_GROUPS_DISABLED=vision,xzb python -m core.startup_profiler
+
+运行中的 worker 设置 STARTUP_PROFILE=true 时, 启动完成后把路由注册报告写入日志。
+"""
+
+import json
+import os
+import subprocess
+import sys
+from dataclasses import asdict, dataclass, field
+from typing import Any, Dict, List, Optional
+
+STARTUP_PROFILE_ENABLED = os.getenv("STARTUP_PROFILE", "false").lower() in ("true", "1", "yes")
+
+_PROFILE_MARKER = "__STARTUP_PROFILE__"
+
+
+# ---------------------------------------------------------------------------
+# 导入树
+# ---------------------------------------------------------------------------
+
+@dataclass
+class ImportNode:
+    name: str
+    self_us: int
+    cumulative_us: int
+    depth: int
+    children: List["ImportNode"] = field(default_factory=list)
+
+
+def parse_importtime(text: str) -> List[ImportNode]:
+    """
+    解析 -X importtime 的 stderr, 返回顶层模块列表 (子模块挂在 children)
+
+    importtime 按 "导入完成" 的顺序输出 (子模块先于父模块),
+    缩进深度表示层级, 因此用栈把已输出的更深层节点收为当前节点的子节点。
+    """
+    roots: List[ImportNode] = []
+    pending: List[ImportNode] = []
+    for line in text.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        parts = line[len("import time:"):].split("|")
+        if len(parts) != 3:
+            continue
+        try:
+            self_us, cumulative_us = int(parts[0]), int(parts[1])
+        except ValueError:
+            continue  # 表头
+        raw = parts[2].rstrip()
+        name = raw.lstrip()
+        depth = (len(raw) - len(name) - 1) // 2
+        node = ImportNode(name, self_us, cumulative_us, depth)
+        while pending and pending[-1].depth > depth:
+            node.children.insert(0, pending.pop())
+        if depth == 0:
+            roots.append(node)
+        else:
+            pending.append(node)
+    return roots
+
+
+def heaviest(roots: List[ImportNode], top: int = 30) -> List[ImportNode]:
+    """所有节点按累计耗时降序 (同名模块只取最重的一次)"""
+    best: Dict[str, ImportNode] = {}
+    stack = list(roots)
+    while stack:
+        node = stack.pop()
+        if node.name not in best or node.cumulative_us > best[node.name].cumulative_us:
+            best[node.name] = node
+        stack.extend(node.children)
+    return sorted(best.values(), key=lambda n: n.cumulative_us, reverse=True)[:top]
+
+
+def format_tree(roots: List[ImportNode], min_ms: float = 10.0, max_depth: int = 6) -> str:
+    """累计耗时 >= min_ms 的子树, 子节点按耗时降序"""
+    lines: List[str] = []
+
+    def walk(node: ImportNode, indent: int):
+        if node.cumulative_us < min_ms * 1000 or indent > max_depth:
+            return
+        lines.append(f"{node.cumulative_us / 1000:>9.1f} ms  {'  ' * indent}{node.name}")
+        for child in sorted(node.children, key=lambda n: n.cumulative_us, reverse=True):
+            walk(child, indent + 1)
+
+    for root in sorted(roots, key=lambda n: n.cumulative_us, reverse=True):
+        walk(root, 0)
+    return "\n".join(lines)
+
+
+# ---------------------------------------------------------------------------
+# 路由注册
+# ---------------------------------------------------------------------------
+
+@dataclass
+class RouterTiming:
+    label: str
+    group: str
+    modules: List[str]
+    status: str = "ok"          # ok / skipped / failed
+    import_ms: float = 0.0
+    include_ms: float = 0.0
+    routes: int = 0
+    error: Optional[str] = None
+
+    @property
+    def total_ms(self) -> float:
+        return self.import_ms + self.include_ms
+
+
+class StartupProfile:
+    """路由注册耗时记录 (进程内单例 startup_profile)"""
+
+    def __init__(self):
+        self.routers: List[RouterTiming] = []
+
+    def add(self, timing: RouterTiming):
+        self.routers.append(timing)
+
+    def reset(self):
+        self.routers.clear()
+
+    def by_group(self) -> Dict[str, Dict[str, Any]]:
+        groups: Dict[str, Dict[str, Any]] = {}
+        for t in self.routers:
+            g = groups.setdefault(t.group, {"routers": 0, "routes": 0, "ms": 0.0, "skipped": 0, "failed": 0})
+            g["routers"] += 1
+            g["routes"] += t.routes
+            g["ms"] += t.total_ms
+            if t.status == "skipped":
+                g["skipped"] += 1
+            elif t.status == "failed":
+                g["failed"] += 1
+        return groups
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "total_ms": round(sum(t.total_ms for t in self.routers), 1),
+            "groups": self.by_group(),
+            "routers": [asdict(t) for t in self.routers],
+        }
+
+    def report(self, top: int = 20) -> str:
+        total = sum(t.total_ms for t in self.routers)
+        lines = [f"路由注册: {len(self.routers)} 项, 共 {total:.0f} ms"]
+        lines.append(f"  {'功能组':<12}{'项数':>6}{'路由':>7}{'耗时ms':>10}  跳过/失败")
+        for name, g in sorted(self.by_group().items(), key=lambda kv: kv[1]["ms"], reverse=True):
+            lines.append(f"  {name:<12}{g['routers']:>6}{g['routes']:>7}{g['ms']:>10.1f}  {g['skipped']}/{g['failed']}")
+        lines.append(f"  最慢 {top} 项 (导入 + 挂载):")
+        for t in sorted(self.routers, key=lambda t: t.total_ms, reverse=True)[:top]:
+            lines.append(
+                f"  {t.total_ms:>9.1f} ms  (导入 {t.import_ms:.1f} / 挂载 {t.include_ms:.1f})  "
+                f"[{t.group}] {t.label}  {t.status}"
+            )
+        return "\n".join(lines)
+
+
+startup_profile = StartupProfile()
+
+
+# ---------------------------------------------------------------------------
+# 命令行
+# ---------------------------------------------------------------------------
+
+def profile_app_import(target: str = "api.main", env: Optional[Dict[str, str]] = None):
+    """在子进程中以 -X importtime 导入 target, 返回 (导入树, 路由注册报告 dict)"""
+    code = (
+        f"import json, {target}\n"
+        "from core.startup_profiler import startup_profile\n"
+        f"print({_PROFILE_MARKER!r} + json.dumps(startup_profile.as_dict(), ensure_ascii=False))\n"
+    )
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        cwd=root, env={**os.environ, **(env or {})}, capture_output=True, text=True,
+    )
+    routers: Dict[str, Any] = {}
+    for line in proc.stdout.splitlines():
+        if line.startswith(_PROFILE_MARKER):
+            routers = json.loads(line[len(_PROFILE_MARKER):])
+    if proc.returncode != 0 and not routers:
+        raise RuntimeError(f"导入 {target} 失败:\n{proc.stderr[-2000:]}")
+    return parse_importtime(proc.stderr), routers
+
+
+def main(argv=None):
+    import argparse
+
+    parser = argparse.ArgumentParser(description="API 启动耗时剖析 (导入树 + 路由注册)")
+    parser.add_argument("--target", default="api.main")
+    parser.add_argument("--top", type=int, default=30, help="最重模块 / 最慢路由条数")
+    parser.add_argument("--min-ms", type=float, default=50.0, help="导入树只展开累计耗时不低于该值的节点")
+    parser.add_argument("--depth", type=int, default=6)
+    args = parser.parse_args(argv)
+
+    roots, routers = profile_app_import(args.target)
+    total = sum(r.cumulative_us for r in roots) / 1000
+    print(f"== 导入树 (累计 {total:.0f} ms, >= {args.min_ms:g} ms) ==")
+    print(format_tree(roots, args.min_ms, args.depth))
+    print(f"\n== 最重的 {args.top} 个模块 ==")
+    for node in heaviest(roots, args.top):
+        print(f"{node.cumulative_us / 1000:>9.1f} ms  (自身 {node.self_us / 1000:.1f})  {node.name}")
+    if routers:
+        profile = StartupProfile()
+        for item in routers["routers"]:
+            profile.add(RouterTiming(**item))
+        print("\n== " + profile.report(args.top))
+
+
+if __name__ == "__main__":
+    main()
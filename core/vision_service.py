@@ -11,6 +11,7 @@ VisionGuard 视力行为保护 — 核心服务
 - 目标自动调整 (按 TTM 阶段)
 - 周报生成
 - 处方触发 (连续3天评分下降 → coach_push_queue, 遵守 AI→审核→推送铁律)
+- 批量任务 (Scheduler): 每晚日评分 / 风险等级重算, 集合化查询 + 批量 UPDATE
 """
 from __future__ import annotations
 
@@ -23,6 +24,7 @@ from sqlalchemy import (
     Boolean, Column, Date, DateTime, Float, ForeignKey,
     Index, Integer, String, Text, UniqueConstraint,
 )
+from sqlalchemy import func, insert, select, update
 from sqlalchemy.dialects.postgresql import JSON
 from sqlalchemy.orm import Session, relationship
 from sqlalchemy import text as sa_text
@@ -261,20 +263,43 @@ _RISK_LEVELS_ORDER = {
     VisionRiskLevel.URGENT: 3,
 }
 
+# 行为评分风险的滚动窗口 (天)
+_RISK_LOG_WINDOW_DAYS = 7
+
 
 def assess_vision_risk(db: Session, user_id: int) -> VisionRiskLevel:
     """
     综合风险评估 = max(检查数据风险, 行为评分风险)
     """
-    risk = VisionRiskLevel.NORMAL
-
-    # 1. 最近检查记录的风险
+    # 1. 最近检查记录
     latest_exam = (
         db.query(VisionExamRecord)
         .filter(VisionExamRecord.user_id == user_id)
         .order_by(VisionExamRecord.exam_date.desc())
         .first()
     )
+
+    # 2. 近7天行为评分
+    recent_logs = (
+        db.query(VisionBehaviorLog)
+        .filter(
+            VisionBehaviorLog.user_id == user_id,
+            VisionBehaviorLog.log_date >= date.today() - timedelta(days=_RISK_LOG_WINDOW_DAYS),
+        )
+        .all()
+    )
+    return combine_vision_risk(latest_exam, [l.behavior_score for l in recent_logs])
+
+
+def combine_vision_risk(latest_exam, recent_scores: list) -> VisionRiskLevel:
+    """
+    风险判定规则 (单人评估与批量重算共用)
+
+    latest_exam: 最近一次检查 (需含 left/right_eye_sph, left/right_eye_axial_len 属性), 可为 None
+    recent_scores: 近7天日志的 behavior_score 列表 (None 记 0)
+    """
+    risk = VisionRiskLevel.NORMAL
+
     if latest_exam:
         # 球镜 < -6.0 → URGENT, < -3.0 → ALERT, < -0.5 → WATCH
         worst_sph = min(
@@ -298,17 +323,9 @@ def assess_vision_risk(db: Session, user_id: int) -> VisionRiskLevel:
             if _RISK_LEVELS_ORDER.get(axial_risk, 0) > _RISK_LEVELS_ORDER.get(risk, 0):
                 risk = axial_risk
 
-    # 2. 近7天行为评分 < 40 → 至少 WATCH, < 25 → ALERT
-    recent_logs = (
-        db.query(VisionBehaviorLog)
-        .filter(
-            VisionBehaviorLog.user_id == user_id,
-            VisionBehaviorLog.log_date >= date.today() - timedelta(days=7),
-        )
-        .all()
-    )
-    if recent_logs:
-        avg_score = sum((l.behavior_score or 0) for l in recent_logs) / len(recent_logs)
+    # 近7天行为评分 < 40 → 至少 WATCH, < 25 → ALERT
+    if recent_scores:
+        avg_score = sum((s or 0) for s in recent_scores) / len(recent_scores)
         if avg_score < 25:
             behavior_risk = VisionRiskLevel.ALERT
         elif avg_score < 40:
@@ -655,35 +672,113 @@ def check_rx_trigger(db: Session, user_id: int) -> bool:
 # ══════════════════════════════════════════
 
 def batch_calc_daily_scores(db: Session) -> int:
-    """为所有今天有打卡但未计算评分的日志计算评分"""
+    """
+    为所有今天有打卡但未计算评分的日志计算评分
+
+    集合化: 一次补齐缺失的默认目标, 一次联表取出 (日志, 目标),
+    内存中逐条计算后以一条按主键的批量 UPDATE 写回。
+    """
     today = date.today()
-    logs = (
-        db.query(VisionBehaviorLog)
-        .filter(
-            VisionBehaviorLog.log_date == today,
-            VisionBehaviorLog.behavior_score == None,
-        )
-        .all()
+    pending = (
+        VisionBehaviorLog.log_date == today,
+        VisionBehaviorLog.behavior_score.is_(None),
     )
-    count = 0
-    for log in logs:
-        goal = get_or_create_goal(db, log.user_id)
-        log.behavior_score = calc_behavior_score(log, goal)
-        count += 1
-    if count:
+
+    # 1. 缺目标的用户一次性插入默认目标 (取值由表的 server_default 决定, 与 get_or_create_goal 一致)
+    missing = db.execute(
+        select(VisionBehaviorLog.user_id)
+        .outerjoin(VisionBehaviorGoal, VisionBehaviorGoal.user_id == VisionBehaviorLog.user_id)
+        .where(*pending, VisionBehaviorGoal.id.is_(None))
+        .distinct()
+    ).scalars().all()
+    if missing:
+        db.execute(insert(VisionBehaviorGoal), [{"user_id": uid} for uid in missing])
+
+    # 2. 日志与目标同行取出, 同一行既作 log 又作 goal 传给评分函数 (两表字段名不重叠)
+    rows = db.execute(
+        select(
+            VisionBehaviorLog.id,
+            VisionBehaviorLog.outdoor_minutes,
+            VisionBehaviorLog.screen_total_minutes,
+            VisionBehaviorLog.eye_exercise_done,
+            VisionBehaviorLog.lutein_intake_mg,
+            VisionBehaviorLog.sleep_minutes,
+            VisionBehaviorGoal.outdoor_target_min,
+            VisionBehaviorGoal.screen_daily_limit,
+            VisionBehaviorGoal.lutein_target_mg,
+            VisionBehaviorGoal.sleep_target_min,
+        )
+        .join(VisionBehaviorGoal, VisionBehaviorGoal.user_id == VisionBehaviorLog.user_id)
+        .where(*pending)
+    ).all()
+
+    # 3. 一条批量 UPDATE 写回
+    updates = [{"id": row.id, "behavior_score": calc_behavior_score(row, row)} for row in rows]
+    if updates:
+        db.execute(update(VisionBehaviorLog), updates)
+    if updates or missing:
         db.commit()
-    return count
+    return len(updates)
 
 
 def batch_update_risk_levels(db: Session) -> int:
-    """更新所有视力学生的风险等级"""
-    profiles = db.query(VisionProfile).filter(VisionProfile.is_vision_student == True).all()
-    count = 0
+    """
+    更新所有视力学生的风险等级
+
+    集合化: ROW_NUMBER() 窗口取每人最近一次检查, 一次扫描取出近7天日志评分,
+    规则与 assess_vision_risk 共用 combine_vision_risk, 变化的档案以一条批量 UPDATE 写回。
+    """
+    students = VisionProfile.is_vision_student == True  # noqa: E712
+    profiles = db.execute(
+        select(VisionProfile.id, VisionProfile.user_id, VisionProfile.current_risk_level)
+        .where(students)
+    ).all()
+    if not profiles:
+        return 0
+
+    # 1. 每人最近一次检查
+    ranked = (
+        select(
+            VisionExamRecord.user_id,
+            VisionExamRecord.left_eye_sph,
+            VisionExamRecord.right_eye_sph,
+            VisionExamRecord.left_eye_axial_len,
+            VisionExamRecord.right_eye_axial_len,
+            func.row_number().over(
+                partition_by=VisionExamRecord.user_id,
+                order_by=(VisionExamRecord.exam_date.desc(), VisionExamRecord.id.desc()),
+            ).label("rn"),
+        )
+        .join(VisionProfile, VisionProfile.user_id == VisionExamRecord.user_id)
+        .where(students)
+        .subquery()
+    )
+    latest_exams = {
+        row.user_id: row
+        for row in db.execute(select(ranked).where(ranked.c.rn == 1))
+    }
+
+    # 2. 近7天日志评分 (按 id 顺序累加, 与单人评估的求和顺序一致)
+    recent_scores: dict[int, list] = {}
+    window_rows = db.execute(
+        select(VisionBehaviorLog.user_id, VisionBehaviorLog.behavior_score)
+        .join(VisionProfile, VisionProfile.user_id == VisionBehaviorLog.user_id)
+        .where(
+            students,
+            VisionBehaviorLog.log_date >= date.today() - timedelta(days=_RISK_LOG_WINDOW_DAYS),
+        )
+        .order_by(VisionBehaviorLog.user_id, VisionBehaviorLog.id)
+    )
+    for user_id, score in window_rows:
+        recent_scores.setdefault(user_id, []).append(score)
+
+    # 3. 计算并只写回有变化的档案
+    updates = []
     for p in profiles:
-        new_risk = assess_vision_risk(db, p.user_id)
+        new_risk = combine_vision_risk(latest_exams.get(p.user_id), recent_scores.get(p.user_id, []))
         if p.current_risk_level != new_risk.value:
-            p.current_risk_level = new_risk.value
-            count += 1
-    if count:
+            updates.append({"id": p.id, "current_risk_level": new_risk.value})
+    if updates:
+        db.execute(update(VisionProfile), updates)
         db.commit()
-    return count
+    return len(updates)
@@ -0,0 +1,338 @@
+"""
+WebSocket 跨 worker 推送中枢
+WebSocket fan-out hub
+
+- 频道: "user:<id>" / "content:<id>" / "broadcast"; 同一用户可有多个连接 (多标签页 / 多设备)
+- 跨 worker: 配置 REDIS_URL 时消息经 Redis PUBLISH 到 "bhp:ws:<频道>",
+  每个 worker 以 PSUBSCRIBE "bhp:ws:*" 接收并投递给本进程的连接;
+  Redis 不可用 / 订阅中断时退化为本进程直接投递
+- 背压: 每个连接一个有界发送队列 + 独立发送任务, 投递只做 put_nowait, 不等待慢连接;
+  队列满的连接被视为慢消费者, 以 1013 关闭
+- 合并: stats_update 等高频消息在队列中尚未发出时合并为一条 (*_delta 字段累加, 其余取最新值)
+- 指标: bhp_ws_connected_users / bhp_ws_connections / bhp_ws_queue_depth 等 (prometheus_client 可用时)
+
+调度器线程等非事件循环上下文使用 publish_sync()。
+
+环境变量:
+  WS_SEND_QUEUE_SIZE  每连接发送队列上限 (默认 256)
+"""
+
+import asyncio
+import json
+import os
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from loguru import logger
+
+WS_CHANNEL_PREFIX = "bhp:ws:"
+WS_SEND_QUEUE_SIZE = int(os.getenv("WS_SEND_QUEUE_SIZE", "256"))
+
+# 可合并的消息类型
+COALESCE_TYPES = frozenset({"stats_update"})
+
+# 1013 Try Again Later: 客户端可重连
+SLOW_CONSUMER_CLOSE_CODE = 1013
+
+
+def merge_message(pending: dict, message: dict) -> None:
+    """把 message 合并进尚未发出的 pending (data 中 *_delta 累加, 其余覆盖)"""
+    data = pending.setdefault("data", {})
+    for key, value in (message.get("data") or {}).items():
+        if key.endswith("_delta") and isinstance(value, (int, float)):
+            data[key] = data.get(key, 0) + value
+        else:
+            data[key] = value
+    for key, value in message.items():
+        if key != "data":
+            pending[key] = value
+
+
+class _Coalesced:
+    """队列中的占位: 发送时取 pending 中的最新合并结果"""
+
+    __slots__ = ("key",)
+
+    def __init__(self, key):
+        self.key = key
+
+
+class WSConnection:
+    """单个 WebSocket 连接: 有界发送队列 + 发送任务"""
+
+    def __init__(self, websocket, channel: str, hub: "ConnectionHub", queue_size: int = WS_SEND_QUEUE_SIZE):
+        self.websocket = websocket
+        self.channel = channel
+        self.hub = hub
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+        self.closed = False
+        self._pending: Dict[str, dict] = {}
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self):
+        self._task = asyncio.ensure_future(self._sender())
+
+    def offer(self, message: dict) -> bool:
+        """非阻塞入队; 队列满则按慢消费者断开"""
+        if self.closed:
+            return False
+        key = message.get("type") if message.get("type") in COALESCE_TYPES else None
+        if key is not None:
+            pending = self._pending.get(key)
+            if pending is not None:
+                merge_message(pending, message)
+                self.hub.coalesced += 1
+                return True
+            item = _Coalesced(key)
+        else:
+            item = message
+        try:
+            self.queue.put_nowait(item)
+        except asyncio.QueueFull:
+            logger.warning(f"[WS] 慢消费者, 断开连接: channel={self.channel} queue={self.queue.qsize()}")
+            self.hub.dropped += 1
+            self.close(SLOW_CONSUMER_CLOSE_CODE, "slow consumer")
+            return False
+        if key is not None:
+            self._pending[key] = {**message, "data": dict(message.get("data") or {})}
+        return True
+
+    async def _sender(self):
+        try:
+            while True:
+                item = await self.queue.get()
+                message = self._pending.pop(item.key) if isinstance(item, _Coalesced) else item
+                # 不加 wait_for 超时: 卡住的发送会让队列积满, 由 offer() 按慢消费者断开
+                await self.websocket.send_json(message)
+                self.hub.delivered += 1
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.debug(f"[WS] 发送失败, 移除连接: channel={self.channel} err={e}")
+            self.hub.disconnect(self)
+
+    def close(self, code: int = 1000, reason: str = ""):
+        """从中枢移除并关闭底层连接 (可重复调用)"""
+        if self.closed:
+            return
+        self.hub.disconnect(self)
+
+        async def _close():
+            try:
+                await self.websocket.close(code=code, reason=reason)
+            except Exception:
+                pass
+
+        asyncio.ensure_future(_close())
+
+    def _stop(self):
+        self.closed = True
+        if self._task is not None and self._task is not asyncio.current_task():
+            self._task.cancel()
+
+
+class ConnectionHub:
+    """本进程连接表 + Redis pub/sub 中继"""
+
+    def __init__(self, queue_size: int = WS_SEND_QUEUE_SIZE):
+        self.queue_size = queue_size
+        self.channels: Dict[str, Set[WSConnection]] = {}
+        self.delivered = 0
+        self.coalesced = 0
+        self.dropped = 0
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._listener: Optional[asyncio.Task] = None
+        self._relay_active = False
+        self._redis = None
+        self._async_redis = None
+
+    # ---- Redis ----
+
+    def _get_redis(self):
+        if self._redis is None:
+            self._redis = False
+            redis_url = os.getenv("REDIS_URL")
+            if redis_url:
+                try:
+                    import redis
+                    self._redis = redis.from_url(redis_url, decode_responses=True)
+                except Exception as e:
+                    logger.warning(f"[WS] Redis 不可用 ({e}), 仅本进程投递")
+        return self._redis or None
+
+    def _get_async_redis(self):
+        if self._async_redis is None:
+            self._async_redis = False
+            redis_url = os.getenv("REDIS_URL")
+            if redis_url:
+                try:
+                    import redis.asyncio as aioredis
+                    self._async_redis = aioredis.from_url(redis_url, decode_responses=True)
+                except Exception as e:
+                    logger.warning(f"[WS] 异步 Redis 不可用 ({e}), 仅本进程投递")
+        return self._async_redis or None
+
+    def _ensure_listener(self):
+        self._loop = asyncio.get_running_loop()
+        if self._listener is None or self._listener.done():
+            if self._get_async_redis() is not None:
+                self._listener = asyncio.ensure_future(self._listen())
+
+    async def _listen(self):
+        """订阅 bhp:ws:*, 把其他 worker (及本 worker) 发布的消息投递给本进程连接"""
+        backoff = 1.0
+        while True:
+            pubsub = None
+            try:
+                pubsub = self._get_async_redis().pubsub(ignore_subscribe_messages=True)
+                await pubsub.psubscribe(f"{WS_CHANNEL_PREFIX}*")
+                self._relay_active = True
+                backoff = 1.0
+                async for item in pubsub.listen():
+                    if item.get("type") != "pmessage":
+                        continue
+                    channel = item["channel"][len(WS_CHANNEL_PREFIX):]
+                    try:
+                        self.deliver_local(channel, json.loads(item["data"]))
+                    except ValueError:
+                        logger.warning(f"[WS] 忽略无法解析的消息: channel={channel}")
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"[WS] 订阅中断 ({e}), {backoff:.0f}s 后重连; 期间仅本进程投递")
+            finally:
+                self._relay_active = False
+                if pubsub is not None:
+                    try:
+                        await pubsub.aclose()
+                    except Exception:
+                        pass
+            await asyncio.sleep(backoff)
+            backoff = min(backoff * 2, 30.0)
+
+    # ---- 连接 ----
+
+    async def connect(self, websocket, channel: str) -> WSConnection:
+        await websocket.accept()
+        conn = WSConnection(websocket, channel, self, self.queue_size)
+        self.channels.setdefault(channel, set()).add(conn)
+        conn.start()
+        self._ensure_listener()
+        return conn
+
+    def disconnect(self, conn: WSConnection):
+        conns = self.channels.get(conn.channel)
+        if conns is not None:
+            conns.discard(conn)
+            if not conns:
+                del self.channels[conn.channel]
+        conn._stop()
+
+    # ---- 投递 ----
+
+    def deliver_local(self, channel: str, message: dict) -> int:
+        """投递给本进程在该频道的连接 (必须在事件循环线程调用), 返回成功入队数"""
+        return sum(conn.offer(message) for conn in list(self.channels.get(channel, ())))
+
+    async def publish(self, channel: str, message: dict):
+        """
+        发布到所有 worker
+
+        本 worker 的订阅正常时, 本地连接经订阅收到 (不重复投递);
+        Redis 不可用或本 worker 订阅中断时直接投递给本地连接。
+        """
+        published = False
+        r = self._get_async_redis()
+        if r is not None:
+            try:
+                await r.publish(f"{WS_CHANNEL_PREFIX}{channel}", json.dumps(message, ensure_ascii=False, default=str))
+                published = True
+            except Exception as e:
+                logger.warning(f"[WS] 发布失败 ({e}), 仅本进程投递")
+        if not (published and self._relay_active):
+            self.deliver_local(channel, message)
+
+    def publish_sync(self, channel: str, message: dict):
+        """同 publish(), 供调度器线程等同步代码调用"""
+        published = False
+        r = self._get_redis()
+        if r is not None:
+            try:
+                r.publish(f"{WS_CHANNEL_PREFIX}{channel}", json.dumps(message, ensure_ascii=False, default=str))
+                published = True
+            except Exception as e:
+                logger.warning(f"[WS] 发布失败 ({e}), 仅本进程投递")
+        if published and self._relay_active:
+            return
+        loop = self._loop
+        if loop is not None and not loop.is_closed():
+            loop.call_soon_threadsafe(self.deliver_local, channel, message)
+
+    def publish_many_sync(self, items: List[Tuple[str, dict]]):
+        """批量 publish_sync: 一个 Redis pipeline 发出全部消息 (提醒批量触发等)"""
+        published = False
+        r = self._get_redis()
+        if r is not None and items:
+            try:
+                pipe = r.pipeline(transaction=False)
+                for channel, message in items:
+                    pipe.publish(f"{WS_CHANNEL_PREFIX}{channel}", json.dumps(message, ensure_ascii=False, default=str))
+                pipe.execute()
+                published = True
+            except Exception as e:
+                logger.warning(f"[WS] 批量发布失败 ({e}), 仅本进程投递")
+        if published and self._relay_active:
+            return
+        loop = self._loop
+        if loop is not None and not loop.is_closed():
+            for channel, message in items:
+                loop.call_soon_threadsafe(self.deliver_local, channel, message)
+
+    # ---- 统计 ----
+
+    def stats(self) -> Dict[str, Any]:
+        conns = [c for cs in self.channels.values() for c in cs]
+        return {
+            "connections": len(conns),
+            "connected_users": sum(1 for ch in self.channels if ch.startswith("user:")),
+            "channels": len(self.channels),
+            "queue_depth": sum(c.queue.qsize() for c in conns),
+            "max_queue_depth": max((c.queue.qsize() for c in conns), default=0),
+            "delivered": self.delivered,
+            "coalesced": self.coalesced,
+            "dropped_slow_consumers": self.dropped,
+            "relay_active": self._relay_active,
+        }
+
+
+class _HubCollector:
+    """从 hub.stats() 导出指标 (采集时计算, 投递路径无额外开销)"""
+
+    def __init__(self, hub: ConnectionHub):
+        self.hub = hub
+
+    def collect(self):
+        from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily
+
+        s = self.hub.stats()
+        yield GaugeMetricFamily("bhp_ws_connected_users", "Users with at least one WebSocket on this worker",
+                                value=s["connected_users"])
+        yield GaugeMetricFamily("bhp_ws_connections", "Open WebSocket connections on this worker",
+                                value=s["connections"])
+        yield GaugeMetricFamily("bhp_ws_queue_depth", "Messages waiting in per-connection send queues",
+                                value=s["queue_depth"])
+        yield GaugeMetricFamily("bhp_ws_max_queue_depth", "Deepest per-connection send queue",
+                                value=s["max_queue_depth"])
+        yield CounterMetricFamily("bhp_ws_messages_delivered", "WebSocket messages sent", value=s["delivered"])
+        yield CounterMetricFamily("bhp_ws_messages_coalesced", "WebSocket messages merged before send",
+                                  value=s["coalesced"])
+        yield CounterMetricFamily("bhp_ws_slow_consumers_dropped", "Connections closed for a full send queue",
+                                  value=s["dropped_slow_consumers"])
+
+
+ws_hub = ConnectionHub()
+
+try:
+    from prometheus_client import REGISTRY
+    REGISTRY.register(_HubCollector(ws_hub))
+except Exception:  # prometheus_client 未安装或重复注册
+    pass
@@ -12,11 +12,20 @@ V4.1 数据脱敏管道 — 跨层数据传输时的字段级脱敏
   Level 1 (部分脱敏): email, phone, ip_address → 教练可见掩码版
   Level 2 (聚合脱敏): 评估原始答题 → 教练只见统计摘要
   Level 3 (对话脱敏): 对话日志 → 教练可见但去除PII
+
+性能 (大批量学员数据):
+  - 字段策略按 (viewer_role, key) 解析一次并缓存, 不再逐键做小写 / 子串判断
+  - PII 正则预编译, 并合并为一条交替式做单遍预筛: 绝大多数文本无命中直接返回;
+    有命中的文本仍按 PII_PATTERNS 顺序逐条替换 (前面的替换会消耗后面模式可能命中的文本,
+    单遍替换无法保证与逐条替换逐字节一致)
+  - 可选 schema (Pydantic 响应模型): 预先算出安全字段, 其标量值直接拷贝
 """
 from __future__ import annotations
 import re
-from typing import Any, Dict, List, Optional
-from copy import deepcopy
+from dataclasses import dataclass, field
+from functools import lru_cache
+from types import UnionType
+from typing import Any, Dict, FrozenSet, List, Optional, Union, get_args, get_origin
 
 
 # ═══════════════════════════════════════════════════════════
@@ -58,6 +67,9 @@ PII_PATTERNS = [
     (r'(?:密码|口令|password)\s*[:=：]\s*\S+', '[密码已脱敏]'),   # 密码明文
 ]
 
+# 字段名含以下关键词时做 Level 3 PII 扫描
+TEXT_SCAN_KEYWORDS = ("message", "content", "text", "note", "log", "chat", "reply")
+
 
 # ═══════════════════════════════════════════════════════════
 # 掩码函数
@@ -113,6 +125,90 @@ MASK_FUNCS = {
 }
 
 
+# ═══════════════════════════════════════════════════════════
+# 脱敏计划 (预编译)
+# ═══════════════════════════════════════════════════════════
+
+# 字段策略
+POLICY_DROP = "drop"            # Level 0
+POLICY_AGGREGATE = "aggregate"  # Level 2
+POLICY_MASK = "mask"            # Level 1
+POLICY_PLAIN = "plain"
+
+_PII_COMPILED = [(re.compile(pattern), replacement) for pattern, replacement in PII_PATTERNS]
+_PII_ANY = re.compile("|".join(f"(?:{pattern})" for pattern, _ in PII_PATTERNS))
+
+# 原样输出的标量类型
+_SCALAR_TYPES = (str, int, float, bool, type(None))
+
+
+@dataclass(frozen=True)
+class FieldPolicy:
+    kind: str
+    mask_func: Optional[Any] = None
+    scan_text: bool = False     # 字符串值做 PII 扫描
+
+
+@lru_cache(maxsize=8192)
+def resolve_field_policy(viewer_role: str, key: str) -> FieldPolicy:
+    """(viewer_role, 字段名) → 字段策略, 每个组合只解析一次"""
+    key_lower = key.lower()
+    scan_text = any(kw in key_lower for kw in TEXT_SCAN_KEYWORDS)
+    if key_lower in BLACKLIST_FIELDS:
+        return FieldPolicy(POLICY_DROP, scan_text=scan_text)
+    if key_lower in AGGREGATE_FIELDS:
+        return FieldPolicy(POLICY_AGGREGATE, scan_text=scan_text)
+    if key_lower in MASK_FIELDS:
+        return FieldPolicy(POLICY_MASK, MASK_FUNCS[MASK_FIELDS[key_lower]], scan_text)
+    return FieldPolicy(POLICY_PLAIN, scan_text=scan_text)
+
+
+@dataclass(frozen=True)
+class SchemaPlan:
+    """
+    响应模型的脱敏计划
+
+    safe_keys: 策略为 PLAIN 且不做 PII 扫描的字段, 值为标量时原样拷贝;
+    nested: 嵌套模型 (或模型列表) 字段 → 子计划。
+    值的实际类型不符 (如安全字段里出现 dict) 时回退到通用路径, 输出不依赖数据是否符合模型。
+    """
+    safe_keys: FrozenSet[str]
+    nested: Dict[str, "SchemaPlan"] = field(default_factory=dict, compare=False, hash=False)
+
+
+@lru_cache(maxsize=256)
+def compile_schema_plan(schema: type, viewer_role: str = "coach") -> SchemaPlan:
+    """Pydantic 模型 → SchemaPlan (按字段名与别名)"""
+    return _build_schema_plan(schema, viewer_role, frozenset())
+
+
+def _build_schema_plan(schema: type, viewer_role: str, building: FrozenSet[type]) -> SchemaPlan:
+    building = building | {schema}
+    safe, nested = set(), {}
+    for name, info in schema.model_fields.items():
+        keys = {name} | ({info.alias} if info.alias else set())
+        model = _nested_model(info.annotation)
+        for key in keys:
+            if model is not None and model not in building:  # 递归模型只展开一层
+                nested[key] = _build_schema_plan(model, viewer_role, building)
+            policy = resolve_field_policy(viewer_role, key)
+            if policy.kind == POLICY_PLAIN and not policy.scan_text:
+                safe.add(key)
+    return SchemaPlan(frozenset(safe), nested)
+
+
+def _nested_model(annotation) -> Optional[type]:
+    """Model / Optional[Model] / List[Model] → Model"""
+    if isinstance(annotation, type) and hasattr(annotation, "model_fields"):
+        return annotation
+    if get_origin(annotation) in (Union, UnionType, list, tuple, set):
+        for arg in get_args(annotation):
+            model = _nested_model(arg)
+            if model is not None:
+                return model
+    return None
+
+
 # ═══════════════════════════════════════════════════════════
 # 核心脱敏器
 # ═══════════════════════════════════════════════════════════
@@ -125,11 +221,15 @@ class DataSanitizer:
         sanitizer = DataSanitizer(viewer_role="coach")
         safe_data = sanitizer.sanitize(raw_user_data)
         redacted_fields = sanitizer.get_redacted_fields()
+
+        # 已知响应模型时走 schema 快速路径 (输出相同)
+        sanitizer = DataSanitizer(viewer_role="coach", schema=StudentBundle)
     """
 
-    def __init__(self, viewer_role: str = "coach"):
+    def __init__(self, viewer_role: str = "coach", schema: Optional[type] = None):
         self.viewer_role = viewer_role
         self._redacted_fields: List[str] = []
+        self._plan = compile_schema_plan(schema, viewer_role) if schema is not None else None
 
     def sanitize(self, data: Any, field_name: str = "") -> Any:
         """递归脱敏数据结构"""
@@ -137,71 +237,92 @@ class DataSanitizer:
             return None
 
         if isinstance(data, dict):
-            return self._sanitize_dict(data)
+            return self._sanitize_dict(data, self._plan)
         elif isinstance(data, list):
-            return [self.sanitize(item) for item in data]
+            return self._sanitize_list(data, self._plan)
         elif isinstance(data, str) and field_name:
             return self._sanitize_field(field_name, data)
         return data
 
-    def _sanitize_dict(self, d: Dict[str, Any]) -> Dict[str, Any]:
+    def _sanitize_dict(self, d: Dict[str, Any], plan: Optional[SchemaPlan] = None) -> Dict[str, Any]:
         result = {}
+        role = self.viewer_role
+        safe_keys = plan.safe_keys if plan is not None else ()
         for key, value in d.items():
-            key_lower = key.lower()
+            # schema 快速路径: 已知安全字段的标量值原样拷贝
+            if key in safe_keys and type(value) in _SCALAR_TYPES:
+                result[key] = value
+                continue
+
+            policy = resolve_field_policy(role, key)
 
             # Level 0: 黑名单字段 → 删除
-            if key_lower in BLACKLIST_FIELDS:
+            if policy.kind == POLICY_DROP:
                 self._redacted_fields.append(key)
                 continue  # 完全不输出
 
             # Level 2: 聚合脱敏
-            if key_lower in AGGREGATE_FIELDS:
+            if policy.kind == POLICY_AGGREGATE:
                 self._redacted_fields.append(key)
                 result[key + "_summary"] = self._aggregate(value)
                 continue
 
             # Level 1: 掩码脱敏
-            if key_lower in MASK_FIELDS:
-                mask_func_name = MASK_FIELDS[key_lower]
-                mask_func = MASK_FUNCS[mask_func_name]
-                if isinstance(value, str):
-                    self._redacted_fields.append(key)
-                    result[key] = mask_func(value)
-                    continue
+            if policy.kind == POLICY_MASK and isinstance(value, str):
+                self._redacted_fields.append(key)
+                result[key] = policy.mask_func(value)
+                continue
 
             # 递归处理嵌套
             if isinstance(value, dict):
-                result[key] = self._sanitize_dict(value)
+                result[key] = self._sanitize_dict(value, plan.nested.get(key) if plan is not None else None)
             elif isinstance(value, list):
-                result[key] = [self.sanitize(item) for item in value]
+                result[key] = self._sanitize_list(value, plan.nested.get(key) if plan is not None else None)
             elif isinstance(value, str):
-                result[key] = self._sanitize_text(value, key)
-            elif isinstance(value, (int, float, bool)):
-                result[key] = value
+                result[key] = self._scan_pii(value, key) if policy.scan_text else value
             else:
                 result[key] = value
 
         return result
 
+    def _sanitize_list(self, items: List[Any], plan: Optional[SchemaPlan] = None) -> List[Any]:
+        # 列表元素没有字段名: 标量原样保留, 只有 dict / list 需要递归
+        if all(type(item) in _SCALAR_TYPES for item in items):
+            return list(items)
+        result = []
+        for item in items:
+            if isinstance(item, dict):
+                result.append(self._sanitize_dict(item, plan))
+            elif isinstance(item, list):
+                result.append(self._sanitize_list(item, plan))
+            else:
+                result.append(item)
+        return result
+
     def _sanitize_field(self, field_name: str, value: str) -> str:
         """对单个字段值脱敏"""
-        fl = field_name.lower()
-        if fl in BLACKLIST_FIELDS:
+        policy = resolve_field_policy(self.viewer_role, field_name)
+        if policy.kind == POLICY_DROP:
             return "[已脱敏]"
-        if fl in MASK_FIELDS:
-            func = MASK_FUNCS[MASK_FIELDS[fl]]
-            return func(value)
+        if policy.kind == POLICY_MASK:
+            return policy.mask_func(value)
         return self._sanitize_text(value, field_name)
 
     def _sanitize_text(self, text: str, field_name: str = "") -> str:
         """Level 3: 文本中的PII检测和替换"""
         # 对话日志类字段做PII扫描
-        if any(kw in field_name.lower() for kw in
-               ["message", "content", "text", "note", "log", "chat", "reply"]):
-            for pattern, replacement in PII_PATTERNS:
-                if re.search(pattern, text):
-                    self._redacted_fields.append(f"{field_name}:pii_redacted")
-                    text = re.sub(pattern, replacement, text)
+        if resolve_field_policy(self.viewer_role, field_name).scan_text:
+            return self._scan_pii(text, field_name)
+        return text
+
+    def _scan_pii(self, text: str, field_name: str) -> str:
+        # 合并交替式单遍预筛: 无任何模式命中时直接返回
+        if _PII_ANY.search(text) is None:
+            return text
+        for pattern, replacement in _PII_COMPILED:
+            text, n = pattern.subn(replacement, text)
+            if n:
+                self._redacted_fields.append(f"{field_name}:pii_redacted")
         return text
 
     def _aggregate(self, raw_data: Any) -> Dict[str, Any]:
@@ -233,16 +354,16 @@ class DataSanitizer:
 # 便捷函数
 # ═══════════════════════════════════════════════════════════
 
-def sanitize_for_coach(data: Dict[str, Any]) -> tuple[Dict[str, Any], List[str]]:
-    """教练视角脱敏 — 返回 (脱敏数据, 被脱敏字段列表)"""
-    s = DataSanitizer(viewer_role="coach")
+def sanitize_for_coach(data: Dict[str, Any], schema: Optional[type] = None) -> tuple[Dict[str, Any], List[str]]:
+    """教练视角脱敏 — 返回 (脱敏数据, 被脱敏字段列表); schema 为响应模型时走快速路径"""
+    s = DataSanitizer(viewer_role="coach", schema=schema)
     result = s.sanitize(data)
     return result, s.get_redacted_fields()
 
 
-def sanitize_for_supervisor(data: Dict[str, Any]) -> tuple[Dict[str, Any], List[str]]:
+def sanitize_for_supervisor(data: Dict[str, Any], schema: Optional[type] = None) -> tuple[Dict[str, Any], List[str]]:
     """督导视角脱敏 — 同教练（督导不应看到更多PII）"""
-    return sanitize_for_coach(data)
+    return sanitize_for_coach(data, schema)
 
 
 def sanitize_for_admin(data: Dict[str, Any]) -> tuple[Dict[str, Any], List[str]]:
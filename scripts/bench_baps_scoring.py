@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+"""
+BAPS 批量计分基准 — 逐人计分 vs CohortScorer
+=============================================
+
+模拟机构入组: N 份随机答卷 (固定 seed), 四份问卷各自对比
+  1. BAPSScoringEngine.score_xxx 逐人计分
+  2. CohortScorer.dimension_scores 仅分数矩阵 (答卷 -> 矩阵 -> 矩阵乘法)
+  3. CohortScorer.score 完整结果对象 (与逐人计分逐字段一致)
+
+用法:
+  python scripts/bench_baps_scoring.py --users 10000
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core.baps.cohort_scoring import CohortScorer
+from core.baps.scoring_engine import BAPSScoringEngine
+
+ITEM_RANGES = {
+    "big_five": (BAPSScoringEngine.BIG_FIVE_ITEMS, -4, 4),
+    "bpt6": (BAPSScoringEngine.BPT6_ITEMS, 1, 5),
+    "capacity": (BAPSScoringEngine.CAPACITY_ITEMS, 1, 5),
+    "spi": (BAPSScoringEngine.SPI_ITEMS, 1, 5),
+}
+
+
+def make_sheets(questionnaire: str, n: int, seed: int):
+    rng = random.Random(seed)
+    dims, lo, hi = ITEM_RANGES[questionnaire]
+    items = [item for group in dims.values() for item in group]
+    return [{item: rng.randint(lo, hi) for item in items} for _ in range(n)]
+
+
+def timed(fn):
+    t0 = time.perf_counter()
+    fn()
+    return time.perf_counter() - t0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=10000)
+    parser.add_argument("--seed", type=int, default=43)
+    args = parser.parse_args()
+
+    engine = BAPSScoringEngine()
+    scorer = CohortScorer(engine)
+    print(f"BAPS scoring benchmark: users={args.users} seed={args.seed}")
+    print(f"  {'questionnaire':<10} {'per-user':>10} {'matrix':>10} {'cohort':>10}   speedup (matrix / cohort)")
+    for name in CohortScorer.QUESTIONNAIRES:
+        sheets = make_sheets(name, args.users, args.seed)
+        per_user = getattr(engine, f"score_{name}")
+        base = timed(lambda: [per_user(s) for s in sheets])
+        matrix = timed(lambda: scorer.dimension_scores(name, sheets))
+        cohort = timed(lambda: scorer.score(name, sheets))
+        print(f"  {name:<10} {base * 1000:>8.1f}ms {matrix * 1000:>8.1f}ms {cohort * 1000:>8.1f}ms"
+              f"   x{base / matrix:.1f} / x{base / cohort:.1f}")
+
+
+if __name__ == "__main__":
+    main()
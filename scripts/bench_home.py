@@ -0,0 +1,167 @@
+#!/usr/bin/env python3
+"""
+/home 首页基准 — 顺序 vs 并发扇出 vs 快照缓存
+==============================================
+
+对比
+  1. cold 顺序: 单会话逐个执行数据块 (改造前的行为)
+  2. cold 扇出: 各数据块独立连接并发执行 (build_home)
+  3. warm:      快照缓存命中
+  4. concurrent: --users 个用户共 --requests 次并发请求 (顺序 / 扇出 / 扇出+快照)
+
+默认用模拟会话 (每条查询 sleep --latency-ms, 返回空结果, 连接池上限 --pool-size)
+隔离出查询编排本身的收益;
+加 --db 则连接 DATABASE_URL 对真实库压测 (需要 asyncpg, --user-ids 指定已有用户)。
+
+用法:
+  python scripts/bench_home.py --home admin --latency-ms 8
+  python scripts/bench_home.py --db --home coach --user-ids 3,4,5
+"""
+
+import argparse
+import asyncio
+import logging
+import os
+import random
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from api import home_api
+from core import database
+from core.home_snapshot_cache import HomeSnapshotCache
+
+
+class _EmptyResult:
+    def mappings(self):
+        return self
+
+    def first(self):
+        return None
+
+    def all(self):
+        return []
+
+    def scalar(self):
+        return 0
+
+
+class SimulatedSession:
+    """每条查询固定延迟的假会话; 连接数受 --pool-size 限制, 统计峰值并发连接数"""
+
+    latency = 0.005
+    pool: asyncio.Semaphore = None
+    active = 0
+    peak = 0
+
+    async def __aenter__(self):
+        cls = SimulatedSession
+        await cls.pool.acquire()
+        cls.active += 1
+        cls.peak = max(cls.peak, cls.active)
+        return self
+
+    async def __aexit__(self, *exc):
+        SimulatedSession.active -= 1
+        SimulatedSession.pool.release()
+        return False
+
+    async def execute(self, *args, **kwargs):
+        await asyncio.sleep(SimulatedSession.latency)
+        return _EmptyResult()
+
+    async def rollback(self):
+        pass
+
+
+def report(label, samples, wall=None):
+    samples = sorted(samples)
+    p50 = statistics.median(samples) * 1000
+    p95 = samples[int(len(samples) * 0.95) - 1] * 1000 if len(samples) > 1 else p50
+    line = f"  {label:<30} p50 {p50:>8.2f} ms   p95 {p95:>8.2f} ms"
+    if wall:
+        line += f"   {len(samples) / wall:>9.0f} req/s"
+    print(line)
+
+
+async def timed_call(coro_fn):
+    t0 = time.perf_counter()
+    await coro_fn()
+    return time.perf_counter() - t0
+
+
+async def bench(args):
+    home = args.home
+    user_ids = [int(u) for u in args.user_ids.split(",")] if args.user_ids else list(range(1, args.users + 1))
+    shared = home in home_api._SHARED_HOMES
+    rng = random.Random(args.seed)
+
+    async def sequential(uid):
+        async with database.AsyncSessionLocal() as session:
+            await home_api.build_home(home, uid, session)
+
+    async def fanout(uid):
+        await home_api.build_home(home, uid)
+
+    sections = len(home_api._HOME_SECTIONS[home])
+    print(f"home={home} sections={sections} users={len(user_ids)} requests={args.requests}")
+
+    samples = [await timed_call(lambda: sequential(rng.choice(user_ids))) for _ in range(args.rounds)]
+    report("cold 顺序 (单会话)", samples)
+    samples = [await timed_call(lambda: fanout(rng.choice(user_ids))) for _ in range(args.rounds)]
+    report("cold 扇出 (独立连接)", samples)
+
+    cache = HomeSnapshotCache(fresh_ttl=args.fresh_ttl, stale_ttl=args.stale_ttl)
+
+    def cached(uid):
+        key = (home, None if shared else uid)
+        return cache.get(key, lambda: home_api.build_home(home, uid))
+
+    await cached(user_ids[0])
+    samples = [await timed_call(lambda: cached(user_ids[0])) for _ in range(args.rounds)]
+    report("warm (快照命中)", samples)
+
+    runs = (("concurrent 顺序", sequential), ("concurrent 扇出", fanout), ("concurrent 扇出+快照", cached))
+    for label, handler in runs:
+        cache.clear()
+        SimulatedSession.peak = 0
+        picks = [rng.choice(user_ids) for _ in range(args.requests)]
+        t0 = time.perf_counter()
+        samples = await asyncio.gather(*(timed_call(lambda u=u: handler(u)) for u in picks))
+        wall = time.perf_counter() - t0
+        report(label, samples, wall)
+        if not args.db:
+            print(f"  {'':<30} 峰值并发连接 {SimulatedSession.peak}")
+    print(f"  cache stats: {cache.stats()}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--home", default="coach", choices=sorted(home_api._HOME_SECTIONS))
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--user-ids", default="", help="逗号分隔的真实用户ID (--db 时使用)")
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--rounds", type=int, default=50)
+    parser.add_argument("--latency-ms", type=float, default=5.0)
+    parser.add_argument("--pool-size", type=int, default=15, help="模拟连接池上限 (SQLAlchemy 默认 5+10)")
+    parser.add_argument("--fresh-ttl", type=float, default=15.0)
+    parser.add_argument("--stale-ttl", type=float, default=60.0)
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--db", action="store_true", help="使用 DATABASE_URL 的真实连接池")
+    args = parser.parse_args()
+
+    logging.getLogger("api.home_api").setLevel(logging.ERROR)
+    if args.db:
+        if database.AsyncSessionLocal is None:
+            sys.exit("异步引擎不可用 (asyncpg 未安装?)")
+    else:
+        SimulatedSession.latency = args.latency_ms / 1000
+        SimulatedSession.pool = asyncio.Semaphore(args.pool_size)
+        database.AsyncSessionLocal = SimulatedSession
+    asyncio.run(bench(args))
+
+
+if __name__ == "__main__":
+    main()
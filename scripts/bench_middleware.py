@@ -0,0 +1,163 @@
+#!/usr/bin/env python3
+"""
+中间件栈基准 — BaseHTTPMiddleware vs 纯 ASGI
+=============================================
+
+对同一个空端点 (GET /ping → {"ok": true}) 比较每请求开销:
+  1. bare:    无中间件
+  2. legacy:  原 BaseHTTPMiddleware 七层 (安全头/日志/限流/CSRF/旧版鉴权/HTTPS)
+  3. asgi:    ASGIMiddlewareStack 两个栈, 层相同
+  4. asgi+timing: 同上并开启按层耗时直方图
+
+直接调用 ASGI app (不经网络 / TestClient), 限流使用本地 GCRA (不连接 Redis),
+日志输出关闭, 只测中间件本身。--concurrency > 1 时用 asyncio.gather 并发驱动。
+
+用法:
+  python scripts/bench_middleware.py --requests 20000
+  python scripts/bench_middleware.py --concurrency 50
+"""
+
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+os.environ.setdefault("ENVIRONMENT", "production")
+
+from fastapi import FastAPI
+from loguru import logger
+
+import core.rate_limiter
+from core.asgi_middleware import (
+    ASGIMiddlewareStack, CSRFAuditLayer, HTTPSRedirectLayer, LegacyAuthLayer, production_layers,
+)
+from core.csrf_audit_middleware import CSRFAuditMiddleware
+from core.https_middleware import HTTPSRedirectMiddleware
+from core.legacy_auth_middleware import LegacyAuthMiddleware
+from core.middleware import RateLimitMiddleware, RequestLoggingMiddleware, SecurityHeadersMiddleware
+
+RPM = 10 ** 9
+
+
+def make_app():
+    app = FastAPI()
+
+    @app.get("/ping")
+    async def ping():
+        return {"ok": True}
+
+    return app
+
+
+def bare_app():
+    return make_app()
+
+
+def legacy_app():
+    app = make_app()
+    app.add_middleware(SecurityHeadersMiddleware)
+    app.add_middleware(RequestLoggingMiddleware)
+    app.add_middleware(RateLimitMiddleware, requests_per_minute=RPM)
+    app.add_middleware(CSRFAuditMiddleware)
+    app.add_middleware(LegacyAuthMiddleware)
+    app.add_middleware(HTTPSRedirectMiddleware)
+    return app
+
+
+def asgi_app(timing=False):
+    app = make_app()
+    app.add_middleware(ASGIMiddlewareStack, layers=production_layers(RPM), timing=timing)
+    app.add_middleware(
+        ASGIMiddlewareStack,
+        layers=[HTTPSRedirectLayer(), LegacyAuthLayer(), CSRFAuditLayer()],
+        timing=timing,
+    )
+    return app
+
+
+def _scope():
+    return {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": "GET",
+        "scheme": "https",
+        "path": "/ping",
+        "raw_path": b"/ping",
+        "root_path": "",
+        "query_string": b"",
+        "headers": [(b"host", b"bench"), (b"x-request-id", b"bench-01")],
+        "client": ("127.0.0.1", 50000),
+        "server": ("bench", 443),
+    }
+
+
+async def one_request(app):
+    sent = []
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        sent.append(message)
+
+    t0 = time.perf_counter()
+    await app(_scope(), receive, send)
+    elapsed = time.perf_counter() - t0
+    assert sent[0]["status"] == 200, sent[0]
+    return elapsed
+
+
+async def run(app, requests, concurrency):
+    for _ in range(min(200, requests)):  # 预热 (构建中间件栈 / 路由缓存)
+        await one_request(app)
+    samples = []
+    t0 = time.perf_counter()
+    for start in range(0, requests, concurrency):
+        batch = min(concurrency, requests - start)
+        samples += await asyncio.gather(*(one_request(app) for _ in range(batch)))
+    return samples, time.perf_counter() - t0
+
+
+def report(label, samples, wall, baseline=None):
+    samples = sorted(samples)
+    p50 = statistics.median(samples) * 1e6
+    p99 = samples[int(len(samples) * 0.99) - 1] * 1e6
+    line = f"  {label:<14} p50 {p50:>8.1f} µs   p99 {p99:>8.1f} µs   {len(samples) / wall:>9.0f} req/s"
+    if baseline is not None:
+        line += f"   开销 {p50 - baseline:>7.1f} µs/req"
+    print(line)
+    return p50
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=10000)
+    parser.add_argument("--concurrency", type=int, default=1)
+    args = parser.parse_args()
+
+    logger.remove()
+    core.rate_limiter._redis = False
+    core.rate_limiter._async_redis = False
+
+    print(f"requests={args.requests} concurrency={args.concurrency}")
+    cases = (
+        ("bare", bare_app()),
+        ("legacy", legacy_app()),
+        ("asgi", asgi_app()),
+        ("asgi+timing", asgi_app(timing=True)),
+    )
+    baseline = None
+    for label, app in cases:
+        samples, wall = asyncio.run(run(app, args.requests, args.concurrency))
+        p50 = report(label, samples, wall, baseline)
+        if baseline is None:
+            baseline = p50
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+"""
+BehaviorRxEngine 吞吐基准 — 逐个 vs 记忆化 vs 批量
+====================================================
+
+模拟夜间重新开方: N 个用户 (固定 seed), 阶段/能力/障碍随机, 其中 --assessed 比例的
+用户完成了 BigFive 测评 (随机人格), 其余使用默认人格剖面。对比
+  1. compute_rx 逐个计算, 关闭记忆化 (memo_size=0)
+  2. compute_rx 逐个计算, 开启记忆化
+  3. compute_rx_batch 一次计算
+
+用法:
+  python scripts/bench_rx_engine.py --users 20000 --agent metabolic_expert
+"""
+
+import argparse
+import logging
+import os
+import random
+import sys
+import time
+import uuid
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from behavior_rx.core.behavior_rx_engine import BehaviorRxEngine
+from behavior_rx.core.rx_schemas import BigFiveProfile, ExpertAgentType, RxContext
+
+BARRIERS = ["fear", "forgetfulness", "low_motivation", "cognitive", "economic", "relational"]
+
+
+def make_contexts(n: int, seed: int, assessed: float = 0.3):
+    rng = random.Random(seed)
+    contexts = []
+    for _ in range(n):
+        if rng.random() < assessed:
+            personality = BigFiveProfile(**{t: rng.randint(10, 90) for t in "OCEAN"})
+        else:
+            personality = BigFiveProfile()
+        contexts.append(RxContext(
+            user_id=uuid.UUID(int=rng.getrandbits(128)),
+            ttm_stage=rng.randint(0, 6),
+            stage_stability=round(rng.random(), 2),
+            personality=personality,
+            capacity_score=round(rng.random(), 2),
+            recent_adherence=round(rng.random(), 2),
+            active_barriers=rng.sample(BARRIERS, rng.randint(0, 2)),
+        ))
+    return contexts
+
+
+def timed(label, fn, n):
+    t0 = time.perf_counter()
+    fn()
+    elapsed = time.perf_counter() - t0
+    print(f"  {label:<28} {elapsed * 1000:>9.1f} ms   {n / elapsed:>10.0f} rx/s")
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=10000)
+    parser.add_argument("--agent", default=ExpertAgentType.BEHAVIOR_COACH.value,
+                        choices=[a.value for a in ExpertAgentType])
+    parser.add_argument("--assessed", type=float, default=0.3, help="完成 BigFive 测评的用户比例")
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    logging.disable(logging.INFO)   # 逐个计算时的 info 日志会主导耗时
+    agent = ExpertAgentType(args.agent)
+    contexts = make_contexts(args.users, args.seed, args.assessed)
+
+    plain = BehaviorRxEngine(memo_size=0)
+    memo = BehaviorRxEngine()
+    batch = BehaviorRxEngine(memo_size=0)
+
+    print(f"BehaviorRxEngine benchmark: users={args.users} agent={agent.value} seed={args.seed}")
+    base = timed("per-user (no memo)", lambda: [plain.compute_rx(c, agent) for c in contexts], args.users)
+    cached = timed("per-user (memo)", lambda: [memo.compute_rx(c, agent) for c in contexts], args.users)
+    batched = timed("compute_rx_batch", lambda: batch.compute_rx_batch(contexts, agent), args.users)
+
+    stats = memo.memo_stats()
+    print(f"  memo: size={stats['size']} hit_rate={stats['hit_rate']:.1%}")
+    print(f"  speedup: memo x{base / cached:.2f}, batch x{base / batched:.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,209 @@
+#!/usr/bin/env python3
+"""
+DataSanitizer 基准 — 原逐键 / 逐正则实现 vs 预编译脱敏计划
+============================================================
+
+构造约 --mb MB 的教练视图学员数据包 (固定 seed): 档案 PII、对话记录 (部分含手机号 /
+邮箱 / 身份证 / 密码明文)、原始答题、设备读数列表等, 对比
+  1. legacy       重构前的实现 (LegacySanitizer, 逐键小写 + 子串判断, 逐条正则 search + sub)
+  2. compiled     DataSanitizer (字段策略缓存 + 合并正则预筛)
+  3. schema       DataSanitizer(schema=StudentBundle) 响应模型快速路径
+三者输出按 json.dumps 逐字节比较, 被脱敏字段集合也须一致。
+
+用法:
+  python scripts/bench_sanitizer.py --mb 5
+"""
+
+import argparse
+import json
+import os
+import random
+import re
+import sys
+import time
+from typing import Any, Dict, List, Optional
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from pydantic import BaseModel
+
+from gateway.sanitizer import (
+    AGGREGATE_FIELDS, BLACKLIST_FIELDS, MASK_FIELDS, MASK_FUNCS, PII_PATTERNS, DataSanitizer,
+)
+
+
+class LegacySanitizer(DataSanitizer):
+    """重构前的 DataSanitizer (逐字保留, 作为基准与逐字节对照)"""
+
+    def sanitize(self, data: Any, field_name: str = "") -> Any:
+        if data is None:
+            return None
+        if isinstance(data, dict):
+            return self._sanitize_dict(data)
+        elif isinstance(data, list):
+            return [self.sanitize(item) for item in data]
+        elif isinstance(data, str) and field_name:
+            return self._sanitize_field(field_name, data)
+        return data
+
+    def _sanitize_dict(self, d: Dict[str, Any], plan=None) -> Dict[str, Any]:
+        result = {}
+        for key, value in d.items():
+            key_lower = key.lower()
+            if key_lower in BLACKLIST_FIELDS:
+                self._redacted_fields.append(key)
+                continue
+            if key_lower in AGGREGATE_FIELDS:
+                self._redacted_fields.append(key)
+                result[key + "_summary"] = self._aggregate(value)
+                continue
+            if key_lower in MASK_FIELDS:
+                mask_func = MASK_FUNCS[MASK_FIELDS[key_lower]]
+                if isinstance(value, str):
+                    self._redacted_fields.append(key)
+                    result[key] = mask_func(value)
+                    continue
+            if isinstance(value, dict):
+                result[key] = self._sanitize_dict(value)
+            elif isinstance(value, list):
+                result[key] = [self.sanitize(item) for item in value]
+            elif isinstance(value, str):
+                result[key] = self._sanitize_text(value, key)
+            else:
+                result[key] = value
+        return result
+
+    def _sanitize_field(self, field_name: str, value: str) -> str:
+        fl = field_name.lower()
+        if fl in BLACKLIST_FIELDS:
+            return "[已脱敏]"
+        if fl in MASK_FIELDS:
+            return MASK_FUNCS[MASK_FIELDS[fl]](value)
+        return self._sanitize_text(value, field_name)
+
+    def _sanitize_text(self, text: str, field_name: str = "") -> str:
+        if any(kw in field_name.lower() for kw in
+               ["message", "content", "text", "note", "log", "chat", "reply"]):
+            for pattern, replacement in PII_PATTERNS:
+                if re.search(pattern, text):
+                    self._redacted_fields.append(f"{field_name}:pii_redacted")
+                    text = re.sub(pattern, replacement, text)
+        return text
+
+
+# ── 响应模型 (schema 快速路径) ──
+
+class ChatMessage(BaseModel):
+    role: str
+    content: str
+    created_at: str
+
+
+class Reading(BaseModel):
+    ts: str
+    value: float
+    unit: str
+    source: str
+
+
+class StudentRecord(BaseModel):
+    id: int
+    username: str
+    email: Optional[str] = None
+    phone: Optional[str] = None
+    ip_address: Optional[str] = None
+    stage: str
+    risk_level: str
+    trust_score: float
+    tags: List[str] = []
+    chat_history: List[ChatMessage] = []
+    readings: List[Reading] = []
+    coach_notes: Optional[str] = None
+
+
+class StudentBundle(BaseModel):
+    coach_id: int
+    generated_at: str
+    students: List[StudentRecord]
+
+
+TEXTS = [
+    "今天走了八千步，感觉不错",
+    "晚饭后血糖有点高，明天注意",
+    "我的手机号是13912345678，麻烦回电",
+    "邮箱 li.si@example.com 可以收到周报",
+    "身份证110101199001011234已经上传",
+    "登录密码: abc123 别告诉别人",
+    "服务器 10.0.0.12 连不上",
+    "这周坚持每天冥想十分钟",
+    "手机13812345678@qq.com 也能联系",
+]
+
+
+def make_bundle(target_mb: float, seed: int = 42) -> Dict[str, Any]:
+    rng = random.Random(seed)
+    students, size, i = [], 0, 0
+    while size < target_mb * 1e6:
+        i += 1
+        student = {
+            "id": i,
+            "username": f"学员{i}",
+            "email": f"user{i}@example.com",
+            "phone": f"138{rng.randint(10_000_000, 99_999_999)}",
+            "ip_address": f"192.168.{rng.randint(0, 255)}.{rng.randint(1, 254)}",
+            "password_hash": "$2b$12$" + "x" * 40,
+            "token": "eyJhbGciOi" + "y" * 60,
+            "stage": rng.choice(["S0", "S1", "S2", "S3", "S4"]),
+            "risk_level": rng.choice(["low", "medium", "high"]),
+            "trust_score": round(rng.random(), 3),
+            "tags": [rng.choice(["控糖", "减重", "睡眠", "运动"]) for _ in range(3)],
+            "chat_history": [
+                {"role": rng.choice(["user", "assistant"]), "content": rng.choice(TEXTS),
+                 "created_at": f"2026-10-{rng.randint(1, 28):02d}T08:00:00"}
+                for _ in range(rng.randint(5, 15))
+            ],
+            "readings": [
+                {"ts": f"2026-10-{rng.randint(1, 28):02d}T{rng.randint(0, 23):02d}:00:00",
+                 "value": round(rng.uniform(3.5, 12.0), 1), "unit": "mmol/L", "source": "cgm"}
+                for _ in range(rng.randint(20, 60))
+            ],
+            "raw_assessment_answers": [{"q": q, "a": rng.randint(1, 5)} for q in range(20)],
+            "coach_notes": rng.choice(TEXTS),
+        }
+        students.append(student)
+        size += len(json.dumps(student, ensure_ascii=False).encode())
+    return {"coach_id": 7, "generated_at": "2026-10-19T00:00:00", "students": students}
+
+
+def run(make_sanitizer, bundle, rounds):
+    best, out = float("inf"), None
+    for _ in range(rounds):
+        s = make_sanitizer()
+        t0 = time.perf_counter()
+        result = s.sanitize(bundle)
+        best = min(best, time.perf_counter() - t0)
+        out = (json.dumps(result, ensure_ascii=False).encode(), sorted(s.get_redacted_fields()))
+    return best, out
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--mb", type=float, default=5.0)
+    parser.add_argument("--rounds", type=int, default=3)
+    args = parser.parse_args()
+
+    bundle = make_bundle(args.mb)
+    raw = len(json.dumps(bundle, ensure_ascii=False).encode())
+    print(f"bundle: {len(bundle['students'])} students, {raw / 1e6:.1f} MB")
+
+    legacy_t, legacy = run(lambda: LegacySanitizer("coach"), bundle, args.rounds)
+    print(f"  legacy    {legacy_t * 1000:8.1f} ms")
+    for name, factory in [("compiled", lambda: DataSanitizer("coach")),
+                          ("schema", lambda: DataSanitizer("coach", schema=StudentBundle))]:
+        t, out = run(factory, bundle, args.rounds)
+        same = "identical" if out == legacy else "MISMATCH"
+        print(f"  {name:<9} {t * 1000:8.1f} ms  x{legacy_t / t:4.1f}  {same}")
+
+
+if __name__ == "__main__":
+    main()
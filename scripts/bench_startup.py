@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+"""
+Worker 启动基准 — time-to-ready 与常驻内存
+==========================================
+
+两种模式 (每种场景各跑 --runs 次取中位数):
+  import: 子进程 `import api.main`, 记录墙钟耗时与子进程峰值 RSS (ru_maxrss)
+  serve:  子进程 `uvicorn api.main:app` (单 worker), 轮询 GET /health 直到 200,
+          记录从拉起进程到就绪的耗时 (含 lifespan 启动) 与就绪时的 RSS
+
+场景由 --scenario 指定, 格式 "名称=禁用功能组" (逗号分隔, 参见 api/router_manifest.py),
+默认对比全量加载与只保留 core 组。不依赖 CI, 本机直接运行。
+
+用法:
+  python scripts/bench_startup.py
+  python scripts/bench_startup.py --mode serve --runs 3
+  python scripts/bench_startup.py --scenario full= --scenario lean=vision,xzb,exam,survey
+"""
+
+import argparse
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import time
+import urllib.request
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+
+def _rss_mb(pid: int) -> float:
+    """/proc/<pid>/status 中的 VmRSS (Linux); 不可用时返回 0"""
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return 0.0
+
+
+def _env(disabled: str):
+    env = {**os.environ, "ROUTER_GROUPS_DISABLED": disabled}
+    env.pop("ROUTER_GROUPS_ENABLED", None)
+    return env
+
+
+def run_import(disabled: str):
+    code = (
+        "import resource, api.main\n"
+        "print('__RSS__', resource.getrusage(resource.RUSAGE_SELF).ru_maxrss)\n"
+    )
+    t0 = time.perf_counter()
+    proc = subprocess.run([sys.executable, "-c", code], cwd=ROOT, env=_env(disabled),
+                          capture_output=True, text=True)
+    elapsed = time.perf_counter() - t0
+    if proc.returncode != 0:
+        raise RuntimeError(proc.stderr[-2000:])
+    peak_kb = next(int(line.split()[1]) for line in proc.stdout.splitlines() if line.startswith("__RSS__"))
+    return elapsed, peak_kb / 1024
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def run_serve(disabled: str, timeout: float = 120.0):
+    port = _free_port()
+    cmd = [sys.executable, "-m", "uvicorn", "api.main:app", "--host", "127.0.0.1", "--port", str(port),
+           "--workers", "1", "--log-level", "warning"]
+    t0 = time.perf_counter()
+    proc = subprocess.Popen(cmd, cwd=ROOT, env=_env(disabled),
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        url = f"http://127.0.0.1:{port}/health"
+        while time.perf_counter() - t0 < timeout:
+            if proc.poll() is not None:
+                raise RuntimeError(f"uvicorn 提前退出 (code={proc.returncode})")
+            try:
+                with urllib.request.urlopen(url, timeout=1) as resp:
+                    if resp.status == 200:
+                        return time.perf_counter() - t0, _rss_mb(proc.pid)
+            except OSError:
+                time.sleep(0.05)
+        raise RuntimeError(f"{timeout:.0f}s 内未就绪")
+    finally:
+        proc.terminate()
+        try:
+            proc.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+
+
+def main():
+    from api.router_manifest import CORE_GROUP, ROUTER_GROUPS
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--mode", choices=("import", "serve"), default="import")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--scenario", action="append", default=[],
+                        help='"名称=禁用的功能组" (可重复), 默认 full 与 core-only')
+    args = parser.parse_args()
+
+    scenarios = [s.partition("=")[::2] for s in args.scenario] or [
+        ("full", ""),
+        ("core-only", ",".join(sorted(ROUTER_GROUPS - {CORE_GROUP}))),
+    ]
+    runner = run_import if args.mode == "import" else run_serve
+    runner(scenarios[0][1])  # 预热: 生成 .pyc, 避免首轮计入编译耗时
+
+    print(f"mode={args.mode} runs={args.runs}  功能组: {', '.join(sorted(ROUTER_GROUPS))}")
+    for name, disabled in scenarios:
+        samples = [runner(disabled) for _ in range(args.runs)]
+        secs = [s for s, _ in samples]
+        rss = [m for _, m in samples]
+        print(
+            f"  {name:<12} ready p50 {statistics.median(secs) * 1000:>7.0f} ms  "
+            f"min {min(secs) * 1000:>7.0f} ms   RSS {statistics.median(rss):>7.1f} MB"
+            + (f"   (禁用: {disabled})" if disabled else "")
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,46 @@
+#!/usr/bin/env python3
+"""
+手动运行信任预警 / 教练自动升级任务 (默认 dry-run)
+====================================================
+
+dry-run 执行与正式运行相同的 SELECT (不写库), 逐行输出将要写入的通知 / 教练队列记录,
+用于上线前与旧逻辑核对; --apply 时正式写入并推送。
+
+用法:
+  python scripts/run_engagement_jobs.py --job trust
+  python scripts/run_engagement_jobs.py --job escalation --apply
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core.engagement_jobs import run_coach_auto_escalation, run_trust_engagement_monitor
+
+JOBS = {
+    "trust": run_trust_engagement_monitor,
+    "escalation": run_coach_auto_escalation,
+}
+
+
+async def main(job: str, apply: bool):
+    from core.database import AsyncSessionLocal
+
+    async with AsyncSessionLocal() as db:
+        report = await JOBS[job](db, dry_run=not apply)
+    for kind, rows in report.rows.items():
+        for row in rows:
+            print(json.dumps({"kind": kind, **row}, ensure_ascii=False, default=str))
+    print(json.dumps(report.summary(), ensure_ascii=False), file=sys.stderr)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--job", choices=sorted(JOBS), required=True)
+    parser.add_argument("--apply", action="store_true", help="正式写入 (默认仅 dry-run)")
+    args = parser.parse_args()
+    asyncio.run(main(args.job, args.apply))
@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+"""
+StateSyncManager 浸泡测试 — 百万事件下进程内存应保持平稳
+============================================================
+
+持续调用 process_event (每 4 条一条待审核, 用户 ID 不断变化), 每 --every 条打印一次
+tracemalloc 当前占用与 RSS。默认纯内存模式 (有界 LRU); --db-url 指向 SQLite/PostgreSQL
+时同时测试写后批量落库, 结束后核对行数。
+
+用法:
+  python scripts/soak_state_sync.py --events 1000000
+  python scripts/soak_state_sync.py --events 200000 --db-url sqlite:////tmp/state_sync.db
+"""
+
+import argparse
+import gc
+import os
+import resource
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from loguru import logger
+
+from services.state_sync.manager import EventType, StateSyncManager, UserStateSyncTable
+from services.state_sync.store import StateSyncStore
+
+
+def rss_mb() -> float:
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--events", type=int, default=1_000_000)
+    parser.add_argument("--capacity", type=int, default=10_000)
+    parser.add_argument("--every", type=int, default=100_000)
+    parser.add_argument("--db-url", default=None)
+    args = parser.parse_args()
+
+    logger.remove()
+    logger.add(sys.stderr, level="WARNING")
+
+    factory = None
+    if args.db_url:
+        from sqlalchemy import create_engine, text
+        from sqlalchemy.orm import sessionmaker
+        engine = create_engine(args.db_url)
+        UserStateSyncTable.__table__.drop(engine, checkfirst=True)
+        UserStateSyncTable.__table__.create(engine)
+        factory = sessionmaker(bind=engine)
+
+    store = StateSyncStore(session_factory=factory, capacity=args.capacity, batch_size=500)
+    manager = StateSyncManager(store=store)
+    tracemalloc.start()
+    t0 = time.perf_counter()
+    print(f"events={args.events} capacity={args.capacity} db={args.db_url or 'memory'}")
+    for i in range(1, args.events + 1):
+        if i % 4 == 0:
+            manager.process_event(i % 50_000, EventType.TEXT_INPUT, {"text": "停不下来吃零食"})
+        else:
+            manager.process_event(i % 50_000, EventType.TASK_COMPLETE, {"task_id": f"T-{i}"})
+        if i % args.every == 0:
+            gc.collect()
+            current, peak = tracemalloc.get_traced_memory()
+            print(f"  {i:>9}  traced {current / 1e6:7.1f} MB  peak {peak / 1e6:7.1f} MB  "
+                  f"max RSS {rss_mb():7.1f} MB  backlog {len(store._unflushed):>6}  "
+                  f"{i / (time.perf_counter() - t0):>8.0f} ev/s")
+    store.shutdown()
+    print(f"  stats {store.stats}")
+    if factory is not None:
+        db = factory()
+        print(f"  rows {db.execute(text('SELECT COUNT(*) FROM user_state_sync')).scalar()}")
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -19,13 +19,16 @@ from typing import Dict, Any, List, Optional, Literal
 from dataclasses import dataclass, field
 from datetime import datetime
 from enum import Enum
+import atexit
+import os
 import uuid
 import json
 from loguru import logger
 
 # 尝试导入数据库模块
 try:
-    from sqlalchemy import Column, String, Integer, DateTime, Text, JSON, Enum as SQLEnum
+    from sqlalchemy import Column, String, Integer, Boolean, DateTime, Text, JSON, Index, Enum as SQLEnum
+    from sqlalchemy import text as sa_text
     from sqlalchemy.ext.declarative import declarative_base
     SQLALCHEMY_AVAILABLE = True
 except ImportError:
@@ -290,13 +293,15 @@ class StateSyncManager:
     
     核心职责：
     1. 将原始事件数据转换为不同角色的视图
-    2. 管理视图的存储和检索
+    2. 管理视图的存储和检索 (StateSyncStore: 有界 LRU + 写后批量落库 user_state_sync)
     3. 支持分角色数据分发
     """
     
-    def __init__(self):
-        self._records: Dict[str, StateSyncRecord] = {}  # event_id -> record
-        self._user_events: Dict[int, List[str]] = {}    # user_id -> [event_ids]
+    def __init__(self, store=None):
+        from services.state_sync.store import StateSyncStore
+
+        # 未指定 store 时为纯内存模式 (有界 LRU); 全局单例使用落库的 store
+        self._store = store if store is not None else StateSyncStore()
         logger.info("[StateSync] 状态同步管理器初始化")
     
     def process_event(
@@ -350,10 +355,7 @@ class StateSyncManager:
         )
         
         # 存储
-        self._records[event_id] = record
-        if user_id not in self._user_events:
-            self._user_events[user_id] = []
-        self._user_events[user_id].append(event_id)
+        self._store.put(record)
         
         logger.info(f"[StateSync] 事件处理完成: event={event_id} user={user_id} type={event_type.value}")
         
@@ -500,10 +502,13 @@ class StateSyncManager:
         Returns:
             对应角色的视图数据
         """
-        record = self._records.get(event_id)
+        record = self._store.get(event_id)
         if not record:
             return None
-        
+        return self._view_of(record, role)
+
+    @staticmethod
+    def _view_of(record: StateSyncRecord, role: ViewRole) -> Optional[Dict]:
         if role == ViewRole.PATIENT:
             return record.client_view.to_dict()
         elif role == ViewRole.COACH:
@@ -521,27 +526,30 @@ class StateSyncManager:
         role: ViewRole,
         limit: int = 10
     ) -> List[Dict]:
-        """获取用户的事件列表"""
-        event_ids = self._user_events.get(user_id, [])
-        
+        """获取用户最近 limit 条事件 (时间升序)"""
         results = []
-        for event_id in event_ids[-limit:]:
-            view = self.get_view(event_id, role)
+        for record in self._store.user_events(user_id, limit):
+            view = self._view_of(record, role)
             if view:
                 results.append({
-                    "event_id": event_id,
+                    "event_id": record.event_id,
                     "view": view
                 })
         
         return results
     
-    def get_pending_reviews(self) -> List[Dict]:
-        """获取待审核事件"""
-        pending = []
-        for record in self._records.values():
-            if record.expert_view and record.expert_view.requires_review:
-                pending.append(record.to_dict())
-        return pending
+    def get_pending_reviews(self, limit: int = 100) -> List[Dict]:
+        """获取最近 limit 条待审核事件 (时间升序)"""
+        return [record.to_dict() for record in self._store.pending_reviews(limit)]
+
+    def get_stats(self) -> Dict[str, Any]:
+        """记录总数 / 待审核数 / 存储计数"""
+        return {
+            "total_records": self._store.count(),
+            "pending_reviews": self._store.pending_count(),
+            "persistent": self._store.persistent,
+            "store": dict(self._store.stats),
+        }
 
 
 # ============================================
@@ -572,9 +580,17 @@ if SQLALCHEMY_AVAILABLE:
         
         # 状态
         processed = Column(Integer, default=1)
+        requires_review = Column(Boolean, nullable=False, default=False)  # 冗余自 expert_view, 供部分索引
         created_at = Column(DateTime, default=datetime.now)
         updated_at = Column(DateTime, default=datetime.now, onupdate=datetime.now)
 
+        __table_args__ = (
+            Index('idx_user_state_sync_user_ts', 'user_id', 'timestamp'),
+            Index('idx_user_state_sync_pending', 'timestamp',
+                  postgresql_where=sa_text('requires_review'),
+                  sqlite_where=sa_text('requires_review = 1')),
+        )
+
 
 # ============================================
 # 创建表的 SQL（备用）
@@ -599,6 +615,7 @@ CREATE TABLE IF NOT EXISTS user_state_sync (
     
     -- 状态
     processed INTEGER DEFAULT 1,
+    requires_review BOOLEAN NOT NULL DEFAULT FALSE,
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
     updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
 );
@@ -607,6 +624,8 @@ CREATE TABLE IF NOT EXISTS user_state_sync (
 CREATE INDEX IF NOT EXISTS idx_user_state_sync_user_id ON user_state_sync(user_id);
 CREATE INDEX IF NOT EXISTS idx_user_state_sync_event_type ON user_state_sync(event_type);
 CREATE INDEX IF NOT EXISTS idx_user_state_sync_timestamp ON user_state_sync(timestamp);
+CREATE INDEX IF NOT EXISTS idx_user_state_sync_user_ts ON user_state_sync(user_id, timestamp);
+CREATE INDEX IF NOT EXISTS idx_user_state_sync_pending ON user_state_sync(timestamp) WHERE requires_review;
 """
 
 
@@ -618,8 +637,24 @@ _state_sync_manager: Optional[StateSyncManager] = None
 
 
 def get_state_sync_manager() -> StateSyncManager:
-    """获取状态同步管理器"""
+    """获取状态同步管理器 (以 user_state_sync 为记录源; STATE_SYNC_PERSIST=0 时仅内存)"""
     global _state_sync_manager
     if _state_sync_manager is None:
-        _state_sync_manager = StateSyncManager()
+        from services.state_sync.store import StateSyncStore
+
+        session_factory = None
+        if SQLALCHEMY_AVAILABLE and os.getenv("STATE_SYNC_PERSIST", "1") != "0":
+            try:
+                from core.database import SessionLocal
+                session_factory = SessionLocal
+            except Exception as e:
+                logger.warning(f"[StateSync] 数据库不可用, 使用内存存储: {e}")
+        store = StateSyncStore(
+            session_factory=session_factory,
+            capacity=int(os.getenv("STATE_SYNC_CACHE_SIZE", "10000")),
+            batch_size=int(os.getenv("STATE_SYNC_BATCH", "200")),
+            flush_interval_ms=int(os.getenv("STATE_SYNC_FLUSH_MS", "500")),
+        )
+        atexit.register(store.shutdown)
+        _state_sync_manager = StateSyncManager(store=store)
     return _state_sync_manager
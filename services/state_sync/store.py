@@ -0,0 +1,321 @@
+"""
+状态同步存储
+State Sync Store
+
+user_state_sync 表为记录源, 进程内只保留:
+- 有界 LRU (最近事件, 含按用户 / 待审核的进程内索引, 随淘汰一并移除)
+- 写后队列 (write-behind): 满 batch_size 条或每 flush_interval_ms 由后台线程批量 INSERT,
+  积压超过 max_backlog 时丢弃最旧记录并计数
+
+查询走索引:
+- get_user_events: (user_id, timestamp) 组合索引, 合并尚未落库的记录
+- get_pending_reviews: requires_review 部分索引
+
+未配置 session_factory (或读库失败) 时退化为纯内存模式, 内存占用同样受 capacity 约束。
+"""
+import threading
+from collections import OrderedDict
+from datetime import datetime
+from typing import Callable, Dict, List, Optional
+
+from loguru import logger
+
+from services.state_sync.manager import (
+    ClientView,
+    CoachView,
+    EventType,
+    ExpertView,
+    StateSyncRecord,
+    UiStyle,
+)
+
+
+def record_to_row(record: StateSyncRecord) -> Dict:
+    """记录 -> user_state_sync 行"""
+    return {
+        "event_id": record.event_id,
+        "user_id": record.user_id,
+        "event_type": record.event_type.value,
+        "timestamp": record.timestamp,
+        "client_view": record.client_view.to_dict(),
+        "coach_view": record.coach_view.to_dict(),
+        "expert_view": record.expert_view.to_dict() if record.expert_view else None,
+        "trigger_id": record.trigger_id,
+        "action_id": record.action_id,
+        "processed": 1 if record.processed else 0,
+        "requires_review": _requires_review(record),
+    }
+
+
+def row_to_record(row) -> StateSyncRecord:
+    """user_state_sync 行 -> 记录"""
+    client = dict(row.client_view)
+    client["ui_style"] = UiStyle(client.get("ui_style", UiStyle.WARM.value))
+    return StateSyncRecord(
+        event_id=row.event_id,
+        user_id=row.user_id,
+        event_type=EventType(row.event_type),
+        timestamp=row.timestamp,
+        client_view=ClientView(**client),
+        coach_view=CoachView(**row.coach_view),
+        expert_view=ExpertView(**row.expert_view) if row.expert_view else None,
+        trigger_id=row.trigger_id,
+        action_id=row.action_id,
+        processed=bool(row.processed),
+    )
+
+
+def _requires_review(record: StateSyncRecord) -> bool:
+    return bool(record.expert_view and record.expert_view.requires_review)
+
+
+class StateSyncStore:
+    """StateSyncManager 的存储层 (有界 LRU + 写后批量落库)"""
+
+    def __init__(
+        self,
+        session_factory: Optional[Callable] = None,
+        capacity: int = 10000,
+        batch_size: int = 200,
+        flush_interval_ms: int = 500,
+        max_backlog: int = 50000,
+    ):
+        self._session_factory = session_factory
+        self.capacity = capacity
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval_ms / 1000.0
+        self.max_backlog = max_backlog
+
+        self._lru: "OrderedDict[str, StateSyncRecord]" = OrderedDict()
+        self._by_user: Dict[int, "OrderedDict[str, None]"] = {}
+        self._pending_ids: "OrderedDict[str, None]" = OrderedDict()
+        self._unflushed: "OrderedDict[str, StateSyncRecord]" = OrderedDict()
+        self._inflight: List[StateSyncRecord] = []
+
+        self._cond = threading.Condition()
+        self._thread: Optional[threading.Thread] = None
+        self._stopped = False
+        self.stats = {"written": 0, "flushed": 0, "dropped": 0, "flush_errors": 0, "evicted": 0}
+
+    @property
+    def persistent(self) -> bool:
+        return self._session_factory is not None
+
+    # ── 写入 ──
+
+    def put(self, record: StateSyncRecord):
+        """写入 LRU, 持久化模式下进入写后队列"""
+        with self._cond:
+            self._cache(record)
+            self.stats["written"] += 1
+            if self.persistent:
+                self._unflushed[record.event_id] = record
+                while len(self._unflushed) > self.max_backlog:
+                    self._unflushed.popitem(last=False)
+                    self.stats["dropped"] += 1
+                if len(self._unflushed) >= self.batch_size:
+                    self._cond.notify()
+        if self.persistent:
+            self._ensure_started()
+
+    def _cache(self, record: StateSyncRecord):
+        """放入 LRU 并维护进程内索引 (调用方持锁)"""
+        event_id = record.event_id
+        if event_id in self._lru:
+            self._lru.move_to_end(event_id)
+            return
+        self._lru[event_id] = record
+        self._by_user.setdefault(record.user_id, OrderedDict())[event_id] = None
+        if _requires_review(record):
+            self._pending_ids[event_id] = None
+        while len(self._lru) > self.capacity:
+            old_id, old = self._lru.popitem(last=False)
+            user_ids = self._by_user.get(old.user_id)
+            if user_ids is not None:
+                user_ids.pop(old_id, None)
+                if not user_ids:
+                    del self._by_user[old.user_id]
+            self._pending_ids.pop(old_id, None)
+            self.stats["evicted"] += 1
+
+    # ── 读取 ──
+
+    def get(self, event_id: str) -> Optional[StateSyncRecord]:
+        with self._cond:
+            record = self._lru.get(event_id)
+            if record is not None:
+                self._lru.move_to_end(event_id)
+                return record
+            record = self._unflushed.get(event_id) or next(
+                (r for r in self._inflight if r.event_id == event_id), None)
+            if record is not None or not self.persistent:
+                return record
+
+        rows = self._query(lambda db, t: db.query(t).filter(t.event_id == event_id).limit(1).all())
+        if not rows:
+            return None
+        record = row_to_record(rows[0])
+        with self._cond:
+            self._cache(record)
+        return record
+
+    def user_events(self, user_id: int, limit: int = 10) -> List[StateSyncRecord]:
+        """用户最近 limit 条事件, 时间升序"""
+        unflushed = self._unflushed_matching(lambda r: r.user_id == user_id)
+        rows = self._query(lambda db, t: db.query(t)
+                           .filter(t.user_id == user_id)
+                           .order_by(t.timestamp.desc(), t.id.desc())
+                           .limit(limit).all())
+        if rows is None:
+            with self._cond:
+                ids = list(self._by_user.get(user_id, ()))[-limit:]
+                return [self._lru[i] for i in ids]
+        return self._merge(rows, unflushed, limit)
+
+    def pending_reviews(self, limit: int = 100) -> List[StateSyncRecord]:
+        """最近 limit 条待审核事件, 时间升序"""
+        unflushed = self._unflushed_matching(_requires_review)
+        rows = self._query(lambda db, t: db.query(t)
+                           .filter(t.requires_review)
+                           .order_by(t.timestamp.desc(), t.id.desc())
+                           .limit(limit).all())
+        if rows is None:
+            with self._cond:
+                return [self._lru[i] for i in list(self._pending_ids)[-limit:]]
+        return self._merge(rows, unflushed, limit)
+
+    def count(self) -> int:
+        total = self._query(lambda db, t: db.query(t.id).count())
+        with self._cond:
+            if total is None:
+                return len(self._lru)
+            return total + len(self._unflushed) + len(self._inflight)
+
+    def pending_count(self) -> int:
+        total = self._query(lambda db, t: db.query(t.id).filter(t.requires_review).count())
+        with self._cond:
+            if total is None:
+                return len(self._pending_ids)
+            unflushed = list(self._unflushed.values()) + self._inflight
+            return total + sum(1 for r in unflushed if _requires_review(r))
+
+    def _query(self, fn):
+        """执行只读查询; 非持久化模式或读库失败返回 None (调用方回退到内存)"""
+        if not self.persistent:
+            return None
+        from services.state_sync.manager import UserStateSyncTable
+
+        db = None
+        try:
+            db = self._session_factory()
+            return fn(db, UserStateSyncTable)
+        except Exception as e:
+            logger.warning(f"[StateSync] 读取 user_state_sync 失败, 使用内存数据: {e}")
+            return None
+        finally:
+            if db is not None:
+                db.close()
+
+    def _unflushed_matching(self, predicate) -> List[StateSyncRecord]:
+        """尚未落库 (写后队列 + 写入中) 的记录快照
+
+        须在查库之前获取: 查询期间落库的批次要么已在快照中, 要么已被查询看到, 不会两头都漏掉。
+        """
+        with self._cond:
+            return [r for r in list(self._unflushed.values()) + self._inflight if predicate(r)]
+
+    @staticmethod
+    def _merge(rows, unflushed: List[StateSyncRecord], limit: int) -> List[StateSyncRecord]:
+        """库内结果 + 尚未落库的记录快照, 按时间取最新 limit 条"""
+        merged = {r.event_id: r for r in unflushed}
+        for row in rows:
+            if row.event_id not in merged:
+                merged[row.event_id] = row_to_record(row)
+        records = sorted(merged.values(), key=lambda r: r.timestamp)
+        return records[-limit:] if limit else []
+
+    # ── 落库 ──
+
+    def _ensure_started(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._cond:
+            if self._stopped or (self._thread is not None and self._thread.is_alive()):
+                return
+            self._thread = threading.Thread(target=self._run, name="state-sync-writer", daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                if len(self._unflushed) < self.batch_size and not self._stopped:
+                    self._cond.wait(self.flush_interval)
+                if self._stopped and not self._unflushed:
+                    return
+            errors = self.stats["flush_errors"]
+            self.flush()
+            if self.stats["flush_errors"] > errors:
+                # 写库失败: 退避一个周期再重试; 停止时剩余记录交给 shutdown() 最后一次 flush
+                with self._cond:
+                    if self._stopped:
+                        return
+                    self._cond.wait(self.flush_interval)
+
+    def flush(self) -> int:
+        """把写后队列全部批量写入, 返回写入条数"""
+        if not self.persistent:
+            return 0
+        written = 0
+        while True:
+            with self._cond:
+                if not self._unflushed:
+                    return written
+                n = min(self.batch_size, len(self._unflushed))
+                batch = [self._unflushed.popitem(last=False)[1] for _ in range(n)]
+                self._inflight = batch
+            try:
+                self._bulk_insert(batch)
+                written += len(batch)
+                with self._cond:
+                    self.stats["flushed"] += len(batch)
+            except Exception as e:
+                with self._cond:
+                    self.stats["flush_errors"] += 1
+                    # 放回队首等待下次重试, 超出积压上限的部分丢弃
+                    room = max(self.max_backlog - len(self._unflushed), 0)
+                    keep = batch[:room]
+                    rest = list(self._unflushed.items())
+                    self._unflushed.clear()
+                    self._unflushed.update((r.event_id, r) for r in keep)
+                    self._unflushed.update(rest)
+                    self.stats["dropped"] += len(batch) - len(keep)
+                logger.error(f"[StateSync] 批量写入 user_state_sync 失败 ({len(batch)} 条, 将重试): {e}")
+                return written
+            finally:
+                with self._cond:
+                    self._inflight = []
+
+    def _bulk_insert(self, records: List[StateSyncRecord]):
+        from sqlalchemy import insert
+        from services.state_sync.manager import UserStateSyncTable
+
+        now = datetime.now()
+        rows = [{**record_to_row(r), "created_at": now, "updated_at": now} for r in records]
+        db = self._session_factory()
+        try:
+            db.execute(insert(UserStateSyncTable), rows)
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+    def shutdown(self, timeout: float = 5.0):
+        """停止后台线程并刷出剩余记录"""
+        with self._cond:
+            self._stopped = True
+            self._cond.notify_all()
+        if self._thread is not None:
+            self._thread.join(timeout)
+        self.flush()
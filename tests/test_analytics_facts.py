@@ -0,0 +1,233 @@
+"""
+Unit tests for core/analytics_facts.py — incremental analytics fact table
+
+Tests cover one grouped query per source table scanning only the range from
+each source's watermark, clear-then-upsert of the touched day partitions and
+monotonic watermark writes, snapshot columns spread across refreshed days,
+the daily rollup (retention against day-7, conversion, per-DAU averages,
+tenant filter), and (with TEST_DATABASE_URL pointing at PostgreSQL) the
+materialized numbers matching the previous per-metric live queries.
+"""
+import asyncio
+import os
+import sys
+from datetime import date, datetime, timedelta
+
+import pytest
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+
+from core.analytics_facts import SOURCE_NAMES, SOURCES, daily_series, refresh_facts, rollup, verify_days
+
+UNTIL = datetime(2026, 10, 19)
+
+
+class _Result:
+    def __init__(self, rows):
+        self._rows = rows
+
+    def scalar(self):
+        return self._rows
+
+    def mappings(self):
+        return self
+
+    def all(self):
+        return self._rows
+
+
+class RecordingSession:
+    """按来源表返回预置分组行, 记录执行的语句与参数"""
+
+    def __init__(self, watermarks=None, source_rows=None, facts=None):
+        self.watermarks = watermarks or {}
+        self.source_rows = source_rows or {}
+        self.facts = facts or []
+        self.log = []
+
+    async def execute(self, stmt, params=None):
+        sql = str(stmt)
+        self.log.append((sql, params))
+        if "FROM analytics_watermarks" in sql:
+            return _Result([{"source": k, "watermark": v} for k, v in self.watermarks.items()])
+        if "FROM analytics_daily_facts" in sql:
+            return _Result(self.facts)
+        for source in SOURCES:
+            if sql == source.sql:
+                return _Result(self.source_rows.get(source.name, []))
+        return _Result([])
+
+    async def commit(self):
+        self.log.append(("commit", None))
+
+    def statements(self, prefix):
+        return [(s, p) for s, p in self.log if s.lstrip().startswith(prefix)]
+
+
+def test_refresh_scans_from_watermark_with_one_query_per_source():
+    db = RecordingSession(
+        watermarks={"user_activity_logs": datetime(2026, 10, 17, 14, 30)},
+        source_rows={"assessments": [
+            {"day": date(2026, 10, 18), "tenant_id": "t1", "role": "GROWER",
+             "assessments": 3, "high_risk_assessments": 1},
+        ]},
+    )
+    report = asyncio.run(refresh_facts(db, until=UNTIL))
+
+    selects = [(s, p) for s, p in db.log if any(s == src.sql for src in SOURCES)]
+    assert len(selects) == len(SOURCES)
+    activity = selects[0][1]
+    # 水位所在日整日重算; 留存回看 7 天
+    assert activity["start"] == datetime(2026, 10, 17) and activity["end"] == UNTIL
+    assert activity["lookback"] == datetime(2026, 10, 10)
+    # 无水位的来源默认只刷新 until 前一天
+    assert all(p["start"] == datetime(2026, 10, 18) for _, p in selects[1:])
+    assert report.days == [date(2026, 10, 17), date(2026, 10, 18)]
+
+    upserts = db.statements("INSERT INTO analytics_daily_facts")
+    assert len(upserts) == 1 and upserts[0][1][0]["tenant_id"] == "t1"
+    assert "high_risk_assessments = EXCLUDED.high_risk_assessments" in upserts[0][0]
+    clears = db.statements("UPDATE analytics_daily_facts")
+    assert len(clears) == len(SOURCES)
+    assert clears[0][1] == {"s": date(2026, 10, 17), "e": date(2026, 10, 18)}
+
+    marks = db.statements("INSERT INTO analytics_watermarks")
+    assert [p["src"] for _, p in marks] == list(SOURCE_NAMES)
+    assert all(p["wm"] == UNTIL for _, p in marks) and "GREATEST" in marks[0][0]
+    assert db.log[-1][0] == "commit" and sum(1 for s, _ in db.log if s == "commit") == 1
+
+
+def test_up_to_date_sources_are_skipped_and_since_overrides_watermark():
+    marks = {name: UNTIL for name in SOURCE_NAMES}
+    idle = RecordingSession(watermarks=marks)
+    report = asyncio.run(refresh_facts(idle, until=UNTIL))
+    assert report.days == [] and not idle.statements("UPDATE")
+
+    backfill = RecordingSession(watermarks=marks)
+    report = asyncio.run(refresh_facts(backfill, until=UNTIL, since=datetime(2026, 10, 1),
+                                       sources=["users"]))
+    assert list(report.sources) == ["users"] and len(report.days) == 18
+
+
+def test_snapshot_columns_fill_every_refreshed_day():
+    db = RecordingSession(
+        watermarks={"users": datetime(2026, 10, 16)},
+        source_rows={"users": [
+            {"day": None, "tenant_id": "", "role": "OBSERVER", "new_users": 40, "accounts_active": 30},
+            {"day": date(2026, 10, 17), "tenant_id": "", "role": "OBSERVER",
+             "new_users": 2, "accounts_active": 2},
+        ]},
+    )
+    asyncio.run(refresh_facts(db, until=UNTIL, sources=["users"]))
+    (_, rows), = db.statements("INSERT INTO analytics_daily_facts")
+    by_day = {r["day"]: r for r in rows}
+    assert sorted(by_day) == [date(2026, 10, 16), date(2026, 10, 17), date(2026, 10, 18)]
+    assert all(r["accounts_active"] == 32 for r in rows)
+    assert [by_day[d]["new_users"] for d in sorted(by_day)] == [0, 2, 0]
+
+
+def fact(day, role, **values):
+    return {"day": day, "role": role, **values}
+
+
+def test_rollup_derives_daily_metrics():
+    d0, d7 = date(2026, 10, 10), date(2026, 10, 17)
+    series = rollup([
+        fact(d0, "OBSERVER", active_users=6, accounts_active=10),
+        fact(d0, "GROWER", active_users=4, accounts_active=5),
+        fact(d7, "OBSERVER", active_users=3, retained_7d=2, accounts_active=10, total_events=30,
+             chat_events=4, ai_response_ms_sum=900.0, ai_response_count=3, tasks_completed=6),
+        fact(d7, "GROWER", active_users=5, retained_7d=3, accounts_active=10, total_events=50,
+             ai_response_ms_sum=300.0, ai_response_count=1, tasks_completed=2, new_users=1),
+    ])
+    day = series[-1]
+    assert day["date"] == "2026-10-17" and day["dau"] == 8 and day["active_growers"] == 5
+    assert day["retention_7d"] == 0.5            # (2 + 3) / 10
+    assert day["conversion_rate"] == 0.5         # 10 / 20
+    assert day["avg_tasks_completed"] == 1.0     # 8 / 8
+    assert day["ai_response_avg_ms"] == 300.0    # 1200 / 4
+    assert day["total_events"] == 80 and day["total_chat_messages"] == 4 and day["new_users"] == 1
+    assert series[0]["retention_7d"] == 0.0      # 无 7 天前数据
+
+
+def test_daily_series_filters_tenant_and_window():
+    db = RecordingSession(facts=[fact(date(2026, 10, 10), "GROWER", active_users=1),
+                                 fact(date(2026, 10, 17), "GROWER", active_users=2)])
+    rows = asyncio.run(daily_series(db, date(2026, 10, 17), date(2026, 10, 17), tenant_id="t1"))
+    sql, params = db.log[0]
+    assert "AND tenant_id = :t" in sql and params["t"] == "t1"
+    assert params["s"] == date(2026, 10, 10)     # 多取 7 天用于留存分母
+    assert [r["date"] for r in rows] == ["2026-10-17"]
+
+
+# ── PostgreSQL 对照 (原每日聚合任务的逐指标实时查询) ──
+
+PG_URL = os.getenv("TEST_DATABASE_URL")
+
+
+@pytest.mark.skipif(not PG_URL, reason="TEST_DATABASE_URL not set (PostgreSQL)")
+def test_postgres_materialized_matches_live_queries():
+    from sqlalchemy import text
+    from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+    engine = create_async_engine(PG_URL)
+    factory = async_sessionmaker(engine, expire_on_commit=False)
+    today = date.today()
+    day = lambda n: datetime.combine(today - timedelta(days=n), datetime.min.time())  # noqa: E731
+
+    async def scenario():
+        async with factory() as db:
+            for ddl in [
+                "CREATE TEMP TABLE users (id int PRIMARY KEY, role text, is_active bool, created_at timestamp)",
+                "CREATE TEMP TABLE tenant_clients (tenant_id text, user_id int)",
+                "CREATE TEMP TABLE user_activity_logs (id serial, user_id int, activity_type text, "
+                "detail json, created_at timestamp)",
+                "CREATE TEMP TABLE chat_sessions (id int PRIMARY KEY, user_id int)",
+                "CREATE TEMP TABLE chat_messages (id serial, session_id int, created_at timestamp)",
+                "CREATE TEMP TABLE micro_action_tasks (id serial, user_id int, status text, "
+                "completed_at timestamp)",
+                "CREATE TEMP TABLE assessments (id serial, user_id int, risk_level text, created_at timestamp)",
+                "CREATE TEMP TABLE analytics_daily_facts (LIKE public.analytics_daily_facts INCLUDING ALL)",
+                "CREATE TEMP TABLE analytics_watermarks (LIKE public.analytics_watermarks INCLUDING ALL)",
+                "CREATE TEMP TABLE analytics_daily (LIKE public.analytics_daily INCLUDING ALL)",
+            ]:
+                await db.execute(text(ddl))
+            for uid in range(1, 13):
+                await db.execute(text("INSERT INTO users VALUES (:i, :r, :a, :c)"), {
+                    "i": uid, "r": "OBSERVER" if uid % 3 == 0 else "GROWER",
+                    "a": uid != 5, "c": day(uid % 10) + timedelta(hours=uid)})
+                await db.execute(text("INSERT INTO chat_sessions VALUES (:i, :i)"), {"i": uid})
+                if uid % 4 == 0:
+                    await db.execute(text("INSERT INTO tenant_clients VALUES ('t1', :i)"), {"i": uid})
+            for n in range(1, 11):
+                for uid in range(1, 13):
+                    if (uid + n) % 3 == 0:
+                        continue
+                    ts = day(n) + timedelta(hours=uid)
+                    detail = '{"response_ms": %d}' % (100 * uid) if uid % 2 else "{}"
+                    await db.execute(text("INSERT INTO user_activity_logs (user_id, activity_type, detail, "
+                                          "created_at) VALUES (:u, :t, CAST(:d AS json), :c)"),
+                                     {"u": uid, "t": "chat" if uid % 5 == 0 else "login", "d": detail, "c": ts})
+                    await db.execute(text("INSERT INTO chat_messages (session_id, created_at) VALUES (:u, :c)"),
+                                     {"u": uid, "c": ts})
+                    if uid % 2 == 0:
+                        await db.execute(text("INSERT INTO micro_action_tasks (user_id, status, completed_at) "
+                                              "VALUES (:u, 'completed', :c)"), {"u": uid, "c": ts})
+                    if uid % 4 == 1:
+                        await db.execute(text("INSERT INTO assessments (user_id, risk_level, created_at) "
+                                              "VALUES (:u, :r, :c)"), {"u": uid, "r": "R3" if n % 2 else "R1",
+                                                                       "c": ts})
+            await refresh_facts(db, since=day(10), until=day(4))
+            await refresh_facts(db, until=day(0))      # 从水位增量继续
+            again = await refresh_facts(db, until=day(0))
+            mismatches = await verify_days(db, [today - timedelta(days=n) for n in range(1, 11)])
+            tenant = await daily_series(db, today - timedelta(days=2), today - timedelta(days=2), "t1")
+            return again, mismatches, tenant
+
+    again, mismatches, tenant = asyncio.run(scenario())
+    asyncio.run(engine.dispose())
+    assert mismatches == []
+    assert again.days == []
+    assert tenant and tenant[0]["dau"] <= 3
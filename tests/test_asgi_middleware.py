@@ -0,0 +1,206 @@
+"""
+Unit tests for core/asgi_middleware.py — pure-ASGI middleware stack
+
+Each scenario is sent to two identical apps: one wrapped in the original
+BaseHTTPMiddleware classes, one wrapped in ASGIMiddlewareStack layers. Status,
+body and headers must match (request timing values aside), including rate-limit
+rejections, legacy-auth 401s, HTTPS redirects, cookie stripping, errors and
+streaming responses.
+"""
+import os
+import sys
+
+import pytest
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+from fastapi.testclient import TestClient
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+
+import core.rate_limiter
+from core.asgi_middleware import (
+    ASGIMiddlewareStack,
+    CSRFAuditLayer,
+    HTTPSRedirectLayer,
+    Layer,
+    LegacyAuthLayer,
+    global_rate_limit_layer,
+    production_layers,
+)
+from core.csrf_audit_middleware import CSRFAuditMiddleware
+from core.https_middleware import HTTPSRedirectMiddleware
+from core.legacy_auth_middleware import LegacyAuthMiddleware
+from core.middleware import RateLimitMiddleware, RequestLoggingMiddleware, SecurityHeadersMiddleware
+from core.rate_limit_middleware import GlobalRateLimitMiddleware
+
+TIMING_HEADERS = {"x-response-time"}
+
+
+@pytest.fixture(autouse=True)
+def limiter(monkeypatch):
+    # 本地 GCRA 限流 (不连接 Redis)
+    monkeypatch.setattr(core.rate_limiter, "_redis", False)
+    monkeypatch.setattr(core.rate_limiter, "_async_redis", False)
+    monkeypatch.setenv("ENVIRONMENT", "production")
+    core.rate_limiter.rate_limiter.reset()
+    yield core.rate_limiter.rate_limiter
+    core.rate_limiter.rate_limiter.reset()
+
+
+def make_app():
+    app = FastAPI()
+
+    @app.get("/ok")
+    async def ok(request: Request):
+        return {"ok": True, "request_id": request.state.request_id}
+
+    @app.get("/health")
+    async def health():
+        return {"status": "healthy"}
+
+    @app.get("/cookie")
+    async def cookie():
+        response = JSONResponse({"ok": True})
+        response.set_cookie("session_id", "abc")
+        response.set_cookie("theme", "dark")
+        return response
+
+    @app.get("/boom")
+    async def boom():
+        raise RuntimeError("boom")
+
+    @app.get("/stream")
+    async def stream():
+        async def chunks():
+            for i in range(3):
+                yield f"data: {i}\n\n"
+        return StreamingResponse(chunks(), media_type="text/event-stream")
+
+    @app.post("/api/assessment/submit")
+    async def submit():
+        return {"submitted": True}
+
+    return app
+
+
+def legacy_app(rpm, global_limit=False):
+    app = make_app()
+    app.add_middleware(SecurityHeadersMiddleware)
+    app.add_middleware(RequestLoggingMiddleware)
+    app.add_middleware(RateLimitMiddleware, requests_per_minute=rpm)
+    if global_limit:
+        app.add_middleware(GlobalRateLimitMiddleware)
+    app.add_middleware(CSRFAuditMiddleware)
+    app.add_middleware(LegacyAuthMiddleware)
+    app.add_middleware(HTTPSRedirectMiddleware)
+    return app
+
+
+def asgi_app(rpm, global_limit=False):
+    app = make_app()
+    app.add_middleware(ASGIMiddlewareStack, layers=production_layers(rpm))
+    layers = [HTTPSRedirectLayer(), LegacyAuthLayer(), CSRFAuditLayer()]
+    if global_limit:
+        layers.append(global_rate_limit_layer())
+    app.add_middleware(ASGIMiddlewareStack, layers=layers)
+    return app
+
+
+def _snapshot(response):
+    headers = sorted(
+        (k, v) for k, v in response.headers.multi_items() if k not in TIMING_HEADERS
+    )
+    return response.status_code, response.content, headers
+
+
+def run_both(limiter, requests, rpm=120, global_limit=False):
+    results = []
+    for factory in (legacy_app, asgi_app):
+        limiter.reset()
+        client = TestClient(factory(rpm, global_limit), base_url="https://testserver",
+                            raise_server_exceptions=False, follow_redirects=False)
+        results.append([
+            _snapshot(client.request(method, url, headers={"X-Request-ID": "req-1", **headers}))
+            for method, url, headers in requests
+        ])
+    return results
+
+
+@pytest.mark.parametrize("requests", [
+    [("GET", "/ok", {})],
+    [("GET", "/health", {})],
+    [("GET", "/cookie", {})],
+    [("GET", "/stream", {})],
+    [("GET", "/missing", {})],
+    [("POST", "/api/assessment/submit", {})],
+    [("POST", "/api/assessment/submit", {"Authorization": "Bearer " + "x" * 20})],
+    [("GET", "http://testserver/ok?a=1", {})],
+    [("GET", "/ok", {"X-Forwarded-Proto": "http"})],
+])
+def test_layers_match_base_http_middleware(limiter, requests):
+    legacy, asgi = run_both(limiter, requests)
+    assert asgi == legacy
+
+
+def test_rate_limit_rejection_matches(limiter):
+    requests = [("GET", "/ok", {})] * 4 + [("GET", "/health", {})]
+    legacy, asgi = run_both(limiter, requests, rpm=2)
+    assert [status for status, _, _ in asgi] == [200, 200, 429, 429, 200]
+    # GCRA 给出精确的 Retry-After (2次/分钟 → 约30秒), 旧实现固定为 60
+    retry_after = [dict(h)["retry-after"] for status, _, h in asgi if status == 429]
+    assert all(0 < int(v) <= 30 for v in retry_after)
+
+    def without_retry_after(results):
+        return [(s, b, [kv for kv in h if kv[0] != "retry-after"]) for s, b, h in results]
+
+    assert without_retry_after(asgi) == without_retry_after(legacy)
+
+
+def test_global_rate_limit_preset_matches(limiter):
+    requests = [("GET", "/ok", {})] * 3
+    legacy, asgi = run_both(limiter, requests, rpm=1000, global_limit=True)
+    assert asgi == legacy
+
+
+def test_generated_request_id_and_timing_headers(limiter):
+    client = TestClient(asgi_app(120), base_url="https://testserver")
+    response = client.get("/ok")
+    request_id = response.headers["x-request-id"]
+    assert len(request_id) == 8 and response.json()["request_id"] == request_id
+    assert response.headers["x-response-time"].endswith("s")
+
+
+def test_error_is_logged_and_reraised(limiter):
+    client = TestClient(asgi_app(120), base_url="https://testserver")
+    with pytest.raises(RuntimeError):
+        client.get("/boom")
+
+
+def test_non_http_scopes_pass_through():
+    seen = []
+
+    async def inner(scope, receive, send):
+        seen.append(scope["type"])
+
+    class Exploding(Layer):
+        def on_request(self, ctx):
+            raise AssertionError("layer ran for non-http scope")
+
+    import asyncio
+    asyncio.run(ASGIMiddlewareStack(inner, [Exploding()])({"type": "lifespan"}, None, None))
+    assert seen == ["lifespan"]
+
+
+def test_layer_timing_histogram(limiter):
+    from prometheus_client import REGISTRY
+
+    app = make_app()
+    app.add_middleware(ASGIMiddlewareStack, layers=production_layers(120), timing=True)
+    before = REGISTRY.get_sample_value("bhp_middleware_layer_seconds_count", {"layer": "rate_limit"}) or 0
+    TestClient(app, base_url="https://testserver").get("/ok")
+    for layer in ("rate_limit", "request_logging", "security_headers"):
+        assert REGISTRY.get_sample_value("bhp_middleware_layer_seconds_count", {"layer": layer}) is not None
+    after = REGISTRY.get_sample_value("bhp_middleware_layer_seconds_count", {"layer": "rate_limit"})
+    assert after == before + 1
@@ -0,0 +1,259 @@
+"""
+Unit tests for core/auth_cache.py — principal cache and revocation filter
+
+Tests cover Bloom filter membership, Redis-free revocation checks once the
+filter is synced, cross-worker events, and get_current_user serving cached
+principals without JWT decode or a users query, with invalidation on role /
+active-status changes and token revocation.
+"""
+import hashlib
+import os
+import sys
+import uuid
+from datetime import datetime
+
+import pytest
+from fastapi import HTTPException
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+
+from core.auth import TokenBlacklist, create_access_token, token_blacklist
+from core.auth_cache import (
+    AUTH_EVENTS_CHANNEL,
+    Principal,
+    PrincipalCache,
+    RevocationFilter,
+    apply_auth_event,
+    principal_cache,
+    revocation_filter,
+)
+from core.models import User, UserRole
+
+
+def _h(i):
+    return hashlib.sha256(f"token-{i}".encode()).hexdigest()
+
+
+class FakeRedis:
+    def __init__(self):
+        self.store = {}
+        self.published = []
+        self.exists_calls = 0
+
+    def setex(self, key, ttl, value):
+        self.store[key] = value
+
+    def exists(self, key):
+        self.exists_calls += 1
+        return int(key in self.store)
+
+    def publish(self, channel, message):
+        self.published.append((channel, message))
+
+
+@pytest.fixture(autouse=True)
+def reset_caches():
+    principal_cache.clear()
+    yield
+    principal_cache.clear()
+    revocation_filter.synced = False
+
+
+@pytest.fixture()
+def blacklist():
+    bl = TokenBlacklist()
+    bl._redis = FakeRedis()
+    bl._redis_checked = True
+    bl._sync_started = True  # 不启动订阅线程, 由测试直接驱动过滤器
+    revocation_filter.rebuild([])
+    return bl
+
+
+# -----------------------------------------------
+# Revocation filter
+# -----------------------------------------------
+
+class TestRevocationFilter:
+    def test_no_false_negatives_and_low_false_positive_rate(self):
+        f = RevocationFilter(capacity=5000, error_rate=0.001)
+        for i in range(5000):
+            f.add(_h(i))
+        assert all(f.might_contain(_h(i)) for i in range(5000))
+        false_positives = sum(f.might_contain(_h(i)) for i in range(5000, 25000))
+        assert false_positives < 20000 * 0.005
+
+    def test_rebuild_drops_expired_and_marks_synced(self):
+        f = RevocationFilter(capacity=1000)
+        f.add(_h(1))
+        assert not f.synced
+        f.rebuild([_h(2)])
+        assert f.synced
+        assert f.might_contain(_h(2)) and not f.might_contain(_h(1))
+
+    def test_rebuild_grows_capacity(self):
+        f = RevocationFilter(capacity=1000)
+        f.rebuild(_h(i) for i in range(3000))
+        assert f.capacity >= 6000
+        assert all(f.might_contain(_h(i)) for i in range(3000))
+
+
+# -----------------------------------------------
+# Token blacklist with filter
+# -----------------------------------------------
+
+class TestBlacklistFilter:
+    def test_synced_filter_skips_redis_for_unrevoked_tokens(self, blacklist):
+        token = create_access_token({"user_id": 1})
+        assert blacklist.is_revoked(token) is False
+        assert blacklist._redis.exists_calls == 0
+
+    def test_revoke_publishes_and_confirms_with_redis(self, blacklist):
+        token = create_access_token({"user_id": 1})
+        blacklist.revoke(token)
+        token_hash = TokenBlacklist._hash(token)
+        assert blacklist._redis.published == [(AUTH_EVENTS_CHANNEL, f"revoke:{token_hash}")]
+        assert blacklist.is_revoked(token) is True
+        assert blacklist._redis.exists_calls == 1
+
+    def test_unsynced_filter_falls_back_to_redis(self, blacklist):
+        revocation_filter.synced = False
+        assert blacklist.is_revoked(create_access_token({"user_id": 1})) is False
+        assert blacklist._redis.exists_calls == 1
+
+    def test_remote_revoke_event_evicts_principal(self):
+        principal_cache.put(_h(1), Principal(user_id=1, role=UserRole.GROWER, is_active=True))
+        apply_auth_event(f"revoke:{_h(1)}")
+        assert principal_cache.get(_h(1)) is None
+        assert revocation_filter.might_contain(_h(1))
+
+
+# -----------------------------------------------
+# Principal cache
+# -----------------------------------------------
+
+class TestPrincipalCache:
+    def test_ttl_capped_by_token_exp(self):
+        cache = PrincipalCache(ttl=60)
+        cache.put(_h(1), Principal(1, UserRole.GROWER, True), token_exp=datetime.utcnow().timestamp() - 1)
+        assert cache.get(_h(1)) is None
+
+    def test_invalidate_user_drops_all_tokens(self):
+        cache = PrincipalCache(ttl=60)
+        cache.put(_h(1), Principal(1, UserRole.GROWER, True))
+        cache.put(_h(2), Principal(1, UserRole.GROWER, True))
+        cache.put(_h(3), Principal(2, UserRole.COACH, True))
+        cache.invalidate_user(1)
+        assert cache.get(_h(1)) is None and cache.get(_h(2)) is None
+        assert cache.get(_h(3)) is not None
+
+    def test_max_entries(self):
+        cache = PrincipalCache(ttl=60, max_entries=2)
+        for i in range(3):
+            cache.put(_h(i), Principal(i, UserRole.GROWER, True))
+        assert len(cache) == 2 and cache.get(_h(0)) is None
+
+
+# -----------------------------------------------
+# get_current_user
+# -----------------------------------------------
+
+@pytest.fixture()
+def engine():
+    eng = create_engine("sqlite:///:memory:")
+
+    @event.listens_for(eng, "connect")
+    def _register(dbapi_conn, record):
+        dbapi_conn.create_function("gen_random_uuid", 0, lambda: str(uuid.uuid4()))
+        dbapi_conn.create_function("now", 0, lambda: datetime.now().strftime("%Y-%m-%d %H:%M:%S"))
+
+    User.__table__.create(eng)
+    yield eng
+    eng.dispose()
+
+
+@pytest.fixture()
+def Session(engine):
+    return sessionmaker(bind=engine)
+
+
+@pytest.fixture()
+def user(Session):
+    with Session() as s:
+        u = User(username="g1", email="g1@x.com", password_hash="x", role=UserRole.GROWER,
+                 is_active=True, full_name="成长者")
+        s.add(u)
+        s.commit()
+        return u.id
+
+
+@pytest.fixture()
+def dependencies():
+    # 延迟导入: 收集阶段导入 api 包会被 backend/ 路径遮蔽
+    from api import dependencies
+    return dependencies
+
+
+@pytest.fixture()
+def statements(engine):
+    stmts = []
+    event.listen(engine, "before_cursor_execute", lambda *a: stmts.append(a[2]))
+    return stmts
+
+
+class TestGetCurrentUser:
+    def test_cached_principal_skips_decode_and_query(self, dependencies, Session, user, statements, monkeypatch):
+        token = create_access_token({"user_id": user})
+        with Session() as db:
+            assert dependencies.get_current_user(token, db).id == user
+        assert len(statements) == 1
+
+        def no_decode(*args, **kwargs):
+            raise AssertionError("token decoded on cache hit")
+
+        monkeypatch.setattr(dependencies, "verify_token_with_blacklist", no_decode)
+        statements.clear()
+        with Session() as db:
+            current = dependencies.get_current_user(token, db)
+            assert (current.id, current.role, current.is_active) == (user, UserRole.GROWER, True)
+            assert statements == []
+            assert current.full_name == "成长者"  # 其他字段按需加载
+            assert len(statements) == 1
+            current.nickname = "新昵称"
+            db.commit()
+        with Session() as db:
+            assert db.get(User, user).nickname == "新昵称"
+
+    def test_role_change_invalidates_principal(self, dependencies, Session, user):
+        token = create_access_token({"user_id": user})
+        with Session() as db:
+            dependencies.get_current_user(token, db)
+        with Session() as db:
+            db.get(User, user).role = UserRole.COACH
+            db.commit()
+        with Session() as db:
+            assert dependencies.get_current_user(token, db).role == UserRole.COACH
+
+    def test_deactivation_takes_effect_immediately(self, dependencies, Session, user):
+        token = create_access_token({"user_id": user})
+        with Session() as db:
+            dependencies.get_current_user(token, db)
+        with Session() as db:
+            db.get(User, user).is_active = False
+            db.commit()
+        with Session() as db, pytest.raises(HTTPException):
+            dependencies.get_current_user(token, db)
+        with Session() as db:
+            assert dependencies.get_optional_user(token, db) is None
+
+    def test_revoked_token_rejected_on_cache_hit(self, dependencies, Session, user):
+        token = create_access_token({"user_id": user})
+        with Session() as db:
+            dependencies.get_current_user(token, db)
+        token_blacklist.revoke(token)
+        with Session() as db, pytest.raises(HTTPException) as exc:
+            dependencies.get_current_user(token, db)
+        assert exc.value.status_code == 401
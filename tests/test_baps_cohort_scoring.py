@@ -0,0 +1,125 @@
+"""
+Unit tests for core/baps/cohort_scoring.py — vectorized BAPS cohort scoring
+
+Tests cover batch results matching the per-user BAPSScoringEngine functions
+field by field (including out-of-range and boundary scores), questionnaire
+compilation with reverse items, searchsorted level lookup and rescoring
+after a norm (level range) change.
+"""
+import os
+import random
+import sys
+from dataclasses import asdict
+
+import numpy as np
+import pytest
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+
+from core.baps.cohort_scoring import CohortScorer, LevelTable, compile_questionnaire
+from core.baps.scoring_engine import BAPSScoringEngine
+
+ITEMS = {
+    "big_five": (BAPSScoringEngine.BIG_FIVE_ITEMS, -4, 4),
+    "bpt6": (BAPSScoringEngine.BPT6_ITEMS, 1, 5),
+    "capacity": (BAPSScoringEngine.CAPACITY_ITEMS, 1, 5),
+    "spi": (BAPSScoringEngine.SPI_ITEMS, 1, 5),
+}
+
+
+def random_sheets(name, n, seed, skip=0.1):
+    """随机答卷; 部分题目缺答, 另加一道无关题号"""
+    rng = random.Random(seed)
+    dims, lo, hi = ITEMS[name]
+    items = [item for group in dims.values() for item in group]
+    sheets = []
+    for _ in range(n):
+        sheet = {item: rng.randint(lo, hi) for item in items if rng.random() > skip}
+        sheet["EXTRA1"] = 3
+        sheets.append(sheet)
+    return sheets
+
+
+def comparable(result):
+    d = asdict(result)
+    d.pop("assessed_at")
+    return d
+
+
+@pytest.mark.parametrize("name", CohortScorer.QUESTIONNAIRES)
+def test_cohort_matches_per_user_scoring(name):
+    engine = BAPSScoringEngine()
+    scorer = CohortScorer(engine)
+    sheets = random_sheets(name, 400, seed=len(name)) + [{}]  # 空答卷落在区间外 -> 默认水平
+    user_ids = [f"u{i}" for i in range(len(sheets))]
+
+    batch = scorer.score(name, sheets, user_ids)
+    single = [getattr(engine, f"score_{name}")(s, uid) for s, uid in zip(sheets, user_ids)]
+    assert [comparable(r) for r in batch] == [comparable(r) for r in single]
+    # 分数保持 Python int/float, 可直接序列化
+    first = comparable(batch[0])
+    assert all(type(v) in (int, float) for v in _numbers(first))
+
+
+def _numbers(obj):
+    if isinstance(obj, dict):
+        for v in obj.values():
+            yield from _numbers(v)
+    elif isinstance(obj, list):
+        for v in obj:
+            yield from _numbers(v)
+    elif isinstance(obj, (int, float, np.generic)) and not isinstance(obj, bool):
+        yield obj
+
+
+def test_spi_rounding_and_level_boundaries_match():
+    engine = BAPSScoringEngine()
+    scorer = CohortScorer(engine)
+    # 所有维度同分, 覆盖各水平区间边界 (10/20/30/40 等)
+    sheets = [{f"SPI{i}": v for i in range(1, 51)} for v in range(0, 6)]
+    sheets += [{**{f"SPI{i}": 2 for i in range(1, 51)}, **{f"SPI{i}": k for i in range(1, 11)}}
+               for k in range(1, 6)]
+    batch = scorer.score_spi(sheets)
+    single = [engine.score_spi(s) for s in sheets]
+    assert [(r.spi_score, r.success_level) for r in batch] == [(r.spi_score, r.success_level) for r in single]
+
+
+def test_compile_questionnaire_applies_reverse_items():
+    compiled = compile_questionnaire("big_five", BAPSScoringEngine.BIG_FIVE_ITEMS,
+                                     BAPSScoringEngine.BIG_FIVE_REVERSE)
+    assert compiled.weights.shape == (50, 5)
+    assert compiled.weights[compiled.index["E3"], 0] == -1
+    assert compiled.weights[:, 0].sum() == 8
+    dims, scores = CohortScorer().dimension_scores("big_five", [{"E1": 4, "E3": 2, "N1": -3}])
+    assert dims == ["E", "N", "C", "A", "O"]
+    assert scores.tolist() == [[2, -3, 0, 0, 0]]
+
+    with pytest.raises(ValueError):
+        compiled.matrix(np.zeros((3, 7)))
+    with pytest.raises(ValueError):
+        CohortScorer().score("ttm9", [])
+
+
+def test_level_table_resolves_closed_ranges_with_gaps():
+    table = LevelTable([{"range": (10, 19.99), "level": "b"}, {"range": (20, 30), "level": "c"},
+                        {"range": (0, 5), "level": "a"}])
+    idx = table.resolve(np.array([-1, 0, 5, 5.5, 10, 19.99, 19.995, 20, 30, 31]))
+    assert idx.tolist() == [-1, 2, 2, -1, 0, 0, -1, 1, 1, -1]
+
+
+def test_rescoring_after_norm_change():
+    engine = BAPSScoringEngine()
+    sheets = random_sheets("capacity", 50, seed=3, skip=0)
+    before = CohortScorer(engine).score_capacity(sheets)
+
+    engine.capacity_total_levels = [
+        {"range": (0, 99), "level": "low", "label": "需要准备", "strategy": "先解决前置问题"},
+        {"range": (100, 160), "level": "high", "label": "高潜力", "strategy": "可挑战高目标"},
+    ]
+    after = CohortScorer(engine).score_capacity(sheets)
+    assert [r.total_score for r in after] == [r.total_score for r in before]
+    assert [r.potential_level for r in after] == [
+        "high" if r.total_score >= 100 else "low" for r in before]
+    assert [comparable(r) for r in after] == [comparable(engine.score_capacity(s)) for s in sheets]
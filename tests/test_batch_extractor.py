@@ -0,0 +1,202 @@
+"""
+Unit tests for core/batch_extractor.py — batch health-report extraction
+
+Tests cover directory scanning (category + device ID from file or folder name),
+hash-keyed caching so re-runs skip unchanged files, process-pool extraction,
+failure categories, unreadable files not aborting a run, and bulk writes to
+health_data that map devices to users once per chunk, never insert the same
+report content twice and count each failed file once.
+"""
+import os
+import sys
+from datetime import datetime
+
+import pytest
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+
+from core.batch_extractor import (
+    FAIL_DB_ERROR, FAIL_MISSING_DEPENDENCY, FAIL_NO_DATA, FAIL_UNMAPPED_DEVICE, FAIL_UNREADABLE,
+    ExtractionCache, FileResult, HealthDataWriter, extract_report_file, run_batch, scan_directory,
+)
+
+CALLS = []
+
+
+def fake_extractor(path, category):
+    """按文件内容返回结果: 'empty' → 无数据, 其余解析为 SDNN / anxiety_score"""
+    CALLS.append(path)
+    with open(path, encoding="utf-8") as f:
+        text = f.read()
+    if text == "empty":
+        return FileResult(path, category, False, failure=FAIL_NO_DATA)
+    key = "SDNN" if category == "physio_excel" else "anxiety_score"
+    return FileResult(path, category, True, {key: float(text)})
+
+
+def make_cohort(root):
+    (root / "batch1" / "beb2").mkdir(parents=True)
+    (root / "batch1" / "9348").mkdir(parents=True)
+    files = {
+        "batch1/beb2/【AAAAAAAABEB2】生理测评数据.xlsx": "42.5",
+        "batch1/beb2/【AAAAAAAABEB2】心理测评数据.xlsx": "30",
+        "batch1/9348/生理测评.xlsx": "55",
+        "batch1/9348/心理健康测评报告.pdf": "empty",
+        "batch1/9348/notes.txt": "ignored",
+        "batch1/9348/其他.xlsx": "ignored",
+    }
+    for rel, content in files.items():
+        (root / rel).write_text(content, encoding="utf-8")
+    return root
+
+
+@pytest.fixture(autouse=True)
+def reset_calls():
+    CALLS.clear()
+
+
+def test_scan_classifies_files_and_derives_device_ids(tmp_path):
+    make_cohort(tmp_path)
+    found = sorted((os.path.basename(r.path), r.category, r.device_id) for r in scan_directory(str(tmp_path)))
+    assert found == [
+        ("【AAAAAAAABEB2】心理测评数据.xlsx", "psych_excel", "AAAAAAAABEB2"),
+        ("【AAAAAAAABEB2】生理测评数据.xlsx", "physio_excel", "AAAAAAAABEB2"),
+        ("心理健康测评报告.pdf", "pdf", "9348"),
+        ("生理测评.xlsx", "physio_excel", "9348"),
+    ]
+
+
+def test_cache_skips_unchanged_files(tmp_path):
+    root = make_cohort(tmp_path / "cohort")
+    cache = ExtractionCache(str(tmp_path / "cache"))
+
+    first = run_batch(str(root), workers=0, cache=cache, extractor=fake_extractor)
+    assert (first.files_total, first.files_extracted, first.files_ok) == (4, 4, 3)
+    assert first.failures == {FAIL_NO_DATA: 1}
+    assert len(CALLS) == 4
+
+    changed = root / "batch1" / "9348" / "生理测评.xlsx"
+    changed.write_text("56", encoding="utf-8")
+    second = run_batch(str(root), workers=0, cache=cache, extractor=fake_extractor)
+    assert (second.files_cached, second.files_extracted, second.files_ok) == (3, 1, 3)
+    assert CALLS[4:] == [str(changed)]
+    assert second.failures == {FAIL_NO_DATA: 1}
+
+
+def test_process_pool_extraction(tmp_path):
+    root = make_cohort(tmp_path)
+    report = run_batch(str(root), workers=2, cache=None, extractor=fake_extractor)
+    assert (report.files_total, report.files_ok) == (4, 3)
+    assert report.files_per_sec > 0
+    assert "files/sec" in report.summary()
+
+
+def test_real_extractor_failure_categories(tmp_path):
+    broken = tmp_path / "生理测评.xlsx"
+    broken.write_bytes(b"not a zip file")
+    result = extract_report_file(str(broken), "physio_excel")
+    assert not result.ok and result.failure in (FAIL_UNREADABLE, FAIL_MISSING_DEPENDENCY)
+
+
+def test_physio_workbook_sheet_fallback(tmp_path):
+    pytest.importorskip("openpyxl")
+    import pandas as pd
+
+    path = tmp_path / "生理测评.xlsx"
+    with pd.ExcelWriter(path, engine="openpyxl") as writer:
+        pd.DataFrame({"SDNN": [0, 0]}).to_excel(writer, sheet_name="生理测评", index=False)
+        pd.DataFrame({"SDNN": [40, 50, 60], "平均心率": [70, 72, 74]}).to_excel(
+            writer, sheet_name="明细", index=False)
+    result = extract_report_file(str(path), "physio_excel")
+    assert result.ok and result.data == {"SDNN": 50.0, "heart_rate": 72.0}
+
+
+@pytest.fixture()
+def session_factory():
+    from sqlalchemy import create_engine
+    from sqlalchemy.orm import sessionmaker
+
+    from core.models import DeviceType, HealthData, UserDevice
+
+    engine = create_engine("sqlite://")
+    UserDevice.__table__.create(engine)
+    HealthData.__table__.create(engine)
+    factory = sessionmaker(bind=engine)
+    db = factory()
+    db.add(UserDevice(user_id=7, device_id="AAAAAAAABEB2", device_type=list(DeviceType)[0]))
+    db.commit()
+    db.close()
+    return factory
+
+
+def test_bulk_write_maps_devices_and_deduplicates(tmp_path, session_factory):
+    from core.models import HealthData
+
+    root = make_cohort(tmp_path)
+    report = run_batch(str(root), workers=0, cache=None, extractor=fake_extractor,
+                       writer=HealthDataWriter(session_factory, chunk_size=2))
+    assert report.rows_written == 2
+    assert report.failures == {FAIL_NO_DATA: 1, FAIL_UNMAPPED_DEVICE: 1}
+
+    db = session_factory()
+    rows = {r.data_type: r for r in db.query(HealthData).all()}
+    assert set(rows) == {"hrv_report", "psych_report"}
+    hrv = rows["hrv_report"]
+    assert (hrv.user_id, hrv.value, hrv.unit, hrv.device_id) == (7, 42.5, "ms", "AAAAAAAABEB2")
+    assert hrv.values == {"SDNN": 42.5} and len(hrv.data_metadata["sha256"]) == 64
+    assert isinstance(hrv.recorded_at, datetime)
+    db.close()
+
+    again = run_batch(str(root), workers=0, cache=None, extractor=fake_extractor,
+                      writer=HealthDataWriter(session_factory))
+    assert (again.rows_written, again.rows_skipped_existing) == (0, 2)
+    db = session_factory()
+    assert db.query(HealthData).count() == 2
+    db.close()
+
+
+def test_dedup_uses_content_hash_not_mtime(tmp_path, session_factory):
+    from core.models import HealthData
+
+    root = make_cohort(tmp_path)
+    run_batch(str(root), workers=0, cache=None, extractor=fake_extractor,
+              writer=HealthDataWriter(session_factory))
+    physio = root / "batch1" / "beb2" / "【AAAAAAAABEB2】生理测评数据.xlsx"
+    psych = root / "batch1" / "beb2" / "【AAAAAAAABEB2】心理测评数据.xlsx"
+    st = psych.stat()
+    os.utime(physio, (st.st_atime + 3600, st.st_mtime + 3600))  # 仅 touch: 内容未变
+    psych.write_text("31", encoding="utf-8")                    # 内容变化: mtime 保持不变
+    os.utime(psych, (st.st_atime, st.st_mtime))
+
+    again = run_batch(str(root), workers=0, cache=None, extractor=fake_extractor,
+                      writer=HealthDataWriter(session_factory))
+    assert (again.rows_written, again.rows_skipped_existing) == (1, 1)
+    db = session_factory()
+    assert sorted(r.value for r in db.query(HealthData).filter_by(data_type="psych_report")) == [30.0, 31.0]
+    db.close()
+
+
+def test_db_error_does_not_recount_unmapped_files(tmp_path, session_factory):
+    from sqlalchemy.orm import Session
+
+    class FailingSession(Session):
+        def bulk_insert_mappings(self, *args, **kwargs):
+            raise RuntimeError("db down")
+
+    factory = lambda: FailingSession(bind=session_factory.kw["bind"])  # noqa: E731
+    report = run_batch(str(make_cohort(tmp_path)), workers=0, cache=None, extractor=fake_extractor,
+                       writer=HealthDataWriter(factory))
+    assert report.failures == {FAIL_NO_DATA: 1, FAIL_UNMAPPED_DEVICE: 1, FAIL_DB_ERROR: 2}
+    assert sum(report.failures.values()) == len(set().union(*report.failed_files.values()))
+
+
+def test_broken_symlink_is_skipped(tmp_path):
+    root = make_cohort(tmp_path)
+    os.symlink(tmp_path / "missing.xlsx", root / "batch1" / "beb2" / "生理测评_link.xlsx")
+
+    found = {os.path.basename(r.path) for r in scan_directory(str(root))}
+    assert "生理测评_link.xlsx" not in found and len(found) == 4
+    report = run_batch(str(root), workers=0, cache=None, extractor=fake_extractor)
+    assert report.files_total == 4
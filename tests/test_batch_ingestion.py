@@ -0,0 +1,149 @@
+"""
+Unit tests for core/knowledge/batch_ingestion_service.py — staged ingestion pipeline
+
+Tests cover archive ingestion with batched embeddings, per-stage stats,
+skipped files, process-pool conversion order and resume after failure.
+"""
+import json
+import os
+import sys
+import zipfile
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+
+from core.knowledge import batch_ingestion_service as svc
+from core.models import BatchIngestionJob, KnowledgeChunk, KnowledgeDocument
+
+
+class FakeEmbedder:
+    """Records batch sizes; optionally fails on the N-th call."""
+
+    def __init__(self, fail_on_call=None):
+        self.calls = []
+        self.fail_on_call = fail_on_call
+
+    def embed_many(self, texts, batch_size=32):
+        self.calls.append(len(texts))
+        if self.fail_on_call is not None and len(self.calls) == self.fail_on_call:
+            raise RuntimeError("embedding backend down")
+        return [[0.1, 0.2, 0.3] for _ in texts]
+
+
+USER_ID = 1
+
+
+@pytest.fixture()
+def db():
+    """只建灌注相关的三张表 (完整 metadata 含 schema 限定表, SQLite 无法全部创建)"""
+    engine = create_engine("sqlite:///:memory:")
+    tables = [KnowledgeDocument.__table__, KnowledgeChunk.__table__, BatchIngestionJob.__table__]
+    KnowledgeDocument.metadata.create_all(engine, tables=tables)
+    session = sessionmaker(bind=engine)()
+    yield session
+    session.close()
+    engine.dispose()
+
+
+@pytest.fixture(autouse=True)
+def ingest_dir(tmp_path, monkeypatch):
+    path = tmp_path / "ingest"
+    monkeypatch.setattr(svc, "INGEST_DIR", str(path))
+    return path
+
+
+def _doc(name, paragraphs=3):
+    body = "\n\n".join(f"{name} 段落 {i} " + "内容" * 40 for i in range(paragraphs))
+    return f"# {name}\n\n{body}\n"
+
+
+def _zip(tmp_path, files):
+    path = tmp_path / "upload.zip"
+    with zipfile.ZipFile(path, "w") as zf:
+        for name, content in files.items():
+            zf.writestr(name, content)
+    return str(path)
+
+
+def _job(db, tmp_path, files):
+    return svc.create_batch_job(db, USER_ID, _zip(tmp_path, files), "kb.zip", scope="domain", domain_id="sleep")
+
+
+def test_archive_pipeline_batches_embeddings(db, tmp_path):
+    job = _job(db, tmp_path, {"a.md": _doc("A", 6), "b.md": _doc("B"), "c.txt": _doc("C")})
+    assert job.status == "pending"
+    assert os.path.exists(job.source_path)
+
+    embedder = FakeEmbedder()
+    job = svc.run_ingestion_job(db, job.id, convert_workers=0, embed_batch_size=4, embedder=embedder)
+
+    assert job.status == "completed"
+    assert job.stage == "done"
+    assert job.processed_files == job.total_files == 3
+    assert job.completed_files == ["a.md", "b.md", "c.txt"]
+    assert not os.path.exists(job.source_path)
+
+    chunks = db.query(KnowledgeChunk).filter(KnowledgeChunk.document_id.in_(job.result_doc_ids)).all()
+    assert len(chunks) == job.total_chunks == sum(embedder.calls)
+    assert len(embedder.calls) == 3  # one embed_many call per document
+    assert all(json.loads(c.embedding_1024) == [0.1, 0.2, 0.3] for c in chunks)
+    assert {c.domain_id for c in chunks} == {"sleep"}
+
+    stats = job.stage_stats
+    assert stats["convert"]["items"] == 3
+    assert stats["embed"]["items"] == stats["insert"]["items"] == job.total_chunks
+    assert stats["skipped"] == []
+
+
+def test_unconvertible_files_are_skipped(db, tmp_path):
+    job = _job(db, tmp_path, {"bad.pdf": b"not a pdf", "ok.md": _doc("OK")})
+    job = svc.run_ingestion_job(db, job.id, convert_workers=0, embedder=FakeEmbedder())
+
+    assert job.status == "completed"
+    assert job.processed_files == 1
+    assert [s["file"] for s in job.stage_stats["skipped"]] == ["bad.pdf"]
+
+
+def test_process_pool_keeps_file_order(db, tmp_path):
+    files = {"1.docx": b"broken", "2.md": _doc("Two"), "3.docx": b"broken", "4.md": _doc("Four")}
+    job = _job(db, tmp_path, files)
+    job = svc.run_ingestion_job(db, job.id, convert_workers=2, embedder=FakeEmbedder())
+
+    assert job.status == "completed"
+    assert job.completed_files == ["1.docx", "2.md", "3.docx", "4.md"]
+    assert [s["file"] for s in job.stage_stats["skipped"]] == ["1.docx", "3.docx"]
+    titles = [db.get(KnowledgeDocument, i).title for i in job.result_doc_ids]
+    assert titles == ["2", "4"]
+
+
+def test_failed_job_resumes_after_last_completed_file(db, tmp_path):
+    job = _job(db, tmp_path, {"a.md": _doc("RA"), "b.md": _doc("RB"), "c.md": _doc("RC")})
+
+    job = svc.run_ingestion_job(db, job.id, convert_workers=0, embedder=FakeEmbedder(fail_on_call=2))
+    assert job.status == "failed"
+    assert "embedding backend down" in job.error_message
+    assert job.completed_files == ["a.md"]
+    assert len(job.result_doc_ids) == 1
+    assert os.path.exists(job.source_path)
+
+    embedder = FakeEmbedder()
+    job = svc.run_ingestion_job(db, job.id, convert_workers=0, embedder=embedder)
+    assert job.status == "completed"
+    assert len(embedder.calls) == 2  # a.md is not re-embedded
+    assert job.completed_files == ["a.md", "b.md", "c.md"]
+    assert job.processed_files == 3
+    assert len(set(job.result_doc_ids)) == 3
+    assert job.stage_stats["convert"]["items"] == 3  # stats of the failed file were rolled back
+
+
+def test_unsupported_upload_rejected(db, tmp_path):
+    path = tmp_path / "x.exe"
+    path.write_bytes(b"MZ")
+    with pytest.raises(ValueError):
+        svc.create_batch_job(db, USER_ID, str(path), "x.exe")
+    assert db.query(BatchIngestionJob).count() == 0
@@ -0,0 +1,203 @@
+"""
+Unit tests for core/budget_ledger.py — atomic budget counters for CostController
+
+Tests cover 1k parallel record_usage calls losing no usage (in-process
+counters, and Redis when REDIS_URL is set), check_budget served from the
+short-TTL status cache without touching the database, usage reports that
+include unflushed deltas and deltas being retried after a failed flush.
+"""
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, timedelta
+
+import pytest
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+
+from core.budget_ledger import BudgetLedger
+from core.cost_controller import CostController
+from core.models import CostBudgetLedger
+
+
+class Clock:
+    def __init__(self, t=1000.0):
+        self.t = t
+
+    def __call__(self):
+        return self.t
+
+
+@pytest.fixture()
+def session_factory(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'ledger.db'}", connect_args={"timeout": 30})
+    CostBudgetLedger.__table__.create(engine)
+    statements = []
+    event.listen(engine, "before_cursor_execute",
+                 lambda conn, cursor, stmt, *a: statements.append(stmt))
+    factory = sessionmaker(bind=engine)
+    factory.statements = statements
+    yield factory
+    engine.dispose()
+
+
+def add_budget(factory, tenant_id="t1", user_id=None, max_tokens=1_000_000, used_tokens=0,
+               overflow_action="downgrade"):
+    db = factory()
+    now = datetime.utcnow()
+    row = CostBudgetLedger(
+        tenant_id=tenant_id, user_id=user_id, budget_type="daily", max_tokens=max_tokens,
+        used_tokens=used_tokens, used_cost_cny=0.0, overflow_action=overflow_action, is_active=True,
+        period_start=date.today() - timedelta(days=1), period_end=date.today() + timedelta(days=1),
+        created_at=now, updated_at=now,
+    )
+    db.add(row)
+    db.commit()
+    ledger_id = row.id
+    db.close()
+    return ledger_id
+
+
+def db_usage(factory, ledger_id):
+    db = factory()
+    row = db.get(CostBudgetLedger, ledger_id)
+    result = (row.used_tokens, row.used_cost_cny)
+    db.close()
+    return result
+
+
+def run_parallel(factory, ledger, calls=1000, workers=32):
+    def call(i):
+        db = factory()
+        try:
+            return CostController(db, ledger=ledger).record_usage("t1", 7, "qwen-plus", 100 + i % 7, 50)
+        finally:
+            db.close()
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        return list(pool.map(call, range(calls)))
+
+
+def expected_totals(calls=1000):
+    tokens = sum(150 + i % 7 for i in range(calls))
+    cost = sum(CostController._calculate_cost("qwen-plus", 100 + i % 7, 50) for i in range(calls))
+    return tokens, cost
+
+
+def test_parallel_record_usage_loses_nothing(session_factory):
+    ledger_id = add_budget(session_factory, user_id=7, used_tokens=500)
+    ledger = BudgetLedger(session_factory, redis_client=False, flush_interval=0.005)
+
+    results = run_parallel(session_factory, ledger)
+    tokens, cost = expected_totals()
+    # 每次调用看到的实时用量互不相同 (原子累加, 无丢失更新)
+    assert len({r["remaining_tokens"] for r in results}) == 1000
+
+    ledger.shutdown()
+    used_tokens, used_cost = db_usage(session_factory, ledger_id)
+    assert used_tokens == 500 + tokens
+    assert used_cost == pytest.approx(cost, abs=1e-6)
+    assert ledger.stats["recorded"] == 1000
+    assert ledger.stats["flushed_rows"] >= 1
+    updates = [s for s in session_factory.statements if s.lstrip().upper().startswith("UPDATE")]
+    assert 1 <= len(updates) < 1000
+
+
+@pytest.mark.skipif(not os.getenv("REDIS_URL"), reason="REDIS_URL not set")
+def test_parallel_record_usage_with_redis(session_factory):
+    import redis
+
+    client = redis.from_url(os.environ["REDIS_URL"], decode_responses=True)
+    ledger_id = add_budget(session_factory, tenant_id="t1", user_id=7)
+    keys = BudgetLedger._keys(ledger_id)
+    client.delete(*keys)
+    try:
+        ledger = BudgetLedger(session_factory, redis_client=client, flush_interval=0.005,
+                              meta_ttl=60)
+        run_parallel(session_factory, ledger)
+        ledger.shutdown()
+        tokens, cost = expected_totals()
+        used_tokens, used_cost = db_usage(session_factory, ledger_id)
+        assert used_tokens == tokens
+        assert used_cost == pytest.approx(cost, abs=1e-6)
+        assert int(client.hget(keys[0], "tok")) == tokens
+        assert not client.exists(keys[1])
+    finally:
+        client.delete(*keys)
+
+
+def test_check_budget_served_from_cache(session_factory):
+    add_budget(session_factory, tenant_id="t1", max_tokens=10_000, used_tokens=7_000)
+    clock = Clock()
+    ledger = BudgetLedger(session_factory, redis_client=False, flush_interval=0, clock=clock)
+    db = session_factory()
+    controller = CostController(db, ledger=ledger)
+
+    assert controller.check_budget("t1", 3, "qwen-max")["reason"] == "within_budget"
+    assert controller.check_budget("missing", 3, "qwen-max")["reason"] == "no_budget_configured"
+    session_factory.statements.clear()
+    for _ in range(100):
+        controller.check_budget("t1", 3, "qwen-max")
+        controller.check_budget("missing", 3, "qwen-max")
+
+    # 记录用量同步刷新本地状态, 越过 80% 后立即降级, 仍不访问数据库
+    controller.record_usage("t1", 3, "qwen-max", 1_000, 500)
+    check = controller.check_budget("t1", 3, "qwen-max")
+    assert check["model"] == "qwen-plus" and check["downgraded"]
+    assert check["usage_ratio"] == 0.85
+    assert session_factory.statements == []
+
+    # 状态过期后重新读取实时用量; 元数据仍在缓存内
+    clock.t += 5
+    assert controller.check_budget("t1", 3, "qwen-max")["usage_ratio"] == 0.85
+    assert session_factory.statements == []
+    db.close()
+
+
+def test_usage_report_includes_unflushed_usage(session_factory):
+    ledger_id = add_budget(session_factory, tenant_id="t1", max_tokens=1_000, used_tokens=100)
+    ledger = BudgetLedger(session_factory, redis_client=False, flush_interval=0)
+    db = session_factory()
+    controller = CostController(db, ledger=ledger)
+    controller.record_usage("t1", None, "deepseek-chat", 200, 100)
+
+    report = controller.get_usage_report("t1")
+    assert report["total_used_tokens"] == 400
+    assert report["budgets"][0]["usage_ratio"] == 0.4
+    assert db_usage(session_factory, ledger_id)[0] == 100
+
+    assert ledger.flush() == 1
+    db.expire_all()
+    assert controller.get_usage_report("t1")["total_used_tokens"] == 400
+    assert db_usage(session_factory, ledger_id)[0] == 400
+    db.close()
+
+
+def test_failed_flush_keeps_deltas_for_retry(session_factory):
+    ledger_id = add_budget(session_factory, tenant_id="t1")
+    attempts = []
+
+    def flaky_factory():
+        attempts.append(1)
+        if len(attempts) == 1:
+            raise RuntimeError("db down")
+        return session_factory()
+
+    ledger = BudgetLedger(flaky_factory, redis_client=False, flush_interval=0)
+    db = session_factory()
+    controller = CostController(db, ledger=ledger)
+    controller.record_usage("t1", None, "deepseek-chat", 1_000, 0)
+    assert ledger.flush() == 0
+    assert ledger.stats["flush_errors"] == 1
+
+    controller.record_usage("t1", None, "deepseek-chat", 500, 0)
+    assert controller.check_budget("t1", None, "deepseek-chat")["remaining_tokens"] == 1_000_000 - 1_500
+    assert ledger.flush() == 1
+    assert db_usage(session_factory, ledger_id)[0] == 1_500
+    assert ledger.flush() == 0
+    db.close()
@@ -0,0 +1,135 @@
+"""
+Unit tests for core/knowledge/chunk_sync.py — chunk-level incremental re-embed
+
+Tests cover id/vector reuse for unchanged chunks, single-paragraph edits,
+removed chunks, reordering and backfill of legacy rows without content_hash.
+"""
+import json
+import os
+import sys
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+
+from core.knowledge.chunk_sync import chunk_content_hash, sync_document_chunks
+from core.knowledge.chunker import chunk_markdown
+from core.models import KnowledgeChunk, KnowledgeDocument
+
+
+class CountingEmbedder:
+    def __init__(self):
+        self.texts = []
+
+    def embed_many(self, texts, batch_size=32):
+        self.texts.extend(texts)
+        return [[float(len(t))] for t in texts]
+
+
+@pytest.fixture()
+def db():
+    engine = create_engine("sqlite:///:memory:")
+    KnowledgeDocument.metadata.create_all(
+        engine, tables=[KnowledgeDocument.__table__, KnowledgeChunk.__table__]
+    )
+    session = sessionmaker(bind=engine)()
+    yield session
+    session.close()
+    engine.dispose()
+
+
+@pytest.fixture()
+def doc(db):
+    d = KnowledgeDocument(
+        title="指南", raw_content="", scope="tenant", tenant_id="t1", status="draft", file_hash="h",
+    )
+    db.add(d)
+    db.commit()
+    return d
+
+
+def _guideline(n_sections=40, edited=None):
+    parts = []
+    for i in range(n_sections):
+        body = f"第 {i} 节建议。" + "保持规律作息。" * 30
+        if edited == i:
+            body = f"第 {i} 节建议 (修订)。" + "每晚固定时间上床。" * 30
+        parts.append(f"## 第 {i} 节\n\n{body}")
+    return "\n\n".join(parts)
+
+
+def _rows(db, doc):
+    return db.query(KnowledgeChunk).filter(
+        KnowledgeChunk.document_id == doc.id
+    ).order_by(KnowledgeChunk.chunk_index).all()
+
+
+def test_single_paragraph_edit_embeds_one_chunk(db, doc):
+    embedder = CountingEmbedder()
+    first = sync_document_chunks(db, doc.id, chunk_markdown(_guideline()), embedder)
+    db.commit()
+    assert first["added"] == first["embedded"] == len(embedder.texts) > 30
+    before = {r.chunk_index: (r.id, r.embedding_1024) for r in _rows(db, doc)}
+
+    embedder.texts.clear()
+    stats = sync_document_chunks(db, doc.id, chunk_markdown(_guideline(edited=7)), embedder)
+    db.commit()
+
+    assert stats["embedded"] == len(embedder.texts) <= 2
+    assert stats["removed"] == stats["added"]
+    after = _rows(db, doc)
+    assert [r.chunk_index for r in after] == list(range(len(after)))
+    unchanged = [r for r in after if (r.id, r.embedding_1024) == before.get(r.chunk_index)]
+    assert len(unchanged) == len(after) - stats["added"]
+
+
+def test_removed_and_reordered_chunks(db, doc):
+    chunks = [{"heading": h, "content": f"{h} 内容"} for h in ("A", "B", "C")]
+    sync_document_chunks(db, doc.id, chunks, CountingEmbedder())
+    db.commit()
+    ids = {r.heading: r.id for r in _rows(db, doc)}
+
+    embedder = CountingEmbedder()
+    stats = sync_document_chunks(db, doc.id, [chunks[2], chunks[0]], embedder)
+    db.commit()
+
+    rows = _rows(db, doc)
+    assert [(r.heading, r.chunk_index, r.id) for r in rows] == [("C", 0, ids["C"]), ("A", 1, ids["A"])]
+    assert stats == {"kept": 2, "added": 0, "removed": 1, "embedded": 0}
+    assert embedder.texts == []
+
+
+def test_legacy_rows_without_hash_are_reused(db, doc):
+    db.add(KnowledgeChunk(
+        document_id=doc.id, heading="A", content="旧内容", chunk_index=0,
+        embedding_1024=json.dumps([1.0]),
+    ))
+    db.commit()
+
+    embedder = CountingEmbedder()
+    stats = sync_document_chunks(db, doc.id, [{"heading": "A", "content": "旧内容"}], embedder)
+    db.commit()
+
+    row = _rows(db, doc)[0]
+    assert stats["kept"] == 1 and embedder.texts == []
+    assert row.content_hash == chunk_content_hash("A", "旧内容")
+    assert json.loads(row.embedding_1024) == [1.0]
+
+
+def test_kept_chunk_without_vector_is_embedded(db, doc):
+    chunks = [{"heading": "A", "content": "x"}]
+    sync_document_chunks(db, doc.id, chunks, embedder=None)
+    db.commit()
+
+    embedder = CountingEmbedder()
+    stats = sync_document_chunks(db, doc.id, chunks, embedder, chunk_fields={"doc_title": "新标题"})
+    db.commit()
+
+    row = _rows(db, doc)[0]
+    assert stats == {"kept": 1, "added": 0, "removed": 0, "embedded": 1}
+    assert row.embedding_1024 is not None
+    assert row.doc_title == "新标题"
@@ -0,0 +1,197 @@
+"""
+Unit tests for core/decision_trace.py — buffered DecisionTraceSink
+
+Tests cover bulk flushing, backpressure sampling, shutdown flush, retry backoff
+during a database outage, concurrent flushes, and read-back of unflushed traces.
+"""
+import os
+import sys
+import threading
+import time
+from unittest.mock import MagicMock
+
+import pytest
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+
+from core.decision_trace import DecisionTraceRecorder, DecisionTraceSink
+
+
+class RecordingSink(DecisionTraceSink):
+    """Captures bulk inserts instead of writing to the database."""
+
+    def __init__(self, start_thread=True, **kw):
+        super().__init__(**kw)
+        self.batches = []
+        self.inserted = threading.Event()
+        self._start_thread = start_thread
+
+    def _bulk_insert(self, rows):
+        self.batches.append(list(rows))
+        self.inserted.set()
+
+    def _ensure_started(self):
+        if self._start_thread:
+            super()._ensure_started()
+
+
+def _record(recorder, user_id=1, final="behavior_rx", tenant="t1"):
+    return recorder.record(
+        event_id="evt", user_id=user_id, tenant_id=tenant, session_id=None,
+        triggered_agents=[{"agent_id": final, "score": 0.9}],
+        policy_applied=[], rule_weights={}, conflict_resolution=None,
+        final_output=final,
+    )
+
+
+def _empty_db():
+    db = MagicMock()
+    chain = db.query.return_value.filter.return_value
+    chain.order_by.return_value.offset.return_value.limit.return_value.all.return_value = []
+    chain.order_by.return_value.limit.return_value.all.return_value = []
+    db.query.return_value.order_by.return_value.limit.return_value.all.return_value = []
+    return db
+
+
+class TestDecisionTraceSink:
+    def test_record_does_not_touch_request_session(self):
+        sink = RecordingSink(start_thread=False)
+        db = _empty_db()
+        trace_id = _record(DecisionTraceRecorder(db, sink=sink))
+
+        assert trace_id
+        db.add.assert_not_called()
+        db.commit.assert_not_called()
+        assert len(sink.pending()) == 1
+
+    def test_flush_in_batches(self):
+        sink = RecordingSink(start_thread=False, batch_size=10)
+        recorder = DecisionTraceRecorder(_empty_db(), sink=sink)
+        for i in range(25):
+            _record(recorder, user_id=i)
+
+        assert sink.flush() == 25
+        assert [len(b) for b in sink.batches] == [10, 10, 5]
+        assert sink.pending() == []
+
+    def test_background_flush_on_batch_size(self):
+        sink = RecordingSink(batch_size=5, flush_interval_ms=10_000)
+        recorder = DecisionTraceRecorder(_empty_db(), sink=sink)
+        for i in range(5):
+            _record(recorder, user_id=i)
+
+        assert sink.inserted.wait(2.0)
+        sink.shutdown()
+        assert sum(len(b) for b in sink.batches) == 5
+
+    def test_backpressure_samples_then_drops(self):
+        sink = RecordingSink(start_thread=False, capacity=100, high_watermark=0.5)
+        accepted = sum(sink.submit({"id": i}) for i in range(1000))
+
+        assert 50 <= accepted <= 100
+        assert sink.stats["sampled_out"] + sink.stats["dropped"] == 1000 - accepted
+        assert sink.stats["dropped"] > 0 or accepted < 100
+
+    def test_shutdown_flushes_remaining(self):
+        sink = RecordingSink(batch_size=1000, flush_interval_ms=60_000)
+        recorder = DecisionTraceRecorder(_empty_db(), sink=sink)
+        for i in range(7):
+            _record(recorder, user_id=i)
+
+        sink.shutdown()
+        assert sum(len(b) for b in sink.batches) == 7
+
+    def test_failed_insert_is_retried(self):
+        sink = RecordingSink(start_thread=False)
+        sink.submit({"id": "a"})
+        calls = []
+
+        def flaky(rows):
+            calls.append(len(rows))
+            if len(calls) == 1:
+                raise RuntimeError("db down")
+        sink._bulk_insert = flaky
+
+        assert sink.flush() == 0
+        assert len(sink.pending()) == 1
+        assert sink.flush() == 1
+        assert sink.stats["flush_errors"] == 1
+
+    def test_background_retry_backs_off_during_outage(self):
+        sink = RecordingSink(batch_size=1, flush_interval_ms=50, max_retry_interval_s=0.2)
+        attempts = []
+
+        def down(rows):
+            attempts.append(time.monotonic())
+            raise RuntimeError("db down")
+        sink._bulk_insert = down
+
+        for i in range(5):
+            sink.submit({"id": i})  # 队列始终满一批
+        time.sleep(0.6)
+        sink.shutdown(timeout=1.0)
+
+        # 退避 0.05 → 0.1 → 0.2 → 0.2 ...; 未退避时会空转数千次
+        assert 2 <= len(attempts) <= 8
+        gaps = [b - a for a, b in zip(attempts, attempts[1:-1])]
+        assert all(g >= 0.04 for g in gaps)
+        assert len(sink.pending()) == 5
+
+    def test_concurrent_flushes_keep_all_inflight_batches_visible(self):
+        sink = RecordingSink(start_thread=False, batch_size=2)
+        for i in range(4):
+            sink.submit({"id": i})
+        entered, release = threading.Barrier(3), threading.Event()
+        seen = []
+
+        def slow(rows):
+            entered.wait(1.0)
+            release.wait(1.0)
+        sink._bulk_insert = slow
+
+        workers = [threading.Thread(target=sink.flush) for _ in range(2)]
+        for w in workers:
+            w.start()
+        entered.wait(1.0)
+        seen.extend(r["id"] for r in sink.pending())
+        release.set()
+        for w in workers:
+            w.join(1.0)
+        assert sorted(seen) == [0, 1, 2, 3]
+        assert sink.pending() == []
+
+    def test_buffered_rows_use_server_clock(self):
+        sink = RecordingSink(start_thread=False)
+        _record(DecisionTraceRecorder(_empty_db(), sink=sink))
+        assert "created_at" not in sink.pending()[0]
+
+
+class TestUnflushedReadBack:
+    @pytest.fixture()
+    def recorder(self):
+        return DecisionTraceRecorder(_empty_db(), sink=RecordingSink(start_thread=False))
+
+    def test_query_by_user_includes_unflushed(self, recorder):
+        _record(recorder, user_id=42)
+        _record(recorder, user_id=42)
+        _record(recorder, user_id=7)
+
+        traces = recorder.query_by_user(42)
+        assert len(traces) == 2
+        assert all(t["user_id"] == 42 for t in traces)
+
+    def test_query_by_agent_includes_unflushed(self, recorder):
+        _record(recorder, final="sleep_expert")
+        _record(recorder, final="behavior_rx", tenant="t2")
+
+        stats = recorder.query_by_agent("sleep_expert", tenant_id="t1")
+        assert stats["total_decisions"] == 1
+        assert stats["selected_as_primary"] == 1
+
+    def test_explainable_trace_from_buffer(self, recorder):
+        trace_id = _record(recorder)
+        result = recorder.get_explainable_trace(trace_id)
+        assert result["id"] == trace_id
+        assert result["explanation"]["details"][-1] == "Final: behavior_rx"
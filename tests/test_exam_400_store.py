@@ -0,0 +1,180 @@
+"""
+Unit tests for core/exam_400_store.py — shared, durable 400-point exam state
+
+Tests cover state round-tripping through the exam_400_candidates table, a
+restarted engine (fresh store, empty cache) seeing the same progress,
+version-checked writes replaying on a stale cache, read-through caching, and
+several OS processes submitting module scores for the same candidate
+concurrently without losing updates, and persistent store I/O running in
+worker threads rather than on the event loop.
+"""
+import asyncio
+import multiprocessing
+import os
+import sys
+import threading
+
+import pytest
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+
+from sqlalchemy import create_engine, event, text
+from sqlalchemy.orm import sessionmaker
+
+from core.exam_400_engine import (
+    CertificationResult, CoachTrack, Exam400Engine, ExamModule, state_from_dict, state_to_dict,
+)
+from core.exam_400_store import CandidateStateStore, Exam400Candidate
+
+
+def make_factory(path):
+    engine = create_engine(f"sqlite:///{path}", connect_args={"timeout": 30})
+
+    @event.listens_for(engine, "connect")
+    def _setup(dbapi_conn, _):
+        # server_default now() 在 SQLite 中没有对应函数; WAL 允许读写并发
+        dbapi_conn.create_function("now", 0, lambda: "2026-01-01 00:00:00")
+        dbapi_conn.execute("PRAGMA journal_mode=WAL")
+
+    Exam400Candidate.__table__.create(engine, checkfirst=True)
+    return sessionmaker(bind=engine)
+
+
+@pytest.fixture()
+def db_path(tmp_path):
+    path = tmp_path / "exam400.db"
+    make_factory(path)
+    return path
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+def test_state_round_trip():
+    engine = Exam400Engine()
+    run(engine.enroll(1, CoachTrack.B_PAID))
+    run(engine.submit_module_score(1, ExamModule.THEORY, {"M1": 30, "M2": 25, "M3": 20, "M4": 30}))
+    state = engine._load(1)
+    assert state_from_dict(state_to_dict(state)) == state
+
+
+def test_restart_sees_persisted_progress(db_path):
+    engine = Exam400Engine(store=CandidateStateStore(make_factory(db_path)))
+    run(engine.enroll(7, CoachTrack.A_ORGANIC))
+    run(engine.submit_module_score(7, ExamModule.THEORY, {"M1": 30, "M2": 25, "M3": 20, "M4": 30}))
+    run(engine.submit_module_score(7, ExamModule.SKILLS, {"SK1": 12, "SK2": 4, "SK3": 0.9, "SK4": 1, "SK5": 1}))
+    before = engine.get_exam_status(7)
+
+    restarted = Exam400Engine(store=CandidateStateStore(make_factory(db_path)))
+    assert restarted.get_exam_status(7) == before
+    assert restarted.get_module_detail(7, ExamModule.THEORY)["status"] == "passed"
+    assert run(restarted.enroll(7, CoachTrack.A_ORGANIC)) == before  # 已注册, 返回现有进度
+
+
+def test_stale_cache_write_is_replayed(db_path):
+    factory = make_factory(db_path)
+    a = Exam400Engine(store=CandidateStateStore(factory, cache_ttl=60))
+    b = Exam400Engine(store=CandidateStateStore(factory, cache_ttl=60))
+    run(a.enroll(3, CoachTrack.B_PAID))
+    assert b.get_exam_status(3)["training_growth_points"] == 0  # b 缓存 version 1
+
+    run(a.record_training_credits(3, 5, "M1"))
+    result = run(b.record_training_credits(3, 7, "M2"))  # 基于过期缓存, 版本冲突后重放
+    assert result["total_training_points"] == 12
+    assert b._store.stats["conflicts"] == 1
+
+    fresh = Exam400Engine(store=CandidateStateStore(factory))
+    assert fresh.get_exam_status(3)["training_growth_points"] == 12
+    db = factory()
+    assert db.execute(text("SELECT version FROM exam_400_candidates WHERE user_id = 3")).scalar() == 3
+    db.close()
+
+
+def test_reads_are_cached_within_ttl(db_path):
+    clock = [0.0]
+    store = CandidateStateStore(make_factory(db_path), cache_ttl=1.0, clock=lambda: clock[0])
+    engine = Exam400Engine(store=store)
+    run(engine.enroll(5, CoachTrack.E_INTENT))
+    loads = store.stats["loads"]
+    for _ in range(5):
+        engine.get_exam_status(5)
+    assert store.stats["hits"] == 5 and store.stats["loads"] == loads
+    clock[0] = 2.0
+    engine.get_exam_status(5)  # 过期后只核对 version
+    assert store.stats["revalidated"] == 1 and store.stats["loads"] == loads
+
+
+def test_concurrent_enroll_keeps_first(db_path):
+    factory = make_factory(db_path)
+    a = Exam400Engine(store=CandidateStateStore(factory))
+    b = Exam400Engine(store=CandidateStateStore(factory))
+    first = run(a.enroll(9, CoachTrack.B_PAID))
+    assert first["enrolled"] is True
+    assert b._store.create(9, state_to_dict(a._load(9))) is False
+    assert run(b.enroll(9, CoachTrack.A_ORGANIC))["coach_track"] == "paid"
+
+
+def _worker(path, user_id, rounds, barrier, results):
+    engine = Exam400Engine(store=CandidateStateStore(make_factory(path), cache_ttl=60))
+    barrier.wait()
+    errors = 0
+    for i in range(rounds):
+        r1 = run(engine.submit_module_score(user_id, ExamModule.SKILLS, {"SK1": i}))
+        r2 = run(engine.record_training_credits(user_id, 1, "M1"))
+        errors += ("error" in r1) + ("error" in r2)
+    results.put((engine._store.stats["conflicts"], errors))
+
+
+def test_multi_process_submissions_are_consistent(db_path):
+    workers, rounds = 4, 15
+    engine = Exam400Engine(store=CandidateStateStore(make_factory(db_path)))
+    run(engine.enroll(42, CoachTrack.B_PAID))
+
+    ctx = multiprocessing.get_context("spawn")
+    barrier = ctx.Barrier(workers)
+    results = ctx.Queue()
+    procs = [ctx.Process(target=_worker, args=(str(db_path), 42, rounds, barrier, results))
+             for _ in range(workers)]
+    for p in procs:
+        p.start()
+    for p in procs:
+        p.join(120)
+    assert all(p.exitcode == 0 for p in procs)
+    conflicts, errors = zip(*[results.get(timeout=5) for _ in procs])
+    assert sum(errors) == 0
+
+    status = Exam400Engine(store=CandidateStateStore(make_factory(db_path))).get_exam_status(42)
+    assert status["training_growth_points"] == workers * rounds
+    assert status["modules"]["skills"]["attempt_count"] == workers * rounds
+    assert status["certification_result"] == CertificationResult.IN_PROGRESS.value
+    db = make_factory(db_path)()
+    version = db.execute(text("SELECT version FROM exam_400_candidates WHERE user_id = 42")).scalar()
+    db.close()
+    assert version == 1 + 2 * workers * rounds
+    assert sum(conflicts) > 0  # 各进程缓存过期, 确实走了冲突重放
+
+
+def test_persistent_store_io_stays_off_the_event_loop(db_path):
+    store = CandidateStateStore(make_factory(db_path))
+    threads = []
+    for name in ("get", "create", "update"):
+        original = getattr(store, name)
+
+        def recorded(*args, _original=original, **kwargs):
+            threads.append(threading.get_ident())
+            return _original(*args, **kwargs)
+        setattr(store, name, recorded)
+
+    engine = Exam400Engine(store=store)
+
+    async def scenario():
+        loop_thread = threading.get_ident()
+        await engine.enroll(11, CoachTrack.B_PAID)
+        await engine.record_training_credits(11, 2, "M1")
+        return loop_thread
+
+    loop_thread = run(scenario())
+    assert threads and loop_thread not in threads
@@ -0,0 +1,98 @@
+"""
+Unit tests for gateway/sanitizer.py — compiled sanitization plans
+
+Tests cover byte-identical output against the pre-compilation implementation
+(kept in scripts/bench_sanitizer.py) on a generated coach bundle and on texts
+where sequential regex replacement interacts, the per-(viewer_role, key)
+policy cache, and the schema fast path falling back to the generic path when
+the data does not match the response model.
+"""
+import json
+import os
+import sys
+from typing import List
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+for path in (PROJECT_ROOT, os.path.join(PROJECT_ROOT, "scripts")):
+    if path not in sys.path:
+        sys.path.insert(0, path)
+
+from pydantic import BaseModel
+
+from bench_sanitizer import TEXTS, LegacySanitizer, StudentBundle, make_bundle
+from gateway.sanitizer import (
+    DataSanitizer, compile_schema_plan, resolve_field_policy, sanitize_for_coach,
+)
+
+
+def both(data, schema=None):
+    legacy, new = LegacySanitizer("coach"), DataSanitizer("coach", schema=schema)
+    out = []
+    for s in (legacy, new):
+        result = s.sanitize(data)
+        out.append((json.dumps(result, ensure_ascii=False).encode(), sorted(s.get_redacted_fields())))
+    return out
+
+
+def test_bundle_output_is_byte_identical():
+    bundle = make_bundle(0.3, seed=5)
+    legacy, compiled = both(bundle)
+    assert legacy == compiled
+    assert both(bundle, schema=StudentBundle)[1] == legacy
+    assert b"13912345678" not in compiled[0] and b"password_hash" not in compiled[0]
+
+
+def test_interacting_patterns_match_sequential_replacement():
+    # 单遍交替式会把整段当作邮箱; 逐条替换先命中手机号, 邮箱模式随后不再命中
+    texts = TEXTS + [
+        "a13812345678@qq.com",
+        "密码:13812345678",
+        "联系 13812345678 或 110101199001011234 或 x@y.cn, ip 8.8.8.8",
+        "普通文本没有任何敏感信息",
+        "",
+    ]
+    for text in texts:
+        for key in ("content", "coach_notes", "reply_text", "title"):
+            legacy, compiled = both({key: text, "items": [{"message": text}, text]})
+            assert legacy == compiled, (key, text)
+    assert DataSanitizer().sanitize("a13812345678@qq.com", "message") == "a[手机号已脱敏]@qq.com"
+
+
+def test_field_policy_is_cached():
+    resolve_field_policy.cache_clear()
+    sanitize_for_coach({"students": [{"Email": "a@b.cn", "content": "hi", "score": 1}] * 50})
+    info = resolve_field_policy.cache_info()
+    assert info.misses == 4
+    assert info.hits > 100
+    assert resolve_field_policy("coach", "Email").kind == "mask"
+    assert resolve_field_policy("coach", "therapy_notes_raw").scan_text is True
+
+
+class Inner(BaseModel):
+    label: str
+    value: float
+
+
+class Outer(BaseModel):
+    name: str
+    count: int
+    content: str
+    inner: List[Inner]
+
+
+def test_schema_plan_and_fallback():
+    plan = compile_schema_plan(Outer)
+    assert plan.safe_keys == frozenset({"name", "count", "inner"})
+    assert plan.nested["inner"].safe_keys == frozenset({"label", "value"})
+
+    # 不符合模型的数据: 安全字段里出现 dict / 额外的敏感字段, 仍按通用规则脱敏
+    data = {
+        "name": {"token": "t", "phone": "13812345678"},
+        "count": 3,
+        "content": "电话13812345678",
+        "inner": [{"label": "x", "value": 1.0, "password": "p"}, "raw"],
+        "email": "z@example.com",
+    }
+    legacy, fast = both(data, schema=Outer)
+    assert legacy == fast
+    assert json.loads(fast[0])["name"] == {"phone": "138****5678"}
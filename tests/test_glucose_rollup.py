@@ -0,0 +1,162 @@
+"""
+Unit tests for core/glucose_rollup.py — daily/hourly glucose aggregates
+
+Tests cover incremental UPSERT maintenance matching a NumPy backfill, CGM
+metrics merged from buckets matching metrics computed on raw readings,
+MAGE on known excursions, lazy MAGE refresh, time-zone normalisation on
+ingest and LTTB downsampling.
+"""
+import os
+import sys
+from datetime import date, datetime, timedelta, timezone
+
+import numpy as np
+import pytest
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from core.glucose_rollup import (
+    DAY, HOUR, backfill, glucose_summary, load_rollups, lttb, mage, record_readings,
+    rollup_on_ingest, summarize, window_summary,
+)
+from core.models import GlucoseReading, GlucoseRollup
+
+START = datetime(2026, 3, 1)
+
+
+@pytest.fixture()
+def db():
+    engine = create_engine("sqlite://")
+    GlucoseReading.__table__.create(engine)
+    GlucoseRollup.__table__.create(engine)
+    session = sessionmaker(bind=engine)()
+    yield session
+    session.close()
+
+
+def cgm_series(days=3, seed=7):
+    """5 分钟一条, 日内正弦波动 + 噪声, 覆盖低/目标/高各区间"""
+    rng = np.random.default_rng(seed)
+    n = days * 288
+    t = np.arange(n)
+    values = 7.5 + 4.5 * np.sin(t / 288 * 2 * np.pi * 3) + rng.normal(0, 0.6, n)
+    return [(START + timedelta(minutes=5 * int(i)), round(float(v), 1)) for i, v in zip(t, values)]
+
+
+def ingest(db, user_id, readings, batch=50):
+    for i in range(0, len(readings), batch):
+        chunk = readings[i:i + batch]
+        db.add_all(GlucoseReading(user_id=user_id, value=v, recorded_at=ts) for ts, v in chunk)
+        db.flush()
+        record_readings(db, user_id, chunk)
+    db.commit()
+
+
+def snapshot(db):
+    fields = ("granularity", "bucket_start", "count", "min_value", "max_value",
+              "n_very_low", "n_low", "n_in_range", "n_high", "n_very_high", "first_at", "last_at")
+    rows = db.query(GlucoseRollup).order_by(GlucoseRollup.granularity, GlucoseRollup.bucket_start).all()
+    return [tuple(getattr(r, f) for f in fields) + (round(r.sum_value, 6), round(r.sum_sq, 4)) for r in rows]
+
+
+def test_incremental_upsert_matches_backfill(db):
+    ingest(db, 1, cgm_series())
+    incremental = snapshot(db)
+    assert len([r for r in incremental if r[0] == DAY]) == 3
+    assert len([r for r in incremental if r[0] == HOUR]) == 72
+
+    totals = backfill(db, user_id=1)
+    db.commit()
+    assert totals == {"users": 1, "readings": 864, "buckets": 75}
+    assert snapshot(db) == incremental
+
+
+def test_bucket_metrics_match_raw_readings(db):
+    readings = cgm_series()
+    ingest(db, 1, readings)
+    values = np.array([v for _, v in readings])
+
+    s = summarize(load_rollups(db, 1, START, START + timedelta(days=3), DAY))
+    assert s["readings_count"] == values.size
+    assert s["mean"] == round(values.mean(), 2)
+    assert s["sd"] == pytest.approx(values.std(), abs=0.01)
+    assert s["cv"] == pytest.approx(values.std() / values.mean() * 100, abs=0.1)
+    assert s["tir"] == round(((values >= 3.9) & (values <= 10.0)).mean() * 100, 1)
+    assert s["tbr"] == pytest.approx(s["tbr_level1"] + s["tbr_level2"], abs=0.11)
+    assert s["tar"] == pytest.approx(s["tar_level1"] + s["tar_level2"], abs=0.11)
+    assert s["tar_level2"] == round((values > 13.9).mean() * 100, 1)
+    assert s["gmi"] == round(3.31 + 0.02392 * values.mean() * 18.0182, 2)
+
+    hourly = summarize(load_rollups(db, 1, START, START + timedelta(days=3), HOUR))
+    assert {k: hourly[k] for k in ("readings_count", "mean", "tir")} == \
+        {k: s[k] for k in ("readings_count", "mean", "tir")}
+
+
+def test_mage_counts_only_excursions_above_one_sd():
+    wave = [5, 8, 11, 8, 5, 8, 11, 8, 5]
+    assert mage(wave) == 6.0
+    # 幅度小于 1 SD 的小抖动不打断大波动
+    assert mage([5, 8, 7.8, 11, 8, 8.2, 5, 8, 11]) == 6.0
+    assert mage([6, 6, 6, 6]) is None
+    assert mage([5, 9]) is None
+
+
+def test_summary_refreshes_stale_mage_and_persists_it(db):
+    ingest(db, 1, cgm_series())
+    days = load_rollups(db, 1, START, START + timedelta(days=3))
+    assert all(r.mage is None for r in days)
+
+    result = glucose_summary(db, 1, date(2026, 3, 1), date(2026, 3, 3))
+    db.commit()
+    assert result["period"]["days_with_data"] == 3
+    assert [d["date"] for d in result["daily"]] == ["2026-03-01", "2026-03-02", "2026-03-03"]
+    assert all(r.mage is not None and r.mage > 0 for r in load_rollups(db, 1, START, START + timedelta(days=3)))
+    assert result["summary"]["mage"] is not None
+
+    # 新读数写入后当天 MAGE 失效, 其余天保留
+    ingest(db, 1, [(START + timedelta(days=2, hours=23, minutes=59), 12.0)])
+    stale = [r.bucket_start.day for r in load_rollups(db, 1, START, START + timedelta(days=3)) if r.mage is None]
+    assert stale == [3]
+
+
+def test_timezone_aware_readings_bucket_in_utc(db):
+    cst = timezone(timedelta(hours=8))
+    record_readings(db, 1, [(datetime(2026, 3, 2, 7, 30, tzinfo=cst), 6.0)])
+    record_readings(db, 1, [(datetime(2026, 3, 1, 23, 10), 8.0)])
+    db.commit()
+    day = load_rollups(db, 1, START, START + timedelta(days=2))
+    assert [(r.bucket_start, r.count) for r in day] == [(START, 2)]
+    hour = load_rollups(db, 1, START, START + timedelta(days=2), HOUR)
+    assert [(r.bucket_start.hour, r.count) for r in hour] == [(23, 2)]
+    assert (hour[0].min_value, hour[0].max_value) == (6.0, 8.0)
+
+
+def test_window_summary_and_ingest_savepoint(db):
+    rollup_on_ingest(db, 2, [(START + timedelta(minutes=m), 5.0 + m / 100) for m in range(0, 120, 5)])
+    db.commit()
+    s = window_summary(db, 2, START + timedelta(minutes=30), START + timedelta(hours=3))
+    assert s["readings_count"] == 24 and s["in_range_count"] == 24
+
+    GlucoseRollup.__table__.drop(db.get_bind())
+    db.add(GlucoseReading(user_id=2, value=6.0, recorded_at=START))
+    db.flush()
+    rollup_on_ingest(db, 2, [(START, 6.0)])  # 聚合失败不影响读数入库
+    db.commit()
+    assert db.query(GlucoseReading).count() == 1
+
+
+def test_lttb_keeps_endpoints_and_spikes():
+    x = np.arange(1000, dtype=float)
+    y = np.sin(x / 50)
+    y[500] = 10
+    keep = lttb(x, y, 50)
+    assert len(keep) == 50
+    assert keep[0] == 0 and keep[-1] == 999
+    assert np.all(np.diff(keep) > 0)
+    assert 500 in keep
+    assert list(lttb(x[:10], y[:10], 50)) == list(range(10))
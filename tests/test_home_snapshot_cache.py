@@ -0,0 +1,208 @@
+"""
+Unit tests for core/home_snapshot_cache.py and the /home section aggregator
+
+Tests cover fresh/stale/miss states, background revalidation, deduplicated
+loads, invalidation during an in-flight load and from worker threads, uncacheable (degraded)
+snapshots and concurrent section fan-out in api/home_api.build_home.
+"""
+import asyncio
+import os
+import sys
+import threading
+
+import pytest
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+
+from core.home_snapshot_cache import HomeSnapshotCache
+
+pytestmark = pytest.mark.asyncio
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class Loader:
+    def __init__(self, cacheable=True, delay=0.0):
+        self.calls = 0
+        self.cacheable = cacheable
+        self.delay = delay
+
+    async def __call__(self):
+        self.calls += 1
+        if self.delay:
+            await asyncio.sleep(self.delay)
+        return {"version": self.calls}, self.cacheable
+
+
+KEY = ("grower", 7)
+
+
+@pytest.fixture()
+def clock():
+    return Clock()
+
+
+@pytest.fixture()
+def cache(clock):
+    return HomeSnapshotCache(fresh_ttl=15, stale_ttl=60, clock=clock)
+
+
+async def test_fresh_then_stale_revalidates_in_background(cache, clock):
+    loader = Loader()
+    assert await cache.get(KEY, loader) == ({"version": 1}, "miss")
+    assert await cache.get(KEY, loader) == ({"version": 1}, "fresh")
+
+    clock.now += 20
+    data, state = await cache.get(KEY, loader)
+    assert (data, state) == ({"version": 1}, "stale")
+    await asyncio.sleep(0)
+    assert await cache.get(KEY, loader) == ({"version": 2}, "fresh")
+    assert loader.calls == 2
+
+    clock.now += 61
+    assert await cache.get(KEY, loader) == ({"version": 3}, "miss")
+
+
+async def test_concurrent_misses_share_one_load(cache):
+    loader = Loader(delay=0.01)
+    results = await asyncio.gather(*(cache.get(KEY, loader) for _ in range(10)))
+    assert loader.calls == 1
+    assert {r[0]["version"] for r in results} == {1}
+
+
+async def test_stale_not_served_when_background_refresh_disallowed(cache, clock):
+    loader = Loader()
+    await cache.get(KEY, loader)
+    clock.now += 20
+    assert await cache.get(KEY, loader, allow_stale=False) == ({"version": 2}, "miss")
+
+
+async def test_invalidate_user_drops_snapshot_and_inflight_result(cache):
+    await cache.get(KEY, Loader())
+    await cache.get(("coach", 8), Loader())
+    cache.invalidate_user(7)
+    assert cache.stats()["entries"] == 1
+
+    slow = Loader(delay=0.01)
+    pending = asyncio.ensure_future(cache.get(KEY, slow))
+    await asyncio.sleep(0)
+    cache.invalidate_user(7)  # event lands while the load is reading old rows
+    data, _ = await pending
+    assert data == {"version": 1}
+
+    fresh = Loader()
+    assert await cache.get(KEY, fresh) == ({"version": 1}, "miss")
+    assert fresh.calls == 1
+
+
+async def test_invalidation_from_worker_threads_while_serving(cache):
+    """同步路由在线程池中失效, 与事件循环读写并发"""
+    stop = threading.Event()
+
+    def invalidate_loop():
+        while not stop.is_set():
+            cache.invalidate_user(7)
+
+    workers = [threading.Thread(target=invalidate_loop) for _ in range(4)]
+    for t in workers:
+        t.start()
+    try:
+        for i in range(300):
+            await cache.get(("grower", 7 if i % 2 else 100 + i), Loader(delay=0.0001 if i % 5 == 0 else 0.0))
+    finally:
+        stop.set()
+        for t in workers:
+            t.join()
+    cache.invalidate_user(7)
+    stats = cache.stats()
+    assert stats["inflight"] == 0 and stats["invalidations"] > 0
+    assert all(key[1] != 7 for key in cache._entries)
+
+
+async def test_invalidate_profile_for_shared_snapshot(cache):
+    await cache.get(("admin", None), Loader())
+    cache.invalidate_user(1)
+    assert cache.stats()["entries"] == 1
+    cache.invalidate_profile("admin")
+    assert cache.stats()["entries"] == 0
+
+
+async def test_degraded_snapshot_is_not_cached(cache):
+    loader = Loader(cacheable=False)
+    await cache.get(KEY, loader)
+    await cache.get(KEY, loader)
+    assert loader.calls == 2
+
+
+async def test_failed_background_refresh_keeps_stale_snapshot(cache, clock):
+    await cache.get(KEY, Loader())
+    clock.now += 20
+
+    async def broken():
+        raise RuntimeError("db down")
+
+    assert (await cache.get(KEY, broken))[1] == "stale"
+    await asyncio.sleep(0)
+    assert (await cache.get(KEY, broken))[0] == {"version": 1}
+    assert cache.stats()["refresh_errors"] == 1
+
+
+async def test_max_entries_evicts_least_recent(clock):
+    cache = HomeSnapshotCache(fresh_ttl=15, stale_ttl=60, max_entries=2, clock=clock)
+    for uid in (1, 2):
+        await cache.get(("grower", uid), Loader())
+    await cache.get(("grower", 1), Loader())
+    await cache.get(("grower", 3), Loader())
+    assert (await cache.get(("grower", 1), Loader()))[1] == "fresh"
+    assert (await cache.get(("grower", 2), Loader()))[1] == "miss"
+
+
+async def test_build_home_fans_out_on_separate_sessions(monkeypatch):
+    from api import home_api
+
+    active = {"now": 0, "peak": 0}
+    sessions = []
+
+    class FakeSession:
+        async def __aenter__(self):
+            sessions.append(self)
+            return self
+
+        async def __aexit__(self, *exc):
+            return False
+
+    async def section(user_id, db):
+        active["now"] += 1
+        active["peak"] = max(active["peak"], active["now"])
+        await asyncio.sleep(0.01)
+        active["now"] -= 1
+        return {"uid": user_id}
+
+    async def streak(user_id, db):
+        return 5
+
+    async def broken(user_id, db):
+        raise RuntimeError("relation does not exist")
+
+    monkeypatch.setattr(home_api.database, "AsyncSessionLocal", FakeSession)
+    monkeypatch.setitem(home_api._HOME_SECTIONS, "test", [
+        ("today", section, {}),
+        ("today.streak_days", streak, 0),
+        ("coach_tip", section, {}),
+        ("influence", broken, {"total": 0}),
+    ])
+
+    data, ok = await home_api.build_home("test", 42)
+
+    assert data == {"today": {"uid": 42, "streak_days": 5}, "coach_tip": {"uid": 42}, "influence": {"total": 0}}
+    assert ok is False
+    assert active["peak"] == 2
+    assert len(sessions) == 4
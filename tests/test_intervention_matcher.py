@@ -0,0 +1,181 @@
+"""
+Unit tests for core/intervention_matcher.py — compiled InterventionMatcher lookups
+
+Tests cover parity with the previous scan-per-call matcher for every
+domain × stage × SPI band combination over the shipped libraries and over a
+synthetic library with edge cases (missing stage strategy, advice without
+difficulty, custom difficulty level, unnamed category), returned plans not
+aliasing the compiled tables, shared compilation across instances, and
+hot reload when a library file changes.
+"""
+import json
+import os
+import sys
+
+import pytest
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+
+from loguru import logger
+
+from core import intervention_matcher as im
+from core.intervention_matcher import DOMAIN_TO_CATEGORY, STAGE_TO_STRATEGY_KEY, InterventionMatcher
+
+STAGES = sorted(STAGE_TO_STRATEGY_KEY) + ["S9"]
+SPI_SCORES = [float("nan"), -5, 0, 29.9, 30, 49.99, 50, 69, 70, 100]
+DOMAINS = sorted(DOMAIN_TO_CATEGORY) + ["unknown"]
+
+
+def legacy_match(rx_library, strategy_library, current_stage, spi_score, target_domains):
+    """重构前的逐次扫描实现 (逐字保留逻辑), 返回 plan_to_dict 的 domain_interventions"""
+    rx_by_category = {}
+    for rx in rx_library.get("prescriptions", []):
+        rx_by_category.setdefault(rx.get("category", ""), []).append(rx)
+
+    spi_ranges = (strategy_library.get("prescription_framework", {})
+                  .get("smart_goal_rules", {}).get("spi_ranges", {}))
+    if spi_score >= 70:
+        cfg = spi_ranges.get(">=70", {})
+        level, mult = cfg.get("level", "challenging"), cfg.get("intensity_multiplier", 1.0)
+    elif spi_score >= 50:
+        cfg = spi_ranges.get("50-69", {})
+        level, mult = cfg.get("level", "moderate"), cfg.get("intensity_multiplier", 0.7)
+    elif spi_score >= 30:
+        cfg = spi_ranges.get("30-49", {})
+        level, mult = cfg.get("level", "easy"), cfg.get("intensity_multiplier", 0.4)
+    else:
+        cfg = spi_ranges.get("<30", {})
+        level, mult = cfg.get("level", "minimal"), cfg.get("intensity_multiplier", 0.2)
+
+    strategy_key = STAGE_TO_STRATEGY_KEY.get(current_stage, "intention")
+    out = []
+    for domain in target_domains:
+        category = DOMAIN_TO_CATEGORY.get(domain)
+        if not category or not rx_by_category.get(category):
+            continue
+        rx = rx_by_category[category][0]
+        stage_strategy = rx.get("stage_strategy", {}).get(strategy_key, {})
+        if not stage_strategy:
+            stage_strategy = rx.get("stage_strategy", {}).get("intention", {})
+        content = rx.get("content", {})
+        cap = {"challenging": 5, "moderate": 3, "easy": 2, "minimal": 1}.get(level, 3)
+        filtered = [a for a in content.get("constructive_advice", []) if a.get("difficulty", 3) <= cap]
+        out.append({
+            "domain": domain,
+            "domain_name": rx_library.get("categories", {}).get(category, domain),
+            "rx_id": rx.get("rx_id", ""),
+            "rx_name": rx.get("name", ""),
+            "stage_strategy": strategy_key,
+            "tone": stage_strategy.get("tone", "gentle_accepting"),
+            "core_goal": stage_strategy.get("core_goal", ""),
+            "scripts": {
+                "opening": stage_strategy.get("script_opening", ""),
+                "motivation": stage_strategy.get("script_motivation", ""),
+                "closing": stage_strategy.get("script_closing", ""),
+            },
+            "do_list": stage_strategy.get("do", []),
+            "dont_list": stage_strategy.get("dont", []),
+            "advice": [{"id": a.get("advice_id"), "title": a.get("title"), "description": a.get("description"),
+                        "difficulty": a.get("difficulty"), "priority": a.get("priority")} for a in filtered[:5]],
+            "knowledge": [{"id": k.get("knowledge_id"), "title": k.get("title"), "content": k.get("content")}
+                          for k in content.get("knowledge_points", [])[:3]],
+            "difficulty_level": level,
+            "intensity_multiplier": mult,
+        })
+    return out
+
+
+@pytest.fixture(autouse=True)
+def quiet_logs():
+    logger.disable("core.intervention_matcher")
+    yield
+    logger.enable("core.intervention_matcher")
+
+
+def assert_parity(matcher, rx_library, strategy_library):
+    for stage in STAGES:
+        for score in SPI_SCORES:
+            plan = matcher.plan_to_dict(matcher.match(1, stage, "L2", "T", score, DOMAINS))
+            expected = legacy_match(rx_library, strategy_library, stage, score, DOMAINS)
+            assert plan["domain_interventions"] == expected, (stage, score)
+
+
+def test_parity_with_shipped_libraries():
+    matcher = InterventionMatcher()
+    assert matcher.library.entries
+    assert_parity(matcher, matcher.rx_library, matcher.strategy_library)
+
+
+def _advice(i, difficulty):
+    item = {"advice_id": f"A{i}", "title": f"t{i}", "description": "d", "priority": i % 3}
+    if difficulty is not None:
+        item["difficulty"] = difficulty
+    return item
+
+
+SYNTHETIC_RX = {
+    "categories": {"sleep_regulation": "睡眠调节", "exercise_habit": ""},
+    "prescriptions": [
+        {
+            "rx_id": "RX-S-1", "name": "睡眠", "category": "sleep_regulation",
+            "stage_strategy": {"intention": {"tone": "gentle", "do": ["a"], "dont": ["b"]},
+                               "action": {"core_goal": "g", "script_opening": "hi"}},
+            "content": {"constructive_advice": [_advice(i, d) for i, d in enumerate([5, 1, None, 2, 4, 3, 1, 2, 1])],
+                        "knowledge_points": [{"knowledge_id": f"K{i}", "title": "k"} for i in range(5)]},
+        },
+        {"rx_id": "RX-S-2", "name": "第二个睡眠处方", "category": "sleep_regulation"},
+        {"rx_id": "RX-E-1", "name": "运动", "category": "exercise_habit",
+         "stage_strategy": {"preparation": {"tone": "firm"}}, "content": {}},
+        {"rx_id": "RX-N-1", "name": "营养", "category": "nutrition_management"},
+    ],
+}
+SYNTHETIC_STRATEGY = {"prescription_framework": {"smart_goal_rules": {"spi_ranges": {
+    ">=70": {"level": "stretch", "intensity_multiplier": 1.2},
+    "30-49": {"intensity_multiplier": 0.5},
+}}}}
+
+
+def write_libraries(tmp_path, rx, strategy):
+    paths = []
+    for name, data in [("rx.json", rx), ("strategy.json", strategy), ("spi.json", {})]:
+        path = tmp_path / name
+        path.write_text(json.dumps(data, ensure_ascii=False), encoding="utf-8")
+        paths.append(str(path))
+    return paths
+
+
+def test_parity_with_edge_case_library(tmp_path):
+    rx_path, strategy_path, spi_path = write_libraries(tmp_path, SYNTHETIC_RX, SYNTHETIC_STRATEGY)
+    matcher = InterventionMatcher(rx_path, strategy_path, spi_path)
+    assert_parity(matcher, SYNTHETIC_RX, SYNTHETIC_STRATEGY)
+    assert matcher._get_difficulty(80) == ("stretch", 1.2)
+
+
+def test_plans_do_not_alias_compiled_entries(tmp_path):
+    matcher = InterventionMatcher(*write_libraries(tmp_path, SYNTHETIC_RX, SYNTHETIC_STRATEGY))
+    first = matcher.match(1, "S0", "L1", "T", 10, ["sleep"]).domain_interventions[0]
+    first.advice[0]["title"] = "changed"
+    first.do_list.append("x")
+    second = matcher.match(1, "S0", "L1", "T", 10, ["sleep"]).domain_interventions[0]
+    assert second.advice[0]["title"] == "t1" and second.do_list == ["a"]
+
+
+def test_instances_share_compilation_and_hot_reload(tmp_path):
+    paths = write_libraries(tmp_path, SYNTHETIC_RX, SYNTHETIC_STRATEGY)
+    a = InterventionMatcher(*paths, reload_interval=0)
+    b = InterventionMatcher(*paths, reload_interval=3600)
+    assert a.library is b.library
+
+    changed = json.loads(json.dumps(SYNTHETIC_RX))
+    changed["prescriptions"][0]["name"] = "睡眠 v2"
+    with open(paths[0], "w", encoding="utf-8") as f:
+        json.dump(changed, f, ensure_ascii=False)
+    st = os.stat(paths[0])
+    os.utime(paths[0], ns=(st.st_atime_ns, st.st_mtime_ns + 10**9))
+
+    assert a.match(1, "S4", "L3", "T", 60, ["sleep"]).domain_interventions[0].rx_name == "睡眠 v2"
+    # 检查间隔内沿用已加载的编译结果
+    assert b.match(1, "S4", "L3", "T", 60, ["sleep"]).domain_interventions[0].rx_name == "睡眠"
+    assert im.load_compiled_library(tuple(paths)) is a.library
@@ -0,0 +1,192 @@
+"""
+Unit tests for core/profile_store.py and the UserMasterProfile cache/flusher in core/master_agent_v0.py
+
+Tests cover LRU bounds, write coalescing, delta replay, optimistic version checks, legacy snapshots,
+conflict handling without blind overwrites, I/O outside the profile lock and bounded lock maps.
+"""
+import json
+import os
+import sys
+import threading
+
+import pytest
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+
+from core.profile_store import FileProfileStore, ProfileVersionConflict
+from core.master_agent_v0 import UserMasterProfile
+
+
+@pytest.fixture()
+def storage(tmp_path):
+    return str(tmp_path / "profiles")
+
+
+class TestFileProfileStore:
+    def test_delta_replay(self, storage):
+        store = FileProfileStore(storage)
+        v1 = store.write_full("u1", {"basic": {"age": 30, "sex": "F"}}, expected_version=0)
+        v2 = store.write_delta("u1", {"basic": {"age": 31}}, expected_version=v1)
+
+        profile, version = store.load("u1")
+        assert version == v2 == 2
+        assert profile == {"basic": {"age": 31, "sex": "F"}}
+
+    def test_version_conflict(self, storage):
+        store = FileProfileStore(storage)
+        store.write_full("u1", {"a": 1}, expected_version=0)
+        store.write_delta("u1", {"a": 2}, expected_version=1)
+
+        with pytest.raises(ProfileVersionConflict):
+            store.write_delta("u1", {"a": 3}, expected_version=1)
+
+    def test_compaction_truncates_log(self, storage):
+        store = FileProfileStore(storage, compact_every=4)
+        version = store.write_full("u1", {"n": 0}, expected_version=0)
+        for i in range(1, 10):
+            version = store.write_delta("u1", {"n": i}, expected_version=version)
+
+        profile, loaded = store.load("u1")
+        assert profile == {"n": 9}
+        assert loaded == version
+        with open(os.path.join(storage, "u1.delta"), "rb") as f:
+            assert len(f.readlines()) < 4
+
+    def test_legacy_indented_snapshot(self, storage):
+        os.makedirs(storage, exist_ok=True)
+        with open(os.path.join(storage, "old.json"), "w", encoding="utf-8") as f:
+            json.dump({"user_id": "old", "goals": {"primary": "睡眠"}}, f, ensure_ascii=False, indent=2)
+
+        profile, version = FileProfileStore(storage).load("old")
+        assert version == 0
+        assert profile["goals"]["primary"] == "睡眠"
+
+
+class TestUserMasterProfile:
+    def test_cache_is_bounded(self, storage):
+        manager = UserMasterProfile(storage, cache_size=3, flush_interval=0)
+        for i in range(10):
+            manager.get_profile(f"u{i}")
+        assert len(manager._cache) == 3
+
+    def test_evicted_pending_updates_are_persisted(self, storage):
+        manager = UserMasterProfile(storage, cache_size=1, flush_interval=0)
+        manager.update_profile("u1", {"basic": {"age": 50}})
+        manager.get_profile("u2")  # evicts u1
+
+        assert UserMasterProfile(storage).get_profile("u1")["basic"]["age"] == 50
+
+    def test_write_behind_coalesces(self, storage):
+        manager = UserMasterProfile(storage, flush_interval=60)
+        manager.set_profile("u1", {"basic": {"age": 20}})
+        manager.flush()
+        for i in range(20):
+            manager.update_profile("u1", {"history": {"total_sessions": i}})
+            manager.save_profile("u1")
+        assert manager.flush() == 1
+        manager.close()
+
+        with open(os.path.join(storage, "u1.delta"), "rb") as f:
+            assert len(f.readlines()) == 1
+        assert UserMasterProfile(storage).get_profile("u1")["history"]["total_sessions"] == 19
+
+    def test_concurrent_writers_rebase_on_conflict(self, storage):
+        a = UserMasterProfile(storage, flush_interval=0)
+        b = UserMasterProfile(storage, flush_interval=0)
+        a.set_profile("u1", {})
+        b.get_profile("u1")
+
+        a.update_profile("u1", {"goals": {"primary": "sleep"}})
+        a.save_profile("u1")
+        b.update_profile("u1", {"basic": {"age": 40}})
+        b.save_profile("u1")
+
+        merged = UserMasterProfile(storage).get_profile("u1")
+        assert merged["goals"]["primary"] == "sleep"
+        assert merged["basic"]["age"] == 40
+
+    def test_new_profile_does_not_overwrite_newer_stored_version(self, storage):
+        a = UserMasterProfile(storage, flush_interval=0)
+        b = UserMasterProfile(storage, flush_interval=0)
+        b.get_profile("u1")  # default profile, not yet written
+        a.update_profile("u1", {"basic": {"age": 33}})
+        a.save_profile("u1")
+
+        b._full_write.add("u1")
+        assert b.save_profile("u1") is False  # dropped instead of a blind overwrite
+        assert b.get_profile("u1")["basic"]["age"] == 33
+        assert UserMasterProfile(storage).get_profile("u1")["basic"]["age"] == 33
+
+    def test_persistent_conflict_requeues_delta(self, storage, monkeypatch):
+        manager = UserMasterProfile(storage, flush_interval=60)
+        manager.set_profile("u1", {"basic": {"age": 20}})
+        manager.flush()
+        other = FileProfileStore(storage)
+
+        real_write_delta = manager.store.write_delta
+
+        def racing_write_delta(user_id, delta, expected_version):
+            # another worker always wins the race
+            _, version = other.load(user_id)
+            other.write_delta(user_id, {"psych": {"stress_score": version}}, expected_version=version)
+            return real_write_delta(user_id, delta, expected_version=expected_version)
+
+        monkeypatch.setattr(manager.store, "write_delta", racing_write_delta)
+        manager.update_profile("u1", {"basic": {"age": 21}})
+        manager.save_profile("u1")
+        assert manager.flush() == 0
+        assert "u1" in manager._queued and manager._pending["u1"]["basic"]["age"] == 21
+
+        monkeypatch.setattr(manager.store, "write_delta", real_write_delta)
+        assert manager.flush() == 1
+        stored, _ = FileProfileStore(storage).load("u1")
+        assert stored["basic"]["age"] == 21 and stored["psych"]["stress_score"] >= 1
+        manager.close()
+
+    def test_flush_writes_outside_the_profile_lock(self, storage, monkeypatch):
+        manager = UserMasterProfile(storage, flush_interval=60)
+        manager.update_profile("u1", {"basic": {"age": 40}})
+        manager.save_profile("u1")
+        seen = []
+
+        def try_lock():
+            acquired = manager._lock.acquire(timeout=1)
+            if acquired:
+                manager._lock.release()
+            seen.append(acquired)
+
+        real_write_full = manager.store.write_full
+
+        def probing_write_full(*args, **kwargs):
+            # another thread can use the profile manager while the write is on disk
+            t = threading.Thread(target=try_lock)
+            t.start()
+            t.join()
+            return real_write_full(*args, **kwargs)
+
+        monkeypatch.setattr(manager.store, "write_full", probing_write_full)
+        assert manager.flush() == 1
+        assert seen == [True]
+        manager.close()
+
+    def test_flusher_restart_registers_atexit_once(self, storage, monkeypatch):
+        registered = []
+        monkeypatch.setattr("core.master_agent_v0.atexit.register", registered.append)
+        manager = UserMasterProfile(storage, flush_interval=0.01)
+        for _ in range(2):
+            manager.update_profile("u1", {"basic": {"age": 1}})
+            manager.save_profile("u1")
+            manager._closed = True
+            manager._wakeup.set()
+            manager._flusher.join(timeout=1)
+            manager._closed = False
+        assert registered == [manager.close]
+        manager.close()
+
+    def test_store_thread_locks_are_bounded(self, storage):
+        store = FileProfileStore(storage)
+        for i in range(200):
+            store.write_full(f"u{i}", {"n": i}, expected_version=0)
+        assert len(store._thread_locks) == 64
@@ -0,0 +1,214 @@
+"""
+Unit tests for core/rate_limiter.py — GCRA rate limiter
+
+Tests cover burst/refill behaviour of the local GCRA fallback, all-or-nothing
+multi-key checks (client + tenant), route/tenant policy resolution, LRU-bounded
+local state, the Redis path (one script call per check and no call at all
+while a client is known to be over its limit), and that the middleware takes the
+tenant only from a verified token, never from the X-Tenant-ID header.
+"""
+import asyncio
+import os
+import sys
+
+import pytest
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+
+import core.rate_limiter
+from core.rate_limiter import RateLimiter, RateLimitPolicies, RateLimitPolicy
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture()
+def clock():
+    return Clock()
+
+
+@pytest.fixture()
+def limiter(clock, monkeypatch):
+    monkeypatch.setattr(core.rate_limiter, "_redis", False)
+    monkeypatch.setattr(core.rate_limiter, "_async_redis", False)
+    return RateLimiter(clock=clock)
+
+
+def hits(limiter, checks, n):
+    return [limiter.hit(checks) for _ in range(n)]
+
+
+class TestLocalGCRA:
+    def test_burst_then_refill(self, limiter, clock):
+        checks = [("global:1.2.3.4", RateLimitPolicy("global", 6, 60))]
+        results = hits(limiter, checks, 7)
+        assert [r.allowed for r in results] == [True] * 6 + [False]
+        assert [r.remaining for r in results[:6]] == [5, 4, 3, 2, 1, 0]
+        assert results[-1].retry_after == pytest.approx(10)
+
+        clock.now += 10  # 发射间隔 60/6 = 10 秒, 恢复一次
+        assert [r.allowed for r in hits(limiter, checks, 2)] == [True, False]
+
+    def test_multi_key_is_all_or_nothing(self, limiter):
+        tenant = RateLimitPolicy("tenant:acme", 2, 60)
+        client = RateLimitPolicy("global", 10, 60)
+        a = [("global:a", client), ("tenant:acme", tenant)]
+        b = [("global:b", client), ("tenant:acme", tenant)]
+        assert limiter.hit(a).allowed and limiter.hit(b).allowed
+        assert not limiter.hit(a).allowed
+        # 租户配额耗尽的请求不消耗客户端配额
+        assert limiter.hit([("global:a", client)]).remaining == 8
+
+    def test_local_state_is_lru_bounded(self, clock, monkeypatch):
+        monkeypatch.setattr(core.rate_limiter, "_redis", False)
+        limiter = RateLimiter(local_max_keys=100, clock=clock)
+        policy = RateLimitPolicy("global", 1, 60)
+        for i in range(1000):
+            limiter.hit([(f"global:{i}", policy)])
+            limiter.hit([(f"global:{i}", policy)])
+        assert len(limiter._tats) == 100 and len(limiter._denied) == 100
+
+    def test_module_helpers_keep_signature(self, monkeypatch):
+        monkeypatch.setattr(core.rate_limiter, "_redis", False)
+        monkeypatch.setattr(core.rate_limiter, "_async_redis", False)
+        core.rate_limiter.rate_limiter.reset()
+        key = "login:test-helpers"
+        assert core.rate_limiter.check_rate_limit(key, max_attempts=2) == (True, 1)
+        assert asyncio.run(core.rate_limiter.check_rate_limit_async(key, max_attempts=2)) == (True, 0)
+        assert core.rate_limiter.check_rate_limit(key, max_attempts=2) == (False, 0)
+        with pytest.raises(Exception) as exc:
+            core.rate_limiter.rate_limit_or_429(key, 2, 60)
+        assert exc.value.status_code == 429 and int(exc.value.headers["Retry-After"]) <= 30
+        core.rate_limiter.rate_limiter.reset()
+
+
+class TestPolicies:
+    def test_route_and_tenant_resolution(self, monkeypatch):
+        monkeypatch.setenv("RATE_LIMIT_ROUTE_POLICIES", "/api/v1/auth/=20/60, /api/v1/auth/login=5,bogus")
+        monkeypatch.setenv("RATE_LIMIT_TENANT_POLICIES", "acme=600,default=1200/120")
+        policies = RateLimitPolicies.from_env(120)
+
+        (key, policy), = policies.resolve("/api/v1/home", "1.1.1.1")
+        assert key == "global:1.1.1.1" and policy.limit == 120
+
+        (key, policy), = policies.resolve("/api/v1/auth/login", "1.1.1.1")
+        assert key == "route:/api/v1/auth/login:1.1.1.1" and policy.limit == 5
+
+        checks = policies.resolve("/api/v1/auth/me", "1.1.1.1", tenant="acme")
+        assert [(k, p.limit) for k, p in checks] == [
+            ("route:/api/v1/auth/:1.1.1.1", 20), ("tenant:acme", 600),
+        ]
+        _, (key, policy) = policies.resolve("/x", "1.1.1.1", tenant="other")
+        assert key == "tenant:other" and (policy.limit, policy.period) == (1200, 120)
+
+
+class TestMiddlewareTenant:
+    @staticmethod
+    def request(layer, ip, headers):
+        from core.asgi_middleware import RequestContext
+
+        scope = {
+            "type": "http", "path": "/api/v1/home", "client": (ip, 1234),
+            "headers": [(k.lower().encode(), v.encode()) for k, v in headers.items()],
+        }
+        return asyncio.run(layer.on_request(RequestContext(scope)))
+
+    def test_spoofed_header_does_not_touch_tenant_bucket(self, limiter, monkeypatch):
+        from core.asgi_middleware import RateLimitLayer
+        from core.auth import create_access_token
+
+        monkeypatch.setattr(core.rate_limiter, "rate_limiter", limiter)
+        layer = RateLimitLayer(policies=RateLimitPolicies(
+            default=RateLimitPolicy("global", 100, 60),
+            tenants={"victim": RateLimitPolicy("tenant:victim", 2, 60)},
+        ))
+
+        # 伪造请求头: 不消耗受害租户配额, 也绕不开自身的 IP 配额
+        for _ in range(5):
+            assert self.request(layer, "6.6.6.6", {"X-Tenant-ID": "victim"}) is None
+        assert not any("tenant:" in key for key in limiter._tats)
+
+        # 受害租户凭签入 tenant_id 的令牌计数, 配额仍完整
+        token = create_access_token({"user_id": 1, "tenant_id": "victim"})
+        auth = {"Authorization": f"Bearer {token}", "X-Tenant-ID": "other"}
+        assert self.request(layer, "1.1.1.1", auth) is None
+        assert self.request(layer, "2.2.2.2", auth) is None
+        assert self.request(layer, "3.3.3.3", auth).status_code == 429
+
+        forged = create_access_token({"user_id": 1, "tenant_id": "victim"}).rsplit(".", 1)[0] + ".bad"
+        assert self.request(layer, "6.6.6.6", {"Authorization": f"Bearer {forged}"}) is None
+
+
+class FakeScript:
+    def __init__(self, replies):
+        self.replies = list(replies)
+        self.calls = []
+
+    def __call__(self, keys, args):
+        self.calls.append((keys, args))
+        return self.replies.pop(0)
+
+
+class AsyncFakeScript(FakeScript):
+    async def __call__(self, keys, args):
+        return super().__call__(keys, args)
+
+
+class FakeRedis:
+    def __init__(self, script):
+        self.script = script
+
+    def register_script(self, source):
+        assert "redis.call('TIME')" in source
+        return self.script
+
+
+class TestRedisPath:
+    def test_one_script_call_per_check(self, clock, monkeypatch):
+        script = FakeScript([[1, 4, 0], [1, 3, 0]])
+        monkeypatch.setattr(core.rate_limiter, "_redis", FakeRedis(script))
+        limiter = RateLimiter(clock=clock)
+        policy = RateLimitPolicy("global", 5, 60)
+
+        assert limiter.hit([("global:ip", policy)]).remaining == 4
+        assert limiter.hit([("global:ip", policy)]).remaining == 3
+        keys, args = script.calls[0]
+        assert keys == ["rl:gcra:global:ip"] and args == [12000.0, 60000.0]
+        assert len(script.calls) == 2
+
+    def test_rejected_client_is_short_circuited_locally(self, clock, monkeypatch):
+        script = AsyncFakeScript([[0, 0, 4500], [1, 0, 0]])
+        monkeypatch.setattr(core.rate_limiter, "_async_redis", FakeRedis(script))
+        limiter = RateLimiter(clock=clock)
+        checks = [("global:ip", RateLimitPolicy("global", 5, 60))]
+
+        first = asyncio.run(limiter.hit_async(checks))
+        assert not first.allowed and first.retry_after == pytest.approx(4.5)
+        for _ in range(10):
+            clock.now += 0.4
+            assert not asyncio.run(limiter.hit_async(checks)).allowed
+        assert len(script.calls) == 1
+
+        clock.now += 1
+        assert asyncio.run(limiter.hit_async(checks)).allowed
+        assert len(script.calls) == 2
+
+    def test_redis_error_falls_back_to_local(self, clock, monkeypatch):
+        class Broken:
+            def register_script(self, source):
+                def call(keys, args):
+                    raise ConnectionError("redis down")
+                return call
+
+        monkeypatch.setattr(core.rate_limiter, "_redis", Broken())
+        limiter = RateLimiter(clock=clock)
+        checks = [("global:ip", RateLimitPolicy("global", 1, 60))]
+        assert limiter.hit(checks).allowed
+        assert not limiter.hit(checks).allowed
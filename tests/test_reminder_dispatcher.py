@@ -0,0 +1,185 @@
+"""
+Unit tests for core/reminder_dispatcher.py — timer wheel + batched reminder claims
+
+Tests cover the hierarchical timer wheel (exact-second expiry across the
+second/minute/hour levels and the overflow heap, rescheduling and removal),
+batched claiming that advances cron reminders and deactivates one-shots with
+set-based UPDATEs, one push call per batch, the catch-all sweep, resync from
+the database and the async run loop firing with sub-second lateness.
+"""
+import asyncio
+import math
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+
+import pytest
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from core.models import Reminder
+from core.reminder_dispatcher import ReminderDispatcher, TimerWheel, to_epoch
+
+T0 = 1_780_000_000  # 整点之前的任意时刻
+NOW = datetime.utcfromtimestamp(T0)
+
+
+# ---- TimerWheel ----
+
+def run_wheel(wheel, until, step=1):
+    fired = {}
+    t = wheel.now
+    while t < until:
+        t = min(t + step, until)
+        for key in wheel.advance(t):
+            fired[key] = t
+    return fired
+
+
+def test_wheel_fires_on_exact_second_across_levels():
+    wheel = TimerWheel(T0)
+    offsets = {1: 1, 2: 59, 3: 61, 4: 3599, 5: 3601, 6: 86_399, 7: 90_000, 8: 200_000.4}
+    for key, off in offsets.items():
+        wheel.add(key, T0 + off)
+    fired = run_wheel(wheel, T0 + 200_010)
+    assert fired == {k: T0 + math.ceil(off) for k, off in offsets.items()}
+    assert len(wheel) == 0
+
+
+def test_wheel_reschedule_remove_and_overdue():
+    wheel = TimerWheel(T0)
+    wheel.add(1, T0 + 100)
+    wheel.add(1, T0 + 5000)   # 重新调度, 旧条目作废
+    wheel.add(2, T0 + 100)
+    wheel.remove(2)
+    wheel.add(3, T0 - 30)     # 已过期: 下次推进立即返回
+    assert wheel.advance(T0) == [3]
+    assert run_wheel(wheel, T0 + 6000) == {1: T0 + 5000}
+
+
+def test_wheel_random_schedule_with_coarse_steps():
+    rng = random.Random(41)
+    wheel = TimerWheel(T0)
+    due = {k: T0 + rng.uniform(-5, 3 * 86_400) for k in range(3000)}
+    for k, when in due.items():
+        wheel.add(k, when)
+    fired = run_wheel(wheel, T0 + 3 * 86_400 + 10, step=7)
+    assert set(fired) == set(due)
+    for k, t in fired.items():
+        tick = max(math.ceil(due[k]), T0)
+        assert tick <= t < tick + 7
+
+
+# ---- ReminderDispatcher ----
+
+class Clock:
+    def __init__(self, t):
+        self.t = t
+
+    def __call__(self):
+        return self.t
+
+
+@pytest.fixture()
+def session_factory():
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    Reminder.__table__.create(engine)
+    statements = []
+    event.listen(engine, "before_cursor_execute",
+                 lambda conn, cursor, stmt, *a: statements.append(stmt))
+    factory = sessionmaker(bind=engine)
+    factory.statements = statements
+    return factory
+
+
+def add_reminders(factory, specs):
+    db = factory()
+    rows = [Reminder(user_id=uid, type="behavior", title=f"r{uid}", cron_expr=cron, next_fire_at=at)
+            for uid, cron, at in specs]
+    db.add_all(rows)
+    db.commit()
+    ids = [r.id for r in rows]
+    db.close()
+    return ids
+
+
+def test_fire_batch_advances_cron_and_deactivates_one_shots(session_factory):
+    at = NOW.replace(hour=8, minute=0, second=0, microsecond=0)
+    ids = add_reminders(session_factory, [
+        (1, "08:00", at), (2, "08:00", at), (3, "0 8 * * *", at), (4, None, at),
+        (5, None, at + timedelta(hours=1)),
+    ])
+    pushes = []
+    clock = Clock(to_epoch(at) + 0.25)
+    d = ReminderDispatcher(session_factory, push=pushes.append, batch_size=2, clock=clock)
+
+    session_factory.statements.clear()
+    assert d.dispatch(ids) == 4
+    assert [len(p) for p in pushes] == [2, 2]
+    assert {p[0] for batch in pushes for p in batch} == {"1", "2", "3", "4"}
+    assert pushes[0][0][1]["type"] == "reminder"
+    updates = [s for s in session_factory.statements if s.lstrip().upper().startswith("UPDATE")]
+    assert len(updates) == 3  # 第一批同一下次时间 1 条; 第二批 cron + 一次性各 1 条
+
+    db = session_factory()
+    state = {r.user_id: (r.is_active, r.next_fire_at) for r in db.query(Reminder).all()}
+    db.close()
+    tomorrow = at + timedelta(days=1)
+    assert state[1] == state[2] == state[3] == (True, tomorrow)
+    assert state[4][0] is False
+    assert state[5] == (True, at + timedelta(hours=1))
+
+    # cron 提醒已按新时间重新入轮; 到明天同一时刻再次触发
+    assert d.wheel.due == {ids[0]: to_epoch(tomorrow), ids[1]: to_epoch(tomorrow), ids[2]: to_epoch(tomorrow)}
+    assert d.stats()["fired"] == 4 and d.stats()["lateness_p99_s"] == 0.25
+
+
+def test_sweep_and_resync_cover_reminders_not_in_wheel(session_factory):
+    ids = add_reminders(session_factory, [(1, None, NOW - timedelta(seconds=5)),
+                                          (2, None, NOW + timedelta(seconds=30)),
+                                          (3, None, NOW + timedelta(hours=2))])
+    clock = Clock(T0)
+    d = ReminderDispatcher(session_factory, push=lambda n: None, resync_seconds=60, clock=clock)
+    assert d.dispatch() == 1  # 兜底扫描, 不依赖时间轮
+
+    assert d.resync() == 1  # 只载入 2 分钟窗口内的 #2
+    clock.t = T0 + 30
+    assert d.due_ids() == [ids[1]]
+
+
+def test_schedule_and_deactivate(session_factory):
+    ids = add_reminders(session_factory, [(1, None, NOW + timedelta(seconds=3))])
+    clock = Clock(T0)
+    d = ReminderDispatcher(session_factory, push=lambda n: None, clock=clock)
+    d.schedule(ids[0], NOW + timedelta(seconds=3))
+    d.schedule(ids[0], NOW + timedelta(seconds=3), active=False)
+    clock.t = T0 + 10
+    assert d.due_ids() == []
+
+
+def test_run_loop_fires_with_subsecond_lateness(session_factory):
+    pushes = []
+
+    async def scenario():
+        d = ReminderDispatcher(session_factory, push=pushes.extend, resync_seconds=0.5)
+        task = asyncio.create_task(d.run())
+        due = datetime.utcfromtimestamp(math.ceil(time.time()) + 1)
+        add_reminders(session_factory, [(9, None, due)])  # 由 resync 发现
+        for _ in range(40):
+            await asyncio.sleep(0.1)
+            if pushes:
+                break
+        d.stop()
+        await task
+        return d.stats()
+
+    stats = asyncio.run(scenario())
+    assert [uid for uid, _ in pushes] == ["9"]
+    assert stats["lateness_max_s"] < 1.0
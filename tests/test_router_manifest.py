@@ -0,0 +1,140 @@
+"""
+Unit tests for api/router_manifest.py and core/startup_profiler.py
+
+Tests cover manifest-driven router loading (order, prefixes, multi-router
+entries, failure isolation, ImportError vs broad catch), feature-group gating
+that skips disabled groups without importing them, the invariants of the real
+manifest (bridge catch-all after the R2-R8 routers, no duplicate targets) and
+parsing of `python -X importtime` output into a tree.
+"""
+import os
+import sys
+import types
+
+import pytest
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+
+from fastapi import APIRouter, FastAPI
+
+from api.router_manifest import (
+    CORE_GROUP, EARLY_ROUTERS, LATE_ROUTERS, ROUTER_GROUPS, R, group_enabled, load_routers,
+)
+from core.startup_profiler import StartupProfile, heaviest, parse_importtime
+
+
+def fake_module(monkeypatch, name, **routers):
+    module = types.ModuleType(name)
+    for attr, path in routers.items():
+        router = APIRouter()
+        router.add_api_route(path, lambda: {"ok": True}, methods=["GET"])
+        setattr(module, attr, router)
+    monkeypatch.setitem(sys.modules, name, module)
+    return module
+
+
+def paths(app):
+    return [r.path for r in app.router.routes if r.path.startswith("/t")]
+
+
+def test_loads_in_order_with_prefix_and_multiple_routers(monkeypatch):
+    fake_module(monkeypatch, "fake_a", router="/ta")
+    fake_module(monkeypatch, "fake_b", router="/tb", alias_router="/tb-alias")
+    app, profile = FastAPI(), StartupProfile()
+    timings = load_routers(app, [
+        R("B", "fake_b:router", "fake_b:alias_router"),
+        R("A", "fake_a:router", prefix="/tv1"),
+    ], disabled=(), enabled=(), profile=profile)
+
+    assert paths(app) == ["/tb", "/tb-alias", "/tv1/ta"]
+    assert [t.routes for t in timings] == [2, 1]
+    assert [t.status for t in profile.routers] == ["ok", "ok"]
+
+
+def test_failures_are_isolated(monkeypatch):
+    fake_module(monkeypatch, "fake_ok", router="/tok")
+    fake_module(monkeypatch, "fake_no_router")
+    app = FastAPI()
+    timings = load_routers(app, [
+        R("missing", "fake_module_that_does_not_exist:router"),
+        R("no attr", "fake_no_router:router"),
+        R("ok", "fake_ok:router"),
+    ], disabled=(), enabled=(), profile=StartupProfile())
+
+    assert [t.status for t in timings] == ["failed", "failed", "ok"]
+    assert "fake_no_router" in timings[1].error
+    assert paths(app) == ["/tok"]
+
+
+def test_import_error_catch_does_not_hide_other_errors(monkeypatch):
+    module = types.ModuleType("fake_broken")
+    module.router = "not a router"  # include_router 时抛 AttributeError
+    monkeypatch.setitem(sys.modules, "fake_broken", module)
+
+    with pytest.raises(AttributeError):
+        load_routers(FastAPI(), [R("strict", "fake_broken:router")],
+                     disabled=(), enabled=(), profile=StartupProfile())
+    timings = load_routers(FastAPI(), [R("broad", "fake_broken:router", catch=Exception)],
+                           disabled=(), enabled=(), profile=StartupProfile())
+    assert timings[0].status == "failed"
+
+
+def test_disabled_groups_are_not_imported(monkeypatch):
+    fake_module(monkeypatch, "fake_core", router="/tcore")
+    specs = [
+        R("core", "fake_core:router"),
+        R("vision", "fake_never_imported:router", group="vision"),
+    ]
+    app = FastAPI()
+    timings = load_routers(app, specs, disabled={"vision", CORE_GROUP}, enabled=(), profile=StartupProfile())
+    assert [t.status for t in timings] == ["ok", "skipped"]
+    assert "fake_never_imported" not in sys.modules
+
+    monkeypatch.setenv("ROUTER_GROUPS_ENABLED", "exam")
+    monkeypatch.delenv("ROUTER_GROUPS_DISABLED", raising=False)
+    timings = load_routers(FastAPI(), specs, profile=StartupProfile())
+    assert [t.status for t in timings] == ["ok", "skipped"]
+
+
+def test_group_enabled_rules():
+    assert group_enabled(CORE_GROUP, disabled=frozenset({CORE_GROUP}))
+    assert not group_enabled("xzb", disabled=frozenset({"xzb"}))
+    assert group_enabled("xzb", enabled=frozenset({"xzb"}))
+    assert not group_enabled("vision", enabled=frozenset({"xzb"}))
+
+
+def test_real_manifest_invariants():
+    specs = [*EARLY_ROUTERS, *LATE_ROUTERS]
+    targets = [t for s in specs for t in s.targets]
+    assert len(targets) == len(set(targets))
+    assert all(":" in t for t in targets)
+
+    labels = [s.label for s in LATE_ROUTERS]
+    bridge = next(i for i, s in enumerate(LATE_ROUTERS) if "gateway.bridge:bridge_router" in s.targets)
+    flywheel = [i for i, s in enumerate(LATE_ROUTERS) if s.label.startswith(("R2", "R8"))]
+    assert len(flywheel) == 2 and max(flywheel) < bridge, labels
+    assert CORE_GROUP in ROUTER_GROUPS and "vision" in ROUTER_GROUPS
+
+
+IMPORTTIME = """\
+import time: self [us] | cumulative | imported package
+import time:       100 |        100 |   encodings.aliases
+import time:       200 |        300 | encodings
+import time:        50 |         50 |       llama_index.core.schema
+import time:        70 |        120 |     llama_index.core
+import time:        30 |        150 |   agents.base
+import time:        40 |         40 |   agents.octopus_engine
+import time:        10 |        200 | agents
+"""
+
+
+def test_parse_importtime_builds_tree():
+    roots = parse_importtime(IMPORTTIME)
+    assert [r.name for r in roots] == ["encodings", "agents"]
+    agents = roots[1]
+    assert [c.name for c in agents.children] == ["agents.base", "agents.octopus_engine"]
+    assert agents.children[0].children[0].name == "llama_index.core"
+    assert agents.children[0].children[0].children[0].cumulative_us == 50
+    assert [n.name for n in heaviest(roots, 3)] == ["encodings", "agents", "agents.base"]
@@ -0,0 +1,187 @@
+"""
+Unit tests for services/state_sync/store.py — persistent StateSyncManager store
+
+Tests cover write-behind batching into user_state_sync, reads that survive a
+restart (fresh manager on the same table), unflushed records merged into
+user/pending queries (including batches flushed while a query runs), retry
+after a failed flush, the query plans using the (user_id, timestamp) and
+partial pending-review indexes, and memory staying flat under a long soak with
+a bounded LRU.
+"""
+import gc
+import os
+import sys
+import tracemalloc
+
+import pytest
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+
+from loguru import logger
+from sqlalchemy import create_engine, event, text
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from services.state_sync.manager import EventType, StateSyncManager, UserStateSyncTable, ViewRole
+from services.state_sync.store import StateSyncStore
+
+REVIEW = {"text": "停不下来吃零食"}   # emotional_eating -> requires_review
+PLAIN = {"task_id": "T-1"}           # task_completed
+
+
+@pytest.fixture()
+def session_factory():
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    UserStateSyncTable.__table__.create(engine)
+    statements = []
+    event.listen(engine, "before_cursor_execute",
+                 lambda conn, cursor, stmt, *a: statements.append(stmt))
+    factory = sessionmaker(bind=engine)
+    factory.statements = statements
+    return factory
+
+
+@pytest.fixture(autouse=True)
+def quiet_logs():
+    handler = logger.add(sys.stderr, level="WARNING")
+    logger.disable("services.state_sync")
+    yield
+    logger.enable("services.state_sync")
+    logger.remove(handler)
+
+
+def emit(manager, n, user_of=lambda i: i % 5, review_every=4):
+    records = []
+    for i in range(n):
+        if i % review_every == 0:
+            records.append(manager.process_event(user_of(i), EventType.TEXT_INPUT, REVIEW))
+        else:
+            records.append(manager.process_event(user_of(i), EventType.TASK_COMPLETE, PLAIN))
+    return records
+
+
+def db_count(factory, where=""):
+    db = factory()
+    n = db.execute(text(f"SELECT COUNT(*) FROM user_state_sync {where}")).scalar()
+    db.close()
+    return n
+
+
+def test_write_behind_persists_and_survives_restart(session_factory):
+    store = StateSyncStore(session_factory, capacity=50, batch_size=20, flush_interval_ms=20)
+    records = emit(StateSyncManager(store=store), 200)
+    store.shutdown()
+
+    inserts = [s for s in session_factory.statements if s.lstrip().upper().startswith("INSERT")]
+    assert db_count(session_factory) == 200
+    assert db_count(session_factory, "WHERE requires_review") == 50
+    assert len(inserts) < 200  # executemany per batch
+    assert len(store._lru) == 50
+
+    # 新进程: 空缓存, 全部从表中读取
+    restarted = StateSyncManager(store=StateSyncStore(session_factory, capacity=50))
+    first = records[0]
+    assert restarted.get_view(first.event_id, ViewRole.ADMIN) == first.to_dict()
+
+    events = restarted.get_user_events(3, ViewRole.COACH, limit=5)
+    expected = [r.event_id for r in records if r.user_id == 3][-5:]
+    assert [e["event_id"] for e in events] == expected
+    assert events[-1]["view"] == records[-2].coach_view.to_dict()
+
+    pending = restarted.get_pending_reviews(limit=10)
+    assert [p["event_id"] for p in pending] == [r.event_id for r in records[::4]][-10:]
+    assert restarted.get_stats()["total_records"] == 200
+    assert restarted.get_stats()["pending_reviews"] == 50
+
+
+def test_unflushed_records_are_visible(session_factory):
+    store = StateSyncStore(session_factory, capacity=3, batch_size=1000, flush_interval_ms=60_000)
+    manager = StateSyncManager(store=store)
+    emit(manager, 10, user_of=lambda i: 1)
+    store.flush()
+    late = emit(manager, 8, user_of=lambda i: 1)  # 仍在写后队列
+
+    assert db_count(session_factory) == 10
+    events = manager.get_user_events(1, ViewRole.PATIENT, limit=8)
+    assert [e["event_id"] for e in events] == [r.event_id for r in late]
+    assert len(manager.get_pending_reviews(limit=100)) == 3 + 2
+    assert manager.get_stats()["total_records"] == 18
+    assert manager.get_view(late[0].event_id, ViewRole.PATIENT) is not None
+    store.shutdown()
+    assert db_count(session_factory) == 18
+
+
+def test_records_flushed_during_query_are_not_lost(session_factory, monkeypatch):
+    store = StateSyncStore(session_factory, batch_size=1000, flush_interval_ms=60_000)
+    manager = StateSyncManager(store=store)
+    records = emit(manager, 8, user_of=lambda i: 1)
+    real_query = store._query
+
+    def query_then_flush(fn):
+        rows = real_query(fn)
+        store.flush()  # 写后线程在查询结束后、合并之前落库
+        return rows
+
+    monkeypatch.setattr(store, "_query", query_then_flush)
+    events = manager.get_user_events(1, ViewRole.PATIENT, limit=8)
+    assert [e["event_id"] for e in events] == [r.event_id for r in records]
+    emit(manager, 4, user_of=lambda i: 2)
+    assert len(manager.get_pending_reviews(limit=100)) == 3
+    store.shutdown()
+
+
+def test_failed_flush_is_retried(session_factory):
+    calls = []
+
+    def flaky():
+        calls.append(1)
+        if len(calls) == 1:
+            raise RuntimeError("db down")
+        return session_factory()
+
+    store = StateSyncStore(flaky, batch_size=1000, flush_interval_ms=60_000)
+    emit(StateSyncManager(store=store), 6)
+    assert store.flush() == 0
+    assert store.stats["flush_errors"] == 1
+    assert store.flush() == 6
+    assert db_count(session_factory) == 6
+
+
+def test_queries_use_indexes(session_factory):
+    store = StateSyncStore(session_factory)
+    session_factory.statements.clear()
+    store.user_events(7, 10)
+    store.pending_reviews(10)
+    db = session_factory()
+    conn = db.connection()
+    plans = [" ".join(str(r) for r in conn.exec_driver_sql("EXPLAIN QUERY PLAN " + s, _params(s)).fetchall())
+             for s in session_factory.statements if s.lstrip().upper().startswith("SELECT")]
+    db.close()
+    assert any("idx_user_state_sync_user_ts" in p for p in plans)
+    assert any("idx_user_state_sync_pending" in p for p in plans)
+
+
+def _params(stmt):
+    return tuple(0 for _ in range(stmt.count("?")))
+
+
+def test_memory_stays_flat_under_soak():
+    store = StateSyncStore(capacity=500)
+    manager = StateSyncManager(store=store)
+    tracemalloc.start()
+    # 预热: LRU 已整体替换多轮, 此后常驻内存只应是 capacity 条记录
+    emit(manager, 5_000, user_of=lambda i: i)  # 每条一个新用户, 检验按用户索引也随淘汰释放
+    gc.collect()
+    base = tracemalloc.get_traced_memory()[0]
+    emit(manager, 20_000, user_of=lambda i: i + 5_000)
+    gc.collect()
+    grown = tracemalloc.get_traced_memory()[0] - base
+    tracemalloc.stop()
+
+    assert len(store._lru) == 500
+    assert sum(len(v) for v in store._by_user.values()) == 500
+    assert len(store._pending_ids) == 125
+    assert grown < 64 * 1024
+    assert len(manager.get_pending_reviews(limit=1000)) == 125
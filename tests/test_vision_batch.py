@@ -0,0 +1,139 @@
+"""
+Unit tests for the set-based VisionGuard nightly jobs in core/vision_service.py
+
+Tests cover batch_calc_daily_scores (missing default goals created in one pass,
+scores identical to get_or_create_goal + calc_behavior_score per log) and
+batch_update_risk_levels (latest exam via ROW_NUMBER, 7-day log window, same
+levels and change count as assess_vision_risk per profile), plus a bounded
+number of statements regardless of the number of students.
+"""
+import os
+import random
+import sys
+from datetime import date, datetime, timedelta
+
+import pytest
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from core.models import Base
+from core.vision_service import (
+    VisionBehaviorGoal,
+    VisionBehaviorLog,
+    VisionExamRecord,
+    VisionProfile,
+    assess_vision_risk,
+    batch_calc_daily_scores,
+    batch_update_risk_levels,
+    calc_behavior_score,
+    get_or_create_goal,
+)
+
+TABLES = [VisionExamRecord.__table__, VisionBehaviorLog.__table__,
+          VisionBehaviorGoal.__table__, VisionProfile.__table__]
+
+
+@pytest.fixture()
+def session_factory():
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+
+    @event.listens_for(engine, "connect")
+    def _now(dbapi_conn, _):
+        # server_default now() 在 SQLite 中没有对应函数
+        dbapi_conn.create_function("now", 0, lambda: datetime.now().isoformat(" "))
+
+    Base.metadata.create_all(engine, tables=TABLES)
+    statements = []
+    event.listen(engine, "before_cursor_execute",
+                 lambda conn, cursor, stmt, *a: statements.append(stmt))
+    factory = sessionmaker(bind=engine)
+    factory.statements = statements
+    return factory
+
+
+def seed(db, students=60, seed_=7):
+    rng = random.Random(seed_)
+    today = date.today()
+    for uid in range(1, students + 1):
+        db.add(VisionProfile(user_id=uid, is_vision_student=uid % 10 != 0,
+                             current_risk_level=rng.choice(["normal", "watch", "alert"])))
+        if uid % 3:
+            db.add(VisionBehaviorGoal(user_id=uid, outdoor_target_min=rng.choice([60, 90, 120]),
+                                      screen_daily_limit=rng.choice([60, 120]),
+                                      lutein_target_mg=rng.choice([0.0, 6.0, 10.0]),
+                                      sleep_target_min=rng.choice([420, 480])))
+        for d in range(rng.randint(0, 10)):
+            db.add(VisionBehaviorLog(
+                user_id=uid, log_date=today - timedelta(days=d),
+                outdoor_minutes=rng.randint(0, 180), screen_total_minutes=rng.randint(0, 300),
+                eye_exercise_done=rng.random() < 0.5, lutein_intake_mg=rng.choice([0.0, 4.5, 12.0]),
+                sleep_minutes=rng.randint(300, 560),
+                behavior_score=None if d == 0 else rng.choice([None, 12.5, 24.9, 25.1, 39.9, 40.0, 88.0]),
+            ))
+        for e in range(rng.randint(0, 3)):
+            db.add(VisionExamRecord(
+                user_id=uid, exam_date=today - timedelta(days=30 * (e + 1)),
+                left_eye_sph=rng.choice([None, 0.0, -0.75, -3.25, -6.5]),
+                right_eye_sph=rng.choice([None, -0.25, -2.0]),
+                left_eye_axial_len=rng.choice([None, 24.0, 26.3]),
+            ))
+    db.commit()
+
+
+def test_daily_scores_match_per_log_path(session_factory):
+    db = session_factory()
+    seed(db)
+
+    # 原逐条路径的结果 (回滚, 不落库)
+    logs = db.query(VisionBehaviorLog).filter(
+        VisionBehaviorLog.log_date == date.today(), VisionBehaviorLog.behavior_score.is_(None)).all()
+    expected = {log.id: calc_behavior_score(log, get_or_create_goal(db, log.user_id)) for log in logs}
+    expected_goals = db.query(VisionBehaviorGoal).count()
+    db.rollback()
+
+    assert batch_calc_daily_scores(db) == len(expected) > 0
+    db.expire_all()
+    scored = dict(db.query(VisionBehaviorLog.id, VisionBehaviorLog.behavior_score)
+                  .filter(VisionBehaviorLog.id.in_(list(expected))).all())
+    assert scored == expected
+    assert db.query(VisionBehaviorGoal).count() == expected_goals
+    default = db.query(VisionBehaviorGoal).filter(VisionBehaviorGoal.user_id == 3).first()
+    assert (default.outdoor_target_min, default.screen_daily_limit,
+            default.lutein_target_mg, default.sleep_target_min) == (120, 120, 10.0, 480)
+
+    # 再次运行无待评分日志
+    assert batch_calc_daily_scores(db) == 0
+    db.close()
+
+
+def test_risk_levels_match_per_profile_path(session_factory):
+    db = session_factory()
+    seed(db, students=120, seed_=11)
+    profiles = db.query(VisionProfile).filter(VisionProfile.is_vision_student == True).all()  # noqa: E712
+    expected = {p.user_id: assess_vision_risk(db, p.user_id).value for p in profiles}
+    changed = sum(1 for p in profiles if p.current_risk_level != expected[p.user_id])
+    assert changed > 0
+
+    assert batch_update_risk_levels(db) == changed
+    db.expire_all()
+    after = dict(db.query(VisionProfile.user_id, VisionProfile.current_risk_level).all())
+    assert {uid: after[uid] for uid in expected} == expected
+    assert batch_update_risk_levels(db) == 0
+    db.close()
+
+
+def test_statement_count_is_constant(session_factory):
+    db = session_factory()
+    seed(db, students=200, seed_=3)
+    session_factory.statements.clear()
+    batch_calc_daily_scores(db)
+    batch_update_risk_levels(db)
+    # 缺目标查询 + 插入 + 联表 + 更新 + 档案 + 检查窗口 + 日志窗口 + 更新
+    assert len(session_factory.statements) <= 8
+    db.close()
@@ -0,0 +1,210 @@
+"""
+Unit tests for core/ws_hub.py — WebSocket fan-out hub
+
+Tests cover multiple sockets per user, bounded per-connection queues that
+drop slow consumers without delaying others, stats_update coalescing, Redis
+relay (publish goes through pub/sub, listener delivers locally), thread-safe
+publish from scheduler threads and the /ws/user endpoint end to end.
+"""
+import asyncio
+import json
+import os
+import sys
+import threading
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+
+from core.ws_hub import WS_CHANNEL_PREFIX, ConnectionHub, merge_message
+
+
+class FakeWebSocket:
+    def __init__(self, block=False):
+        self.sent = []
+        self.closed_with = None
+        self.gate = asyncio.Event()
+        if not block:
+            self.gate.set()
+
+    async def accept(self):
+        pass
+
+    async def send_json(self, message):
+        await self.gate.wait()
+        self.sent.append(message)
+
+    async def close(self, code=1000, reason=""):
+        self.closed_with = code
+
+
+async def drain():
+    for _ in range(5):
+        await asyncio.sleep(0)
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+def test_merge_message_sums_deltas_and_keeps_latest():
+    pending = {"type": "stats_update", "data": {"like_count_delta": 1, "view_count": 10}}
+    merge_message(pending, {"type": "stats_update", "data": {"like_count_delta": 2, "view_count": 12}})
+    assert pending["data"] == {"like_count_delta": 3, "view_count": 12}
+
+
+def test_multiple_sockets_per_user_all_receive():
+    async def scenario():
+        hub = ConnectionHub()
+        tab1, tab2, other = FakeWebSocket(), FakeWebSocket(), FakeWebSocket()
+        c1 = await hub.connect(tab1, "user:1")
+        await hub.connect(tab2, "user:1")
+        await hub.connect(other, "user:2")
+        await hub.publish("user:1", {"type": "notification", "data": {"n": 1}})
+        await drain()
+        assert tab1.sent == tab2.sent == [{"type": "notification", "data": {"n": 1}}]
+        assert other.sent == []
+        assert hub.stats()["connected_users"] == 2
+
+        hub.disconnect(c1)
+        await hub.publish("user:1", {"type": "notification", "data": {"n": 2}})
+        await drain()
+        assert len(tab1.sent) == 1 and len(tab2.sent) == 2
+    run(scenario())
+
+
+def test_slow_consumer_is_dropped_without_blocking_others():
+    async def scenario():
+        hub = ConnectionHub(queue_size=3)
+        slow, fast = FakeWebSocket(block=True), FakeWebSocket()
+        slow_conn = await hub.connect(slow, "broadcast")
+        await hub.connect(fast, "broadcast")
+        for i in range(6):
+            hub.deliver_local("broadcast", {"type": "news", "i": i})
+            await drain()
+        assert [m["i"] for m in fast.sent] == list(range(6))
+        assert slow_conn.closed and slow.closed_with == 1013
+        stats = hub.stats()
+        assert stats["dropped_slow_consumers"] == 1 and stats["connections"] == 1
+    run(scenario())
+
+
+def test_stats_updates_coalesce_while_queued():
+    async def scenario():
+        hub = ConnectionHub()
+        ws = FakeWebSocket(block=True)
+        await hub.connect(ws, "content:9")
+        hub.deliver_local("content:9", {"type": "new_comment", "data": {"id": 1}})
+        for _ in range(50):
+            hub.deliver_local("content:9", {"type": "stats_update", "data": {"like_count_delta": 1}})
+        hub.deliver_local("content:9", {"type": "stats_update", "data": {"view_count": 99}})
+        assert hub.stats()["queue_depth"] == 2
+        ws.gate.set()
+        await drain()
+        assert ws.sent == [
+            {"type": "new_comment", "data": {"id": 1}},
+            {"type": "stats_update", "data": {"like_count_delta": 50, "view_count": 99}},
+        ]
+        assert hub.coalesced == 50
+    run(scenario())
+
+
+class FakePubSub:
+    def __init__(self, bus):
+        self.bus = bus
+
+    async def psubscribe(self, pattern):
+        assert pattern == f"{WS_CHANNEL_PREFIX}*"
+
+    async def listen(self):
+        while True:
+            channel, data = await self.bus.get()
+            yield {"type": "pmessage", "channel": channel, "data": data}
+
+    async def aclose(self):
+        pass
+
+
+class FakeAsyncRedis:
+    """两个 hub 共享的 "Redis": publish 进入队列, 由各自 listener 读取"""
+
+    def __init__(self):
+        self.buses = []
+
+    def pubsub(self, ignore_subscribe_messages=True):
+        bus = asyncio.Queue()
+        self.buses.append(bus)
+        return FakePubSub(bus)
+
+    async def publish(self, channel, data):
+        for bus in self.buses:
+            bus.put_nowait((channel, data))
+
+
+def test_publish_reaches_connections_on_other_workers():
+    async def scenario():
+        redis = FakeAsyncRedis()
+        worker_a, worker_b = ConnectionHub(), ConnectionHub()
+        for hub in (worker_a, worker_b):
+            hub._async_redis = redis
+        ws_a, ws_b = FakeWebSocket(), FakeWebSocket()
+        await worker_a.connect(ws_a, "user:7")
+        await worker_b.connect(ws_b, "user:7")
+        await drain()
+        assert worker_a.stats()["relay_active"] and worker_b.stats()["relay_active"]
+
+        await worker_a.publish("user:7", {"type": "notification", "data": {"title": "提醒"}})
+        await drain()
+        assert ws_a.sent == ws_b.sent == [{"type": "notification", "data": {"title": "提醒"}}]
+
+        # 没有任何连接 (未订阅) 的 worker 发布同样能送达
+        scheduler_worker = ConnectionHub()
+        scheduler_worker._async_redis = redis
+        await scheduler_worker.publish("user:7", {"type": "notification"})
+        await drain()
+        assert ws_a.sent[-1] == ws_b.sent[-1] == {"type": "notification"}
+        for hub in (worker_a, worker_b):
+            hub._listener.cancel()
+    run(scenario())
+
+
+def test_publish_sync_from_thread_without_redis(monkeypatch):
+    monkeypatch.delenv("REDIS_URL", raising=False)
+
+    async def scenario():
+        hub = ConnectionHub()
+        ws = FakeWebSocket()
+        await hub.connect(ws, "user:3")
+        t = threading.Thread(target=hub.publish_sync, args=("user:3", {"type": "notification"}))
+        t.start()
+        t.join()
+        await drain()
+        assert ws.sent == [{"type": "notification"}]
+    run(scenario())
+
+
+def test_user_endpoint_receives_scheduler_notifications(monkeypatch):
+    monkeypatch.delenv("REDIS_URL", raising=False)
+    from fastapi import FastAPI
+    from fastapi.testclient import TestClient
+
+    from api import websocket_api
+    from core.auth import create_access_token
+
+    hub = ConnectionHub()
+    monkeypatch.setattr(websocket_api, "manager", hub)
+    app = FastAPI()
+    app.include_router(websocket_api.router)
+    token = create_access_token({"user_id": 5})
+
+    with TestClient(app) as client:
+        url = f"/ws/user/5?token={token}"
+        with client.websocket_connect(url) as tab1, client.websocket_connect(url) as tab2:
+            assert tab1.receive_json()["type"] == "connected"
+            assert tab2.receive_json()["type"] == "connected"
+            websocket_api.push_user_notification_sync("5", {"type": "reminder", "title": "喝水"})
+            for tab in (tab1, tab2):
+                message = tab.receive_json()
+                assert message["type"] == "notification" and message["data"]["title"] == "喝水"
+            tab1.send_text(json.dumps({"type": "ping"}))
+            assert tab1.receive_json() == {"type": "pong"}